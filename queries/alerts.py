@@ -0,0 +1,482 @@
+"""
+Alerts — rule-based alert engine over incoming market / vault points.
+
+The dashboard classifies markets after the fact: load_markets' `_status`
+(bad debt > $1k, utilization ≥ 99% / ≥ 90%) and load_borrowers' top-borrower
+concentration bands, recomputed on every rerun from static CSVs. Those
+thresholds now live here, and the same numbers drive alerts that are
+evaluated incrementally, one point at a time:
+
+  - rules are declarative one-liners, parsed once:
+
+        [name:] metric [drawdown] op value[%] [for 2h] [cooldown 6h] [[severity]]
+
+        oracle_gap: oracle_spot_gap_pct > 10% for 2h [critical]
+        utilization >= 0.99 for 6h
+        share_price drawdown > 1%
+
+    `%` divides the value by 100 (gaps and drawdowns are fractions, as in
+    block1); `drawdown` compares 1 - value / running max instead of the value
+  - per (rule, entity) state: since when the condition has held, the running
+    peak, whether the alert is firing and when it last fired — O(1) per
+    point, no history kept. Rules are indexed by metric, so a point only
+    touches the rules for metrics it carries
+  - an alert FIRES once the condition has held for `for` (event time, so a
+    replay behaves like the live feed), is not repeated while it keeps
+    holding (dedup), RESOLVES when it clears, and can't fire again for that
+    entity until `cooldown` has passed since the last firing
+  - sinks: FileSink appends JSON lines (data/_store/alerts.jsonl),
+    WebhookSink POSTs each alert from a background thread so evaluation
+    never waits on the network (standin_api.py's /webhook receives them)
+
+monitor.py evaluates every poll; `--replay` runs the rules over the history
+the blocks already saved (block3 utilization, the oracle cube, block2 share
+prices, block5 borrower concentration at its snapshot_ts) and reports the
+evaluation cost.
+save()/load() keep the state in data/_store/alert_state.json.
+
+Used by: monitor.py and the dashboard (utils/data_loader.py thresholds).
+requests is only needed for WebhookSink.
+
+    python queries/alerts.py --replay [--rules FILE] [--webhook URL]
+"""
+
+import re
+import sys
+import json
+import math
+import time
+import queue
+import argparse
+import operator
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+STORE_SUBDIR = "_store"
+STATE_FILE = "alert_state.json"
+ALERTS_FILE = "alerts.jsonl"
+
+# ── Thresholds shared with utils/data_loader.py ──
+# load_markets `_status`
+BAD_DEBT_USD = 1000                 # BAD_DEBT
+UTIL_FULL = 0.99                    # AT_RISK_100PCT
+UTIL_HIGH = 0.90                    # AT_RISK_HIGH
+# load_borrowers concentration: top borrower's share of market debt (%)
+CONCENTRATION_LEVELS = ((90, "EXTREME"), (70, "HIGH"), (50, "MODERATE"))
+# Oracle-implied collateral price above spot (the hardcoded-oracle signal)
+ORACLE_GAP_PCT = 10
+SHARE_PRICE_DRAWDOWN_PCT = 1
+
+DEFAULT_COOLDOWN_HOURS = 6
+DEFAULT_SEVERITY = "warning"
+
+DEFAULT_RULES = [
+    f"oracle_gap: oracle_spot_gap_pct > {ORACLE_GAP_PCT}% for 2h [critical]",
+    f"util_full: utilization >= {UTIL_FULL} for 6h [critical]",
+    f"util_high: utilization >= {UTIL_HIGH} for 6h",
+    f"bad_debt: bad_debt_usd > {BAD_DEBT_USD} [critical]",
+    f"share_price_drawdown: share_price drawdown > {SHARE_PRICE_DRAWDOWN_PCT}% [critical]",
+    f"borrower_concentration: top_borrower_pct >= {CONCENTRATION_LEVELS[0][0]}",
+]
+
+ALERT_COLS = ["state", "rule", "severity", "key", "label", "metric", "value", "threshold",
+              "timestamp", "datetime", "since", "held_hours"]
+
+OPS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le, "==": operator.eq}
+UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+RULE_RE = re.compile(
+    r"^\s*(?:(?P<name>[\w.-]+)\s*:\s*)?"
+    r"(?P<metric>\w+)(?:\s+(?P<transform>drawdown))?\s*"
+    r"(?P<op>>=|<=|==|>|<)\s*(?P<value>-?\d+(?:\.\d+)?(?:e-?\d+)?)\s*(?P<pct>%)?"
+    r"(?:\s+for\s+(?P<hold>\d+(?:\.\d+)?[smhd]))?"
+    r"(?:\s+cooldown\s+(?P<cooldown>\d+(?:\.\d+)?[smhd]))?"
+    r"(?:\s+\[(?P<severity>\w+)\])?\s*$"
+)
+
+
+def concentration_level(top_borrower_pct: float) -> str:
+    """load_borrowers band for the top borrower's share of market debt (%)."""
+    for floor, level in CONCENTRATION_LEVELS:
+        if top_borrower_pct >= floor:
+            return level
+    return "LOW"
+
+
+def entity_key(entity_id, chain):
+    """"<market uniqueKey | vault address>|<chain network>" — scalars or Series."""
+    if isinstance(entity_id, pd.Series):
+        return entity_id.astype(str).str.lower() + "|" + chain.astype(str)
+    return f"{str(entity_id).lower()}|{chain}"
+
+
+def _seconds(text: Optional[str], default: float = 0.0) -> float:
+    if not text:
+        return default
+    return float(text[:-1]) * UNITS[text[-1]]
+
+
+class Rule:
+    __slots__ = ("name", "text", "metric", "transform", "op", "cmp", "threshold",
+                 "hold_s", "cooldown_s", "severity")
+
+    def __init__(self, text: str):
+        m = RULE_RE.match(text)
+        if not m:
+            raise ValueError(f"Can't parse alert rule {text!r} — expected "
+                             "'[name:] metric [drawdown] op value[%] [for 2h] [cooldown 6h] [[severity]]'")
+        self.text = text.strip()
+        self.metric = m["metric"]
+        self.transform = m["transform"]
+        self.op = m["op"]
+        self.cmp = OPS[m["op"]]
+        self.threshold = float(m["value"]) / (100 if m["pct"] else 1)
+        self.hold_s = _seconds(m["hold"])
+        self.cooldown_s = _seconds(m["cooldown"], DEFAULT_COOLDOWN_HOURS * 3600)
+        self.severity = m["severity"] or DEFAULT_SEVERITY
+        self.name = m["name"] or re.sub(r"\W+", "_", f"{self.metric} {self.transform or ''} {self.op}").strip("_")
+
+    def __repr__(self) -> str:
+        return f"Rule({self.text!r})"
+
+
+class RuleState:
+    __slots__ = ("since", "peak", "firing", "last_fired")
+
+    def __init__(self):
+        self.since = None
+        self.peak = -math.inf
+        self.firing = False
+        self.last_fired = None
+
+    def to_list(self) -> list:
+        return [getattr(self, f) for f in self.__slots__]
+
+    @classmethod
+    def from_list(cls, values: list) -> "RuleState":
+        state = cls.__new__(cls)
+        for f, v in zip(cls.__slots__, values):
+            setattr(state, f, v)
+        if state.peak is None:
+            state.peak = -math.inf
+        return state
+
+
+class AlertEngine:
+    def __init__(self, rules: Optional[Sequence] = None):
+        self.rules = [r if isinstance(r, Rule) else Rule(r) for r in (rules or DEFAULT_RULES)]
+        names = [r.name for r in self.rules]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate alert rule names: {sorted({n for n in names if names.count(n) > 1})}")
+        self.by_metric: Dict[str, List[Rule]] = {}
+        for rule in self.rules:
+            self.by_metric.setdefault(rule.metric, []).append(rule)
+        self.states: Dict[str, RuleState] = {}
+        self.points = 0
+        self.eval_ns = 0
+
+    def update(self, key: str, timestamp: int, values: Dict, label: str = "") -> List[Dict]:
+        """Evaluate one point (metric → value) for entity `key`; returns FIRING / RESOLVED alerts."""
+        t0 = time.perf_counter_ns()
+        ts = int(timestamp)
+        alerts = []
+        for metric, rules in self.by_metric.items():
+            x = values.get(metric)
+            if x is None:
+                continue
+            try:
+                x = float(x)
+            except (TypeError, ValueError):
+                continue
+            if x != x:                      # NaN: no reading, state unchanged
+                continue
+            for rule in rules:
+                sk = f"{rule.name}|{key}"
+                s = self.states.get(sk)
+                if s is None:
+                    s = self.states[sk] = RuleState()
+                value = x
+                if rule.transform == "drawdown":
+                    if x > s.peak:
+                        s.peak = x
+                    value = 1 - x / s.peak if s.peak > 0 else 0.0
+
+                if rule.cmp(value, rule.threshold):
+                    if s.since is None:
+                        s.since = ts
+                    if (not s.firing and ts - s.since >= rule.hold_s
+                            and (s.last_fired is None or ts - s.last_fired >= rule.cooldown_s)):
+                        s.firing, s.last_fired = True, ts
+                        alerts.append(self._alert("FIRING", rule, key, label, value, ts, s.since))
+                elif s.since is not None:
+                    if s.firing:
+                        alerts.append(self._alert("RESOLVED", rule, key, label, value, ts, s.since))
+                    s.since, s.firing = None, False
+        self.points += 1
+        self.eval_ns += time.perf_counter_ns() - t0
+        return alerts
+
+    @staticmethod
+    def _alert(state: str, rule: Rule, key: str, label: str, value: float, ts: int, since: int) -> Dict:
+        return {
+            "state": state, "rule": rule.name, "severity": rule.severity, "key": key,
+            "label": label, "metric": rule.metric if not rule.transform else f"{rule.metric} {rule.transform}",
+            "value": value, "threshold": rule.threshold, "timestamp": ts,
+            "datetime": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ts)),
+            "since": since, "held_hours": round((ts - since) / 3600, 2),
+        }
+
+    @property
+    def mean_eval_us(self) -> float:
+        return self.eval_ns / self.points / 1000 if self.points else 0.0
+
+    def firing(self) -> List[str]:
+        return [k for k, s in self.states.items() if s.firing]
+
+    # ── state ──
+    @staticmethod
+    def path(data_dir: Path) -> Path:
+        return Path(data_dir) / STORE_SUBDIR / STATE_FILE
+
+    def save(self, data_dir: Path):
+        out = self.path(data_dir)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        tmp = out.with_name(out.name + ".partial")
+        states = {k: [None if v == -math.inf else v for v in s.to_list()] for k, s in self.states.items()}
+        tmp.write_text(json.dumps(states))
+        tmp.replace(out)
+
+    @classmethod
+    def load(cls, data_dir: Path, rules: Optional[Sequence] = None) -> "AlertEngine":
+        """Engine with the saved per-rule state (state of rules no longer defined is dropped)."""
+        engine = cls(rules)
+        src = cls.path(data_dir)
+        if src.exists():
+            try:
+                saved = json.loads(src.read_text())
+            except ValueError:
+                saved = {}
+            names = {r.name for r in engine.rules}
+            engine.states = {k: RuleState.from_list(v) for k, v in saved.items()
+                             if k.split("|", 1)[0] in names}
+        return engine
+
+
+def load_rules(path: Path) -> List[str]:
+    """One rule per line; blank lines and # comments skipped."""
+    lines = Path(path).read_text(encoding="utf-8").splitlines()
+    return [ln.strip() for ln in lines if ln.strip() and not ln.lstrip().startswith("#")]
+
+
+# ═══════════════════════════════════════════════════════════════
+#  SINKS
+# ═══════════════════════════════════════════════════════════════
+
+class FileSink:
+    """Appends one JSON line per alert (data/_store/alerts.jsonl by default)."""
+
+    def __init__(self, data_dir: Path, filename: str = ALERTS_FILE):
+        self.path = Path(data_dir) / STORE_SUBDIR / filename
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def send(self, alert: Dict):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(alert) + "\n")
+
+    def close(self):
+        pass
+
+
+class WebhookSink:
+    """POSTs each alert as JSON from a background thread; failures are counted, never raised."""
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        import requests
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.sent = 0
+        self.failed = 0
+        self.q: "queue.Queue[Optional[Dict]]" = queue.Queue()
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def send(self, alert: Dict):
+        self.q.put(alert)
+
+    def _run(self):
+        while True:
+            alert = self.q.get()
+            if alert is None:
+                break
+            try:
+                self.session.post(self.url, json=alert, timeout=self.timeout).raise_for_status()
+                self.sent += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"      ⚠️  Webhook {self.url}: {e}")
+
+    def close(self):
+        """Flush queued alerts and stop the worker."""
+        self.q.put(None)
+        self.worker.join(timeout=self.timeout * 2)
+
+
+def alert_line(alert: Dict) -> str:
+    icon = "✅" if alert["state"] == "RESOLVED" else ("🚨" if alert["severity"] == "critical" else "⚠️ ")
+    held = f" (held {alert['held_hours']:g}h)" if alert["held_hours"] else ""
+    return (f"  {icon} {alert['datetime']}  {alert['state']:<8} {alert['rule']}: "
+            f"{alert['label'] or alert['key']}  {alert['metric']}={alert['value']:.4g}{held}")
+
+
+# ═══════════════════════════════════════════════════════════════
+#  REPLAY
+# ═══════════════════════════════════════════════════════════════
+
+def replay_points(data_dir: Path) -> pd.DataFrame:
+    """
+    Historical points from the block outputs as one time-ordered stream:
+    key, label, timestamp + one metric column per source (NaN elsewhere).
+    """
+    frames = []
+
+    path = data_dir / "block3_market_utilization_hourly.csv"
+    if path.exists():
+        df = pd.read_csv(path)
+        frames.append(pd.DataFrame({
+            "key": entity_key(df["market_unique_key"], df["chain"]),
+            "label": df["collateral_symbol"] + "/" + df["loan_symbol"] + " (" + df["chain"] + ")",
+            "timestamp": df["timestamp"],
+            "utilization": df["utilization"],
+        }))
+
+    from oracle_cube import OracleCube
+    cube = OracleCube.load(data_dir)
+    if cube is not None:
+        m = cube.markets
+        keys = entity_key(m["market_unique_key"], m["chain"]).to_numpy()
+        labels = (m["collateral_symbol"] + "/" + m["loan_symbol"] + " (" + m["chain"] + ")").to_numpy()
+        n_m, n_h = cube.deviation.shape
+        frames.append(pd.DataFrame({
+            "key": np.repeat(keys, n_h),
+            "label": np.repeat(labels, n_h),
+            "timestamp": np.tile(cube.hours, n_m),
+            "oracle_spot_gap_pct": np.asarray(cube.deviation, dtype="float64").ravel() / 100,
+        }))
+
+    path = data_dir / "block2_share_prices_hourly.csv"
+    if path.exists():
+        df = pd.read_csv(path)
+        frames.append(pd.DataFrame({
+            "key": entity_key(df["vault_address"], df["chain"]),
+            "label": df["vault_name"].fillna("") + " (" + df["chain"] + ")",
+            "timestamp": df["timestamp"],
+            "share_price": df["share_price"],
+        }))
+
+    # Snapshot data: one point per market at the time block5 read the positions.
+    # Files written before block5 recorded snapshot_ts have no event time; skip them.
+    path = data_dir / "block5_borrower_positions.csv"
+    df = pd.read_csv(path) if path.exists() else pd.DataFrame()
+    if "snapshot_ts" in df.columns:
+        df = df[df["position_type"] == "borrower"].copy()
+        df["borrow_assets_usd"] = pd.to_numeric(df["borrow_assets_usd"], errors="coerce").fillna(0)
+        chains = pd.read_csv(data_dir / "block1_markets_graphql.csv", usecols=["chain_id", "chain"]) \
+            .drop_duplicates("chain_id").set_index("chain_id")["chain"]
+        df["chain"] = df["chain_id"].map(chains).fillna(df["chain_id"].astype(str))
+        g = df.groupby(["market_unique_key", "chain", "collateral_symbol", "loan_symbol"])
+        conc = pd.DataFrame({
+            "top_borrower_pct": g["borrow_assets_usd"].max() / g["borrow_assets_usd"].sum() * 100,
+            "snapshot_ts": g["snapshot_ts"].max(),
+        }).dropna().reset_index()
+        frames.append(pd.DataFrame({
+            "key": entity_key(conc["market_unique_key"], conc["chain"]),
+            "label": conc["collateral_symbol"] + "/" + conc["loan_symbol"] + " (" + conc["chain"] + ")",
+            "timestamp": conc["snapshot_ts"],
+            "top_borrower_pct": conc["top_borrower_pct"],
+        }))
+
+    if not frames:
+        return pd.DataFrame()
+    points = pd.concat(frames, ignore_index=True)
+    points["timestamp"] = pd.to_numeric(points["timestamp"], errors="coerce")
+    points = points.dropna(subset=["timestamp"])
+    points["timestamp"] = points["timestamp"].astype("int64")
+    return points.sort_values("timestamp", kind="mergesort").reset_index(drop=True)
+
+
+def replay(engine: AlertEngine, points: pd.DataFrame, sinks: Sequence = ()) -> pd.DataFrame:
+    """Feed the points in time order; returns every alert the rules produced."""
+    metrics = [c for c in points.columns if c not in ("key", "label", "timestamp")]
+    alerts = []
+    for row in points.itertuples(index=False):
+        values = {m: getattr(row, m) for m in metrics}
+        for alert in engine.update(row.key, row.timestamp, values, row.label):
+            alerts.append(alert)
+            for sink in sinks:
+                sink.send(alert)
+    return pd.DataFrame(alerts, columns=ALERT_COLS)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Rule-based alerts over market / vault points")
+    parser.add_argument("--replay", action="store_true", help="Run the rules over the saved block history")
+    parser.add_argument("--rules", type=Path, help="Rules file (one rule per line; default: built-in rules)")
+    parser.add_argument("--webhook", help="POST each alert to this URL")
+    parser.add_argument("--data-dir", type=Path, default=PROJECT_ROOT / "data")
+    args = parser.parse_args(argv)
+
+    rules = load_rules(args.rules) if args.rules else None
+    try:
+        engine = AlertEngine(rules)
+    except ValueError as e:
+        parser.error(str(e))
+
+    print(f"\n{'═' * 70}")
+    print(f"  🔔 Alert Rules")
+    print(f"{'═' * 70}")
+    for rule in engine.rules:
+        print(f"  {rule.severity:<9} {rule.text}")
+
+    if not args.replay:
+        return
+
+    points = replay_points(args.data_dir)
+    if points.empty:
+        print("❌ No history to replay — run block2_share_prices / block3b / block5 first")
+        sys.exit(1)
+
+    sinks = [FileSink(args.data_dir, "alerts_replay.jsonl")]
+    if args.webhook:
+        sinks.append(WebhookSink(args.webhook))
+    started = time.time()
+    alerts = replay(engine, points, sinks)
+    for sink in sinks:
+        sink.close()
+
+    print(f"\n  Replayed {len(points):,} points ({points['key'].nunique()} entities) in {time.time() - started:.2f}s"
+          f" — {engine.mean_eval_us:.1f} µs per point in the engine")
+    firing = alerts[alerts["state"] == "FIRING"] if not alerts.empty else alerts
+    print(f"  {len(firing)} alerts fired, {len(alerts) - len(firing)} resolved, "
+          f"{len(engine.firing())} still firing")
+    if not firing.empty:
+        print(f"\n  {'Rule':<24} {'Fired':>6} {'Entities':>9}  First")
+        for name, grp in firing.groupby("rule", sort=False):
+            print(f"  {name:<24} {len(grp):>6} {grp['key'].nunique():>9}  {grp['datetime'].min()}")
+        print()
+        for alert in alerts.head(20).to_dict("records"):
+            print(alert_line(alert))
+        if len(alerts) > 20:
+            print(f"  ... {len(alerts) - 20} more")
+    print(f"\n  Output: {sinks[0].path}")
+    print(f"{'═' * 70}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+As-Of — "what was the state at time T?" over the timestamped block tables.
+
+load_markets (`supply_at_depeg`: Nov 4, falling back to Nov 3),
+load_pre_depeg_exposure, snapshot (`alloc_by_vault`) and block3's
+classify_curator_response (`alloc_at_depeg_usd`, `alloc_week_before_usd`)
+each filtered on date strings by hand. AsOfIndex sorts a table once by
+(entity keys, timestamp) and answers point-in-time lookups with a backward
+merge_asof:
+
+  - at(T): one row per entity, the latest observation at or before T
+  - at_many([T1..Tn]): the same for every T in one vectorized join, with an
+    `as_of` column (long format)
+  - total_at([T1..Tn], by=...): a value column summed per group and T
+
+`max_age` (seconds) drops entities whose latest observation is older than
+that, so a series that stopped reporting counts as exited instead of being
+carried forward. MAX_AGE is the cutoff every dashboard lookup uses: the
+tables are daily, so at(DEPEG_TS, max_age=MAX_AGE) is "Nov 4, or the last
+point from Nov 2–3 if Nov 4 is missing". Entities with no observation in
+reach are left out.
+
+TABLES names the tables the dashboard indexes (file, entity keys).
+
+Used by: the dashboard (utils/data_loader.py, utils/snapshot.py, Curator
+Response) and block3_curator_B.
+"""
+
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+DAY = 86400
+MAX_AGE = 2 * DAY   # daily series silent for longer than this have exited
+
+# name → (block file, entity keys)
+TABLES: Dict[str, Tuple[str, Sequence[str]]] = {
+    "allocation": ("block3_allocation_timeseries.csv", ["vault_address", "market_unique_key"]),
+    "share_prices": ("block2_share_prices_daily.csv", ["vault_address", "chain_id"]),
+    "utilization": ("block3_market_utilization_hourly.csv", ["market_unique_key"]),
+    "admin_events": ("block3_admin_events.csv", ["vault_address"]),
+}
+
+
+def to_ts(t) -> int:
+    """Unix seconds from an int, a date string ("2025-11-03") or a datetime."""
+    if isinstance(t, (int, np.integer)):
+        return int(t)
+    return int(pd.Timestamp(t).timestamp())    # naive → UTC
+
+
+class AsOfIndex:
+    def __init__(self, df: pd.DataFrame, keys: Sequence[str], ts_col: str = "timestamp"):
+        self.keys = list(keys)
+        self.ts_col = ts_col
+        data = df.dropna(subset=[*self.keys, ts_col]).copy()
+        data[ts_col] = pd.to_numeric(data[ts_col], errors="coerce").astype("int64")
+        # Latest row wins on duplicate (entity, timestamp)
+        self.data = (data.sort_values([ts_col, *self.keys], kind="mergesort")
+                         .drop_duplicates([*self.keys, ts_col], keep="last")
+                         .reset_index(drop=True))
+        self.entities = self.data[self.keys].drop_duplicates().reset_index(drop=True)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @property
+    def span(self) -> Tuple[int, int]:
+        """(first, last) timestamp in the table."""
+        ts = self.data[self.ts_col]
+        return (int(ts.min()), int(ts.max())) if len(ts) else (0, 0)
+
+    def at_many(self, timestamps: Iterable, max_age: Optional[int] = None) -> pd.DataFrame:
+        """
+        Latest observation at or before each T, for every entity. One row per
+        (as_of, entity) that has one; `as_of` is T, `timestamp` the observation's.
+        """
+        ts = np.unique([to_ts(t) for t in timestamps]).astype("int64")
+        if not len(ts) or self.data.empty:
+            return self.data.iloc[0:0].assign(as_of=pd.Series(dtype="int64"))
+
+        queries = self.entities.merge(pd.DataFrame({"as_of": ts}), how="cross")
+        out = pd.merge_asof(
+            queries.sort_values("as_of"),
+            self.data.rename(columns={self.ts_col: "_obs_ts"}).assign(as_of=lambda d: d["_obs_ts"]),
+            on="as_of", by=self.keys, direction="backward", tolerance=max_age,
+        )
+        out = out.dropna(subset=["_obs_ts"])
+        out[self.ts_col] = out.pop("_obs_ts").astype("int64")
+        return out.sort_values(["as_of", *self.keys]).reset_index(drop=True)
+
+    def at(self, t, max_age: Optional[int] = None) -> pd.DataFrame:
+        """Latest observation at or before T, one row per entity."""
+        return self.at_many([t], max_age).drop(columns="as_of")
+
+    def total_at(self, timestamps: Iterable, by, value_col: str = "supply_assets_usd",
+                 max_age: Optional[int] = None) -> pd.DataFrame:
+        """`value_col` summed per `by` group at each T (rows: as_of × group)."""
+        by = [by] if isinstance(by, str) else list(by)
+        snap = self.at_many(timestamps, max_age)
+        snap[value_col] = pd.to_numeric(snap[value_col], errors="coerce").fillna(0)
+        return snap.groupby(["as_of", *by], as_index=False)[value_col].sum()
@@ -0,0 +1,242 @@
+"""
+Bank Run — online bank-run detector over vault TVL / share-price points.
+
+block3b derives net flows after the fact (compute_vault_net_flows) and flagged
+a bank-run onset as the first hour with a ≥ 2% net outflow; the liquidity
+stress page ranks vaults by summed outflows. BankRunDetector consumes the same
+points one at a time and keeps O(1) state per vault:
+
+  - net flow: the TVL change not explained by the share price
+    (TVL[t] - TVL[t-1] × SP[t] / SP[t-1]), so interest and socialized bad debt
+    don't count as deposits / withdrawals; as % of TVL[t-1], per hour
+  - EWMA mean and variance of that hourly flow (half-life HALFLIFE_HOURS)
+    → z-score of each new step against the vault's own history
+  - cumulative net flow and its running peak → outflow since peak
+
+A vault enters a run (one ONSET event) when, with TVL ≥ MIN_TVL_USD,
+
+  - flow_z:      z ≤ -ONSET_Z and the step lost ≥ ONSET_STEP_PCT of TVL
+                 (after WARMUP_STEPS points), or
+  - cumulative:  outflow since peak ≥ ONSET_CUM_PCT of TVL at the peak
+
+and re-arms once its outflow since peak is back under RESET_PCT.
+
+The same object runs a batch replay over historical hourly data (replay()) and
+a live feed (update() per point, or replay() on each new batch — points at or
+before a vault's last timestamp are ignored). save()/load() persist the state
+as JSON under data/_store/, so a refresh picks up where the last one stopped.
+
+Used by: block3b_liquidity (replay, block3_bank_run_events.csv) and
+monitor.py (live updates).
+"""
+
+import json
+import math
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+HOUR = 3600
+STORE_SUBDIR = "_store"
+STATE_FILE = "bank_run_state.json"
+
+HALFLIFE_HOURS = 24.0
+WARMUP_STEPS = 12
+ONSET_Z = 4.0
+ONSET_STEP_PCT = 2.0        # block3b's old fixed rule: ≥ 2% of TVL out in one hour
+ONSET_CUM_PCT = 10.0
+RESET_PCT = 2.0
+MIN_TVL_USD = 10_000
+# A vault with no flow history has zero variance; floor the hourly std (% of TVL)
+STD_FLOOR_PCT = 0.1
+
+EVENT_COLS = ["vault_address", "chain_id", "vault_name", "timestamp", "datetime", "trigger",
+              "tvl_usd", "net_flow_usd", "net_flow_pct", "z_score",
+              "outflow_since_peak_usd", "outflow_since_peak_pct"]
+
+
+class VaultState:
+    __slots__ = ("name", "ts", "tvl", "share_price", "n", "mean", "var",
+                 "cum_flow", "peak_cum", "peak_tvl", "in_run", "onset_ts")
+
+    def __init__(self, name: str, ts: int, tvl: float, share_price: float):
+        self.name = name
+        self.ts = ts
+        self.tvl = tvl
+        self.share_price = share_price
+        self.n = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.cum_flow = 0.0
+        self.peak_cum = 0.0
+        self.peak_tvl = tvl
+        self.in_run = False
+        self.onset_ts = None
+
+    def to_list(self) -> list:
+        return [getattr(self, f) for f in self.__slots__]
+
+    @classmethod
+    def from_list(cls, values: list) -> "VaultState":
+        state = cls.__new__(cls)
+        for f, v in zip(cls.__slots__, values):
+            setattr(state, f, v)
+        return state
+
+
+def _num(x) -> float:
+    try:
+        x = float(x)
+    except (TypeError, ValueError):
+        return math.nan
+    return x
+
+
+class BankRunDetector:
+    def __init__(self, halflife_hours: float = HALFLIFE_HOURS, onset_z: float = ONSET_Z,
+                 onset_step_pct: float = ONSET_STEP_PCT, onset_cum_pct: float = ONSET_CUM_PCT,
+                 min_tvl_usd: float = MIN_TVL_USD):
+        self.halflife_hours = halflife_hours
+        self.onset_z = onset_z
+        self.onset_step_pct = onset_step_pct
+        self.onset_cum_pct = onset_cum_pct
+        self.min_tvl_usd = min_tvl_usd
+        self.states: Dict[str, VaultState] = {}
+
+    @staticmethod
+    def _key(vault_address: str, chain_id) -> str:
+        return f"{str(vault_address).lower()}|{chain_id}"
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    # ── streaming ──
+    def update(self, vault_address: str, chain_id, timestamp: int, tvl_usd: float,
+               share_price: float = math.nan, vault_name: str = "") -> Optional[Dict]:
+        """Feed one point; returns an ONSET event dict if this point starts a run."""
+        tvl, sp, ts = _num(tvl_usd), _num(share_price), int(timestamp)
+        if not math.isfinite(tvl) or tvl < 0:
+            return None
+        key = self._key(vault_address, chain_id)
+        s = self.states.get(key)
+        if s is None:
+            self.states[key] = VaultState(vault_name, ts, tvl, sp)
+            return None
+        if ts <= s.ts:
+            return None
+
+        dt = (ts - s.ts) / HOUR
+        growth = sp / s.share_price if s.share_price > 0 and sp > 0 else 1.0
+        flow = tvl - s.tvl * growth
+        flow_pct = flow / s.tvl * 100 if s.tvl > 0 else 0.0
+        rate = flow_pct / dt
+
+        z = math.nan
+        if s.n >= WARMUP_STEPS:
+            z = (rate - s.mean) / max(math.sqrt(s.var), STD_FLOOR_PCT)
+
+        s.cum_flow += flow
+        if s.cum_flow >= s.peak_cum:
+            s.peak_cum, s.peak_tvl = s.cum_flow, tvl
+        outflow = s.peak_cum - s.cum_flow
+        outflow_pct = outflow / s.peak_tvl * 100 if s.peak_tvl > 0 else 0.0
+
+        event = None
+        if not s.in_run and max(s.tvl, s.peak_tvl) >= self.min_tvl_usd:
+            trigger = None
+            if z <= -self.onset_z and flow_pct <= -self.onset_step_pct:
+                trigger = "flow_z"
+            elif outflow_pct >= self.onset_cum_pct:
+                trigger = "cumulative"
+            if trigger:
+                s.in_run, s.onset_ts = True, ts
+                event = {
+                    "vault_address": str(vault_address).lower(), "chain_id": chain_id,
+                    "vault_name": vault_name or s.name, "timestamp": ts,
+                    "datetime": pd.to_datetime(ts, unit="s"), "trigger": trigger,
+                    "tvl_usd": s.tvl, "net_flow_usd": flow, "net_flow_pct": flow_pct,
+                    "z_score": z, "outflow_since_peak_usd": outflow,
+                    "outflow_since_peak_pct": outflow_pct,
+                }
+        elif s.in_run and outflow_pct < RESET_PCT:
+            s.in_run = False
+
+        # EWMA of the hourly flow rate (decay scaled by the step length)
+        alpha = 1 - 0.5 ** (dt / self.halflife_hours)
+        diff = rate - s.mean
+        s.mean += alpha * diff
+        s.var = (1 - alpha) * (s.var + alpha * diff * diff)
+        s.n += 1
+        s.ts, s.tvl = ts, tvl
+        if sp > 0:
+            s.share_price = sp
+        if vault_name:
+            s.name = vault_name
+        return event
+
+    def replay(self, df: pd.DataFrame, tvl_col: str = "total_assets_usd",
+               price_col: str = "share_price") -> pd.DataFrame:
+        """
+        Feed every row in time order (block2 share-price layout: vault_address,
+        chain_id, vault_name, timestamp, total_assets_usd, share_price).
+        Returns the ONSET events the batch produced.
+        """
+        if df.empty:
+            return pd.DataFrame(columns=EVENT_COLS)
+        d = df.copy()
+        d["timestamp"] = pd.to_numeric(d["timestamp"], errors="coerce")
+        d = d.dropna(subset=["timestamp"]).sort_values("timestamp", kind="mergesort")
+        chain = d["chain_id"] if "chain_id" in d.columns else pd.Series(0, index=d.index)
+        name = d["vault_name"].fillna("") if "vault_name" in d.columns else pd.Series("", index=d.index)
+        price = d[price_col] if price_col in d.columns else pd.Series(math.nan, index=d.index)
+
+        events: List[Dict] = []
+        for addr, cid, ts, tvl, sp, nm in zip(d["vault_address"], chain, d["timestamp"],
+                                              d[tvl_col], price, name):
+            event = self.update(addr, cid, ts, tvl, sp, nm)
+            if event:
+                events.append(event)
+        return pd.DataFrame(events, columns=EVENT_COLS)
+
+    # ── state ──
+    def state_frame(self) -> pd.DataFrame:
+        """One row per vault: last point, EWMA flow, outflow since peak, run status."""
+        rows = []
+        for key, s in self.states.items():
+            addr, chain_id = key.split("|", 1)
+            outflow = s.peak_cum - s.cum_flow
+            rows.append({
+                "vault_address": addr, "chain_id": chain_id, "vault_name": s.name,
+                "last_ts": s.ts, "tvl_usd": s.tvl,
+                "ewma_flow_pct_per_hour": s.mean,
+                "flow_std_pct_per_hour": math.sqrt(s.var),
+                "outflow_since_peak_usd": outflow,
+                "outflow_since_peak_pct": outflow / s.peak_tvl * 100 if s.peak_tvl > 0 else 0.0,
+                "in_run": s.in_run, "onset_ts": s.onset_ts, "points": s.n + 1,
+            })
+        return pd.DataFrame(rows)
+
+    @staticmethod
+    def path(data_dir: Path) -> Path:
+        return Path(data_dir) / STORE_SUBDIR / STATE_FILE
+
+    def save(self, data_dir: Path):
+        out = self.path(data_dir)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        tmp = out.with_name(out.name + ".partial")
+        tmp.write_text(json.dumps({k: s.to_list() for k, s in self.states.items()}))
+        tmp.replace(out)
+
+    @classmethod
+    def load(cls, data_dir: Path, **params) -> "BankRunDetector":
+        """Detector with the saved per-vault state (empty if none was saved)."""
+        detector = cls(**params)
+        src = cls.path(data_dir)
+        if src.exists():
+            try:
+                saved = json.loads(src.read_text())
+            except ValueError:
+                saved = {}
+            detector.states = {k: VaultState.from_list(v) for k, v in saved.items()}
+        return detector
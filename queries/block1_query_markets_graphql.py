@@ -1,10 +1,14 @@
 import os
 import sys
-import requests
 import pandas as pd
 from pathlib import Path
 from dotenv import load_dotenv
-from typing import List, Dict
+from typing import List, Dict, Optional, Set
+from concurrent.futures import ThreadPoolExecutor
+
+import rate_limiter
+from paginator import fetch_all_pages
+from toxic_markets import TOXIC_COLLATERAL, FALSE_POSITIVES, TOXIC_COLLATERAL_ADDRESSES
 
 # Load .env from project root
 # Script lives at: 03-queries/block1-exposure/graphsql/script.py → 4 levels to /app/
@@ -26,41 +30,52 @@ CHAIN_IDS = {
     'hyperevm': 999,
 }
 
-# Toxic collateral — filter by symbol (primary) and exclude false positives
-TOXIC_COLLATERAL = ['xUSD', 'XUSD', 'deUSD', 'sdeUSD', 'deusd']
-FALSE_POSITIVES = [
-    'AA_FalconXUSDC', 'stakedao-crvfrxUSD', 'crvfrxUSD', 'sfrxUSD', 'fxUSD',
-]
+# Toxic collateral symbols, false positives and collateral token addresses
+# live in toxic_markets.py. Discovery filters by collateral address on the
+# API side; the symbol filter below is a second pass over the (few) matches.
+# A chain whose filtered result lacks a market the last run found is re-checked
+# with the full scan + symbol match (new tokens / wrappers). MORPHO_VERIFY_DISCOVERY=1
+# runs that check on every chain.
+VERIFY_DISCOVERY_ENV = "MORPHO_VERIFY_DISCOVERY"
 
 
 def query_graphql(query: str) -> dict:
     """Execute GraphQL query against Morpho API"""
     headers = {"Content-Type": "application/json"}
-    response = requests.post(GRAPHQL_URL, json={"query": query}, headers=headers)
+    response = rate_limiter.post(GRAPHQL_URL, json={"query": query}, headers=headers)
     response.raise_for_status()
     return response.json()
 
 
-def fetch_all_markets(chain_name: str, chain_id: int) -> List[Dict]:
+def fetch_all_markets(chain_name: str, chain_id: int,
+                      collateral_addresses: Optional[List[str]] = None) -> Optional[List[Dict]]:
     """
-    Fetch all markets for a given chain using pagination.
+    Fetch markets for a given chain using pagination.
     Uses 'first' and 'skip' for pagination per the schema.
+
+    With `collateral_addresses`, the API only returns markets whose collateral
+    is one of those tokens. Returns None if the API rejects that filter, so
+    the caller can fall back to the full scan.
     """
-    print(f"\n🔍 Querying {chain_name} (chainId={chain_id})...")
+    scope = "toxic collateral" if collateral_addresses else "all markets"
+    print(f"\n🔍 Querying {chain_name} (chainId={chain_id}, {scope})...")
 
-    all_markets = []
-    skip = 0
     page_size = 100
-    page = 1
+    collateral_filter = ""
+    if collateral_addresses:
+        collateral_filter = "collateralAssetAddress_in: [{}]".format(
+            ", ".join(f'"{a}"' for a in collateral_addresses))
+    errors = []
 
-    while True:
+    def fetch_page(skip: int, first: int):
         query = f"""
         {{
           markets(
-            first: {page_size}
+            first: {first}
             skip: {skip}
             where: {{
               chainId_in: [{chain_id}]
+              {collateral_filter}
             }}
           ) {{
             items {{
@@ -150,47 +165,77 @@ def fetch_all_markets(chain_name: str, chain_id: int) -> List[Dict]:
         }}
         """
 
-        try:
-            result = query_graphql(query)
+        result = query_graphql(query)
 
-            if "errors" in result:
-                error_msg = result['errors'][0].get('message', 'Unknown error')
-                print(f"   ❌ GraphQL Error on page {page}: {error_msg}")
-                print(f"   Error details: {result['errors']}")
-                break
+        if "errors" in result:
+            error_msg = result['errors'][0].get('message', 'Unknown error')
+            errors.append(error_msg)
+            print(f"   ❌ GraphQL Error at skip={skip}: {error_msg}")
+            print(f"   Error details: {result['errors']}")
+            return None
 
-            data = result.get("data", {})
-            if not data or "markets" not in data:
-                print(f"   ❌ No data returned on page {page}")
-                break
+        data = result.get("data", {})
+        if not data or "markets" not in data:
+            print(f"   ❌ No data returned at skip={skip}")
+            return None
 
-            markets_data = data.get("markets", {})
-            items = markets_data.get("items", [])
-            page_info = markets_data.get("pageInfo", {})
+        markets_data = data.get("markets", {})
+        items = markets_data.get("items", [])
+        count_total = markets_data.get("pageInfo", {}).get("countTotal", 0)
+        print(f"   📄 {chain_name} skip={skip}: {len(items)} markets (total matching: {count_total})")
+        return items, count_total
 
-            if not items:
-                break
+    # Page 1 learns countTotal, remaining pages are fetched concurrently
+    all_markets = fetch_all_pages(fetch_page, page_size, key=lambda m: m.get("uniqueKey"))
 
-            all_markets.extend(items)
+    if collateral_addresses and errors and not all_markets:
+        return None
 
-            count_total = page_info.get("countTotal", 0)
-            print(f"   📄 Page {page}: {len(items)} markets (total on chain: {count_total})")
+    print(f"   ✅ Fetched {len(all_markets)} markets on {chain_name}")
+    return all_markets
 
-            # Check if we've fetched everything
-            if skip + len(items) >= count_total:
-                break
 
-            skip += page_size
-            page += 1
+def known_market_keys(chain_id: int) -> Set[str]:
+    """uniqueKeys the last block1 run found on this chain (empty on a first run)."""
+    path = PROJECT_ROOT / "data" / "block1_markets_graphql.csv"
+    if not path.exists():
+        return set()
+    df = pd.read_csv(path, usecols=["market_id", "chain_id"])
+    return set(df.loc[df["chain_id"] == chain_id, "market_id"].dropna().str.lower())
 
-        except Exception as e:
-            print(f"   ❌ Exception on page {page}: {e}")
-            import traceback
-            traceback.print_exc()
-            break
 
-    print(f"   ✅ Fetched {len(all_markets)} total markets on {chain_name}")
-    return all_markets
+def discover_chain_markets(chain_name: str, chain_id: int) -> List[Dict]:
+    """
+    Toxic-collateral markets on one chain: server-side collateral filter, so the
+    cost follows the number of matching markets. Full chain scan + symbol match
+    only if the API rejects the filter, if the filtered result misses a market
+    the last run found (a token address not in TOXIC_COLLATERAL_ADDRESSES yet),
+    or when MORPHO_VERIFY_DISCOVERY=1 asks for the check explicitly.
+    """
+    markets = fetch_all_markets(chain_name, chain_id, TOXIC_COLLATERAL_ADDRESSES)
+    if markets is None:
+        print(f"   ⚠️  {chain_name}: collateral filter not supported — falling back to full scan")
+        return filter_toxic_markets(fetch_all_markets(chain_name, chain_id) or [])
+
+    toxic = filter_toxic_markets(markets)
+    found = {m["uniqueKey"].lower() for m in toxic}
+    missing = known_market_keys(chain_id) - found
+    verify = os.environ.get(VERIFY_DISCOVERY_ENV, "") == "1"
+    if not missing and not verify:
+        return toxic
+
+    reason = (f"address filter is missing {len(missing)} market(s) from the last run" if missing
+              else f"{VERIFY_DISCOVERY_ENV}=1 ({len(toxic)} markets from the address filter)")
+    print(f"   ⚠️  {chain_name}: {reason} — verifying with a full scan (symbol match)")
+    scanned = filter_toxic_markets(fetch_all_markets(chain_name, chain_id) or [])
+    extra = [m for m in scanned if m["uniqueKey"].lower() not in found]
+    for m in extra:
+        collat = m.get("collateralAsset") or {}
+        print(f"   🆕 {chain_name}: {collat.get('symbol')} market {m['uniqueKey'][:10]}... — collateral "
+              f"{collat.get('address')} not in TOXIC_COLLATERAL_ADDRESSES")
+    if scanned and not extra:
+        print(f"   ✅ {chain_name}: full scan agrees with the address filter ({len(toxic)} markets)")
+    return toxic + extra
 
 
 def filter_toxic_markets(markets: List[Dict]) -> List[Dict]:
@@ -422,19 +467,15 @@ def main():
     print("Block 1.1 (GraphQL): Morpho markets with toxic collateral — ENRICHED")
     print("=" * 80)
 
-    all_markets = []
-
-    # Query each chain
-    for chain_name, chain_id in CHAIN_IDS.items():
-        chain_markets = fetch_all_markets(chain_name, chain_id)
-        all_markets.extend(chain_markets)
+    print(f"\n🔍 Toxic collateral: {TOXIC_COLLATERAL}")
+    print(f"   Excluding false positives: {FALSE_POSITIVES}")
+    print(f"   Collateral addresses (server-side filter): {len(TOXIC_COLLATERAL_ADDRESSES)}")
 
-    print(f"\n📊 Total markets fetched across all chains: {len(all_markets)}")
+    # Query all chains concurrently — each chain only returns matching markets
+    with ThreadPoolExecutor(max_workers=len(CHAIN_IDS)) as pool:
+        per_chain = list(pool.map(lambda c: discover_chain_markets(*c), CHAIN_IDS.items()))
 
-    # Filter for toxic collateral
-    print(f"\n🔍 Filtering for toxic collateral: {TOXIC_COLLATERAL}")
-    print(f"   Excluding false positives: {FALSE_POSITIVES}")
-    toxic_markets = filter_toxic_markets(all_markets)
+    toxic_markets = [m for chain_markets in per_chain for m in chain_markets]
 
     if not toxic_markets:
         print("\n⚠️  No markets found with toxic collateral")
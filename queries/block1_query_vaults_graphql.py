@@ -1,13 +1,15 @@
 import os
 import sys
-import requests
 import pandas as pd
-import time
 from pathlib import Path
 from dotenv import load_dotenv
 from typing import List, Dict, Set, Tuple
 from datetime import datetime
 
+import rate_limiter
+import toxic_markets
+from paginator import fetch_all_pages
+
 # Load .env from project root
 # Script lives at: 03-queries/block1-exposure/graphsql/script.py → 4 levels to /app/
 PROJECT_ROOT = Path(__file__).parent.parent
@@ -31,26 +33,17 @@ CHAIN_IDS = {
 # Reverse map for chain name lookup
 CHAIN_NAMES = {v: k for k, v in CHAIN_IDS.items()}
 
-# Toxic collateral — filter by symbol (primary) and exclude false positives
-TOXIC_COLLATERAL = ['xUSD', 'XUSD', 'deUSD', 'sdeUSD', 'deusd']
-FALSE_POSITIVES = [
-    'AA_FalconXUSDC', 'stakedao-crvfrxUSD', 'crvfrxUSD', 'sfrxUSD', 'fxUSD',
-]
-
 # Date range for analysis
 START_DATE = "2025-09-01"
 END_DATE = "2025-11-10"
 DEPEG_START = "2025-11-04"
 PRE_DEPEG_START = "2025-10-28"
 
-# Rate limiting
-API_DELAY = 0.3  # seconds between API calls
-
 
 def query_graphql(query: str) -> dict:
     """Execute GraphQL query against Morpho API"""
     headers = {"Content-Type": "application/json"}
-    response = requests.post(GRAPHQL_URL, json={"query": query}, headers=headers)
+    response = rate_limiter.post(GRAPHQL_URL, json={"query": query}, headers=headers)
     response.raise_for_status()
     return response.json()
 
@@ -171,75 +164,6 @@ VAULT_FIELDS = """
 """
 
 
-# ══════════════════════════════════════════════════════════════════════
-#  PHASE 0: Discover toxic market uniqueKeys
-# ══════════════════════════════════════════════════════════════════════
-
-def discover_toxic_markets() -> Dict[str, Dict]:
-    """
-    Load toxic market uniqueKeys from block1_markets_graphql.csv,
-    or discover them via inline GraphQL query if CSV not available.
-    Returns dict: { uniqueKey: { chain_id, chain, collateral_symbol, loan_symbol } }
-    """
-    markets_csv = PROJECT_ROOT / "data" / "block1_markets_graphql.csv"
-
-    if markets_csv.exists():
-        df = pd.read_csv(markets_csv)
-        print(f"\n📂 Loaded {len(df)} toxic markets from {markets_csv.name}")
-
-        # Handle column name variations
-        chain_col = "blockchain" if "blockchain" in df.columns else "chain"
-        chain_id_col = "chain_id"
-        market_id_col = "market_id"
-        collat_col = "collateral_symbol"
-        loan_col = "loan_symbol"
-
-        toxic_keys = {}
-        for _, row in df.iterrows():
-            key = row[market_id_col]
-            toxic_keys[key] = {
-                "chain_id": int(row[chain_id_col]),
-                "chain": row[chain_col],
-                "collateral_symbol": row[collat_col],
-                "loan_symbol": row[loan_col],
-            }
-        return toxic_keys
-
-    # Fallback: discover inline
-    print("\n⚠️  Markets CSV not found — discovering toxic markets inline...")
-    toxic_keys = {}
-    for chain_name, chain_id in CHAIN_IDS.items():
-        query = f"""
-        {{
-          markets(first: 500, where: {{ chainId_in: [{chain_id}] }}) {{
-            items {{
-              uniqueKey
-              collateralAsset {{ symbol }}
-              loanAsset {{ symbol }}
-            }}
-          }}
-        }}
-        """
-        try:
-            result = query_graphql(query)
-            items = result.get("data", {}).get("markets", {}).get("items", [])
-            for m in items:
-                collat = (m.get("collateralAsset") or {}).get("symbol", "")
-                if collat in TOXIC_COLLATERAL and collat not in FALSE_POSITIVES:
-                    toxic_keys[m["uniqueKey"]] = {
-                        "chain_id": chain_id,
-                        "chain": chain_name,
-                        "collateral_symbol": collat,
-                        "loan_symbol": (m.get("loanAsset") or {}).get("symbol", ""),
-                    }
-            time.sleep(API_DELAY)
-        except Exception as e:
-            print(f"   ❌ Error querying {chain_name}: {e}")
-
-    print(f"   Found {len(toxic_keys)} toxic markets inline")
-    return toxic_keys
-
-
 # ══════════════════════════════════════════════════════════════════════
 #  PHASE 1: Vault discovery via marketUniqueKey_in filter
 # ══════════════════════════════════════════════════════════════════════
@@ -270,15 +194,13 @@ def phase1_vaults_by_market_keys(toxic_keys: Dict[str, Dict]) -> Dict[Tuple[str,
 
         print(f"\n   {chain_name} ({len(market_keys)} toxic markets)...")
 
-        skip = 0
         page_size = 100
-        page = 1
 
-        while True:
+        def fetch_page(skip: int, first: int):
             query = f"""
             {{
               vaults(
-                first: {page_size}
+                first: {first}
                 skip: {skip}
                 where: {{
                   chainId_in: [{chain_id}]
@@ -297,34 +219,27 @@ def phase1_vaults_by_market_keys(toxic_keys: Dict[str, Dict]) -> Dict[Tuple[str,
               }}
             }}
             """
-            try:
-                result = query_graphql(query)
-                time.sleep(API_DELAY)
-
-                if "errors" in result:
-                    print(f"   ❌ GraphQL Error: {result['errors'][0].get('message', '')}")
-                    break
+            result = query_graphql(query)
 
-                items = result.get("data", {}).get("vaults", {}).get("items", [])
-                page_info = result.get("data", {}).get("vaults", {}).get("pageInfo", {})
-                count_total = page_info.get("countTotal", 0)
+            if "errors" in result:
+                print(f"   ❌ GraphQL Error: {result['errors'][0].get('message', '')}")
+                return None
 
-                for v in items:
-                    addr = v.get("address", "").lower()
-                    cid = (v.get("chain") or {}).get("id", chain_id)
-                    found_vaults[(addr, cid)] = v
+            vaults = result.get("data", {}).get("vaults", {})
+            return vaults.get("items", []), vaults.get("pageInfo", {}).get("countTotal", 0)
 
-                if not items or skip + len(items) >= count_total:
-                    total = len([k for k in found_vaults if k[1] == chain_id])
-                    print(f"   ✅ {total} vaults with current positions (total matching: {count_total})")
-                    break
+        items = fetch_all_pages(
+            fetch_page, page_size,
+            key=lambda v: ((v.get("address") or "").lower(), (v.get("chain") or {}).get("id", chain_id)),
+        )
 
-                skip += page_size
-                page += 1
+        for v in items:
+            addr = v.get("address", "").lower()
+            cid = (v.get("chain") or {}).get("id", chain_id)
+            found_vaults[(addr, cid)] = v
 
-            except Exception as e:
-                print(f"   ❌ Exception: {e}")
-                break
+        total = len([k for k in found_vaults if k[1] == chain_id])
+        print(f"   ✅ {total} vaults with current positions")
 
     print(f"\n   Phase 1 total: {len(found_vaults)} unique vaults")
     return found_vaults
@@ -363,15 +278,13 @@ def phase2_reallocate_discovery(toxic_keys: Dict[str, Dict]) -> Tuple[Set[Tuple[
 
         print(f"\n   {chain_name}...")
 
-        skip = 0
         page_size = 500
-        total_events = 0
 
-        while True:
+        def fetch_page(skip: int, first: int):
             query = f"""
             {{
               vaultReallocates(
-                first: {page_size}
+                first: {first}
                 skip: {skip}
                 orderBy: Timestamp
                 orderDirection: Desc
@@ -381,6 +294,7 @@ def phase2_reallocate_discovery(toxic_keys: Dict[str, Dict]) -> Tuple[Set[Tuple[
                 }}
               ) {{
                 items {{
+                  id
                   vault {{
                     address
                   }}
@@ -398,41 +312,31 @@ def phase2_reallocate_discovery(toxic_keys: Dict[str, Dict]) -> Tuple[Set[Tuple[
               }}
             }}
             """
-            try:
-                result = query_graphql(query)
-                time.sleep(API_DELAY)
-
-                if "errors" in result:
-                    print(f"   ❌ GraphQL Error: {result['errors'][0].get('message', '')}")
-                    break
-
-                items = result.get("data", {}).get("vaultReallocates", {}).get("items", [])
-                page_info = result.get("data", {}).get("vaultReallocates", {}).get("pageInfo", {})
-                count_total = page_info.get("countTotal", 0)
+            result = query_graphql(query)
 
-                for r in items:
-                    vault_addr = (r.get("vault") or {}).get("address", "").lower()
-                    market_key = (r.get("market") or {}).get("uniqueKey", "")
-                    if vault_addr:
-                        addr_key = (vault_addr, chain_id)
-                        discovered_addrs.add(addr_key)
-                        if addr_key not in addr_to_markets:
-                            addr_to_markets[addr_key] = set()
-                        if market_key:
-                            addr_to_markets[addr_key].add(market_key)
+            if "errors" in result:
+                print(f"   ❌ GraphQL Error: {result['errors'][0].get('message', '')}")
+                return None
 
-                total_events += len(items)
+            reallocs = result.get("data", {}).get("vaultReallocates", {})
+            return reallocs.get("items", []), reallocs.get("pageInfo", {}).get("countTotal", 0)
 
-                if not items or skip + len(items) >= count_total:
-                    chain_addrs = len([a for a in discovered_addrs if a[1] == chain_id])
-                    print(f"   ✅ {chain_addrs} unique vault addresses from {count_total} reallocation events")
-                    break
+        # Desc scan: new events shift rows down between pages → overlap + dedup by id
+        items = fetch_all_pages(fetch_page, page_size, key=lambda r: r.get("id"))
 
-                skip += page_size
+        for r in items:
+            vault_addr = (r.get("vault") or {}).get("address", "").lower()
+            market_key = (r.get("market") or {}).get("uniqueKey", "")
+            if vault_addr:
+                addr_key = (vault_addr, chain_id)
+                discovered_addrs.add(addr_key)
+                if addr_key not in addr_to_markets:
+                    addr_to_markets[addr_key] = set()
+                if market_key:
+                    addr_to_markets[addr_key].add(market_key)
 
-            except Exception as e:
-                print(f"   ❌ Exception: {e}")
-                break
+        chain_addrs = len([a for a in discovered_addrs if a[1] == chain_id])
+        print(f"   ✅ {chain_addrs} unique vault addresses from {len(items)} reallocation events")
 
     print(f"\n   Phase 2 total: {len(discovered_addrs)} unique vault addresses from reallocations")
     return discovered_addrs, addr_to_markets
@@ -471,7 +375,6 @@ def phase3_fetch_missing_vaults(
         """
         try:
             result = query_graphql(query)
-            time.sleep(API_DELAY)
 
             if "errors" in result:
                 print(f"   ❌ {addr[:10]}... ({chain_name}): {result['errors'][0].get('message', '')}")
@@ -535,7 +438,7 @@ def filter_vaults_with_toxic_exposure(
 
             # Match by market uniqueKey (primary) OR collateral symbol (fallback)
             is_toxic_by_key = market_key in toxic_key_set
-            is_toxic_by_symbol = (symbol in TOXIC_COLLATERAL and symbol not in FALSE_POSITIVES)
+            is_toxic_by_symbol = toxic_markets.is_toxic_symbol(symbol)
 
             if is_toxic_by_key or is_toxic_by_symbol:
                 vault_market_pairs.append({
@@ -867,7 +770,7 @@ def main():
     print("=" * 80)
 
     # ── Phase 0: Get toxic market uniqueKeys ──
-    toxic_keys = discover_toxic_markets()
+    toxic_keys = toxic_markets.load(PROJECT_ROOT / "data")
     if not toxic_keys:
         print("❌ No toxic markets found — cannot discover vaults")
         return
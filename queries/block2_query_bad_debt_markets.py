@@ -12,13 +12,13 @@ Input:  04-data-exports/raw/graphql/block1_markets_graphql.csv
 Output: 04-data-exports/raw/graphql/block2_bad_debt_by_market.csv
 """
 
-import time
-import requests
 import pandas as pd
 from pathlib import Path
 from dotenv import load_dotenv
 from typing import Dict, Optional
 
+import rate_limiter
+
 # Script lives at: 03-queries/block2-bad-debt/graphsql/script.py → 4 levels to /app/
 PROJECT_ROOT = Path(__file__).parent.parent
 env_path = PROJECT_ROOT / '.env'
@@ -26,14 +26,13 @@ load_dotenv(dotenv_path=env_path)
 
 GRAPHQL_URL = "https://blue-api.morpho.org/graphql"
 
-# Rate limit: 5000 req / 5 min. We're doing ~13 calls, no concern, but be polite.
-REQUEST_DELAY = 0.2  # seconds between API calls
+# Rate limit: 5000 req / 5 min — pacing is handled by the shared rate_limiter.
 
 
 def query_graphql(query: str) -> dict:
     """Execute GraphQL query against Morpho API"""
     headers = {"Content-Type": "application/json"}
-    response = requests.post(GRAPHQL_URL, json={"query": query}, headers=headers)
+    response = rate_limiter.post(GRAPHQL_URL, json={"query": query}, headers=headers)
     response.raise_for_status()
     return response.json()
 
@@ -597,7 +596,6 @@ def main():
         if analyzed["oracle_is_vault_based"]:
             print(f"      🏦 VAULT-BASED ORACLE: base={analyzed['oracle_base_vault']}  quote={analyzed['oracle_quote_vault']}")
 
-        time.sleep(REQUEST_DELAY)
 
     if not results:
         print("\n❌ No market data retrieved")
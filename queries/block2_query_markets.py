@@ -7,8 +7,8 @@ Queries each toxic market for:
   - Market warnings (BadDebtUnrealizedMarketWarningMetadata)
   - Current state (supply, borrow, collateral, utilization, oracle price, liquidity)
 
-Input:  04-data-exports/raw/graphql/block1_markets_graphql.csv  (or inline discovery)
-        04-data-exports/raw/graphql/block1_vaults_graphql.csv   (fallback for market keys)
+Input:  toxic market set from toxic_markets.py (block1_markets_graphql.csv,
+        block1_vaults_graphql.csv, or a filtered API query — in that order)
 Output: 04-data-exports/raw/graphql/block2_bad_debt_by_market.csv
 
 Depends on: Block 1 (market discovery)
@@ -17,134 +17,30 @@ Depends on: Block 1 (market discovery)
 import os
 import sys
 import json
-import time
-import requests
 import pandas as pd
 from pathlib import Path
 from datetime import datetime, timezone
 from typing import Dict, List, Optional, Tuple
 
+import rate_limiter
+import toxic_markets
+
 # ── Paths ──
 PROJECT_ROOT = Path(__file__).parent.parent
 env_path = PROJECT_ROOT / '.env'
 
 GRAPHQL_URL = "https://blue-api.morpho.org/graphql"
 
-CHAIN_IDS = {
-    'ethereum': 1,
-    'base': 8453,
-    'arbitrum': 42161,
-    'optimism': 10,
-    'plume': 98866,
-    'unichain': 130,
-    'polygon': 137,
-    'hyperevm': 999,
-}
-CHAIN_NAMES = {v: k for k, v in CHAIN_IDS.items()}
-
-TOXIC_COLLATERAL = ['xUSD', 'XUSD', 'deUSD', 'sdeUSD', 'deusd']
-FALSE_POSITIVES = [
-    'AA_FalconXUSDC', 'stakedao-crvfrxUSD', 'crvfrxUSD', 'sfrxUSD', 'fxUSD',
-]
-
-API_DELAY = 0.5  # seconds between API calls
 
 
 def query_graphql(query: str) -> dict:
     """Execute GraphQL query against Morpho API"""
     headers = {"Content-Type": "application/json"}
-    response = requests.post(GRAPHQL_URL, json={"query": query}, headers=headers)
+    response = rate_limiter.post(GRAPHQL_URL, json={"query": query}, headers=headers)
     response.raise_for_status()
     return response.json()
 
 
-# ══════════════════════════════════════════════════════════════════════
-#  PHASE 0: Load toxic market keys
-# ══════════════════════════════════════════════════════════════════════
-
-def load_toxic_markets() -> Dict[str, Dict]:
-    """
-    Load toxic market uniqueKeys from available CSVs.
-    Priority: block1_markets_graphql.csv > block1_vaults_graphql.csv (extract unique markets)
-    Returns dict: { uniqueKey: { chain_id, chain, collateral_symbol, loan_symbol } }
-    """
-    data_dir = PROJECT_ROOT / "data"
-
-    # Try block1_markets_graphql.csv first
-    markets_csv = data_dir / "block1_markets_graphql.csv"
-    if markets_csv.exists():
-        df = pd.read_csv(markets_csv)
-        print(f"\n📂 Loaded {len(df)} toxic markets from {markets_csv.name}")
-        toxic_keys = {}
-        chain_col = "blockchain" if "blockchain" in df.columns else "chain"
-        for _, row in df.iterrows():
-            key = row.get("market_id", "")
-            if not key:
-                continue
-            toxic_keys[key] = {
-                "chain_id": int(row.get("chain_id", 1)),
-                "chain": row.get(chain_col, "ethereum"),
-                "collateral_symbol": row.get("collateral_symbol", "?"),
-                "loan_symbol": row.get("loan_symbol", "?"),
-            }
-        return toxic_keys
-
-    # Fallback: extract unique market keys from block1_vaults_graphql.csv
-    vaults_csv = data_dir / "block1_vaults_graphql.csv"
-    if vaults_csv.exists():
-        df = pd.read_csv(vaults_csv)
-        print(f"\n📂 Extracting toxic markets from {vaults_csv.name}")
-        toxic_keys = {}
-        for _, row in df.iterrows():
-            key = row.get("market_id", "")
-            if not key or key in toxic_keys:
-                continue
-            collat = row.get("collateral_symbol", "")
-            if collat in TOXIC_COLLATERAL:
-                toxic_keys[key] = {
-                    "chain_id": int(row.get("chain_id", 1)),
-                    "chain": row.get("chain", "ethereum"),
-                    "collateral_symbol": collat,
-                    "loan_symbol": row.get("loan_symbol", "?"),
-                }
-        print(f"   Extracted {len(toxic_keys)} unique toxic markets")
-        return toxic_keys
-
-    # Last resort: discover inline
-    print("\n⚠️  No CSV found — discovering toxic markets inline...")
-    toxic_keys = {}
-    for chain_name, chain_id in CHAIN_IDS.items():
-        query = f"""
-        {{
-          markets(first: 500, where: {{ chainId_in: [{chain_id}] }}) {{
-            items {{
-              uniqueKey
-              collateralAsset {{ symbol }}
-              loanAsset {{ symbol }}
-            }}
-          }}
-        }}
-        """
-        try:
-            result = query_graphql(query)
-            items = result.get("data", {}).get("markets", {}).get("items", [])
-            for m in items:
-                collat = (m.get("collateralAsset") or {}).get("symbol", "")
-                if collat in TOXIC_COLLATERAL and collat not in FALSE_POSITIVES:
-                    toxic_keys[m["uniqueKey"]] = {
-                        "chain_id": chain_id,
-                        "chain": chain_name,
-                        "collateral_symbol": collat,
-                        "loan_symbol": (m.get("loanAsset") or {}).get("symbol", ""),
-                    }
-            time.sleep(API_DELAY)
-        except Exception as e:
-            print(f"   ❌ Error querying {chain_name}: {e}")
-
-    print(f"   Found {len(toxic_keys)} toxic markets inline")
-    return toxic_keys
-
-
 # ══════════════════════════════════════════════════════════════════════
 #  PHASE 1: Query each market for bad debt + oracle + state
 # ══════════════════════════════════════════════════════════════════════
@@ -693,7 +589,7 @@ def main():
     print("=" * 70)
 
     # ── Load toxic markets ──
-    toxic_keys = load_toxic_markets()
+    toxic_keys = toxic_markets.load(PROJECT_ROOT / "data")
     if not toxic_keys:
         print("❌ No toxic markets found. Run Block 1 first.")
         return
@@ -742,7 +638,6 @@ def main():
         else:
             print(f"   ❌ Failed to query")
 
-        time.sleep(API_DELAY)
 
     # ── Save CSV ──
     if not rows:
@@ -8,18 +8,25 @@ Key insight: Morpho Vault V1 mechanism — when bad debt realizes, totalAssets d
 while totalSupply stays the same → share price drops → all depositors absorb loss proportionally.
 
 Input:  04-data-exports/raw/graphql/block1_vaults_graphql.csv
+Store:  data/_store/vault_history.parquet (shared with block7, see vault_history.py)
 Output: 04-data-exports/raw/graphql/block2_share_prices_daily.csv
         04-data-exports/raw/graphql/block2_share_prices_hourly.csv  (Nov 1-15 zoom)
         04-data-exports/raw/graphql/block2_share_price_summary.csv  (per-vault stats)
+        04-data-exports/raw/graphql/block2_share_price_drawdowns.csv  (running-max drawdowns, drawdown.py)
+        04-data-exports/raw/graphql/block2_share_price_change_points.csv  (abrupt moves, drawdown.py)
 """
 
-import time
-import requests
+import os
 import pandas as pd
 from pathlib import Path
 from datetime import datetime, timezone
 from dotenv import load_dotenv
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+
+import rate_limiter
+from drawdown import merge_history, drawdown_table, change_points
+from vault_history import VaultHistoryStore, history_fields, points_to_frame
+from watermarks import history_end
 
 # Script lives at: 03-queries/block2-bad-debt/graphsql/script.py → 4 levels to /app/
 PROJECT_ROOT = Path(__file__).parent.parent
@@ -27,17 +34,47 @@ env_path = PROJECT_ROOT / '.env'
 load_dotenv(dotenv_path=env_path)
 
 GRAPHQL_URL = "https://blue-api.morpho.org/graphql"
-REQUEST_DELAY = 0.3  # seconds between API calls
 
 # ── Time windows ──
-# Daily: Sept 1 2025 → Jan 31 2026 (full story arc)
+# Daily: Sept 1 2025 → Jan 31 2026 (full story arc); MORPHO_HISTORY_END=now
+# extends it — only the tail past the store's watermark is fetched
 DAILY_START = 1756684800   # Sept 1 2025 00:00 UTC
-DAILY_END   = 1769817600   # Jan 31 2026 00:00 UTC
+DAILY_END   = history_end(1769817600)   # Jan 31 2026 00:00 UTC
 
 # Hourly: Nov 1-15 2025 (zoomed depeg window)
 HOURLY_START = 1761955200  # Nov 1 2025 00:00 UTC
 HOURLY_END   = 1763164800  # Nov 15 2025 00:00 UTC
 
+# ── Fetch plan (MORPHO_HISTORY_MODE) ──
+# "split" (default): one request per vault — DAY before and after the hourly
+#   window, HOUR inside it. Daily rows inside the window are derived locally
+#   from the hourly points (vault_history.resample_daily: as-of 00:00 UTC, the
+#   previous day's close), so the daily and hourly CSVs cannot disagree.
+# "both": DAY over the full window + HOUR over the zoom window, two requests
+#   per vault. The API's DAY points inside the window stay in the store, but
+#   the daily view still derives those days from HOUR (VaultHistoryStore.daily).
+HISTORY_MODE = os.environ.get("MORPHO_HISTORY_MODE", "split")
+
+# (alias, interval, start, end) per segment; one inner list = one request.
+# Each segment is narrowed to what the store is missing (store.fetch_window);
+# segments the store already covers are dropped from the request.
+FETCH_PLANS = {
+    "split": [[
+        ("pre", "DAY", DAILY_START, HOURLY_START - 1),
+        ("zoom", "HOUR", HOURLY_START, HOURLY_END),
+        ("post", "DAY", HOURLY_END, DAILY_END),
+    ]],
+    "both": [
+        [("day", "DAY", DAILY_START, DAILY_END)],
+        [("zoom", "HOUR", HOURLY_START, HOURLY_END)],
+    ],
+}
+
+Segment = Tuple[str, str, int, int]
+
+# vault_info fields kept in the store's meta, for refreshes that skip the API
+VAULT_META = ["name", "curator_name", "asset_symbol", "asset_decimals", "listed"]
+
 # Key event timestamps
 DEPEG_TS        = 1762214400  # Nov 4 2025 (Stream Finance collapse)
 ELIXIR_CRASH_TS = 1762387200  # Nov 6 2025 (deUSD crash)
@@ -50,7 +87,7 @@ def query_graphql(query: str, variables: dict = None) -> dict:
     payload = {"query": query}
     if variables:
         payload["variables"] = variables
-    response = requests.post(GRAPHQL_URL, json=payload, headers=headers)
+    response = rate_limiter.post(GRAPHQL_URL, json=payload, headers=headers)
     response.raise_for_status()
     return response.json()
 
@@ -65,12 +102,14 @@ def ts_to_datetime(ts: float) -> str:
     return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d %H:%M")
 
 
-def fetch_vault_history(address: str, chain_id: int, interval: str,
-                        start_ts: int, end_ts: int) -> Optional[Dict]:
+def fetch_vault_history(address: str, chain_id: int, segments: List[Segment]) -> Optional[Dict]:
     """
     Fetch vault historical state via vaultByAddress.
-    Returns current state + timeseries for share price and TVL.
+    Returns current state + timeseries for share price and TVL, one aliased
+    set of series per (alias, interval, start, end) segment.
     """
+    history = "\n".join(history_fields(start_ts, end_ts, interval, alias)
+                        for alias, interval, start_ts, end_ts in segments)
     query = f"""
     {{
       vaultByAddress(address: "{address}", chainId: {chain_id}) {{
@@ -99,21 +138,7 @@ def fetch_vault_history(address: str, chain_id: int, interval: str,
           }}
         }}
         historicalState {{
-          sharePriceNumber(options: {{
-            startTimestamp: {start_ts}
-            endTimestamp: {end_ts}
-            interval: {interval}
-          }}) {{ x y }}
-          totalAssetsUsd(options: {{
-            startTimestamp: {start_ts}
-            endTimestamp: {end_ts}
-            interval: {interval}
-          }}) {{ x y }}
-          totalAssets(options: {{
-            startTimestamp: {start_ts}
-            endTimestamp: {end_ts}
-            interval: {interval}
-          }}) {{ x y }}
+{history}
         }}
       }}
     }}
@@ -130,56 +155,44 @@ def fetch_vault_history(address: str, chain_id: int, interval: str,
         return None
 
 
-def parse_timeseries(data_points: List[Dict], vault_info: Dict,
+def parse_timeseries(series: pd.DataFrame, vault_info: Dict,
                      ts_formatter) -> List[Dict]:
     """
-    Parse share price + TVL timeseries into flat rows.
-    data_points is a list of {x: timestamp, y: value} from sharePriceNumber.
+    Flatten a vault's store series (share price + TVL per timestamp) into rows.
+    Points without a share price are skipped.
     """
-    # Build TVL lookup by timestamp (totalAssetsUsd — may be inflated)
-    tvl_points = vault_info.get("_tvl_points", [])
-    tvl_lookup = {p["x"]: p["y"] for p in tvl_points if p.get("y") is not None}
-
-    # Build raw totalAssets lookup (BigInt, in token units — reliable)
-    raw_points = vault_info.get("_total_assets_raw_points", [])
-    raw_lookup = {p["x"]: p["y"] for p in raw_points if p.get("y") is not None}
+    df = series[series["share_price"].notna()]
+    if df.empty:
+        return []
 
     decimals = vault_info.get("asset_decimals", 6)
 
-    rows = []
-    for pt in data_points:
-        ts = pt["x"]
-        share_price = pt.get("y")
-        if share_price is None:
-            continue
-
-        tvl_usd = tvl_lookup.get(ts)
-
-        # Compute vault TVL from raw on-chain totalAssets
-        # This is the actual contract balance, immune to price-feed inflation
-        raw_assets = raw_lookup.get(ts)
-        total_assets_native = None
-        if raw_assets is not None:
-            try:
-                total_assets_native = float(raw_assets) / (10 ** decimals)
-            except (ValueError, TypeError):
-                total_assets_native = None
-
-        rows.append({
-            "vault_address": vault_info["address"],
-            "vault_name": vault_info["name"],
-            "chain": vault_info["chain"],
-            "chain_id": vault_info["chain_id"],
-            "curator_name": vault_info["curator_name"],
-            "asset_symbol": vault_info["asset_symbol"],
-            "timestamp": ts,
-            "date": ts_formatter(ts),
-            "share_price": share_price,
-            "total_assets_usd": tvl_usd,
-            "total_assets_native": total_assets_native,
-        })
-
-    return rows
+    # Vault TVL from raw on-chain totalAssets (BigInt string, in token units).
+    # This is the actual contract balance, immune to price-feed inflation
+    def to_native(raw):
+        if raw is None or pd.isna(raw):
+            return None
+        try:
+            return float(raw) / (10 ** decimals)
+        except (ValueError, TypeError):
+            return None
+
+    out = pd.DataFrame({
+        "vault_address": vault_info["address"],
+        "vault_name": vault_info["name"],
+        "chain": vault_info["chain"],
+        "chain_id": vault_info["chain_id"],
+        "curator_name": vault_info["curator_name"],
+        "asset_symbol": vault_info["asset_symbol"],
+        "timestamp": df["timestamp"].astype(int).values,
+        "date": df["timestamp"].map(ts_formatter).values,
+        "share_price": df["share_price"].astype(float).values,
+        # totalAssetsUsd — may be inflated
+        "total_assets_usd": df["total_assets_usd"].values,
+        "total_assets_native": df["total_assets_raw"].map(to_native).values,
+    })
+    out["total_assets_usd"] = out["total_assets_usd"].astype(object).where(out["total_assets_usd"].notna(), None)
+    return out.to_dict("records")
 
 
 def compute_vault_stats(daily_rows: List[Dict], vault_info: Dict) -> Dict:
@@ -325,6 +338,7 @@ def main():
     print("=" * 80)
     print(f"Daily window:  {ts_to_date(DAILY_START)} → {ts_to_date(DAILY_END)}")
     print(f"Hourly window: {ts_to_date(HOURLY_START)} → {ts_to_date(HOURLY_END)}")
+    print(f"Fetch mode:    {HISTORY_MODE}")
     print(f"Depeg event:   {ts_to_date(DEPEG_TS)}")
     print("=" * 80)
 
@@ -386,6 +400,10 @@ def main():
     print(f"   Historical (via reallocations): {sum(1 for v in vaults_list if v['discovery_method']=='historical_reallocation')}")
 
     # ── Query each vault ──
+    store = VaultHistoryStore(PROJECT_ROOT / "data")
+    if HISTORY_MODE not in FETCH_PLANS:
+        print(f"   ⚠️  Unknown MORPHO_HISTORY_MODE={HISTORY_MODE!r} — using 'split'")
+    plan = FETCH_PLANS.get(HISTORY_MODE, FETCH_PLANS["split"])
     all_daily_rows = []
     all_hourly_rows = []
     all_summaries = []
@@ -418,79 +436,82 @@ def main():
             "vault_tvl_usd": v.get("vault_tvl_usd"),
         }
 
-        # ── DAILY query ──
-        print(f"      📊 Fetching daily share prices...")
-        daily_data = fetch_vault_history(address, chain_id, "DAY", DAILY_START, DAILY_END)
-
-        if daily_data:
-            vault_info["listed"] = daily_data.get("listed")
-            vault_info["asset_symbol"] = (daily_data.get("asset") or {}).get("symbol", "")
-
-            # Update name/curator from API if Dune had "Unknown"
-            api_name = daily_data.get("name")
-            if api_name and (vault_info["name"] in ("Unknown", "", None)):
-                vault_info["name"] = api_name
-            api_state = daily_data.get("state") or {}
-            api_curators = api_state.get("curators") or []
-            if api_curators and vault_info["curator_name"] in ("Unknown", "", None):
-                verified = [c for c in api_curators if c.get("verified")]
-                if verified:
-                    vault_info["curator_name"] = verified[0].get("name", vault_info["curator_name"])
-
-            hist = daily_data.get("historicalState") or {}
-            sp_points = hist.get("sharePriceNumber") or []
-            tvl_points = hist.get("totalAssetsUsd") or []
-            raw_points = hist.get("totalAssets") or []
-            vault_info["_tvl_points"] = tvl_points
-            vault_info["_total_assets_raw_points"] = raw_points
-
-            # Store asset decimals for raw → native conversion
-            asset_info = daily_data.get("asset") or {}
-            vault_info["asset_decimals"] = int(asset_info.get("decimals", 6))
-
-            daily_rows = parse_timeseries(sp_points, vault_info, ts_to_date)
-            all_daily_rows.extend(daily_rows)
-            print(f"      ✅ {len(sp_points)} daily price points, {len(tvl_points)} TVL points, {len(raw_points)} raw asset points")
-
-            # ── Compute stats ──
-            stats = compute_vault_stats(daily_rows, vault_info)
-            if stats:
-                all_summaries.append(stats)
-                dd = stats["max_drawdown_pct"]
-                if dd > 0.001:
-                    print(f"      🔴 Max drawdown: {dd*100:.2f}% "
-                          f"(peak {stats['peak_price']:.6f} on {stats['peak_date']} → "
-                          f"trough {stats['trough_price']:.6f} on {stats['trough_date']})")
-                    if stats.get("estimated_loss_usd"):
-                        print(f"         Estimated loss: ${stats['estimated_loss_usd']:,.2f}")
-                    if stats.get("depeg_drop_pct") and stats["depeg_drop_pct"] > 0.001:
-                        print(f"         Nov 3-7 drop: {stats['depeg_drop_pct']*100:.2f}%")
-                else:
-                    print(f"      ✅ No significant drawdown (max {dd*100:.4f}%)")
-        else:
-            print(f"      ❌ No daily data returned")
-
-        time.sleep(REQUEST_DELAY)
-
-        # ── HOURLY query (depeg zoom) ──
-        print(f"      📊 Fetching hourly share prices (Nov 1-15)...")
-        hourly_data = fetch_vault_history(address, chain_id, "HOUR", HOURLY_START, HOURLY_END)
-
-        if hourly_data:
-            hist = hourly_data.get("historicalState") or {}
-            sp_points = hist.get("sharePriceNumber") or []
-            tvl_points = hist.get("totalAssetsUsd") or []
-            raw_points = hist.get("totalAssets") or []
-            vault_info["_tvl_points"] = tvl_points
-            vault_info["_total_assets_raw_points"] = raw_points
-
-            hourly_rows = parse_timeseries(sp_points, vault_info, ts_to_datetime)
-            all_hourly_rows.extend(hourly_rows)
-            print(f"      ✅ {len(sp_points)} hourly price points")
-        else:
-            print(f"      ❌ No hourly data returned")
+        # ── History fetch (see FETCH_PLANS), only what the store is missing ──
+        print(f"      📊 Fetching share price history ({HISTORY_MODE})...")
+        fetched = False
+        for segments in plan:
+            pending = []
+            for alias, interval, start_ts, end_ts in segments:
+                window = store.fetch_window(address, chain_id, interval, start_ts, end_ts)
+                if window:
+                    pending.append((alias, interval, *window))
+            if not pending:
+                continue
+            data = fetch_vault_history(address, chain_id, pending)
+            if not data:
+                continue
+
+            if not fetched:
+                vault_info["listed"] = data.get("listed")
+                vault_info["asset_symbol"] = (data.get("asset") or {}).get("symbol", "")
+
+                # Update name/curator from API if Dune had "Unknown"
+                api_name = data.get("name")
+                if api_name and (vault_info["name"] in ("Unknown", "", None)):
+                    vault_info["name"] = api_name
+                api_state = data.get("state") or {}
+                api_curators = api_state.get("curators") or []
+                if api_curators and vault_info["curator_name"] in ("Unknown", "", None):
+                    verified = [c for c in api_curators if c.get("verified")]
+                    if verified:
+                        vault_info["curator_name"] = verified[0].get("name", vault_info["curator_name"])
+
+                # Store asset decimals for raw → native conversion
+                asset_info = data.get("asset") or {}
+                vault_info["asset_decimals"] = int(asset_info.get("decimals", 6))
+                store.set_meta(address, chain_id, {k: vault_info[k] for k in VAULT_META})
+            fetched = True
+
+            for alias, interval, start_ts, end_ts in pending:
+                points = points_to_frame(data.get("historicalState"), address, chain_id, interval, alias)
+                store.upsert(points, address, chain_id, interval, start_ts, end_ts)
+
+        if not fetched:
+            meta = store.get_meta(address, chain_id)
+            if not meta or store.series(address, chain_id, "DAY").empty:
+                print(f"      ❌ No history data returned")
+                continue
+            # Store already up to date — reuse what the last fetch learned
+            vault_info.update(meta)
+            print(f"      ♻️  History up to date in store (no API call)")
+
+        # ── Daily view (API DAY points + days derived from HOUR) ──
+        daily_rows = parse_timeseries(store.daily(address, chain_id, DAILY_START, DAILY_END),
+                                      vault_info, ts_to_date)
+        all_daily_rows.extend(daily_rows)
+
+        # ── Hourly view (depeg zoom) ──
+        hourly_rows = parse_timeseries(store.series(address, chain_id, "HOUR", HOURLY_START, HOURLY_END),
+                                       vault_info, ts_to_datetime)
+        all_hourly_rows.extend(hourly_rows)
+        print(f"      ✅ {len(daily_rows)} daily price points, {len(hourly_rows)} hourly price points")
+
+        # ── Compute stats ──
+        stats = compute_vault_stats(daily_rows, vault_info)
+        if stats:
+            all_summaries.append(stats)
+            dd = stats["max_drawdown_pct"]
+            if dd > 0.001:
+                print(f"      🔴 Max drawdown: {dd*100:.2f}% "
+                      f"(peak {stats['peak_price']:.6f} on {stats['peak_date']} → "
+                      f"trough {stats['trough_price']:.6f} on {stats['trough_date']})")
+                if stats.get("estimated_loss_usd"):
+                    print(f"         Estimated loss: ${stats['estimated_loss_usd']:,.2f}")
+                if stats.get("depeg_drop_pct") and stats["depeg_drop_pct"] > 0.001:
+                    print(f"         Nov 3-7 drop: {stats['depeg_drop_pct']*100:.2f}%")
+            else:
+                print(f"      ✅ No significant drawdown (max {dd*100:.4f}%)")
 
-        time.sleep(REQUEST_DELAY)
 
     # ══════════════════════════════════════════════════════════════
     # SAVE OUTPUTS
@@ -498,6 +519,9 @@ def main():
     output_dir = PROJECT_ROOT / "data"
     output_dir.mkdir(parents=True, exist_ok=True)
 
+    # Raw series for block7 and later refreshes
+    store.save()
+
     # Daily timeseries
     if all_daily_rows:
         df_daily = pd.DataFrame(all_daily_rows)
@@ -516,8 +540,21 @@ def main():
         df_hourly.to_csv(hourly_path, index=False)
         print(f"✅ Saved {len(df_hourly)} hourly rows to {hourly_path}")
     else:
+        df_hourly = pd.DataFrame()
         print("❌ No hourly data collected")
 
+    # Drawdowns and change points over the merged daily + hourly history
+    if all_daily_rows:
+        history = merge_history(df_daily, df_hourly)
+        df_dd = drawdown_table(history)
+        df_cp = change_points(history)
+        dd_path = output_dir / "block2_share_price_drawdowns.csv"
+        cp_path = output_dir / "block2_share_price_change_points.csv"
+        df_dd.to_csv(dd_path, index=False)
+        df_cp.to_csv(cp_path, index=False)
+        print(f"✅ Saved {len(df_dd)} vault drawdowns to {dd_path}")
+        print(f"✅ Saved {len(df_cp)} change points to {cp_path}")
+
     # Summary stats
     if all_summaries:
         df_summary = pd.DataFrame(all_summaries)
@@ -626,6 +663,17 @@ def main():
     else:
         print(f"  (No historically exposed vaults in dataset)")
 
+    # ── Change points (abrupt share-price moves) ──
+    if all_daily_rows and len(df_cp) > 0:
+        print(f"\n{'─' * 70}")
+        print(f"  ⚡ SHARE PRICE CHANGE POINTS ({len(df_cp)})")
+        print(f"{'─' * 70}")
+        for _, r in df_cp.iterrows():
+            icon = "🔴" if r['direction'] == "DROP" else "🟢"
+            print(f"  {icon} {r['datetime']:%Y-%m-%d %H:%M}  {r['vault_name']} ({r['chain']}): "
+                  f"{r['price_before']:.6f} → {r['price_after']:.6f}  "
+                  f"({r['change_pct']:+.2f}%, z={r['z_score']:.0f})")
+
     # ── Total estimated losses ──
     total_loss = df_s['estimated_loss_usd'].sum()
     if total_loss > 0:
@@ -18,13 +18,15 @@ from datetime import datetime, timezone
 from dotenv import load_dotenv
 from typing import List, Dict, Set, Tuple
 
+import rate_limiter
+import toxic_markets
+
 # ── Project paths ──
 PROJECT_ROOT = Path(__file__).parent.parent
 env_path = PROJECT_ROOT / '.env'
 load_dotenv(dotenv_path=env_path)
 
 GRAPHQL_URL = "https://blue-api.morpho.org/graphql"
-REQUEST_DELAY = 0.3
 
 # ── Time windows (Oct 1 → Nov 30, 2025) ──
 TS_OCT_01   = 1759276800
@@ -38,7 +40,7 @@ def query_graphql(query: str, variables: dict = None) -> dict:
         payload["variables"] = variables
     for attempt in range(3):
         try:
-            resp = requests.post(GRAPHQL_URL, json=payload, headers=headers, timeout=60)
+            resp = rate_limiter.post(GRAPHQL_URL, json=payload, headers=headers, timeout=60)
             resp.raise_for_status()
             data = resp.json()
             if "errors" in data:
@@ -66,15 +68,11 @@ def load_block1_data() -> Tuple[pd.DataFrame, pd.DataFrame, Dict, Set]:
     if not vaults_path.exists() or not markets_path.exists():
         raise FileNotFoundError(f"Block 1 CSVs not found in {gql_dir}")
     df_vaults = pd.read_csv(vaults_path)
-    df_markets = pd.read_csv(markets_path)
+    df_markets = toxic_markets.frame(gql_dir)
     if "blockchain" in df_vaults.columns and "chain" not in df_vaults.columns:
         df_vaults.rename(columns={"blockchain": "chain"}, inplace=True)
-    toxic_keys = set(df_markets["market_id"].dropna().unique())
-    chain_keys = {}
-    for _, r in df_markets.iterrows():
-        cid = int(r["chain_id"])
-        key = r["market_id"]
-        chain_keys.setdefault(cid, set()).add(key)
+    toxic_keys = toxic_markets.keys(gql_dir)
+    chain_keys = toxic_markets.keys_by_chain(gql_dir)
     return df_vaults, df_markets, chain_keys, toxic_keys
 
 
@@ -229,7 +227,6 @@ def main():
         else:
             print(f"      ⚠️  No toxic allocation history")
         all_rows.extend(rows)
-        time.sleep(REQUEST_DELAY)
 
     if all_rows:
         df = pd.DataFrame(all_rows)
@@ -17,7 +17,12 @@ import numpy as np
 from pathlib import Path
 from datetime import datetime, timezone
 from dotenv import load_dotenv
-from typing import List, Dict, Set, Tuple
+from typing import List, Dict, Optional, Set, Tuple
+
+import rate_limiter
+import toxic_markets
+from stream_writer import open_writer
+from checkpoint import Checkpoint
 
 # ── Project paths ──
 PROJECT_ROOT = Path(__file__).parent.parent
@@ -25,7 +30,6 @@ env_path = PROJECT_ROOT / '.env'
 load_dotenv(dotenv_path=env_path)
 
 GRAPHQL_URL = "https://blue-api.morpho.org/graphql"
-REQUEST_DELAY = 0.3
 
 
 def query_graphql(query: str, variables: dict = None) -> dict:
@@ -35,7 +39,7 @@ def query_graphql(query: str, variables: dict = None) -> dict:
         payload["variables"] = variables
     for attempt in range(3):
         try:
-            resp = requests.post(GRAPHQL_URL, json=payload, headers=headers, timeout=60)
+            resp = rate_limiter.post(GRAPHQL_URL, json=payload, headers=headers, timeout=60)
             resp.raise_for_status()
             data = resp.json()
             if "errors" in data:
@@ -67,15 +71,11 @@ def load_block1_data() -> Tuple[pd.DataFrame, pd.DataFrame, Dict, Set]:
     if not vaults_path.exists() or not markets_path.exists():
         raise FileNotFoundError(f"Block 1 CSVs not found in {gql_dir}")
     df_vaults = pd.read_csv(vaults_path)
-    df_markets = pd.read_csv(markets_path)
+    df_markets = toxic_markets.frame(gql_dir)
     if "blockchain" in df_vaults.columns and "chain" not in df_vaults.columns:
         df_vaults.rename(columns={"blockchain": "chain"}, inplace=True)
-    toxic_keys = set(df_markets["market_id"].dropna().unique())
-    chain_keys = {}
-    for _, r in df_markets.iterrows():
-        cid = int(r["chain_id"])
-        key = r["market_id"]
-        chain_keys.setdefault(cid, set()).add(key)
+    toxic_keys = toxic_markets.keys(gql_dir)
+    chain_keys = toxic_markets.keys_by_chain(gql_dir)
     return df_vaults, df_markets, chain_keys, toxic_keys
 
 
@@ -103,20 +103,41 @@ def get_unique_vaults(df_vaults: pd.DataFrame) -> List[Dict]:
     return vaults
 
 
-def query_vault_admin_events(vault: Dict, toxic_keys: Set[str]) -> List[Dict]:
-    address = vault["address"]
-    chain_id = vault["chain_id"]
-
-    # Types we need — reallocations handled by block3_B via vaultReallocates
-    # API uses camelCase: setCap, submitCap, etc.
-    ADMIN_TYPES = '["setCap", "submitCap", "revokePendingCap", "submitMarketRemoval", "revokePendingMarketRemoval", "setSupplyQueue", "setWithdrawQueue"]'
-
-    # ── Pass 1: Lightweight scan (filtered to admin-only types) ──
-    raw_events = []
+# API uses camelCase: setCap, submitCap, etc.
+# Reallocations are handled by block3_B via vaultReallocates
+ADMIN_TYPES = '["setCap", "submitCap", "revokePendingCap", "submitMarketRemoval", "revokePendingMarketRemoval", "setSupplyQueue", "setWithdrawQueue"]'
+
+# Page sizes to try, largest first — shrunk whenever the API rejects a page
+# (usually complexity: the inline fragments make each item expensive to resolve)
+ADMIN_PAGE_SIZES = [100, 50, 25, 10, 5]
+
+
+def _event_data(item: Dict) -> Tuple[Dict, Dict]:
+    """Split an item's merged `data` into (cap/timelock data, queue info)."""
+    d = item.get("data") or {}
+    queue = {}
+    if item.get("type") == "setWithdrawQueue" and "withdrawQueue" in d:
+        queue = {"type": "withdraw", "keys": [m.get("uniqueKey", "") for m in (d["withdrawQueue"] or [])]}
+    elif item.get("type") == "setSupplyQueue" and "supplyQueue" in d:
+        queue = {"type": "supply", "keys": [m.get("uniqueKey", "") for m in (d["supplyQueue"] or [])]}
+    return {k: v for k, v in d.items() if k in ("cap", "timelock")}, queue
+
+
+def fetch_admin_events(address: str, chain_id: int) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Every admin event of one vault in a single pass: hash/timestamp/type plus
+    all the `data` fragments (cap, timelock, withdraw/supply queue) together,
+    so each event is transferred once. Pages start at ADMIN_PAGE_SIZES[0] and
+    shrink when the API rejects a page; a size that works is kept for the
+    remaining pages. Returns (items, error) — error is set, and the items
+    partial, if the smallest page size still failed.
+    """
+    sizes = list(ADMIN_PAGE_SIZES)
+    items_all = []
     skip = 0
-    page_size = 100
 
     while True:
+        page_size = sizes[0]
         query = f"""
         {{
           vaultByAddress(address: "{address}", chainId: {chain_id}) {{
@@ -129,6 +150,20 @@ def query_vault_admin_events(vault: Dict, toxic_keys: Set[str]) -> List[Dict]:
                 hash
                 timestamp
                 type
+                data {{
+                  ... on CapEventData {{
+                    cap
+                  }}
+                  ... on TimelockEventData {{
+                    timelock
+                  }}
+                  ... on SetWithdrawQueueEventData {{
+                    withdrawQueue {{ uniqueKey }}
+                  }}
+                  ... on SetSupplyQueueEventData {{
+                    supplyQueue {{ uniqueKey }}
+                  }}
+                }}
               }}
               pageInfo {{ countTotal count skip limit }}
             }}
@@ -140,8 +175,12 @@ def query_vault_admin_events(vault: Dict, toxic_keys: Set[str]) -> List[Dict]:
 
         if "errors" in result:
             err = result["errors"][0].get("message", "")
-            print(f"      ❌ adminEvents pass1 error: {err[:200]}")
-            break
+            if len(sizes) > 1:
+                sizes.pop(0)
+                print(f"      ⚠️  Page of {page_size} failed ({err[:80]}) — retrying skip={skip} with {sizes[0]}")
+                continue
+            print(f"      ❌ adminEvents error: {err[:200]}")
+            return items_all, err or "adminEvents error"
 
         vault_data = result.get("data", {}).get("vaultByAddress")
         if not vault_data:
@@ -149,8 +188,7 @@ def query_vault_admin_events(vault: Dict, toxic_keys: Set[str]) -> List[Dict]:
 
         events_data = vault_data.get("adminEvents", {})
         items = events_data.get("items", [])
-        page_info = events_data.get("pageInfo", {})
-        count_total = page_info.get("countTotal", 0)
+        count_total = events_data.get("pageInfo", {}).get("countTotal", 0)
 
         if skip == 0:
             print(f"      📋 Total admin events in API: {count_total}")
@@ -158,15 +196,24 @@ def query_vault_admin_events(vault: Dict, toxic_keys: Set[str]) -> List[Dict]:
         if not items:
             break
 
-        raw_events.extend(items)
+        items_all.extend(items)
 
         skip += page_size
         if skip >= count_total:
             break
-        time.sleep(REQUEST_DELAY)
 
+    return items_all, None
+
+
+def query_vault_admin_events(vault: Dict, toxic_keys: Set[str]) -> Dict:
+    """{"rows": [...]} for one vault, plus "error" if the fetch was partial."""
+    address = vault["address"]
+    chain_id = vault["chain_id"]
+
+    raw_events, error = fetch_admin_events(address, chain_id)
+    result = {"rows": []} if error is None else {"rows": [], "error": error}
     if not raw_events:
-        return []
+        return result
 
     type_counts = {}
     for evt in raw_events:
@@ -174,145 +221,13 @@ def query_vault_admin_events(vault: Dict, toxic_keys: Set[str]) -> List[Dict]:
         type_counts[t] = type_counts.get(t, 0) + 1
     print(f"      Event types found: {type_counts}")
 
-    # ── Pass 2: Enrichment ──
-    ENRICHABLE_TYPES = {"setCap", "submitCap",
-                        "revokePendingCap", "revokePendingMarketRemoval",
-                        "setSupplyQueue", "setWithdrawQueue"}
-
-    has_enrichable = any(evt.get("type") in ENRICHABLE_TYPES for evt in raw_events)
-
-    enriched_data = {}
-    if has_enrichable:
-        for attempt_size in [25, 10]:
-            enrich_skip = 0
-            success = False
-            while True:
-                query = f"""
-                {{
-                  vaultByAddress(address: "{address}", chainId: {chain_id}) {{
-                    adminEvents(
-                      first: {attempt_size}
-                      skip: {enrich_skip}
-                      where: {{ type_in: {ADMIN_TYPES} }}
-                    ) {{
-                      items {{
-                        hash
-                        type
-                        data {{
-                          ... on CapEventData {{
-                            cap
-                          }}
-                          ... on TimelockEventData {{
-                            timelock
-                          }}
-                        }}
-                      }}
-                      pageInfo {{ countTotal count skip limit }}
-                    }}
-                  }}
-                }}
-                """
-
-                result = query_graphql(query)
-
-                if "errors" in result:
-                    if attempt_size > 10:
-                        break
-                    err = result["errors"][0].get("message", "")
-                    print(f"      ⚠️  Enrichment failed (size={attempt_size}): {err[:120]}")
-                    break
-
-                vault_data = result.get("data", {}).get("vaultByAddress")
-                if not vault_data:
-                    break
-
-                items = vault_data.get("adminEvents", {}).get("items", [])
-                if not items:
-                    success = True
-                    break
-
-                for item in items:
-                    h = item.get("hash", "")
-                    if h and item.get("data"):
-                        enriched_data[h] = item["data"]
-
-                success = True
-                enrich_skip += attempt_size
-                ct = vault_data.get("adminEvents", {}).get("pageInfo", {}).get("countTotal", 0)
-                if enrich_skip >= ct:
-                    break
-                time.sleep(REQUEST_DELAY)
-
-            if success:
-                if enriched_data:
-                    print(f"      ✅ Enriched {len(enriched_data)} events with data")
-                break
-
-    # ── Queue enrichment ──
-    queue_events = [e for e in raw_events if e.get("type") in ("setWithdrawQueue", "setSupplyQueue")]
-    queue_data = {}
-    if queue_events:
-        for q_skip in range(0, len(raw_events), 25):
-            query = f"""
-            {{
-              vaultByAddress(address: "{address}", chainId: {chain_id}) {{
-                adminEvents(
-                  first: 25
-                  skip: {q_skip}
-                  where: {{ type_in: ["setWithdrawQueue", "setSupplyQueue"] }}
-                ) {{
-                  items {{
-                    hash
-                    type
-                    data {{
-                      ... on SetWithdrawQueueEventData {{
-                        withdrawQueue {{ uniqueKey }}
-                      }}
-                      ... on SetSupplyQueueEventData {{
-                        supplyQueue {{ uniqueKey }}
-                      }}
-                    }}
-                  }}
-                  pageInfo {{ countTotal }}
-                }}
-              }}
-            }}
-            """
-            result = query_graphql(query)
-            if "errors" in result:
-                print(f"      ⚠️  Queue enrichment failed (skip={q_skip}), skipping")
-                break
-
-            vault_data = result.get("data", {}).get("vaultByAddress")
-            if not vault_data:
-                break
-
-            items = vault_data.get("adminEvents", {}).get("items", [])
-            for item in items:
-                h = item.get("hash", "")
-                d = item.get("data") or {}
-                if item.get("type") == "setWithdrawQueue" and "withdrawQueue" in d:
-                    queue_data[h] = {"type": "withdraw", "keys": [
-                        m.get("uniqueKey", "") for m in (d["withdrawQueue"] or [])
-                    ]}
-                elif item.get("type") == "setSupplyQueue" and "supplyQueue" in d:
-                    queue_data[h] = {"type": "supply", "keys": [
-                        m.get("uniqueKey", "") for m in (d["supplyQueue"] or [])
-                    ]}
-
-            ct = vault_data.get("adminEvents", {}).get("pageInfo", {}).get("countTotal", 0)
-            if q_skip + 25 >= ct:
-                break
-            time.sleep(REQUEST_DELAY)
-
     # ── Combine into final rows ──
     all_events = []
     for evt in raw_events:
         ts = int(evt.get("timestamp", 0))
         evt_type = evt.get("type", "")
         tx_hash = evt.get("hash", "")
-        data = enriched_data.get(tx_hash, {})
-        q_info = queue_data.get(tx_hash, {})
+        data, q_info = _event_data(evt)
 
         market_key = None
         collateral = None
@@ -356,7 +271,8 @@ def query_vault_admin_events(vault: Dict, toxic_keys: Set[str]) -> List[Dict]:
             "details": json.dumps(details) if details else "",
         })
 
-    return all_events
+    result["rows"] = all_events
+    return result
 
 
 def main():
@@ -376,45 +292,59 @@ def main():
     print(f"🔧 TASK 2: Admin Events (Cap Sets, Queue Changes)")
     print(f"{'─' * 70}")
 
-    all_rows = []
-    for idx, v in enumerate(vaults):
-        print(f"\n   [{idx+1}/{len(vaults)}] {v['name']} ({v['chain']})")
-        rows = query_vault_admin_events(v, toxic_keys)
-        toxic_events = [r for r in rows if r["touches_toxic_market"]]
-        print(f"      ✅ {len(rows)} total events, {len(toxic_events)} touching toxic markets")
-
-        for evt in toxic_events:
-            if evt["event_type"] in ("setCap", "submitCap"):
-                try:
-                    d = json.loads(evt["details"]) if evt["details"] else {}
-                    if d.get("cap_is_zero"):
-                        print(f"         🚫 {evt['datetime']}: SetCap → 0 ({evt['collateral_symbol']})")
-                except (json.JSONDecodeError, TypeError):
-                    pass
-            elif evt["event_type"] == "setWithdrawQueue":
-                try:
-                    d = json.loads(evt["details"]) if evt["details"] else {}
-                    if not d.get("queue_has_toxic", True):
-                        print(f"         ❌ {evt['datetime']}: Toxic market REMOVED from withdraw queue")
-                except (json.JSONDecodeError, TypeError):
-                    pass
-
-        all_rows.extend(rows)
-        time.sleep(REQUEST_DELAY)
-
-    if all_rows:
-        df = pd.DataFrame(all_rows)
-        path = out_dir / "block3_admin_events.csv"
-        df.to_csv(path, index=False)
-        print(f"\n✅ Saved {len(all_rows)} admin events to {path.name}")
-
-        toxic_admin = df[df["touches_toxic_market"]]
-        print(f"   Toxic-related events: {len(toxic_admin)}")
-        if len(toxic_admin) > 0:
-            print(f"   Event types: {dict(toxic_admin['event_type'].value_counts())}")
+    # Rows are streamed to disk per vault; only counters are kept in memory
+    path = out_dir / "block3_admin_events.csv"
+    total_events = 0
+    toxic_type_counts: Dict[str, int] = {}
+
+    # One work unit per vault — `runner.py --resume` skips vaults already fetched
+    ckpt = Checkpoint("block3_curator_A2", out_dir)
+
+    with open_writer(path) as writer:
+        for idx, v in enumerate(vaults):
+            print(f"\n   [{idx+1}/{len(vaults)}] {v['name']} ({v['chain']})")
+            # Partial (errored) fetches are written for this run but not checkpointed
+            result = ckpt.cached(("admin_events", v["address"], v["chain_id"]),
+                                 lambda: query_vault_admin_events(v, toxic_keys),
+                                 keep=lambda r: "error" not in r)
+            rows = result["rows"]
+            if "error" in result:
+                print(f"      ⚠️  Partial admin events ({len(rows)}) — refetched on the next run")
+            toxic_events = [r for r in rows if r["touches_toxic_market"]]
+            print(f"      ✅ {len(rows)} total events, {len(toxic_events)} touching toxic markets")
+
+            for evt in toxic_events:
+                toxic_type_counts[evt["event_type"]] = toxic_type_counts.get(evt["event_type"], 0) + 1
+                if evt["event_type"] in ("setCap", "submitCap"):
+                    try:
+                        d = json.loads(evt["details"]) if evt["details"] else {}
+                        if d.get("cap_is_zero"):
+                            print(f"         🚫 {evt['datetime']}: SetCap → 0 ({evt['collateral_symbol']})")
+                    except (json.JSONDecodeError, TypeError):
+                        pass
+                elif evt["event_type"] == "setWithdrawQueue":
+                    try:
+                        d = json.loads(evt["details"]) if evt["details"] else {}
+                        if not d.get("queue_has_toxic", True):
+                            print(f"         ❌ {evt['datetime']}: Toxic market REMOVED from withdraw queue")
+                    except (json.JSONDecodeError, TypeError):
+                        pass
+
+            writer.write_rows(rows)
+            total_events += len(rows)
+
+    if total_events:
+        print(f"\n✅ Saved {total_events} admin events to {path.name}")
+
+        toxic_total = sum(toxic_type_counts.values())
+        print(f"   Toxic-related events: {toxic_total}")
+        if toxic_total > 0:
+            print(f"   Event types: {dict(sorted(toxic_type_counts.items(), key=lambda kv: -kv[1]))}")
     else:
         print(f"\n⚠️  No admin events collected")
 
+    ckpt.complete()
+
     print(f"\n{'═' * 70}")
     print(f"  ✅ Block 3A2 complete — run block3_curator_response_B.py next")
     print(f"{'═' * 70}")
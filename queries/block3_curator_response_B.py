@@ -28,13 +28,17 @@ from datetime import datetime, timezone
 from dotenv import load_dotenv
 from typing import List, Dict, Set, Tuple, Optional
 
+import rate_limiter
+import toxic_markets
+from paginator import fetch_all_pages
+from asof import AsOfIndex, DAY
+
 # ── Project paths ──
 PROJECT_ROOT = Path(__file__).parent.parent
 env_path = PROJECT_ROOT / '.env'
 load_dotenv(dotenv_path=env_path)
 
 GRAPHQL_URL = "https://blue-api.morpho.org/graphql"
-REQUEST_DELAY = 0.3
 
 # ── Time windows ──
 # ── Time windows (Oct 1 → Nov 30, 2025) ──
@@ -58,7 +62,7 @@ def query_graphql(query: str, variables: dict = None) -> dict:
 
     for attempt in range(3):
         try:
-            resp = requests.post(GRAPHQL_URL, json=payload, headers=headers, timeout=60)
+            resp = rate_limiter.post(GRAPHQL_URL, json=payload, headers=headers, timeout=60)
             resp.raise_for_status()
             data = resp.json()
             if "errors" in data:
@@ -92,17 +96,13 @@ def load_block1_data() -> Tuple[pd.DataFrame, pd.DataFrame, Dict, Set]:
         raise FileNotFoundError(f"Block 1 CSVs not found in {gql_dir}")
 
     df_vaults = pd.read_csv(vaults_path)
-    df_markets = pd.read_csv(markets_path)
+    df_markets = toxic_markets.frame(gql_dir)
 
     if "blockchain" in df_vaults.columns and "chain" not in df_vaults.columns:
         df_vaults.rename(columns={"blockchain": "chain"}, inplace=True)
 
-    toxic_keys = set(df_markets["market_id"].dropna().unique())
-    chain_keys = {}
-    for _, r in df_markets.iterrows():
-        cid = int(r["chain_id"])
-        key = r["market_id"]
-        chain_keys.setdefault(cid, set()).add(key)
+    toxic_keys = toxic_markets.keys(gql_dir)
+    chain_keys = toxic_markets.keys_by_chain(gql_dir)
 
     return df_vaults, df_markets, chain_keys, toxic_keys
 
@@ -142,94 +142,87 @@ def query_reallocations_for_chain(chain_id: int, chain_name: str,
         return []
 
     addrs_str = ", ".join(f'"{a}"' for a in vault_addresses)
-    all_rows = []
-    skip = 0
     page_size = 1000
 
-    while True:
+    def fetch_page(skip: int, first: int):
         query = f"""
-        {{
-          vaultReallocates(
-            first: {page_size}
-            skip: {skip}
-            orderBy: Timestamp
-            orderDirection: Asc
-            where: {{
-              vaultAddress_in: [{addrs_str}]
-              chainId_in: [{chain_id}]
-              timestamp_gte: {TS_OCT_01}
-              timestamp_lte: {TS_NOV_30}
-            }}
-          ) {{
-            items {{
-              id
-              timestamp
-              hash
-              blockNumber
-              caller
-              shares
-              assets
-              type
-              vault {{
-                address
-                name
-              }}
-              market {{
-                uniqueKey
-                collateralAsset {{ symbol }}
-                loanAsset {{ symbol }}
+            {{
+              vaultReallocates(
+                first: {first}
+                skip: {skip}
+                orderBy: Timestamp
+                orderDirection: Asc
+                where: {{
+                  vaultAddress_in: [{addrs_str}]
+                  chainId_in: [{chain_id}]
+                  timestamp_gte: {TS_OCT_01}
+                  timestamp_lte: {TS_NOV_30}
+                }}
+              ) {{
+                items {{
+                  id
+                  timestamp
+                  hash
+                  blockNumber
+                  caller
+                  shares
+                  assets
+                  type
+                  vault {{
+                    address
+                    name
+                  }}
+                  market {{
+                    uniqueKey
+                    collateralAsset {{ symbol }}
+                    loanAsset {{ symbol }}
+                  }}
+                }}
+                pageInfo {{ countTotal count skip limit }}
               }}
             }}
-            pageInfo {{ countTotal count skip limit }}
-          }}
-        }}
-        """
+            """
 
         result = query_graphql(query)
 
         if "errors" in result:
             err = result["errors"][0].get("message", "")
             print(f"      ❌ vaultReallocates error: {err[:100]}")
-            break
+            return None
 
         data = result.get("data", {}).get("vaultReallocates", {})
-        items = data.get("items", [])
-        if not items:
-            break
+        return data.get("items", []), data.get("pageInfo", {}).get("countTotal", 0)
 
-        for item in items:
-            market = item.get("market", {})
-            market_key = market.get("uniqueKey", "")
-            vault_info = item.get("vault", {})
-            collateral = (market.get("collateralAsset") or {}).get("symbol", "?")
-            loan = (market.get("loanAsset") or {}).get("symbol", "?")
-            ts = int(item.get("timestamp", 0))
-
-            all_rows.append({
-                "vault_address": vault_info.get("address", ""),
-                "vault_name": vault_info.get("name", ""),
-                "chain": chain_name,
-                "chain_id": chain_id,
-                "market_unique_key": market_key,
-                "collateral_symbol": collateral,
-                "loan_symbol": loan,
-                "is_toxic_market": market_key in toxic_keys,
-                "timestamp": ts,
-                "date": ts_to_date(ts),
-                "datetime": ts_to_datetime(ts),
-                "tx_hash": item.get("hash", ""),
-                "block_number": item.get("blockNumber"),
-                "caller": item.get("caller", ""),
-                "realloc_type": item.get("type", ""),
-                "assets": str(item.get("assets", "0")),
-                "shares": str(item.get("shares", "0")),
-            })
-
-        skip += page_size
-        count_total = data.get("pageInfo", {}).get("countTotal", 0)
-        if skip >= count_total:
-            break
-        time.sleep(REQUEST_DELAY)
+    items = fetch_all_pages(fetch_page, page_size, key=lambda r: r.get("id"))
+
+    all_rows = []
+    for item in items:
+        market = item.get("market", {})
+        market_key = market.get("uniqueKey", "")
+        vault_info = item.get("vault", {})
+        collateral = (market.get("collateralAsset") or {}).get("symbol", "?")
+        loan = (market.get("loanAsset") or {}).get("symbol", "?")
+        ts = int(item.get("timestamp", 0))
+
+        all_rows.append({
+            "vault_address": vault_info.get("address", ""),
+            "vault_name": vault_info.get("name", ""),
+            "chain": chain_name,
+            "chain_id": chain_id,
+            "market_unique_key": market_key,
+            "collateral_symbol": collateral,
+            "loan_symbol": loan,
+            "is_toxic_market": market_key in toxic_keys,
+            "timestamp": ts,
+            "date": ts_to_date(ts),
+            "datetime": ts_to_datetime(ts),
+            "tx_hash": item.get("hash", ""),
+            "block_number": item.get("blockNumber"),
+            "caller": item.get("caller", ""),
+            "realloc_type": item.get("type", ""),
+            "assets": str(item.get("assets", "0")),
+            "shares": str(item.get("shares", "0")),
+        })
 
     return all_rows
 
@@ -238,13 +231,64 @@ def query_reallocations_for_chain(chain_id: int, chain_name: str,
 #  TASK 4: Curator Response Classification (3.4)
 # ═══════════════════════════════════════════════════════════════
 
-def classify_curator_response(
-    vault: Dict,
+def _parse_details(raw) -> Dict:
+    if not isinstance(raw, str) or not raw:
+        return {}
+    try:
+        return json.loads(raw)
+    except (json.JSONDecodeError, TypeError):
+        return {}
+
+
+def build_vault_index(
     alloc_rows: List[Dict],
     admin_rows: List[Dict],
     realloc_rows: List[Dict],
-    toxic_keys: Set[str]
-) -> Dict:
+) -> Dict[str, Dict]:
+    """
+    Group Part A/B rows by lowercased vault address in one pass each, so the
+    classifier looks a vault up instead of scanning every row per vault:
+
+      alloc   → {address: DataFrame}  (supply/timestamp already numeric)
+      alloc_at → {(address, day_ts): toxic supply USD that day} for the depeg
+                 day and the week before, from one as-of lookup over all vaults
+      admin   → {address: [toxic-market admin rows]}, `details` parsed once
+                into `details_parsed`
+      realloc → {address: [toxic-market reallocation rows]}
+    """
+    index = {"alloc": {}, "alloc_at": {}, "admin": {}, "realloc": {}}
+
+    if alloc_rows:
+        df_a = pd.DataFrame(alloc_rows)
+        df_a["supply_assets_usd"] = pd.to_numeric(df_a["supply_assets_usd"], errors="coerce").fillna(0)
+        df_a["timestamp"] = pd.to_numeric(df_a["timestamp"])
+        addr = df_a["vault_address"].astype(str).str.lower()
+        index["alloc"] = {a: grp for a, grp in df_a.groupby(addr, sort=False)}
+
+        # Latest value within each day [T, T + 1d), summed over the vault's toxic markets
+        asof = AsOfIndex(df_a.assign(vault_key=addr), ["vault_key", "market_unique_key"])
+        days = [DEPEG_TS, TS_OCT_28]
+        at = asof.total_at([t + DAY - 1 for t in days], by="vault_key", max_age=DAY - 1)
+        index["alloc_at"] = {
+            (v, int(t) - DAY + 1): float(usd)
+            for v, t, usd in at[["vault_key", "as_of", "supply_assets_usd"]].itertuples(index=False)
+        }
+
+    for r in admin_rows:
+        if not r["touches_toxic_market"]:
+            continue
+        evt = dict(r, details_parsed=_parse_details(r.get("details")))
+        index["admin"].setdefault(str(r["vault_address"]).lower(), []).append(evt)
+
+    for r in realloc_rows:
+        if r["is_toxic_market"]:
+            index["realloc"].setdefault(str(r["vault_address"]).lower(), []).append(r)
+
+    return index
+
+
+def classify_curator_response(vault: Dict, index: Dict[str, Dict]) -> Dict:
+    """Classify one vault's response timing from its build_vault_index() entries."""
     address = vault["address"].lower()
     name = vault["name"]
     curator = vault["curator_name"]
@@ -262,13 +306,9 @@ def classify_curator_response(
     }
 
     # ── Allocation timeline analysis ──
-    vault_allocs = [r for r in alloc_rows if r["vault_address"].lower() == address]
-
-    if vault_allocs:
-        df_a = pd.DataFrame(vault_allocs)
-        df_a["supply_assets_usd"] = pd.to_numeric(df_a["supply_assets_usd"], errors="coerce").fillna(0)
-        df_a["timestamp"] = pd.to_numeric(df_a["timestamp"])
+    df_a = index["alloc"].get(address)
 
+    if df_a is not None and len(df_a) > 0:
         peak_row = df_a.loc[df_a["supply_assets_usd"].idxmax()] if len(df_a) > 0 else None
         profile["peak_toxic_supply_usd"] = float(df_a["supply_assets_usd"].max())
         profile["peak_toxic_date"] = peak_row["date"] if peak_row is not None else None
@@ -283,11 +323,8 @@ def classify_curator_response(
             profile["first_zero_alloc_ts"] = None
             profile["first_zero_alloc_date"] = None
 
-        depeg_day = df_a[(df_a["timestamp"] >= DEPEG_TS) & (df_a["timestamp"] < DEPEG_TS + 86400)]
-        profile["alloc_at_depeg_usd"] = float(depeg_day["supply_assets_usd"].iloc[0]) if len(depeg_day) > 0 else None
-
-        week_before = df_a[(df_a["timestamp"] >= TS_OCT_28) & (df_a["timestamp"] < TS_OCT_28 + 86400)]
-        profile["alloc_week_before_usd"] = float(week_before["supply_assets_usd"].iloc[0]) if len(week_before) > 0 else None
+        profile["alloc_at_depeg_usd"] = index["alloc_at"].get((address, DEPEG_TS))
+        profile["alloc_week_before_usd"] = index["alloc_at"].get((address, TS_OCT_28))
     else:
         profile["peak_toxic_supply_usd"] = 0
         profile["peak_toxic_date"] = None
@@ -297,18 +334,11 @@ def classify_curator_response(
         profile["alloc_week_before_usd"] = None
 
     # ── Admin event analysis ──
-    vault_admin = [r for r in admin_rows
-                   if r["vault_address"].lower() == address and r["touches_toxic_market"]]
-
-    cap_zero_events = []
-    for evt in vault_admin:
-        if evt["event_type"] in ("setCap", "submitCap") and evt.get("details"):
-            try:
-                d = json.loads(evt["details"])
-                if d.get("cap_is_zero"):
-                    cap_zero_events.append(evt)
-            except (json.JSONDecodeError, TypeError):
-                pass
+    vault_admin = index["admin"].get(address, [])
+
+    cap_zero_events = [evt for evt in vault_admin
+                       if evt["event_type"] in ("setCap", "submitCap")
+                       and evt["details_parsed"].get("cap_is_zero")]
 
     if cap_zero_events:
         first_cap_zero = min(cap_zero_events, key=lambda e: e["timestamp"])
@@ -321,21 +351,17 @@ def classify_curator_response(
     queue_removals = [e for e in vault_admin if e["event_type"] == "setWithdrawQueue"]
     queue_removed_toxic_ts = None
     for evt in sorted(queue_removals, key=lambda e: e["timestamp"]):
-        try:
-            d = json.loads(evt["details"])
-            if not d.get("queue_has_toxic", True):
-                queue_removed_toxic_ts = evt["timestamp"]
-                break
-        except (json.JSONDecodeError, TypeError):
-            pass
+        d = evt["details_parsed"]
+        if d and not d.get("queue_has_toxic", True):
+            queue_removed_toxic_ts = evt["timestamp"]
+            break
 
     profile["queue_removed_toxic_ts"] = queue_removed_toxic_ts
     profile["queue_removed_toxic_date"] = ts_to_date(queue_removed_toxic_ts) if queue_removed_toxic_ts else None
     profile["total_admin_events"] = len(vault_admin)
 
     # ── Reallocation analysis ──
-    vault_reallocs = [r for r in realloc_rows
-                      if r["vault_address"].lower() == address and r["is_toxic_market"]]
+    vault_reallocs = index["realloc"].get(address, [])
 
     withdrawals = [r for r in vault_reallocs if r["realloc_type"] == "ReallocateWithdraw"]
     supplies = [r for r in vault_reallocs if r["realloc_type"] == "ReallocateSupply"]
@@ -467,7 +493,6 @@ def main():
         toxic_rows = [r for r in rows if r["is_toxic_market"]]
         print(f"      ✅ {len(rows)} total reallocations, {len(toxic_rows)} involving toxic markets")
         all_realloc_rows.extend(rows)
-        time.sleep(REQUEST_DELAY)
 
     if all_realloc_rows:
         df_realloc = pd.DataFrame(all_realloc_rows)
@@ -489,10 +514,9 @@ def main():
     print(f"🏷️  TASK 4 (3.4): Curator Response Classification")
     print(f"{'─' * 70}")
 
-    profiles = []
-    for v in vaults:
-        p = classify_curator_response(v, all_alloc_rows, all_admin_rows, all_realloc_rows, toxic_keys)
-        profiles.append(p)
+    # Group + pre-parse once; each vault is then a dict lookup
+    index = build_vault_index(all_alloc_rows, all_admin_rows, all_realloc_rows)
+    profiles = [classify_curator_response(v, index) for v in vaults]
 
     if profiles:
         df_profiles = pd.DataFrame(profiles)
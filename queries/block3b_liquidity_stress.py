@@ -13,7 +13,12 @@ TASK 2: Vault Net Flows
   - Derived from Block 2 share price data (totalAssetsUsd daily)
   - Daily net flow = TVL[t] - TVL[t-1]
   - Withdrawal pressure metric = net_flow / TVL[t-1]
-  - Output: block3_vault_net_flows.csv
+  - Same on block2 hourly data (Nov 1-15)
+  - Bank-run onsets: block2 hourly TVL + share price replayed through the
+    streaming detector (bank_run.py: EWMA flow z-score, outflow since peak);
+    its per-vault state is saved so a live feed can continue from it
+  - Output: block3_vault_net_flows.csv, block3_vault_net_flows_hourly.csv,
+            block3_bank_run_events.csv, _store/bank_run_state.json
 
 TASK 3: Stress Comparison Table
   - Combines: share price drawdown, TVL drawdown, peak utilization, toxic allocation %
@@ -22,6 +27,7 @@ TASK 3: Stress Comparison Table
 
 Input:  04-data-exports/raw/graphql/block1_markets_graphql.csv
         04-data-exports/raw/graphql/block2_share_prices_daily.csv
+        04-data-exports/raw/graphql/block2_share_prices_hourly.csv
         04-data-exports/raw/graphql/block2_share_price_summary.csv
         04-data-exports/raw/graphql/block3_allocation_timeseries.csv
         04-data-exports/raw/graphql/block3_curator_profiles.csv
@@ -34,7 +40,12 @@ import numpy as np
 from pathlib import Path
 from datetime import datetime, timezone
 from dotenv import load_dotenv
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
+
+import rate_limiter
+import toxic_markets
+from bank_run import BankRunDetector, EVENT_COLS
+from watermarks import Watermarks, LATE_OVERLAP, history_end
 
 # ── Project paths ──
 PROJECT_ROOT = Path(__file__).parent.parent
@@ -42,7 +53,6 @@ env_path = PROJECT_ROOT / '.env'
 load_dotenv(dotenv_path=env_path)
 
 GRAPHQL_URL = "https://blue-api.morpho.org/graphql"
-REQUEST_DELAY = 0.3
 
 # ── Time windows ──
 TS_OCT_01   = 1759276800
@@ -54,12 +64,17 @@ TS_NOV_30   = 1764547199
 
 DEPEG_TS = TS_NOV_04
 
+# Daily utilization end; MORPHO_HISTORY_END=now extends it on a refresh
+UTIL_DAILY_END = history_end(TS_NOV_30)
+INTERVAL_SECONDS = {"HOUR": 3600, "DAY": 86400}
+UTIL_KEY_COLS = ["market_unique_key", "timestamp"]
+
 
 def query_graphql(query: str) -> dict:
     headers = {"Content-Type": "application/json"}
     for attempt in range(3):
         try:
-            resp = requests.post(GRAPHQL_URL, json={"query": query}, headers=headers, timeout=60)
+            resp = rate_limiter.post(GRAPHQL_URL, json={"query": query}, headers=headers, timeout=60)
             resp.raise_for_status()
             data = resp.json()
             if "errors" in data:
@@ -171,14 +186,56 @@ def query_market_utilization(market_id: str, chain_id: int, collateral: str,
     return rows
 
 
+def refresh_market_utilization(marks: Watermarks, existing: pd.DataFrame,
+                               market_id: str, chain_id: int, collateral: str,
+                               loan: str, chain: str,
+                               start_ts: int, end_ts: int,
+                               interval: str) -> Tuple[List[Dict], int]:
+    """
+    Utilization rows for [start_ts, end_ts], fetching only what is past the
+    market's watermark (with a small overlap for late corrections) and merging
+    it into the rows already in the previous CSV. Returns (rows, points fetched).
+    """
+    key = (market_id, "utilization", interval)
+    held = pd.DataFrame()
+    if not existing.empty:
+        held = existing[
+            (existing["market_unique_key"] == market_id)
+            & (existing["timestamp"] >= start_ts)
+            & (existing["timestamp"] <= end_ts)
+        ]
+
+    window = marks.fetch_window(key, start_ts, end_ts,
+                                step=INTERVAL_SECONDS[interval],
+                                overlap=LATE_OVERLAP[interval])
+    if held.empty:
+        window = (start_ts, end_ts)   # previous CSV gone — refetch the window
+    if window is None:
+        return held.to_dict("records"), 0
+
+    fetched = query_market_utilization(market_id, chain_id, collateral, loan, chain,
+                                       window[0], window[1], interval)
+    if fetched:
+        marks.advance(key, *window)
+    if held.empty:
+        return fetched, len(fetched)
+
+    merged = pd.concat([held, pd.DataFrame(fetched)], ignore_index=True)
+    merged = merged.drop_duplicates(UTIL_KEY_COLS, keep="last").sort_values("timestamp")
+    return merged.to_dict("records"), len(fetched)
+
+
 # ═══════════════════════════════════════════════════════════════
 #  TASK 2: Vault Net Flows (from existing Block 2 data)
 # ═══════════════════════════════════════════════════════════════
 
 def compute_vault_net_flows(df_share_prices: pd.DataFrame) -> pd.DataFrame:
     """
-    Derive daily net flows from Block 2 share price data.
+    Derive net flows from Block 2 share price data (daily or hourly).
     net_flow[t] = totalAssetsUsd[t] - totalAssetsUsd[t-1]
+
+    One grouped shift over all vaults; steps where either side is NaN or the
+    previous TVL is zero are dropped.
     """
     # Block 2 daily has: vault_address, vault_name, timestamp, date, total_assets_usd, share_price
     # Column names may vary — handle both conventions
@@ -193,43 +250,62 @@ def compute_vault_net_flows(df_share_prices: pd.DataFrame) -> pd.DataFrame:
         print("  ⚠️  Cannot find TVL column in share price data")
         return pd.DataFrame()
 
-    df = df_share_prices.copy()
+    df = df_share_prices[["vault_address", "vault_name", "timestamp", "date", "total_assets_usd"]].copy()
     df["total_assets_usd"] = pd.to_numeric(df["total_assets_usd"], errors="coerce")
     df["timestamp"] = pd.to_numeric(df["timestamp"], errors="coerce")
-    df = df.sort_values(["vault_address", "timestamp"])
+    df = df.sort_values(["vault_address", "timestamp"], kind="mergesort")
 
-    all_flows = []
-    for vault_addr, group in df.groupby("vault_address"):
-        g = group.sort_values("timestamp").reset_index(drop=True)
+    grouped = df.groupby("vault_address", sort=False)
+    df["vault_name"] = grouped["vault_name"].transform("first")
+    df["prev_total_assets_usd"] = grouped["total_assets_usd"].shift(1)
+    df["net_flow_usd"] = df["total_assets_usd"] - df["prev_total_assets_usd"]
 
-        if len(g) < 2:
-            continue
-
-        vault_name = g["vault_name"].iloc[0]
+    valid = (
+        df["prev_total_assets_usd"].notna()
+        & df["total_assets_usd"].notna()
+        & (df["prev_total_assets_usd"] != 0)
+    )
+    df = df[valid].copy()
+    df["net_flow_pct"] = df["net_flow_usd"] / df["prev_total_assets_usd"] * 100
+    df["is_withdrawal"] = df["net_flow_usd"] < 0
+    df["timestamp"] = df["timestamp"].astype(int)
 
-        for i in range(1, len(g)):
-            prev_tvl = g.loc[i - 1, "total_assets_usd"]
-            curr_tvl = g.loc[i, "total_assets_usd"]
+    return df[["vault_address", "vault_name", "timestamp", "date", "total_assets_usd",
+               "prev_total_assets_usd", "net_flow_usd", "net_flow_pct", "is_withdrawal"]
+              ].reset_index(drop=True)
 
-            if pd.isna(prev_tvl) or pd.isna(curr_tvl) or prev_tvl == 0:
-                continue
 
-            net_flow = curr_tvl - prev_tvl
-            flow_pct = (net_flow / prev_tvl) * 100
+def detect_bank_runs(df_share_hourly: pd.DataFrame) -> Tuple[pd.DataFrame, BankRunDetector]:
+    """
+    Replay block2 hourly points through a fresh BankRunDetector.
+    Returns (ONSET events, detector) — the detector's state is what a live
+    feed continues from.
+    """
+    detector = BankRunDetector()
+    if df_share_hourly.empty:
+        return pd.DataFrame(columns=EVENT_COLS), detector
+    return detector.replay(df_share_hourly), detector
 
-            all_flows.append({
-                "vault_address": vault_addr,
-                "vault_name": vault_name,
-                "timestamp": int(g.loc[i, "timestamp"]),
-                "date": g.loc[i, "date"],
-                "total_assets_usd": curr_tvl,
-                "prev_total_assets_usd": prev_tvl,
-                "net_flow_usd": net_flow,
-                "net_flow_pct": flow_pct,
-                "is_withdrawal": net_flow < 0,
-            })
 
-    return pd.DataFrame(all_flows)
+def bank_run_onset(df_events: pd.DataFrame) -> pd.DataFrame:
+    """
+    First bank-run onset per vault and chain (the detector re-arms, so a vault
+    can have several; the same address can be a different vault on another chain).
+    """
+    if df_events.empty:
+        return pd.DataFrame(columns=["vault_address", "chain_id", "onset_ts", "onset_datetime",
+                                     "onset_outflow_pct", "onset_trigger"])
+    first = (df_events.assign(vault_address=df_events["vault_address"].str.lower())
+             .sort_values("timestamp")
+             .drop_duplicates(["vault_address", "chain_id"], keep="first"))
+    return pd.DataFrame({
+        "vault_address": first["vault_address"].values,
+        "chain_id": first["chain_id"].astype(int).values,
+        "onset_ts": first["timestamp"].values,
+        "onset_datetime": first["timestamp"].map(ts_to_datetime).values,
+        "onset_outflow_pct": first["net_flow_pct"].round(2).values,
+        "onset_trigger": first["trigger"].values,
+    })
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -242,6 +318,7 @@ def build_stress_comparison(
     df_profiles: pd.DataFrame,
     df_alloc: pd.DataFrame,
     df_util_hourly: pd.DataFrame,
+    df_onset: Optional[pd.DataFrame] = None,
 ) -> pd.DataFrame:
     """
     Combine per-vault metrics into a single stress comparison table.
@@ -275,6 +352,10 @@ def build_stress_comparison(
     else:
         peak_alloc = {}
 
+    # Bank-run onset hour per (vault, chain) (from hourly net flows)
+    onset_by_vault = ({(r["vault_address"], int(r["chain_id"])): r for r in df_onset.to_dict("records")}
+                      if df_onset is not None and len(df_onset) > 0 else {})
+
     for _, row in df_share_summary.iterrows():
         vault_addr = str(row.get("vault_address", "")).lower()
         vault_name = row.get("vault_name", "")
@@ -350,6 +431,8 @@ def build_stress_comparison(
             "depeg_week_net_flow_usd": round(depeg_net_flow, 0) if depeg_net_flow is not None else None,
             "depeg_week_withdrawal_days": int(withdrawal_days) if withdrawal_days is not None else None,
             "max_daily_outflow_pct": round(max_daily_outflow, 2) if max_daily_outflow is not None else None,
+            "bank_run_onset": onset_by_vault.get((vault_addr, int(row.get("chain_id", 0) or 0)),
+                                                 {}).get("onset_datetime"),
             # Toxic exposure
             "peak_toxic_alloc_usd": round(peak_toxic_usd, 0),
             "toxic_pct_of_tvl": round(toxic_pct_of_tvl, 2),
@@ -375,14 +458,15 @@ def main():
     gql_dir = PROJECT_ROOT / "data"
 
     # ── Load existing data ──
-    markets_path = gql_dir / "block1_markets_graphql.csv"
     share_daily_path = gql_dir / "block2_share_prices_daily.csv"
+    share_hourly_path = gql_dir / "block2_share_prices_hourly.csv"
     share_summary_path = gql_dir / "block2_share_price_summary.csv"
     alloc_path = gql_dir / "block3_allocation_timeseries.csv"
     profiles_path = gql_dir / "block3_curator_profiles.csv"
 
-    df_markets = pd.read_csv(markets_path) if markets_path.exists() else pd.DataFrame()
+    df_markets = toxic_markets.frame(gql_dir)
     df_share_daily = pd.read_csv(share_daily_path) if share_daily_path.exists() else pd.DataFrame()
+    df_share_hourly = pd.read_csv(share_hourly_path) if share_hourly_path.exists() else pd.DataFrame()
     df_share_summary = pd.read_csv(share_summary_path) if share_summary_path.exists() else pd.DataFrame()
     df_alloc = pd.read_csv(alloc_path) if alloc_path.exists() else pd.DataFrame()
     df_profiles = pd.read_csv(profiles_path) if profiles_path.exists() else pd.DataFrame()
@@ -390,6 +474,7 @@ def main():
     print(f"\n📂 Loaded existing data:")
     print(f"   Markets:            {len(df_markets)} rows")
     print(f"   Share prices daily: {len(df_share_daily)} rows")
+    print(f"   Share prices hourly:{len(df_share_hourly)} rows")
     print(f"   Share price summary:{len(df_share_summary)} rows")
     print(f"   Allocation ts:      {len(df_alloc)} rows")
     print(f"   Curator profiles:   {len(df_profiles)} rows")
@@ -401,6 +486,13 @@ def main():
     print(f"📊 TASK 1: Market Utilization Timeseries")
     print(f"{'─' * 70}")
 
+    # Incremental refresh: previous CSVs + watermarks (data/_store/block3b_utilization.json)
+    marks = Watermarks(gql_dir, "block3b_utilization")
+    hourly_path = gql_dir / "block3_market_utilization_hourly.csv"
+    daily_path = gql_dir / "block3_market_utilization_daily.csv"
+    prev_hourly = pd.read_csv(hourly_path) if hourly_path.exists() else pd.DataFrame()
+    prev_daily = pd.read_csv(daily_path) if daily_path.exists() else pd.DataFrame()
+
     all_hourly = []
     all_daily = []
 
@@ -416,40 +508,38 @@ def main():
 
         # Hourly: Nov 1-15 (depeg zoom)
         print(f"      Hourly (Nov 1-15)...")
-        hourly = query_market_utilization(
-            market_id, chain_id, collateral, loan, chain,
+        hourly, n_new = refresh_market_utilization(
+            marks, prev_hourly, market_id, chain_id, collateral, loan, chain,
             TS_NOV_01, TS_NOV_15, "HOUR"
         )
         if hourly:
             # Find peak utilization
             peak_util = max(r["utilization"] for r in hourly)
             hrs_at_100 = sum(1 for r in hourly if r["utilization"] >= 0.999)
-            print(f"      ✅ {len(hourly)} hourly pts, peak util={peak_util:.4f}, "
+            print(f"      ✅ {len(hourly)} hourly pts ({n_new} fetched), peak util={peak_util:.4f}, "
                   f"hours at 100%={hrs_at_100}")
         else:
             print(f"      ⚠️  No hourly data")
         all_hourly.extend(hourly)
 
-        time.sleep(REQUEST_DELAY)
 
-        # Daily: Sept 1 → Jan 31 (full context)
-        print(f"      Daily (Sept 1 → Jan 31)...")
-        daily = query_market_utilization(
-            market_id, chain_id, collateral, loan, chain,
-            TS_OCT_01, TS_NOV_30, "DAY"
+        # Daily: Oct 1 → UTIL_DAILY_END (full context)
+        print(f"      Daily ({ts_to_date(TS_OCT_01)} → {ts_to_date(UTIL_DAILY_END)})...")
+        daily, n_new = refresh_market_utilization(
+            marks, prev_daily, market_id, chain_id, collateral, loan, chain,
+            TS_OCT_01, UTIL_DAILY_END, "DAY"
         )
         if daily:
-            print(f"      ✅ {len(daily)} daily pts")
+            print(f"      ✅ {len(daily)} daily pts ({n_new} fetched)")
         else:
             print(f"      ⚠️  No daily data")
         all_daily.extend(daily)
 
-        time.sleep(REQUEST_DELAY)
 
     # Save utilization data
+    marks.save()
     if all_hourly:
         df_hourly = pd.DataFrame(all_hourly)
-        hourly_path = gql_dir / "block3_market_utilization_hourly.csv"
         df_hourly.to_csv(hourly_path, index=False)
         print(f"\n✅ Saved {len(all_hourly)} hourly utilization rows to {hourly_path.name}")
     else:
@@ -457,7 +547,6 @@ def main():
 
     if all_daily:
         df_daily_util = pd.DataFrame(all_daily)
-        daily_path = gql_dir / "block3_market_utilization_daily.csv"
         df_daily_util.to_csv(daily_path, index=False)
         print(f"✅ Saved {len(all_daily)} daily utilization rows to {daily_path.name}")
     else:
@@ -537,6 +626,33 @@ def main():
         print(f"  ⚠️  No Block 2 share price data to derive flows from")
         df_net_flows = pd.DataFrame()
 
+    # ── Hourly net flows → bank-run onset ──
+    df_onset = bank_run_onset(pd.DataFrame())
+    if len(df_share_hourly) > 0:
+        df_flows_hourly = compute_vault_net_flows(df_share_hourly)
+        if len(df_flows_hourly) > 0:
+            flows_hourly_path = gql_dir / "block3_vault_net_flows_hourly.csv"
+            df_flows_hourly.to_csv(flows_hourly_path, index=False)
+            print(f"\n✅ Saved {len(df_flows_hourly)} hourly net flow rows to {flows_hourly_path.name}")
+
+        # Streaming detector replayed over the hourly points; state saved for live feeds
+        df_events, detector = detect_bank_runs(df_share_hourly)
+        detector.save(PROJECT_ROOT / "data")
+        events_path = gql_dir / "block3_bank_run_events.csv"
+        df_events.to_csv(events_path, index=False)
+        print(f"✅ Saved {len(df_events)} bank-run onset events to {events_path.name} "
+              f"({len(detector)} vaults tracked)")
+
+        df_onset = bank_run_onset(df_events)
+        if len(df_events) > 0:
+            print(f"\n  BANK-RUN ONSETS (EWMA flow z-score / outflow since peak)")
+            for r in df_events.itertuples():
+                z = f"z={r.z_score:.1f}" if pd.notna(r.z_score) else "warm-up"
+                print(f"    {r.datetime:%Y-%m-%d %H:%M}  {r.vault_name}  [{r.trigger}]  "
+                      f"step {r.net_flow_pct:+.1f}%  {z}  since peak -{r.outflow_since_peak_pct:.1f}%")
+    else:
+        print(f"  ℹ️  No Block 2 hourly share prices — skipping hourly flows")
+
     # ══════════════════════════════════════════════════════════
     #  TASK 3: Stress Comparison Table
     # ══════════════════════════════════════════════════════════
@@ -546,7 +662,7 @@ def main():
 
     if len(df_share_summary) > 0:
         df_stress = build_stress_comparison(
-            df_share_summary, df_net_flows, df_profiles, df_alloc, df_hourly
+            df_share_summary, df_net_flows, df_profiles, df_alloc, df_hourly, df_onset
         )
 
         if len(df_stress) > 0:
@@ -601,6 +717,8 @@ def main():
     print(f"    block3_market_utilization_hourly.csv")
     print(f"    block3_market_utilization_daily.csv")
     print(f"    block3_vault_net_flows.csv")
+    print(f"    block3_vault_net_flows_hourly.csv")
+    print(f"    block3_bank_run_events.csv")
     print(f"    block3_stress_comparison.csv")
     print(f"{'═' * 70}")
 
@@ -33,7 +33,15 @@ TASK 6: LLTV vs True LTV Analysis (5.4)
   - Combine oracle price, spot price, LLTV, and positions
   - Show the gap: oracle says healthy, reality says underwater
   - Pure analysis, no API calls
-  - Output: block5_ltv_analysis.csv
+  - Same engine over the hourly price history (markets × hours) → first
+    hour each market crossed LLTV at spot
+  - Output: block5_ltv_analysis.csv, block5_ltv_history.csv
+
+TASK 7: Oracle Deviation Cube
+  - Market × hour oracle-implied price vs spot for every toxic market
+    (oracle path modelled from config + today's oracle price, see oracle_cube)
+  - First hour / longest window above a deviation threshold, per oracle mechanism
+  - Output: _store/oracle_cube/*.npy (+ markets.csv), memory-mapped by the dashboard
 
 Input:  04-data-exports/raw/graphql/block1_markets_graphql.csv
 Output: 04-data-exports/raw/graphql/block5_*.csv
@@ -48,13 +56,17 @@ from datetime import datetime, timezone
 from dotenv import load_dotenv
 from typing import List, Dict, Optional
 
+import rate_limiter
+import toxic_markets
+from resampling import regular_grid, price_matrix, series_id
+from oracle_cube import OracleCube
+
 # ── Project paths ──
 PROJECT_ROOT = Path(__file__).parent.parent
 env_path = PROJECT_ROOT / '.env'
 load_dotenv(dotenv_path=env_path)
 
 GRAPHQL_URL = "https://blue-api.morpho.org/graphql"
-REQUEST_DELAY = 0.3
 
 # ── Time windows ──
 TS_SEPT_01  = 1756684800
@@ -69,13 +81,16 @@ TS_JAN_31   = 1769817600
 DEPEG_TS = TS_NOV_04
 ZERO_ADDR = "0x0000000000000000000000000000000000000000"
 
+# One price series per token per chain
+PRICE_KEYS = ["symbol", "address", "chain_id"]
+
 
 def query_graphql(query: str, timeout: int = 60) -> dict:
     """Execute a GraphQL query with retry logic."""
     headers = {"Content-Type": "application/json"}
     for attempt in range(3):
         try:
-            resp = requests.post(GRAPHQL_URL, json={"query": query},
+            resp = rate_limiter.post(GRAPHQL_URL, json={"query": query},
                                  headers=headers, timeout=timeout)
             resp.raise_for_status()
             data = resp.json()
@@ -116,7 +131,7 @@ def safe_int(val, default=0) -> int:
         return default
 
 
-def forward_fill_daily_prices(daily_rows: List[Dict], depeg_ts: int = TS_NOV_04) -> List[Dict]:
+def forward_fill_daily_prices(df_daily: pd.DataFrame, depeg_ts: int = TS_NOV_04) -> pd.DataFrame:
     """
     Forward-fill gaps in daily price data for the pre-depeg period.
 
@@ -125,51 +140,23 @@ def forward_fill_daily_prices(daily_rows: List[Dict], depeg_ts: int = TS_NOV_04)
     day-by-day until the depeg date.
 
     Prevents charts from drawing misleading diagonal lines across data gaps.
-    Only fills the pre-depeg period — post-depeg data is kept as-is.
+    Only fills the pre-depeg period — post-depeg data is kept as-is. Runs on
+    the whole daily table at once (resampling.regular_grid).
     """
-    if not daily_rows:
-        return daily_rows
-
-    # Sort by timestamp
-    sorted_rows = sorted(daily_rows, key=lambda r: r["timestamp"])
-
-    # Split at depeg boundary
-    pre_depeg = [r for r in sorted_rows if r["timestamp"] < depeg_ts]
-    post_depeg = [r for r in sorted_rows if r["timestamp"] >= depeg_ts]
-
-    if not pre_depeg or not post_depeg:
-        return daily_rows  # nothing to fill
-
-    # Check if there's a significant gap (>2 days) between last pre-depeg point and depeg
-    last_pre = pre_depeg[-1]
-    gap_days = (depeg_ts - last_pre["timestamp"]) / 86400
-
-    if gap_days <= 2:
-        return daily_rows  # no significant gap
-
-    # Forward-fill: create daily points from last known price to day before depeg
-    filled = list(pre_depeg)
-    current_ts = last_pre["timestamp"] + 86400
-
-    while current_ts < depeg_ts:
-        filled.append({
-            "symbol": last_pre["symbol"],
-            "address": last_pre["address"],
-            "chain_id": last_pre["chain_id"],
-            "timestamp": current_ts,
-            "date": ts_to_date(current_ts),
-            "datetime": ts_to_datetime(current_ts),
-            "price_usd": last_pre["price_usd"],
-            "current_price_usd": last_pre.get("current_price_usd", 0),
-        })
-        current_ts += 86400
+    if df_daily.empty:
+        return df_daily
+
+    grid = regular_grid(df_daily, "DAY", keys=PRICE_KEYS)
+    grid = grid[~grid["filled"] | (grid["timestamp"] < depeg_ts)].copy()
+    grid["date"] = grid["timestamp"].map(ts_to_date)
+    grid["datetime"] = grid["timestamp"].map(ts_to_datetime)
 
-    n_filled = len(filled) - len(pre_depeg)
-    if n_filled > 0:
-        print(f"      ℹ️  Forward-filled {n_filled} daily pre-depeg prices "
-              f"at ${last_pre['price_usd']:.4f} ({last_pre['date']} → {ts_to_date(depeg_ts - 86400)})")
+    filled = grid[grid["filled"]]
+    for (symbol, chain_id), grp in filled.groupby(["symbol", "chain_id"]):
+        print(f"   ℹ️  Forward-filled {len(grp)} daily pre-depeg prices for {symbol} (chain {chain_id}) "
+              f"({grp['date'].min()} → {grp['date'].max()})")
 
-    return filled + post_depeg
+    return grid.drop(columns=["filled", "source_ts"]).reset_index(drop=True)
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -440,6 +427,7 @@ def query_asset_price_history(address: str, chain_id: int, symbol: str,
             "datetime": ts_to_datetime(ts),
             "price_usd": price,
             "current_price_usd": current_price,
+            "interval": interval,
         })
 
     return rows
@@ -523,6 +511,7 @@ def query_borrower_positions(market_ids: List[str], chain_id: int,
     all_positions = []
     skip = 0
     page_size = 100
+    snapshot_ts = int(time.time())   # positions are current state: stamp them with the read time
 
     while True:
         query = f"""
@@ -609,12 +598,12 @@ def query_borrower_positions(market_ids: List[str], chain_id: int,
                 "supply_assets_raw": supply_assets,
                 "supply_assets_usd": supply_usd,
                 "position_type": "borrower" if borrow_usd > 0 else ("supplier" if supply_usd > 0 else "collateral_only"),
+                "snapshot_ts": snapshot_ts,
             })
 
         if len(items) < page_size or skip + page_size >= total:
             break
         skip += page_size
-        time.sleep(REQUEST_DELAY)
 
     return all_positions
 
@@ -716,7 +705,6 @@ def query_liquidation_events(market_ids: List[str], chain_id: int = 0) -> List[D
         if len(items) < page_size or skip + page_size >= total:
             break
         skip += page_size
-        time.sleep(REQUEST_DELAY)
 
     return all_events
 
@@ -725,6 +713,71 @@ def query_liquidation_events(market_ids: List[str], chain_id: int = 0) -> List[D
 #  TASK 6: LLTV vs True LTV Analysis (pure analysis)
 # ═══════════════════════════════════════════════════════════════
 
+def ltv_engine(borrow_usd, collateral_usd, supply_usd, lltv_pct,
+               collateral_spot, loan_spot, is_vault_based) -> Dict[str, np.ndarray]:
+    """
+    Oracle LTV, true LTV, price gap and liquidation status, column-wise.
+
+    Inputs are arrays (or scalars) that broadcast together — one entry per
+    market, or a (markets × hours) grid with a price history as
+    `collateral_spot`.
+
+    The API's collateralAssetsUsd uses the oracle price, not spot. A
+    vault-based (ERC4626) oracle keeps reporting ~$1 after a depeg, so when
+    spot falls below $0.90 the true collateral value is reported × spot.
+    Feed-based oracles track spot, so oracle LTV = true LTV there.
+    """
+    borrow_usd, collateral_usd, supply_usd, lltv_pct, collateral_spot, loan_spot = (
+        np.asarray(a, dtype=float)
+        for a in (borrow_usd, collateral_usd, supply_usd, lltv_pct, collateral_spot, loan_spot)
+    )
+    is_vault_based = np.asarray(is_vault_based, dtype=bool)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Oracle-based LTV (what the protocol sees)
+        oracle_ltv = np.where(
+            collateral_usd > 0, borrow_usd / collateral_usd * 100,
+            np.where(borrow_usd > 0, np.inf, 0.0),
+        )
+
+        masked = (is_vault_based & (collateral_spot > 0) & (collateral_spot < 0.90)
+                  & (loan_spot > 0) & (collateral_usd > 0))
+        true_collateral_usd = np.where(masked, collateral_usd * collateral_spot, collateral_usd)
+        true_ltv = np.where(
+            masked,
+            np.where(true_collateral_usd > 0, borrow_usd / true_collateral_usd * 100, np.inf),
+            oracle_ltv,
+        )
+        price_gap_pct = np.where(masked, (1.0 - collateral_spot) * 100, 0.0)
+        ltv_gap = true_ltv - oracle_ltv
+
+    has_lltv = lltv_pct > 0
+    liquidation_status = np.select(
+        [
+            (oracle_ltv >= lltv_pct) & has_lltv,
+            (true_ltv >= lltv_pct) & has_lltv & (true_ltv != oracle_ltv),  # oracle says safe, reality says not
+            (borrow_usd > supply_usd) & (supply_usd > 0),                  # borrow > supply = confirmed bad debt
+            (borrow_usd > 0) & (collateral_usd == 0),                      # borrowing with no collateral
+        ],
+        ["LIQUIDATABLE_ORACLE", "UNDERWATER_MASKED", "BAD_DEBT", "UNSECURED_DEBT"],
+        default="HEALTHY",
+    )
+
+    return {
+        "oracle_ltv": oracle_ltv,
+        "true_ltv": true_ltv,
+        "ltv_gap": ltv_gap,
+        "true_collateral_usd": true_collateral_usd,
+        "price_gap_pct": price_gap_pct,
+        "liquidation_status": liquidation_status,
+    }
+
+
+def _active_markets(df_oracle: pd.DataFrame) -> pd.DataFrame:
+    """Markets with any borrow or collateral."""
+    return df_oracle[(df_oracle["borrow_assets_usd"] != 0) | (df_oracle["collateral_assets_usd"] != 0)]
+
+
 def compute_ltv_analysis(df_oracle: pd.DataFrame, df_positions: pd.DataFrame) -> pd.DataFrame:
     """
     For each market with active borrowing:
@@ -734,111 +787,112 @@ def compute_ltv_analysis(df_oracle: pd.DataFrame, df_positions: pd.DataFrame) ->
     - Implied LTV under oracle vs under spot
     - Gap analysis
     """
-    rows = []
-
-    for _, oracle_row in df_oracle.iterrows():
-        market_key = oracle_row["market_unique_key"]
-        chain = oracle_row["chain"]
-        collateral_sym = oracle_row["collateral_symbol"]
-        loan_sym = oracle_row["loan_symbol"]
-        lltv_pct = oracle_row["lltv_pct"]
-        collateral_spot = oracle_row["collateral_spot_price_usd"]
-        loan_spot = oracle_row["loan_spot_price_usd"]
-        borrow_usd = oracle_row["borrow_assets_usd"]
-        collateral_usd = oracle_row["collateral_assets_usd"]
-        supply_usd = oracle_row["supply_assets_usd"]
-        oracle_mechanism = oracle_row["oracle_mechanism"]
-        is_vault_based = oracle_row["is_vault_based"]
-        bad_debt_usd = oracle_row["bad_debt_usd"]
-        realized_bd_usd = oracle_row["realized_bad_debt_usd"]
-
-        # Skip markets with no activity
-        if borrow_usd == 0 and collateral_usd == 0:
-            continue
-
-        # Oracle-based LTV (what the protocol sees)
-        if collateral_usd > 0:
-            oracle_ltv = (borrow_usd / collateral_usd) * 100
-        else:
-            oracle_ltv = float('inf') if borrow_usd > 0 else 0
-
-        # True LTV calculation:
-        # The oracle says collateral is worth X, but the spot price says it's worth Y
-        # If oracle reports $1 but spot is $0.015, true collateral value is 1.5% of reported
-        # For vault-based oracles: the ERC4626 conversion rate IS the oracle, not the market price
-
-        # We need the implied collateral value at spot price
-        # collateral_usd from the API already uses oracle pricing
-        # True value = collateral_usd * (spot_price / oracle_implied_price)
-
-        # For simplicity: if collateral_spot < 1 and the oracle mechanism is vault-based,
-        # the oracle is likely still reporting ~$1, so:
-        if collateral_spot > 0 and loan_spot > 0 and collateral_usd > 0:
-            # The API's collateralAssetsUsd uses the oracle price, not spot
-            # So true_collateral_usd ≈ collateral_usd * (spot / 1.0) for stablecoins
-            # But we need to be careful — collateralAssetsUsd may already use spot for known assets
-
-            # Better approach: estimate the oracle's implied price for collateral
-            # oracle_implied_price ≈ collateral_usd / (collateral_quantity * loan_spot)
-            # But we don't have collateral_quantity in USD-normalized form easily.
-
-            # Simpler: if spot price is known and differs from $1, compute ratio
-            if is_vault_based and collateral_spot < 0.90:
-                # Oracle reports ~$1, spot says much less
-                # True collateral value = reported_value * spot_price
-                true_collateral_usd = collateral_usd * collateral_spot
-                true_ltv = (borrow_usd / true_collateral_usd) * 100 if true_collateral_usd > 0 else float('inf')
-                price_gap_pct = (1.0 - collateral_spot) * 100  # e.g., 97% gap if spot=$0.03
-            else:
-                # Either oracle is feed-based (should track spot), or spot is close to $1
-                true_collateral_usd = collateral_usd  # Oracle ≈ spot
-                true_ltv = oracle_ltv
-                price_gap_pct = 0
-        else:
-            true_collateral_usd = collateral_usd
-            true_ltv = oracle_ltv
-            price_gap_pct = 0
-
-        # Liquidation status
-        if oracle_ltv >= lltv_pct and lltv_pct > 0:
-            liquidation_status = "LIQUIDATABLE_ORACLE"
-        elif true_ltv >= lltv_pct and lltv_pct > 0 and true_ltv != oracle_ltv:
-            liquidation_status = "UNDERWATER_MASKED"  # Oracle says safe, reality says not
-        elif borrow_usd > supply_usd and supply_usd > 0:
-            liquidation_status = "BAD_DEBT"  # borrow > supply = confirmed bad debt
-        elif borrow_usd > 0 and collateral_usd == 0:
-            liquidation_status = "UNSECURED_DEBT"  # borrowing with no collateral
-        else:
-            liquidation_status = "HEALTHY"
+    m = _active_markets(df_oracle)
+    if m.empty:
+        return pd.DataFrame()
+
+    r = ltv_engine(m["borrow_assets_usd"], m["collateral_assets_usd"], m["supply_assets_usd"],
+                   m["lltv_pct"], m["collateral_spot_price_usd"], m["loan_spot_price_usd"],
+                   m["is_vault_based"])
+
+    return pd.DataFrame({
+        "market_unique_key": m["market_unique_key"].values,
+        "chain": m["chain"].values,
+        "collateral_symbol": m["collateral_symbol"].values,
+        "loan_symbol": m["loan_symbol"].values,
+        "lltv_pct": m["lltv_pct"].values,
+        # Oracle
+        "oracle_mechanism": m["oracle_mechanism"].values,
+        "is_vault_based": m["is_vault_based"].values,
+        "collateral_spot_price": m["collateral_spot_price_usd"].values,
+        "price_gap_pct": np.round(r["price_gap_pct"], 2),
+        # LTV
+        "oracle_ltv_pct": np.round(np.minimum(r["oracle_ltv"], 9999), 2),
+        "true_ltv_pct": np.round(np.minimum(r["true_ltv"], 9999), 2),
+        "ltv_gap_pct": np.round(np.minimum(r["ltv_gap"], 9999), 2),
+        # Values
+        "borrow_usd": np.round(m["borrow_assets_usd"].values.astype(float), 2),
+        "collateral_usd_oracle": np.round(m["collateral_assets_usd"].values.astype(float), 2),
+        "collateral_usd_true": np.round(r["true_collateral_usd"], 2),
+        "supply_usd": np.round(m["supply_assets_usd"].values.astype(float), 2),
+        # Bad debt
+        "bad_debt_usd": m["bad_debt_usd"].values,
+        "realized_bad_debt_usd": m["realized_bad_debt_usd"].values,
+        # Status
+        "liquidation_status": r["liquidation_status"],
+    })
 
-        rows.append({
-            "market_unique_key": market_key,
-            "chain": chain,
-            "collateral_symbol": collateral_sym,
-            "loan_symbol": loan_sym,
-            "lltv_pct": lltv_pct,
-            # Oracle
-            "oracle_mechanism": oracle_mechanism,
-            "is_vault_based": is_vault_based,
-            "collateral_spot_price": collateral_spot,
-            "price_gap_pct": round(price_gap_pct, 2),
-            # LTV
-            "oracle_ltv_pct": round(min(oracle_ltv, 9999), 2),
-            "true_ltv_pct": round(min(true_ltv, 9999), 2),
-            "ltv_gap_pct": round(min(true_ltv - oracle_ltv, 9999), 2),
-            # Values
-            "borrow_usd": round(borrow_usd, 2),
-            "collateral_usd_oracle": round(collateral_usd, 2),
-            "collateral_usd_true": round(true_collateral_usd, 2),
-            "supply_usd": round(supply_usd, 2),
-            # Bad debt
-            "bad_debt_usd": bad_debt_usd,
-            "realized_bad_debt_usd": realized_bd_usd,
-            # Status
-            "liquidation_status": liquidation_status,
-        })
 
-    return pd.DataFrame(rows)
+def compute_ltv_history(df_oracle: pd.DataFrame, df_hourly_prices: pd.DataFrame) -> pd.DataFrame:
+    """
+    Run ltv_engine over every market × hour of its collateral's spot price
+    history in one call. Positions (borrow / collateral / supply) are held at
+    the current snapshot, so the series isolates the price effect: when would
+    each market have crossed LLTV at spot. Returns one row per market-hour
+    with `first_breach` marking each market's first hour at or above LLTV.
+    """
+    m = _active_markets(df_oracle)
+    if m.empty or df_hourly_prices.empty:
+        return pd.DataFrame()
+
+    # (address, chain) × hour price grid, forward-filled across missing hours
+    grid = price_matrix(df_hourly_prices, "HOUR", keys=["address", "chain_id"],
+                        start=int(df_hourly_prices["timestamp"].min()),
+                        end=int(df_hourly_prices["timestamp"].max()))
+    if grid.empty:
+        return pd.DataFrame()
+
+    m = m.assign(chain_id=m["chain"].map(toxic_markets.CHAIN_IDS).fillna(0).astype(int))
+    assets = series_id(m, ["collateral_address", "chain_id"]).values
+    has_prices = np.isin(assets, grid.index)
+    m = m[has_prices]
+    if m.empty:
+        return pd.DataFrame()
+    spot = grid.loc[assets[has_prices]].to_numpy()            # (markets, hours)
+    hours = grid.columns.to_numpy()
+
+    col = lambda name: m[name].to_numpy()[:, None]
+    r = ltv_engine(col("borrow_assets_usd"), col("collateral_assets_usd"), col("supply_assets_usd"),
+                   col("lltv_pct"), spot, col("loan_spot_price_usd"), col("is_vault_based"))
+
+    breached = (r["true_ltv"] >= col("lltv_pct")) & (col("lltv_pct") > 0) & ~np.isnan(spot)
+    first_idx = np.where(breached.any(axis=1), breached.argmax(axis=1), -1)
+    first_breach = np.zeros_like(breached)
+    rows_with = first_idx >= 0
+    first_breach[np.nonzero(rows_with)[0], first_idx[rows_with]] = True
+
+    n_mk, n_hr = spot.shape
+    df = pd.DataFrame({
+        "market_unique_key": np.repeat(m["market_unique_key"].values, n_hr),
+        "chain": np.repeat(m["chain"].values, n_hr),
+        "collateral_symbol": np.repeat(m["collateral_symbol"].values, n_hr),
+        "loan_symbol": np.repeat(m["loan_symbol"].values, n_hr),
+        "lltv_pct": np.repeat(m["lltv_pct"].values, n_hr),
+        "timestamp": np.tile(hours, n_mk).astype(int),
+        "collateral_spot_price": spot.ravel(),
+        "price_gap_pct": np.round(r["price_gap_pct"].ravel(), 2),
+        "oracle_ltv_pct": np.round(np.minimum(np.broadcast_to(r["oracle_ltv"], spot.shape).ravel(), 9999), 2),
+        "true_ltv_pct": np.round(np.minimum(r["true_ltv"].ravel(), 9999), 2),
+        "liquidation_status": r["liquidation_status"].ravel(),
+        "first_breach": first_breach.ravel(),
+    })
+    df = df[df["collateral_spot_price"].notna()]
+    df["datetime"] = df["timestamp"].map(ts_to_datetime)
+    return df.reset_index(drop=True)
+
+
+def build_oracle_cube(df_oracle: pd.DataFrame, df_hourly_prices: pd.DataFrame) -> Optional[OracleCube]:
+    """OracleCube over the same (address, chain) × hour grid as compute_ltv_history."""
+    if df_oracle.empty or df_hourly_prices.empty:
+        return None
+    grid = price_matrix(df_hourly_prices, "HOUR", keys=["address", "chain_id"],
+                        start=int(df_hourly_prices["timestamp"].min()),
+                        end=int(df_hourly_prices["timestamp"].max()))
+    if grid.empty:
+        return None
+    m = df_oracle.assign(chain_id=df_oracle["chain"].map(toxic_markets.CHAIN_IDS).fillna(0).astype(int))
+    cube = OracleCube.build(m, grid, series_id(m, ["collateral_address", "chain_id"]), DEPEG_TS)
+    return cube if len(cube.markets) else None
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -853,8 +907,7 @@ def main():
     gql_dir = PROJECT_ROOT / "data"
 
     # ── Load Block 1 markets ──
-    markets_path = gql_dir / "block1_markets_graphql.csv"
-    df_markets = pd.read_csv(markets_path) if markets_path.exists() else pd.DataFrame()
+    df_markets = toxic_markets.frame(gql_dir)
     print(f"\n📂 Loaded {len(df_markets)} markets from Block 1")
 
     if len(df_markets) == 0:
@@ -913,7 +966,6 @@ def main():
         if row["warning_count"] > 0:
             print(f"      ⚠️  Warnings: {row['warnings']}")
 
-        time.sleep(REQUEST_DELAY)
 
     # Save oracle configs
     if oracle_rows:
@@ -959,7 +1011,8 @@ def main():
         cid = int(mkt[chain_col])
         chain_id_map[ch] = cid
 
-    all_prices = []
+    hourly_prices = []
+    daily_prices = []
 
     if len(unique_assets) > 0:
         # Deduplicate by address (same token on same chain)
@@ -993,9 +1046,8 @@ def main():
                 print(f"      ✅ {len(hourly)} pts, peak: ${peak:.4f}, trough: ${trough:.4f}")
             else:
                 print(f"      ⚠️  No data (possibly delisted token)")
-            all_prices.extend(hourly)
+            hourly_prices.extend(hourly)
 
-            time.sleep(REQUEST_DELAY)
 
             # Daily: wider view Sept 1 → Jan 31
             print(f"      Daily (Sept 1 → Jan 31)...")
@@ -1003,17 +1055,18 @@ def main():
                 addr, chain_id, symbol, TS_SEPT_01, TS_JAN_31, "DAY"
             )
             if daily:
-                # Forward-fill pre-depeg gaps (e.g. xUSD has 1 point in Sept, then nothing until Nov 4)
-                daily = forward_fill_daily_prices(daily, depeg_ts=TS_NOV_04)
                 print(f"      ✅ {len(daily)} daily pts")
             else:
                 print(f"      ⚠️  No daily data")
-            all_prices.extend(daily)
+            daily_prices.extend(daily)
 
-            time.sleep(REQUEST_DELAY)
     else:
         print("  ⚠️  No unique collateral addresses found")
 
+    # Forward-fill pre-depeg gaps (e.g. xUSD has 1 point in Sept, then nothing until Nov 4)
+    df_daily_prices = forward_fill_daily_prices(pd.DataFrame(daily_prices), depeg_ts=TS_NOV_04)
+    all_prices = hourly_prices + df_daily_prices.to_dict("records")
+
     if all_prices:
         df_prices = pd.DataFrame(all_prices)
         prices_path = gql_dir / "block5_asset_prices.csv"
@@ -1062,7 +1115,6 @@ def main():
         for r in risk_data:
             r["chain_id"] = chain_id
         all_risk.extend(risk_data)
-        time.sleep(REQUEST_DELAY)
 
     if all_risk:
         df_risk = pd.DataFrame(all_risk)
@@ -1111,7 +1163,6 @@ def main():
             print(f"      ⚠️  No positions found")
 
         all_positions.extend(positions)
-        time.sleep(REQUEST_DELAY)
 
     if all_positions:
         df_positions = pd.DataFrame(all_positions)
@@ -1239,9 +1290,49 @@ def main():
             n_healthy = (df_ltv["liquidation_status"] == "HEALTHY").sum()
             print(f"\n  Summary: 🔴 {n_masked} oracle-masked  💀 {n_bad_debt} bad debt  "
                   f"🟢 {n_healthy} healthy")
+
+        # ── Same engine over the hourly price history (markets × hours) ──
+        df_ltv_hist = compute_ltv_history(df_oracle, pd.DataFrame(hourly_prices))
+        if len(df_ltv_hist) > 0:
+            hist_path = gql_dir / "block5_ltv_history.csv"
+            df_ltv_hist.to_csv(hist_path, index=False)
+            print(f"\n✅ Saved {len(df_ltv_hist)} market-hour LTV rows to {hist_path.name}")
+
+            breaches = df_ltv_hist[df_ltv_hist["first_breach"]].sort_values("timestamp")
+            print(f"\n  FIRST LLTV BREACH AT SPOT (positions held at current snapshot)")
+            for _, r in breaches.iterrows():
+                print(f"    {r['datetime']}  {r['collateral_symbol']}/{r['loan_symbol']} ({r['chain']}) — "
+                      f"true LTV {r['true_ltv_pct']}% vs LLTV {r['lltv_pct']}% at spot ${r['collateral_spot_price']:.4f}")
+            n_never = df_ltv_hist["market_unique_key"].nunique() - len(breaches)
+            if n_never:
+                print(f"    {n_never} markets never crossed LLTV at spot in the hourly window")
     else:
         print("  ⚠️  No oracle data for LTV analysis")
 
+    # ══════════════════════════════════════════════════════════
+    #  TASK 7: Oracle Deviation Cube
+    # ══════════════════════════════════════════════════════════
+    print(f"\n{'═' * 70}")
+    print(f"  TASK 7: Oracle Deviation Cube (market × hour)")
+    print(f"{'═' * 70}")
+
+    cube = build_oracle_cube(df_oracle, pd.DataFrame(hourly_prices))
+    if cube is not None:
+        cube.save(gql_dir)
+        n_mk, n_hr = cube.deviation.shape
+        print(f"\n✅ Saved {n_mk} markets × {n_hr} hours to {OracleCube.path(gql_dir).relative_to(gql_dir)}/")
+        print(f"  Oracle models: {cube.markets['oracle_model'].value_counts().to_dict()}")
+
+        for threshold in (10, 50):
+            arch = cube.by_architecture(threshold)
+            print(f"\n  DEVIATION > {threshold}% BY ORACLE MECHANISM")
+            for _, r in arch.iterrows():
+                first = r["earliest_above"].strftime("%Y-%m-%d %H:%M") if pd.notna(r["earliest_above"]) else "never"
+                print(f"    {r['oracle_mechanism']:<22} {r['markets_above']}/{r['markets']} markets | "
+                      f"first {first} | longest {r['max_window_hours']}h | peak {r['max_deviation_pct']:.1f}%")
+    else:
+        print("  ⚠️  No oracle configs or hourly prices for the deviation cube")
+
     # ══════════════════════════════════════════════════════════
     #  FINAL SUMMARY
     # ══════════════════════════════════════════════════════════
@@ -1262,6 +1353,8 @@ def main():
     print(f"    block5_borrower_positions.csv")
     print(f"    block5_liquidation_events.csv")
     print(f"    block5_ltv_analysis.csv")
+    print(f"    block5_ltv_history.csv")
+    print(f"    _store/oracle_cube/")
     print(f"{'═' * 70}")
 
 
@@ -29,7 +29,15 @@ TASK 5: Public Allocator Reallocations (API)
 
 TASK 6: Contagion Network Summary (computation)
   - Vault→market adjacency, shared exposure paths
-  - Output: block6_contagion_summary.csv
+  - Sparse allocation graph: multi-hop exposure, loss shares, components
+  - Output: block6_contagion_bridges.csv, block6_contagion_exposure.csv,
+            block6_market_connections.csv
+
+TASK 7: Public Allocator Max-Flow (computation)
+  - Flow network: market liquidity → maxOut → vault → maxIn → stressed market
+  - Most liquidity the PA could route into each market, via which vaults,
+    and how many reallocateTo transactions (hours at the observed PA rate)
+  - Output: block6_pa_max_flow.csv, block6_pa_flow_paths.csv
 
 Input:  04-data-exports/raw/dune/block1_dune_vaults_filtered.csv
         04-data-exports/raw/dune/block1_dune_markets_filtered.csv
@@ -42,13 +50,19 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 from datetime import datetime, timezone
-from collections import defaultdict
 from typing import List, Dict, Tuple, Optional
 
+import rate_limiter
+import toxic_markets
+from stream_writer import open_writer
+from checkpoint import Checkpoint, batch_key
+from watermarks import Watermarks, LATE_OVERLAP, history_end
+from contagion_graph import ContagionGraph
+from pa_flow import AllocatorNetwork, pa_tx_rate
+
 # ── Project paths ──
 PROJECT_ROOT = Path(__file__).parent.parent
 GRAPHQL_URL = "https://blue-api.morpho.org/graphql"
-REQUEST_DELAY = 0.3
 
 # ── Time windows ──
 TS_SEPT_01  = 1756684800
@@ -60,6 +74,12 @@ TS_NOV_15   = 1763164800
 TS_DEC_01   = 1764547200
 TS_JAN_31   = 1769817600
 
+# Hops of toxic market → vault → clean market → vault propagation (TASK 6)
+CONTAGION_HOPS = 3
+
+# Reallocation window end; MORPHO_HISTORY_END=now extends it on a refresh
+REALLOC_END = history_end(TS_DEC_01)
+
 # ── Chain ID map ──
 CHAIN_ID_MAP = {
     "ethereum": 1,
@@ -74,7 +94,7 @@ def query_graphql(query: str, timeout: int = 60) -> dict:
     headers = {"Content-Type": "application/json"}
     for attempt in range(3):
         try:
-            resp = requests.post(GRAPHQL_URL, json={"query": query},
+            resp = rate_limiter.post(GRAPHQL_URL, json={"query": query},
                                  headers=headers, timeout=timeout)
             # Parse JSON body BEFORE raise_for_status — GraphQL returns errors in JSON even on 400
             try:
@@ -151,6 +171,7 @@ def query_vault_allocation(vault_address: str, chain_id: int) -> Dict:
               oracleAddress
               irmAddress
               lltv
+              state {{ liquidityAssetsUsd }}
             }}
             supplyCap
             supplyAssets
@@ -300,7 +321,7 @@ def query_public_allocator_config(vault_address: str, chain_id: int) -> Dict:
             market {{
               uniqueKey
               collateralAsset {{ symbol }}
-              loanAsset {{ symbol }}
+              loanAsset {{ symbol decimals priceUsd }}
             }}
             maxIn
             maxOut
@@ -328,10 +349,13 @@ def query_public_allocator_config(vault_address: str, chain_id: int) -> Dict:
 # ═══════════════════════════════════════════════════════════════
 
 def query_vault_reallocations(vault_addresses: List[str],
-                               start_ts: int, end_ts: int) -> List[Dict]:
+                               start_ts: int, end_ts: int) -> Dict:
     """
     Query vault reallocation events for given vaults in a time window.
     Uses the vaultReallocates endpoint.
+
+    Returns {"events": [...]}; with an "error" key too if a page failed, in
+    which case the events are partial (not checkpointed, window not advanced).
     """
     addr_list = ', '.join(f'"{a}"' for a in vault_addresses)
 
@@ -390,7 +414,7 @@ def query_vault_reallocations(vault_addresses: List[str],
         if "errors" in result:
             err = result["errors"][0].get("message", "")
             print(f"      ❌ Error: {err[:120]}")
-            break
+            return {"events": all_events, "error": err}
 
         realloc_data = result.get("data", {}).get("vaultReallocates", {})
         items = realloc_data.get("items") or []
@@ -426,9 +450,8 @@ def query_vault_reallocations(vault_addresses: List[str],
         if len(items) < page_size or skip + page_size >= total:
             break
         skip += page_size
-        time.sleep(REQUEST_DELAY)
 
-    return all_events
+    return {"events": all_events}
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -436,10 +459,13 @@ def query_vault_reallocations(vault_addresses: List[str],
 # ═══════════════════════════════════════════════════════════════
 
 def query_pa_reallocations(vault_addresses: List[str],
-                            start_ts: int = 0, end_ts: int = 0) -> List[Dict]:
+                            start_ts: int = 0, end_ts: int = 0,
+                            writer=None) -> Dict:
     """
     Query public allocator reallocation events.
     Uses publicAllocatorReallocates endpoint.
+    If a stream writer is given, each page is appended to it as it arrives.
+    Returns {"events": [...]}, plus "error" if a page failed (events partial).
     """
     addr_list = ', '.join(f'"{a}"' for a in vault_addresses)
 
@@ -497,18 +523,19 @@ def query_pa_reallocations(vault_addresses: List[str],
         if "errors" in result:
             err = result["errors"][0].get("message", "")
             print(f"      ❌ Error: {err[:120]}")
-            break
+            return {"events": all_events, "error": err}
 
         pa_data = result.get("data", {}).get("publicAllocatorReallocates", {})
         items = pa_data.get("items") or []
         page_info = pa_data.get("pageInfo") or {}
         total = safe_int(page_info.get("countTotal", 0))
 
+        page_events = []
         for item in items:
             vault = item.get("vault") or {}
             market = item.get("market") or {}
 
-            all_events.append({
+            page_events.append({
                 "id": item.get("id", ""),
                 "timestamp": safe_int(item.get("timestamp", 0)),
                 "date": ts_to_date(safe_int(item.get("timestamp", 0))),
@@ -525,12 +552,15 @@ def query_pa_reallocations(vault_addresses: List[str],
                 "loan_symbol": (market.get("loanAsset") or {}).get("symbol", "?"),
             })
 
+        if writer is not None:
+            writer.write_rows(page_events)
+        all_events.extend(page_events)
+
         if len(items) < page_size or skip + page_size >= total:
             break
         skip += page_size
-        time.sleep(REQUEST_DELAY)
 
-    return all_events
+    return {"events": all_events}
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -548,10 +578,9 @@ def main():
 
     # ── Load data ──
     vaults_path = gql_dir / "block1_vaults_graphql.csv"
-    markets_gql_path = gql_dir / "block1_markets_graphql.csv"
 
     df_vaults_raw = pd.read_csv(vaults_path) if vaults_path.exists() else pd.DataFrame()
-    df_markets_gql = pd.read_csv(markets_gql_path) if markets_gql_path.exists() else pd.DataFrame()
+    df_markets_gql = toxic_markets.frame(gql_dir)
 
     print(f"\n📂 Loaded data:")
     print(f"   Vaults (GraphQL):   {len(df_vaults_raw)} rows")
@@ -586,10 +615,7 @@ def main():
             df_vaults["vault_supply_usd"] = 0.0
 
     # Get toxic market IDs from GraphQL markets data
-    toxic_market_ids = set()
-    if len(df_markets_gql) > 0:
-        mk_col = "market_id" if "market_id" in df_markets_gql.columns else "market_unique_key"
-        toxic_market_ids = set(df_markets_gql[mk_col].tolist())
+    toxic_market_ids = toxic_markets.keys(gql_dir)
     print(f"   Toxic market IDs:   {len(toxic_market_ids)}")
 
     # ═══════════════════════════════════════════════════════════
@@ -695,6 +721,11 @@ def main():
     all_allocations = []
     vault_summaries = []
 
+    # Work units: one per vault (Tasks 2-3) and per vault batch (Tasks 4-5).
+    # `runner.py --resume` replays finished units instead of re-querying them.
+    ckpt = Checkpoint("block6_contagion", out_dir)
+    no_error = lambda r: isinstance(r, dict) and "error" not in r
+
     for idx, (_, vault_row) in enumerate(query_vaults.iterrows()):
         vault_addr = vault_row["vault_address"]
         chain_id = int(vault_row["primary_chain_id"])
@@ -703,15 +734,21 @@ def main():
         print(f"\n   [{idx+1}/{len(query_vaults)}] {vault_name} ({vault_addr[:10]}...) chain={chain_id}")
 
         # Try historical allocation first (pre-depeg snapshot — shows what mattered)
-        vault_data = query_vault_historical_allocation(vault_addr, chain_id, snapshot_ts=TS_NOV_01)
-        time.sleep(REQUEST_DELAY)
+        vault_data = ckpt.cached(
+            ("historical_allocation", vault_addr, chain_id, TS_NOV_01),
+            lambda: query_vault_historical_allocation(vault_addr, chain_id, snapshot_ts=TS_NOV_01),
+            keep=no_error,
+        )
 
         is_historical = "_historical" in vault_data if isinstance(vault_data, dict) else False
 
         if "error" in vault_data:
             print(f"      ⚠️  Historical failed: {vault_data['error'][:60]} — trying current...")
-            vault_data = query_vault_allocation(vault_addr, chain_id)
-            time.sleep(REQUEST_DELAY)
+            vault_data = ckpt.cached(
+                ("current_allocation", vault_addr, chain_id),
+                lambda: query_vault_allocation(vault_addr, chain_id),
+                keep=no_error,
+            )
             is_historical = False
 
         if "error" in vault_data:
@@ -742,6 +779,7 @@ def main():
             supply_assets = str(alloc.get("supplyAssets", "0"))
             supply_cap = str(alloc.get("supplyCap", "0"))
             lltv = safe_float(market.get("lltv", 0))
+            liquidity_usd = safe_float((market.get("state") or {}).get("liquidityAssetsUsd", 0))
 
             is_toxic = mk_key in toxic_market_ids
             if is_toxic:
@@ -762,6 +800,7 @@ def main():
                 "supply_assets": supply_assets,
                 "supply_assets_usd": supply_usd,
                 "supply_cap": supply_cap,
+                "market_liquidity_usd": liquidity_usd,
                 "is_toxic_market": is_toxic,
             })
 
@@ -834,8 +873,11 @@ def main():
 
         print(f"\n   [{idx+1}/{len(pa_vaults)}] {vault_name} ({vault_addr[:10]}...)")
 
-        pa_data = query_public_allocator_config(vault_addr, chain_id)
-        time.sleep(REQUEST_DELAY)
+        pa_data = ckpt.cached(
+            ("pa_config", vault_addr, chain_id),
+            lambda: query_public_allocator_config(vault_addr, chain_id),
+            keep=no_error,
+        )
 
         if "error" in pa_data:
             print(f"      ⚠️  {pa_data['error'][:80]}")
@@ -854,7 +896,8 @@ def main():
             market = cap.get("market") or {}
             mk_key = market.get("uniqueKey", "")
             collat = (market.get("collateralAsset") or {}).get("symbol", "?")
-            loan = (market.get("loanAsset") or {}).get("symbol", "?")
+            loan_asset = market.get("loanAsset") or {}
+            loan = loan_asset.get("symbol", "?")
             max_in = str(cap.get("maxIn", "0"))
             max_out = str(cap.get("maxOut", "0"))
 
@@ -871,6 +914,8 @@ def main():
                 "market_unique_key": mk_key,
                 "collateral_symbol": collat,
                 "loan_symbol": loan,
+                "loan_decimals": safe_int(loan_asset.get("decimals"), 18),
+                "loan_price_usd": safe_float(loan_asset.get("priceUsd"), 1.0),
                 "max_in": max_in,
                 "max_out": max_out,
                 "is_toxic_market": is_toxic,
@@ -910,11 +955,18 @@ def main():
     realloc_vaults = named_vaults["vault_address"].tolist()
     # Also add multi-market vaults regardless of name
     multi_addrs = df_exposure[df_exposure["n_toxic_markets"] > 1]["vault_address"].tolist()
-    realloc_vaults = list(set(realloc_vaults + multi_addrs))
+    realloc_vaults = sorted(set(realloc_vaults + multi_addrs))  # sorted → stable batches for resume
     # Filter out zero addresses
     realloc_vaults = [a for a in realloc_vaults if not a.startswith("0x000000000000")]
 
-    print(f"   Searching reallocations for {len(realloc_vaults)} vaults (Oct 1 → Nov 30)...")
+    print(f"   Searching reallocations for {len(realloc_vaults)} vaults "
+          f"({ts_to_date(TS_OCT_01)} → {ts_to_date(REALLOC_END)})...")
+
+    # Incremental refresh: only events past each batch's watermark are queried
+    # and merged (by event id) into the previous CSV's rows
+    realloc_path = out_dir / "block6_vault_reallocations.csv"
+    realloc_marks = Watermarks(out_dir, "block6_reallocations")
+    prev_realloc = pd.read_csv(realloc_path) if realloc_path.exists() else pd.DataFrame()
 
     # Query in batches of 10 to avoid query size limits
     all_realloc_events = []
@@ -927,19 +979,48 @@ def main():
 
         print(f"   Batch {batch_num}/{total_batches} ({len(batch)} vaults)...")
 
-        events = query_vault_reallocations(batch, TS_OCT_01, TS_DEC_01)
+        mark_key = ("reallocations", batch_key(batch))
+        held = pd.DataFrame()
+        if not prev_realloc.empty:
+            held = prev_realloc[
+                prev_realloc["vault_address"].str.lower().isin({a.lower() for a in batch})
+                & (prev_realloc["timestamp"] >= TS_OCT_01)
+                & (prev_realloc["timestamp"] <= REALLOC_END)
+            ]
+        window = realloc_marks.fetch_window(mark_key, TS_OCT_01, REALLOC_END,
+                                            overlap=LATE_OVERLAP["EVENT"])
+        if held.empty:
+            window = (TS_OCT_01, REALLOC_END)
+
+        if window is None:
+            events = held.to_dict("records")
+            print(f"      ♻️  {len(events)} reallocation events (up to date, no API call)")
+        else:
+            result = ckpt.cached(
+                ("reallocations", batch_key(batch), *window),
+                lambda: query_vault_reallocations(batch, *window),
+                keep=no_error,
+            )
+            fetched = result["events"]
+            if "error" in result:
+                print(f"      ⚠️  Partial fetch ({len(fetched)} events) — window stays open for the next run")
+            else:
+                realloc_marks.advance(mark_key, *window)
+            events = fetched
+            if not held.empty:
+                merged = pd.concat([held, pd.DataFrame(fetched)], ignore_index=True)
+                events = merged.drop_duplicates("id", keep="last").to_dict("records")
+            if events:
+                print(f"      ✅ {len(events)} reallocation events ({len(fetched)} fetched)")
+            else:
+                print(f"      ℹ️  No reallocations found")
         all_realloc_events.extend(events)
 
-        if events:
-            print(f"      ✅ {len(events)} reallocation events")
-        else:
-            print(f"      ℹ️  No reallocations found")
+    realloc_marks.save()
 
-        time.sleep(REQUEST_DELAY)
 
     if all_realloc_events:
-        df_realloc = pd.DataFrame(all_realloc_events)
-        realloc_path = out_dir / "block6_vault_reallocations.csv"
+        df_realloc = pd.DataFrame(all_realloc_events).sort_values("timestamp", ascending=False)
         df_realloc.to_csv(realloc_path, index=False)
         print(f"\n✅ Saved {len(df_realloc)} reallocation events to {realloc_path.name}")
 
@@ -973,39 +1054,47 @@ def main():
 
     print(f"   Searching PA reallocations for {len(realloc_vaults)} vaults...")
 
-    all_pa_events = []
-
-    for i in range(0, len(realloc_vaults), batch_size):
-        batch = realloc_vaults[i:i+batch_size]
-        batch_num = i // batch_size + 1
-        total_batches = (len(realloc_vaults) + batch_size - 1) // batch_size
+    # Events are streamed to disk page by page; only toxic-market rows are kept for analysis
+    pa_path = out_dir / "block6_pa_reallocations.csv"
+    pa_event_count = 0
+    toxic_pa_events = []
 
-        print(f"   Batch {batch_num}/{total_batches}...")
+    with open_writer(pa_path) as pa_writer:
+        for i in range(0, len(realloc_vaults), batch_size):
+            batch = realloc_vaults[i:i+batch_size]
+            batch_num = i // batch_size + 1
+            total_batches = (len(realloc_vaults) + batch_size - 1) // batch_size
 
-        events = query_pa_reallocations(batch, TS_OCT_01, TS_DEC_01)
-        all_pa_events.extend(events)
+            print(f"   Batch {batch_num}/{total_batches}...")
 
-        if events:
-            print(f"      ✅ {len(events)} PA reallocation events")
-        else:
-            print(f"      ℹ️  No PA reallocations")
+            unit = ("pa_reallocations", batch_key(batch), TS_OCT_01, TS_DEC_01)
+            if ckpt.done(unit):
+                events = ckpt.get(unit)
+                pa_writer.write_rows(events)
+            else:
+                result = query_pa_reallocations(batch, TS_OCT_01, TS_DEC_01, writer=pa_writer)
+                events = result["events"]
+                if "error" not in result:       # partial batches are refetched on resume
+                    ckpt.save(unit, events)
+            pa_event_count += len(events)
+            toxic_pa_events.extend(e for e in events if e["market_unique_key"] in toxic_market_ids)
+
+            if events:
+                print(f"      ✅ {len(events)} PA reallocation events")
+            else:
+                print(f"      ℹ️  No PA reallocations")
 
-        time.sleep(REQUEST_DELAY)
 
-    if all_pa_events:
-        df_pa = pd.DataFrame(all_pa_events)
-        pa_path = out_dir / "block6_pa_reallocations.csv"
-        df_pa.to_csv(pa_path, index=False)
-        print(f"\n✅ Saved {len(df_pa)} PA reallocation events to {pa_path.name}")
+    if pa_event_count:
+        print(f"\n✅ Saved {pa_event_count} PA reallocation events to {pa_path.name}")
 
         # Analyze PA movements involving toxic markets
-        df_pa["is_toxic"] = df_pa["market_unique_key"].isin(toxic_market_ids)
-        toxic_pa = df_pa[df_pa["is_toxic"]]
+        toxic_pa = pd.DataFrame(toxic_pa_events)
 
         print(f"\n{'─' * 70}")
         print(f"  PUBLIC ALLOCATOR REALLOCATION ANALYSIS")
         print(f"{'─' * 70}")
-        print(f"  Total PA reallocations:      {len(df_pa)}")
+        print(f"  Total PA reallocations:      {pa_event_count}")
         print(f"  Involving toxic markets:     {len(toxic_pa)}")
 
         if len(toxic_pa) > 0:
@@ -1031,51 +1120,45 @@ def main():
     print(f"{'─' * 70}")
 
     # Build vault → market adjacency from allocation data
-    contagion_rows = []
+    bridge_vaults = []
+    graph = None
 
     if all_allocations:
         df_alloc_full = pd.DataFrame(all_allocations)
 
-        # Find vaults that bridge toxic and clean markets
-        bridge_vaults = []
-
-        for vault_addr, grp in df_alloc_full.groupby("vault_address"):
-            vault_name = grp["vault_name"].iloc[0]
-            toxic_mkts = grp[grp["is_toxic_market"] == True]
-            clean_mkts = grp[grp["is_toxic_market"] == False]
-
-            toxic_supply = toxic_mkts["supply_assets_usd"].sum()
-            clean_supply = clean_mkts["supply_assets_usd"].sum()
-            total = toxic_supply + clean_supply
-
-            if len(toxic_mkts) > 0 and len(clean_mkts) > 0:
-                # This vault bridges toxic and clean → contagion path
-                bridge_vaults.append({
-                    "vault_address": vault_addr,
-                    "vault_name": vault_name,
-                    "n_toxic_markets": len(toxic_mkts),
-                    "n_clean_markets": len(clean_mkts),
-                    "toxic_supply_usd": toxic_supply,
-                    "clean_supply_usd": clean_supply,
-                    "total_supply_usd": total,
-                    "toxic_pct": (toxic_supply / total * 100) if total > 0 else 0,
-                    "contagion_path": "BRIDGE",
-                    "risk": "Depositors in clean markets share loss from toxic markets",
-                })
-            elif len(toxic_mkts) > 1:
-                # Multi-toxic vault — amplified exposure
-                bridge_vaults.append({
-                    "vault_address": vault_addr,
-                    "vault_name": vault_name,
-                    "n_toxic_markets": len(toxic_mkts),
-                    "n_clean_markets": 0,
-                    "toxic_supply_usd": toxic_supply,
-                    "clean_supply_usd": 0,
-                    "total_supply_usd": total,
-                    "toxic_pct": 100.0,
-                    "contagion_path": "MULTI_TOXIC",
-                    "risk": "Vault exposed to multiple toxic markets simultaneously",
-                })
+        # Find vaults that bridge toxic and clean markets (one grouped pass)
+        per_vault = df_alloc_full.assign(
+            toxic_usd=df_alloc_full["supply_assets_usd"].where(df_alloc_full["is_toxic_market"], 0.0),
+            clean_usd=df_alloc_full["supply_assets_usd"].where(~df_alloc_full["is_toxic_market"], 0.0),
+        ).groupby("vault_address", sort=False).agg(
+            vault_name=("vault_name", "first"),
+            n_toxic_markets=("is_toxic_market", "sum"),
+            n_markets=("is_toxic_market", "size"),
+            toxic_supply_usd=("toxic_usd", "sum"),
+            clean_supply_usd=("clean_usd", "sum"),
+        ).reset_index()
+        per_vault["n_clean_markets"] = per_vault["n_markets"] - per_vault["n_toxic_markets"]
+        per_vault["total_supply_usd"] = per_vault["toxic_supply_usd"] + per_vault["clean_supply_usd"]
+        per_vault["toxic_pct"] = (
+            per_vault["toxic_supply_usd"] / per_vault["total_supply_usd"].where(per_vault["total_supply_usd"] > 0) * 100
+        ).fillna(0.0)
+
+        # BRIDGE: toxic + clean markets → contagion path
+        # MULTI_TOXIC: several toxic markets, no clean ones → amplified exposure
+        is_bridge = (per_vault["n_toxic_markets"] > 0) & (per_vault["n_clean_markets"] > 0)
+        is_multi = ~is_bridge & (per_vault["n_toxic_markets"] > 1)
+        per_vault["contagion_path"] = np.where(is_bridge, "BRIDGE", "MULTI_TOXIC")
+        per_vault["risk"] = np.where(
+            is_bridge,
+            "Depositors in clean markets share loss from toxic markets",
+            "Vault exposed to multiple toxic markets simultaneously",
+        )
+        per_vault.loc[is_multi, "toxic_pct"] = 100.0
+        bridge_vaults = per_vault[is_bridge | is_multi][[
+            "vault_address", "vault_name", "n_toxic_markets", "n_clean_markets",
+            "toxic_supply_usd", "clean_supply_usd", "total_supply_usd", "toxic_pct",
+            "contagion_path", "risk",
+        ]].to_dict("records")
 
         if bridge_vaults:
             df_bridges = pd.DataFrame(bridge_vaults).sort_values("total_supply_usd", ascending=False)
@@ -1099,43 +1182,87 @@ def main():
         else:
             print(f"\n  ℹ️  No contagion bridges found — markets may be isolated")
 
-    # Build market → market connections (markets sharing depositors via vaults)
-    market_connections = defaultdict(set)
+    # ── Contagion graph: multi-hop exposure, loss shares, components ──
+    # Vault ↔ market allocation graph as a sparse matrix (contagion_graph.py)
     if all_allocations:
-        vault_markets = defaultdict(set)
-        for a in all_allocations:
-            if a["supply_assets_usd"] > 0:
-                vault_markets[a["vault_address"]].add(a["market_unique_key"])
-
-        for vault_addr, markets in vault_markets.items():
-            market_list = list(markets)
-            for i in range(len(market_list)):
-                for j in range(i + 1, len(market_list)):
-                    market_connections[market_list[i]].add(market_list[j])
-                    market_connections[market_list[j]].add(market_list[i])
-
-        # Count toxic market connections
-        toxic_connections = []
-        for mk_key in toxic_market_ids:
-            connected = market_connections.get(mk_key, set())
-            toxic_connected = connected & toxic_market_ids
-            clean_connected = connected - toxic_market_ids
-
-            toxic_connections.append({
-                "market_unique_key": mk_key,
-                "n_connected_markets": len(connected),
-                "n_connected_toxic": len(toxic_connected),
-                "n_connected_clean": len(clean_connected),
-            })
+        graph = ContagionGraph(df_alloc_full, toxic_market_ids)
+        vault_comp, market_comp = graph.components()
+        toxic_comps = set(market_comp[graph.toxic])
+
+        df_exposure_graph = graph.propagate(hops=CONTAGION_HOPS).merge(
+            graph.loss_shares(graph.toxic_supply()).drop(columns=["vault_address"]),
+            left_index=True, right_index=True,
+        )
+        df_exposure_graph.insert(1, "vault_name", df_exposure_graph["vault_address"].map(
+            df_alloc_full.drop_duplicates("vault_address").set_index("vault_address")["vault_name"]))
+        df_exposure_graph["component"] = vault_comp
+        df_exposure_graph["in_toxic_component"] = np.isin(vault_comp, list(toxic_comps))
+        df_exposure_graph = df_exposure_graph.sort_values(
+            [f"exposure_hop{CONTAGION_HOPS}", "supply_usd"], ascending=False
+        )
+        exposure_graph_path = out_dir / "block6_contagion_exposure.csv"
+        df_exposure_graph.to_csv(exposure_graph_path, index=False)
+        print(f"\n✅ Saved {len(df_exposure_graph)} vault exposure profiles to {exposure_graph_path.name}")
+
+        g = graph.summary()
+        print(f"\n  Allocation graph: {g['n_vaults']} vaults × {g['n_markets']} markets, "
+              f"{g['n_edges']} edges, {g['n_components']} components")
+        print(f"  Connected to a toxic market: {g['vaults_in_toxic_components']} vaults, "
+              f"{g['markets_in_toxic_components']} markets")
+        for hop in range(1, CONTAGION_HOPS + 1):
+            reached = int((df_exposure_graph["first_hop"] == hop).sum())
+            print(f"  Hop {hop}: {reached} vaults newly exposed")
 
-        if toxic_connections:
-            df_connections = pd.DataFrame(toxic_connections).sort_values(
+    # Build market → market connections (markets sharing depositors via vaults)
+    if graph is not None:
+        links = graph.market_links().set_index("market_unique_key")
+        df_connections = links.reindex(sorted(toxic_market_ids)).fillna(0)
+        df_connections = df_connections.drop(columns=["is_toxic_market"]).astype(int).reset_index()
+
+        if len(df_connections) > 0:
+            df_connections = df_connections.sort_values(
                 "n_connected_markets", ascending=False
             )
             conn_path = out_dir / "block6_market_connections.csv"
             df_connections.to_csv(conn_path, index=False)
             print(f"\n✅ Saved {len(df_connections)} market connection profiles to {conn_path.name}")
 
+    # ═══════════════════════════════════════════════════════════
+    #  TASK 7: Public Allocator Max-Flow
+    # ═══════════════════════════════════════════════════════════
+    print(f"\n{'─' * 70}")
+    print(f"🚰 TASK 7: Public Allocator Max-Flow")
+    print(f"{'─' * 70}")
+
+    if all_allocations and pa_config_rows:
+        network = AllocatorNetwork(pd.DataFrame(pa_config_rows), pd.DataFrame(all_allocations))
+        # Observed PA cadence over the crisis window → hours per reallocateTo
+        df_pa_all = pd.read_csv(pa_path) if pa_event_count else pd.DataFrame()
+        rate = pa_tx_rate(df_pa_all, TS_NOV_04, TS_NOV_15)
+
+        df_flow, df_paths = network.route_all(tx_per_hour=rate, with_paths=True)
+        if len(df_flow) > 0:
+            df_flow["is_toxic_market"] = df_flow["market_unique_key"].isin(toxic_market_ids)
+            flow_path = out_dir / "block6_pa_max_flow.csv"
+            df_flow.to_csv(flow_path, index=False)
+            print(f"\n✅ Saved max-flow for {len(df_flow)} target markets to {flow_path.name}")
+
+            paths_path = out_dir / "block6_pa_flow_paths.csv"
+            df_paths.to_csv(paths_path, index=False)
+            print(f"✅ Saved {len(df_paths)} routed vault/source-market flows to {paths_path.name}")
+
+            print(f"\n  Observed PA rate (Nov 4–15): {rate:.2f} reallocateTo tx/hour")
+            for _, r in df_flow.head(10).iterrows():
+                icon = "🔴" if r["is_toxic_market"] else "🟢"
+                eta = f"~{r['hours_at_observed_rate']:.1f}h" if pd.notna(r["hours_at_observed_rate"]) else "n/a"
+                print(f"  {icon} {r['collateral_symbol']}/{r['loan_symbol']}: ${r['max_flow_usd']:,.0f} "
+                      f"via {r['n_vaults_routing']} vaults from {r['n_source_markets']} markets "
+                      f"({r['binding']}, {eta})")
+    else:
+        print(f"   ℹ️  Needs allocations (TASK 2) and PA flow caps (TASK 3)")
+
+    ckpt.complete()
+
     # ═══════════════════════════════════════════════════════════
     #  FINAL SUMMARY
     # ═══════════════════════════════════════════════════════════
@@ -1151,7 +1278,7 @@ def main():
         n_bridge_total = len([b for b in bridge_vaults if b["contagion_path"] == "BRIDGE"]) if bridge_vaults else 0
         print(f"  4. Contagion bridges: {n_bridge_total} vaults bridge toxic ↔ clean markets")
     print(f"  5. Vault reallocations: {len(all_realloc_events)} events during crisis")
-    print(f"  6. PA reallocations:    {len(all_pa_events)} events during crisis")
+    print(f"  6. PA reallocations:    {pa_event_count} events during crisis")
 
     print(f"\n  Outputs:")
     print(f"    block6_vault_market_exposure.csv")
@@ -1161,7 +1288,10 @@ def main():
     print(f"    block6_vault_reallocations.csv")
     print(f"    block6_pa_reallocations.csv")
     print(f"    block6_contagion_bridges.csv")
+    print(f"    block6_contagion_exposure.csv")
     print(f"    block6_market_connections.csv")
+    print(f"    block6_pa_max_flow.csv")
+    print(f"    block6_pa_flow_paths.csv")
     print(f"{'═' * 70}")
 
 
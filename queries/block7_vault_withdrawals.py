@@ -14,6 +14,8 @@ is sufficient to prove the bank-run narrative:
   Safe withdrawals: ~$39M        (subtraction)
 
 Input:  block2_share_price_summary.csv (identifies damaged vaults — drawdown > 1%)
+        data/_store/vault_history.parquet (DAY TVL already fetched by block2 —
+        only the part of the window past the store's watermark is queried)
 Output: block7_vault_tvl_daily.csv     (daily TVL timeseries for damaged vaults)
 """
 
@@ -25,17 +27,21 @@ from datetime import datetime, timezone
 from dotenv import load_dotenv
 from typing import List, Dict
 
+import rate_limiter
+from vault_history import VaultHistoryStore, history_fields, points_to_frame
+from watermarks import history_end
+
 # ── Project paths (runner patches PROJECT_ROOT to repo root) ──
 PROJECT_ROOT = Path(__file__).parent.parent
 env_path = PROJECT_ROOT / '.env'
 load_dotenv(dotenv_path=env_path)
 
 GRAPHQL_URL = "https://blue-api.morpho.org/graphql"
-REQUEST_DELAY = 0.3
 
 # ── Time window: Oct 1 2025 → Jan 31 2026 (the depeg was Nov 2025) ──
+# MORPHO_HISTORY_END=now extends the end for a refresh (see watermarks.py)
 TS_OCT_01   = 1759276800   # 2025-10-01 00:00:00 UTC
-TS_JAN_31   = 1769903999   # 2026-01-31 23:59:59 UTC
+TS_JAN_31   = history_end(1769903999)   # 2026-01-31 23:59:59 UTC
 
 # ── Fallback: hardcoded damaged vaults if block2 summary unavailable ──
 FALLBACK_DAMAGED_VAULTS = [
@@ -57,7 +63,7 @@ def query_graphql(query: str, variables: dict = None) -> dict:
         payload["variables"] = variables
     for attempt in range(3):
         try:
-            resp = requests.post(GRAPHQL_URL, json=payload, headers=headers, timeout=60)
+            resp = rate_limiter.post(GRAPHQL_URL, json=payload, headers=headers, timeout=60)
             resp.raise_for_status()
             data = resp.json()
             if "errors" in data:
@@ -109,67 +115,58 @@ def load_damaged_vaults() -> List[Dict]:
     return FALLBACK_DAMAGED_VAULTS
 
 
-def fetch_vault_tvl_timeseries(address: str, chain_id: int, name: str) -> List[Dict]:
+def fetch_vault_tvl_timeseries(address: str, chain_id: int, name: str,
+                               store: VaultHistoryStore) -> List[Dict]:
     """
-    Fetch daily TVL (totalAssets + totalAssetsUsd) timeseries via vaultByAddress.
-    One fast GraphQL call per vault — no pagination needed.
+    Daily TVL (totalAssets + totalAssetsUsd) timeseries for one vault.
+    Served from the vault history store when block2 already fetched the
+    window; otherwise one vaultByAddress call for the missing part only
+    (past the watermark, with a small overlap), merged into the store.
     """
-    query = f"""
-    {{
-      vaultByAddress(address: "{address}", chainId: {chain_id}) {{
-        address
-        name
-        state {{
-          totalAssetsUsd
-          totalAssets
-          totalSupply
-        }}
-        historicalState {{
-          totalAssetsUsd(options: {{
-            startTimestamp: {TS_OCT_01}
-            endTimestamp: {TS_JAN_31}
-            interval: DAY
-          }}) {{ x y }}
-          totalAssets(options: {{
-            startTimestamp: {TS_OCT_01}
-            endTimestamp: {TS_JAN_31}
-            interval: DAY
-          }}) {{ x y }}
+    window = store.fetch_window(address, chain_id, "DAY", TS_OCT_01, TS_JAN_31)
+    if window is None:
+        print(f"  ♻️  {name}: TVL timeseries from vault history store")
+    else:
+        start_ts, end_ts = window
+        query = f"""
+        {{
+          vaultByAddress(address: "{address}", chainId: {chain_id}) {{
+            address
+            name
+            historicalState {{
+{history_fields(start_ts, end_ts, "DAY")}
+            }}
+          }}
         }}
-      }}
-    }}
-    """
-
-    print(f"  Querying TVL timeseries for {name}...")
-    data = query_graphql(query)
-    time.sleep(REQUEST_DELAY)
+        """
 
-    vault = data.get("data", {}).get("vaultByAddress", {})
-    if not vault:
-        print(f"    ⚠ No data returned")
-        return []
+        print(f"  Querying TVL timeseries for {name} ({ts_to_date(start_ts)} → {ts_to_date(end_ts)})...")
+        data = query_graphql(query)
 
-    hist = vault.get("historicalState", {})
-    tvl_usd_points = hist.get("totalAssetsUsd", []) or []
-    raw_points = hist.get("totalAssets", []) or []
+        vault = (data.get("data") or {}).get("vaultByAddress") or {}
+        if vault:
+            points = points_to_frame(vault.get("historicalState"), address, chain_id, "DAY")
+            store.upsert(points, address, chain_id, "DAY", start_ts, end_ts)
+        elif store.coverage(address, chain_id, "DAY") is None:
+            print(f"    ⚠ No data returned")
+            return []
+        else:
+            print(f"    ⚠ No data returned — using the points already in the store")
 
-    raw_lookup = {int(p["x"]): int(p["y"]) for p in raw_points
-                  if p.get("x") and p.get("y") is not None}
+    series = store.daily(address, chain_id, TS_OCT_01, TS_JAN_31)
 
     rows = []
-    for p in tvl_usd_points:
-        ts = int(p["x"])
-        tvl_usd = float(p["y"]) if p["y"] else 0
-        raw_ta = raw_lookup.get(ts, 0)
-
+    for p in series.to_dict("records"):
+        ts = int(p["timestamp"])
+        raw_ta = p.get("total_assets_raw")
         rows.append({
             "vault_address": address,
             "vault_name": name,
             "chain_id": chain_id,
             "timestamp": ts,
             "date": ts_to_date(ts),
-            "tvl_usd": tvl_usd,
-            "total_assets_raw": raw_ta,
+            "tvl_usd": float(p["total_assets_usd"]) if pd.notna(p["total_assets_usd"]) else 0,
+            "total_assets_raw": int(raw_ta) if isinstance(raw_ta, str) and raw_ta else 0,
         })
 
     if rows:
@@ -195,10 +192,12 @@ def main():
     output_dir = PROJECT_ROOT / "data"
     output_dir.mkdir(parents=True, exist_ok=True)
 
+    store = VaultHistoryStore(output_dir)
     all_tvl = []
     for vault in damaged_vaults:
-        tvl = fetch_vault_tvl_timeseries(vault["address"], vault["chain_id"], vault["name"])
+        tvl = fetch_vault_tvl_timeseries(vault["address"], vault["chain_id"], vault["name"], store)
         all_tvl.extend(tvl)
+    store.save()
 
     if all_tvl:
         df_tvl = pd.DataFrame(all_tvl)
@@ -12,12 +12,15 @@ Outputs:
   block8_plume_borrower_positions.csv - Current borrower snapshot
   block8_eth_transactions.csv         - Ethereum sdeUSD/USDC transactions (comparison)
   block8_eth_market_history.csv       - Ethereum sdeUSD/USDC hourly history
+  block8_eth_borrower_positions.csv   - Ethereum sdeUSD/USDC borrower snapshot (HF replay anchor)
   block8_oracle_comparison.csv        - Oracle config side-by-side
+  block8_hf_replay_positions.csv      - Per-borrower HF replay: first hour liquidatable
+                                        at spot but not at the oracle (hf_replay.py)
+  block8_hf_replay_hourly.csv         - Per-market hourly HF replay aggregates
 
-Requires: requests (pip install requests)
+Requires: requests, pandas (pip install requests pandas)
 """
 
-import requests
 import time
 import csv
 import json
@@ -25,6 +28,13 @@ import os
 import sys
 from datetime import datetime, timezone
 
+import pandas as pd
+
+import rate_limiter
+from paginator import iter_pages
+from stream_writer import open_writer
+from hf_replay import replay_market, spot_series, debt_check, DEBT_TOLERANCE
+
 # ─── Config ──────────────────────────────────────────────────────
 API_URL = "https://blue-api.morpho.org/graphql"  # same as all other block scripts
 DATA_DIR = os.environ.get("DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data"))
@@ -47,7 +57,6 @@ TS_START = 1760486400   # Oct 15 2025
 TS_END   = 1763596800   # Nov 20 2025
 TS_DEPEG = 1762214400   # Nov 4  2025
 
-DELAY = 0.3  # seconds between API calls
 
 
 # ─── GraphQL helpers ─────────────────────────────────────────────
@@ -60,7 +69,7 @@ def query_graphql(query: str, variables: dict = None, retries: int = 3) -> dict:
 
     for attempt in range(retries):
         try:
-            resp = requests.post(API_URL, json=payload, timeout=60)
+            resp = rate_limiter.post(API_URL, json=payload, timeout=60)
             if resp.status_code == 400:
                 print(f"  [ERR] 400 Bad Request. Response body:")
                 print(f"  {resp.text[:500]}")
@@ -120,6 +129,7 @@ query MarketTransactions($marketKey: [String!]!, $types: [TransactionType!]!,
     }
   ) {
     items {
+      id
       hash
       timestamp
       blockNumber
@@ -137,6 +147,7 @@ query MarketTransactions($marketKey: [String!]!, $types: [TransactionType!]!,
           seizedAssetsUsd
           repaidAssets
           repaidAssetsUsd
+          repaidShares
           badDebtAssets
           badDebtAssetsUsd
           liquidator
@@ -165,100 +176,107 @@ ALL_MARKET_TX_TYPES = [
 ]
 
 
-def fetch_transactions(market: dict, output_file: str):
-    """Fetch all transaction types for a market, paginated."""
+TRANSACTION_FIELDS = [
+    "hash", "timestamp", "date", "datetime", "block_number", "type",
+    "user_address", "market_unique_key", "assets", "assets_usd",
+    "shares", "seized_assets", "seized_assets_usd",
+    "bad_debt_assets", "bad_debt_assets_usd", "liquidator",
+]
+
+# Nov 3-5: the withdrawal window main() prints in detail
+DEPEG_WINDOW_DATES = ("2025-11-03", "2025-11-04", "2025-11-05")
+
+
+def parse_transaction(tx: dict, market: dict) -> dict:
+    """Flatten one transactions item into a CSV row."""
+    tx_type = tx.get("type", "")
+    ts = int(tx.get("timestamp", 0))
+    user = tx.get("user", {}).get("address", "")
+    td = tx.get("data", {})
+
+    row = {
+        "hash": tx.get("hash", ""),
+        "timestamp": ts,
+        "date": ts_to_date(ts),
+        "datetime": ts_to_datetime(ts),
+        "block_number": tx.get("blockNumber", ""),
+        "type": tx_type,
+        "user_address": user,
+        "market_unique_key": market["key"],
+    }
+
+    if tx_type == "MarketLiquidation":
+        row["assets"] = td.get("repaidAssets", "")
+        row["assets_usd"] = td.get("repaidAssetsUsd", "")
+        row["shares"] = td.get("repaidShares", "")
+        row["seized_assets"] = td.get("seizedAssets", "")
+        row["seized_assets_usd"] = td.get("seizedAssetsUsd", "")
+        row["bad_debt_assets"] = td.get("badDebtAssets", "")
+        row["bad_debt_assets_usd"] = td.get("badDebtAssetsUsd", "")
+        row["liquidator"] = td.get("liquidator", "")
+    elif tx_type in ("MarketSupplyCollateral", "MarketWithdrawCollateral"):
+        row["assets"] = td.get("assets", "")
+        row["assets_usd"] = td.get("assetsUsd", "")
+    else:
+        # MarketBorrow, MarketRepay, MarketSupply, MarketWithdraw
+        row["assets"] = td.get("assets", "")
+        row["assets_usd"] = td.get("assetsUsd", "")
+        row["shares"] = td.get("shares", "")
+
+    return row
+
+
+def fetch_transactions(market: dict, output_file: str) -> dict:
+    """
+    Fetch all transaction types for a market, paginated, streaming each page
+    to the output CSV. Returns a summary (row count, counts by type and the
+    rows inside DEPEG_WINDOW_DATES) rather than every row.
+    """
     print(f"\n{'='*70}")
     print(f"QUERY 1: Transactions for {market['label']}")
     print(f"{'='*70}")
 
-    all_rows = []
     page_size = 100
-    skip = 0
-    total = None
 
-    while True:
+    def fetch_page(skip: int, first: int):
         variables = {
             "marketKey": [market["key"]],
             "types": ALL_MARKET_TX_TYPES,
             "chainId": [market["chain_id"]],
             "tsGte": TS_START,
             "tsLte": TS_END,
-            "first": page_size,
+            "first": first,
             "skip": skip,
         }
 
         data = query_graphql(TRANSACTIONS_QUERY, variables)
+        if not data:
+            return None
         txs = data.get("transactions", {})
         items = txs.get("items", [])
-
-        if total is None:
-            total = txs.get("pageInfo", {}).get("countTotal", "?")
-            print(f"  Total transactions: {total}")
-
-        if not items:
-            break
-
-        for tx in items:
-            tx_type = tx.get("type", "")
-            ts = int(tx.get("timestamp", 0))
-            user = tx.get("user", {}).get("address", "")
-            td = tx.get("data", {})
-
-            row = {
-                "hash": tx.get("hash", ""),
-                "timestamp": ts,
-                "date": ts_to_date(ts),
-                "datetime": ts_to_datetime(ts),
-                "block_number": tx.get("blockNumber", ""),
-                "type": tx_type,
-                "user_address": user,
-                "market_unique_key": market["key"],
-            }
-
-            if tx_type == "MarketLiquidation":
-                row["assets"] = td.get("repaidAssets", "")
-                row["assets_usd"] = td.get("repaidAssetsUsd", "")
-                row["seized_assets"] = td.get("seizedAssets", "")
-                row["seized_assets_usd"] = td.get("seizedAssetsUsd", "")
-                row["bad_debt_assets"] = td.get("badDebtAssets", "")
-                row["bad_debt_assets_usd"] = td.get("badDebtAssetsUsd", "")
-                row["liquidator"] = td.get("liquidator", "")
-            elif tx_type in ("MarketSupplyCollateral", "MarketWithdrawCollateral"):
-                row["assets"] = td.get("assets", "")
-                row["assets_usd"] = td.get("assetsUsd", "")
-            else:
-                # MarketBorrow, MarketRepay, MarketSupply, MarketWithdraw
-                row["assets"] = td.get("assets", "")
-                row["assets_usd"] = td.get("assetsUsd", "")
-                row["shares"] = td.get("shares", "")
-
-            all_rows.append(row)
-
-        print(f"  Fetched {skip + len(items)} / {total}")
-        skip += page_size
-        time.sleep(DELAY)
-
-        if len(items) < page_size:
-            break
-
-    # Write CSV
-    if all_rows:
-        fieldnames = [
-            "hash", "timestamp", "date", "datetime", "block_number", "type",
-            "user_address", "market_unique_key", "assets", "assets_usd",
-            "shares", "seized_assets", "seized_assets_usd",
-            "bad_debt_assets", "bad_debt_assets_usd", "liquidator",
-        ]
-        path = os.path.join(DATA_DIR, output_file)
-        with open(path, "w", newline="") as f:
-            w = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
-            w.writeheader()
-            w.writerows(all_rows)
-        print(f"  Wrote {len(all_rows)} rows to {output_file}")
+        total = txs.get("pageInfo", {}).get("countTotal", 0)
+        print(f"  Fetched skip={skip} ({len(items)} rows) / {total}")
+        return items, total
+
+    summary = {"rows": 0, "by_type": {}, "depeg_window": []}
+    path = os.path.join(DATA_DIR, output_file)
+
+    with open_writer(path, columns=TRANSACTION_FIELDS) as writer:
+        for page in iter_pages(fetch_page, page_size, key=lambda tx: tx.get("id") or tx.get("hash")):
+            rows = [parse_transaction(tx, market) for tx in page]
+            writer.write_rows(rows)
+            for row in rows:
+                summary["by_type"][row["type"]] = summary["by_type"].get(row["type"], 0) + 1
+                if row["date"] in DEPEG_WINDOW_DATES:
+                    summary["depeg_window"].append(row)
+
+    summary["rows"] = writer.rows_written
+    if writer.rows_written:
+        print(f"  Wrote {writer.rows_written} rows to {output_file}")
     else:
         print(f"  No transactions found.")
 
-    return all_rows
+    return summary
 
 
 # ─── Query 2: Market historical state ────────────────────────────
@@ -495,7 +513,6 @@ def fetch_borrower_positions(market: dict, output_file: str):
                 all_rows.append(row)
 
         skip += page_size
-        time.sleep(DELAY)
         if len(items) < page_size:
             break
 
@@ -585,6 +602,111 @@ def write_oracle_comparison(plume_oracle: dict, eth_oracle: dict):
             print(f"    -> If hardcoded, depeg INVISIBLE to liquidation engine")
 
 
+# ─── Query 5: Health-factor replay (no API calls) ────────────────
+
+def market_config(market: dict, oracle_info: dict) -> dict:
+    """LLTV / decimals / oracle kind for hf_replay, from the market history response."""
+    od = oracle_info.get("oracle_data", {}) or {}
+    vault = (od.get("baseOracleVault") or {}).get("address", "")
+    return {
+        "market_unique_key": market["key"],
+        "label": market["label"],
+        "lltv": int(oracle_info["lltv"]) / 1e18,
+        "collateral_decimals": int(oracle_info["collateral_decimals"]),
+        "loan_decimals": int(oracle_info["loan_decimals"]),
+        "is_vault_based": bool(vault and vault != "0x0000000000000000000000000000000000000000"),
+        "collateral_symbol": oracle_info.get("collateral_symbol", ""),
+    }
+
+
+# Borrower snapshot (with borrow shares) per replayed market
+POSITIONS_FILES = {
+    PLUME_SDEUSD_PUSD["key"]: "block8_plume_borrower_positions.csv",
+    ETH_SDEUSD_USDC["key"]: "block8_eth_borrower_positions.csv",
+}
+
+
+def load_anchor(market: dict):
+    """
+    Current positions to walk the event stream back from: the block8 snapshot,
+    which carries borrow shares. None if it hasn't been fetched. (block5's
+    positions only have borrow assets, which include post-window interest.)
+    """
+    path = os.path.join(DATA_DIR, POSITIONS_FILES[market["key"]])
+    if not os.path.exists(path):
+        return None
+    return pd.read_csv(path, dtype=str)[["user_address", "collateral", "borrow_shares"]]
+
+
+def write_hf_replay(markets: list):
+    """
+    Replay every borrower's health factor hourly under spot and oracle
+    prices (hf_replay.py) from the transaction / history CSVs written above.
+    """
+    print(f"\n{'='*70}")
+    print(f"QUERY 5: Health-factor replay (spot vs oracle)")
+    print(f"{'='*70}")
+
+    prices_path = os.path.join(DATA_DIR, "block5_asset_prices.csv")
+    if not os.path.exists(prices_path):
+        print("  block5_asset_prices.csv not found — run block5_liquidation first. Skipping.")
+        return
+    prices = pd.read_csv(prices_path)
+
+    all_positions, all_hourly = [], []
+    for market, oracle_info, tx_file, history_file in markets:
+        tx_path = os.path.join(DATA_DIR, tx_file)
+        history_path = os.path.join(DATA_DIR, history_file)
+        if not oracle_info or not os.path.exists(tx_path) or not os.path.exists(history_path):
+            print(f"  {market['label']}: inputs missing, skipped")
+            continue
+        cfg = market_config(market, oracle_info)
+        spot = spot_series(prices, cfg["collateral_symbol"], chain_id=market["chain_id"])
+        if spot.empty:
+            print(f"  {market['label']}: no {cfg['collateral_symbol']} prices, skipped")
+            continue
+
+        anchor = load_anchor(market)
+        if anchor is None:
+            print(f"  {market['label']}: {POSITIONS_FILES[market['key']]} not found (borrow shares), skipped")
+            continue
+
+        df_history = pd.read_csv(history_path)
+        positions, hourly = replay_market(
+            pd.read_csv(tx_path, dtype={"assets": str, "shares": str, "seized_assets": str}),
+            df_history, anchor, spot, cfg, TS_DEPEG,
+        )
+        rebuilt, recorded, error = debt_check(hourly, df_history)
+        if error > DEBT_TOLERANCE:
+            print(f"  ❌ {market['label']}: rebuilt debt ${rebuilt:,.0f} vs ${recorded:,.0f} borrowed in the "
+                  f"market history at the window end ({error:.0%} of peak) — snapshot doesn't match "
+                  f"the window, skipped")
+            continue
+        all_positions.append(positions)
+        all_hourly.append(hourly)
+
+        masked = positions[positions["masked_from"].notna()]
+        print(f"\n  {market['label']} (oracle {'vault-based' if cfg['is_vault_based'] else 'feed'}):")
+        print(f"    {len(positions)} borrowers replayed over {len(hourly)} hours "
+              f"(window-end debt ${rebuilt:,.0f} vs ${recorded:,.0f} recorded)")
+        print(f"    {len(masked)} liquidatable at spot while the oracle said healthy"
+              f" (${masked['debt_usd_at_masked'].sum():,.0f} debt at that hour)")
+        if not masked.empty:
+            first = masked.sort_values("masked_from").iloc[0]
+            print(f"    First: {first['user_address'][:12]}... at {ts_to_datetime(first['masked_from'])} UTC")
+
+    if not all_positions:
+        return
+    for name, frames in (("block8_hf_replay_positions.csv", all_positions),
+                         ("block8_hf_replay_hourly.csv", all_hourly)):
+        df = pd.concat(frames, ignore_index=True)
+        for col in ("first_liquidatable_spot", "first_liquidatable_oracle", "masked_from", "liquidated_at"):
+            if col in df.columns:
+                df[f"{col}_datetime"] = df[col].map(lambda t: ts_to_datetime(t) if pd.notna(t) else "")
+        df.to_csv(os.path.join(DATA_DIR, name), index=False)
+        print(f"  Wrote {len(df)} rows to {name}")
+
+
 # ─── Main ────────────────────────────────────────────────────────
 
 def main():
@@ -597,56 +719,49 @@ def main():
     plume_txs = fetch_transactions(PLUME_SDEUSD_PUSD, "block8_plume_transactions.csv")
 
     # Quick analysis
-    if plume_txs:
+    if plume_txs["rows"]:
         print(f"\n  Transaction breakdown:")
-        by_type = {}
-        for tx in plume_txs:
-            t = tx["type"]
-            by_type[t] = by_type.get(t, 0) + 1
-        for t, c in sorted(by_type.items()):
+        for t, c in sorted(plume_txs["by_type"].items()):
             print(f"    {t}: {c}")
 
         # Nov 3-5 detail
         print(f"\n  Nov 3-5 events (the withdrawal window):")
-        for tx in plume_txs:
-            if tx["date"] in ("2025-11-03", "2025-11-04", "2025-11-05"):
-                usd = float(tx.get("assets_usd", 0) or 0)
-                if usd > 10 or tx["type"] == "MarketLiquidation":
-                    seized = float(tx.get("seized_assets_usd", 0) or 0)
-                    bd = float(tx.get("bad_debt_assets_usd", 0) or 0)
-                    extra = ""
-                    if tx["type"] == "MarketLiquidation":
-                        extra = f" seized=${seized:,.0f} bad_debt=${bd:,.0f}"
-                    print(f"    {tx['datetime']}  {tx['type']:<25} ${usd:>12,.2f}  {tx['user_address'][:12]}...{extra}")
-    time.sleep(DELAY)
+        for tx in plume_txs["depeg_window"]:
+            usd = float(tx.get("assets_usd", 0) or 0)
+            if usd > 10 or tx["type"] == "MarketLiquidation":
+                seized = float(tx.get("seized_assets_usd", 0) or 0)
+                bd = float(tx.get("bad_debt_assets_usd", 0) or 0)
+                extra = ""
+                if tx["type"] == "MarketLiquidation":
+                    extra = f" seized=${seized:,.0f} bad_debt=${bd:,.0f}"
+                print(f"    {tx['datetime']}  {tx['type']:<25} ${usd:>12,.2f}  {tx['user_address'][:12]}...{extra}")
 
     # ── 2. Plume market history ──
     plume_oracle, _ = fetch_market_history(PLUME_SDEUSD_PUSD, "block8_plume_market_history.csv")
-    time.sleep(DELAY)
 
     # ── 3. Plume borrower positions ──
     fetch_borrower_positions(PLUME_SDEUSD_PUSD, "block8_plume_borrower_positions.csv")
-    time.sleep(DELAY)
 
     # ── 4. Ethereum comparison ──
     eth_txs = fetch_transactions(ETH_SDEUSD_USDC, "block8_eth_transactions.csv")
-    if eth_txs:
+    if eth_txs["rows"]:
         print(f"\n  Ethereum transaction breakdown:")
-        by_type = {}
-        for tx in eth_txs:
-            t = tx["type"]
-            by_type[t] = by_type.get(t, 0) + 1
-        for t, c in sorted(by_type.items()):
+        for t, c in sorted(eth_txs["by_type"].items()):
             print(f"    {t}: {c}")
-    time.sleep(DELAY)
 
     eth_oracle, _ = fetch_market_history(ETH_SDEUSD_USDC, "block8_eth_market_history.csv")
-    time.sleep(DELAY)
+    fetch_borrower_positions(ETH_SDEUSD_USDC, "block8_eth_borrower_positions.csv")
 
     # ── 5. Oracle comparison ──
     if plume_oracle or eth_oracle:
         write_oracle_comparison(plume_oracle, eth_oracle)
 
+    # ── 6. Health-factor replay ──
+    write_hf_replay([
+        (PLUME_SDEUSD_PUSD, plume_oracle, "block8_plume_transactions.csv", "block8_plume_market_history.csv"),
+        (ETH_SDEUSD_USDC, eth_oracle, "block8_eth_transactions.csv", "block8_eth_market_history.csv"),
+    ])
+
     # ── Summary ──
     print(f"\n{'='*70}")
     print("BLOCK 8 COMPLETE")
@@ -0,0 +1,105 @@
+"""
+Checkpoint — per-block resume state for long-running query blocks.
+
+A block splits its work into units (a vault, a vault batch, a chain…) and
+records each finished unit together with its result in an append-only JSONL
+file under data/_checkpoints/<block>.jsonl. If the block dies midway, a rerun
+with `runner.py --resume` (which sets MORPHO_RESUME=1) replays finished units
+from the file and only fetches the outstanding ones. The block calls
+complete() at the end of a successful run, which removes the file.
+
+Without --resume, a block starts fresh and any stale checkpoint is discarded.
+
+Appends are line-at-a-time and flushed, so a crash can at worst leave a
+truncated last line, which is ignored on load.
+
+Used by: block3_curator_A2 (one unit per vault) and block6_contagion (vault
+batches, reallocations). Neither saves a unit that came back with an error,
+so it is refetched on resume rather than replayed.
+"""
+
+import os
+import json
+import hashlib
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+RESUME_ENV = "MORPHO_RESUME"
+CHECKPOINT_SUBDIR = "_checkpoints"
+
+Unit = Tuple
+
+
+def resume_requested() -> bool:
+    return os.environ.get(RESUME_ENV, "") == "1"
+
+
+def batch_key(items: Iterable[str]) -> str:
+    """Stable short key for a batch of addresses (order-independent)."""
+    joined = ",".join(sorted(str(i).lower() for i in items))
+    return hashlib.sha1(joined.encode()).hexdigest()[:16]
+
+
+class Checkpoint:
+    def __init__(self, block: str, data_dir: Path, resume: Optional[bool] = None):
+        self.block = block
+        self.path = Path(data_dir) / CHECKPOINT_SUBDIR / f"{block}.jsonl"
+        self.resume = resume_requested() if resume is None else resume
+        self._done: Dict[str, Any] = {}
+        self.resumed_units = 0
+
+        if self.resume and self.path.exists():
+            self._load()
+            print(f"   ♻️  Resuming {block}: {len(self._done)} work units already done")
+        elif self.path.exists():
+            self.path.unlink()
+
+    @staticmethod
+    def _key(unit: Unit) -> str:
+        return "|".join(str(p).lower() for p in unit)
+
+    def _load(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # truncated last line from a crash
+                self._done[rec["unit"]] = rec.get("result")
+
+    def done(self, unit: Unit) -> bool:
+        return self._key(unit) in self._done
+
+    def get(self, unit: Unit, default: Any = None) -> Any:
+        return self._done.get(self._key(unit), default)
+
+    def save(self, unit: Unit, result: Any = None):
+        """Record a finished unit and its (JSON-serializable) result."""
+        key = self._key(unit)
+        self._done[key] = result
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"unit": key, "result": result}, default=str) + "\n")
+            f.flush()
+
+    def cached(self, unit: Unit, fetch: Callable[[], Any],
+               keep: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Return the stored result for `unit`, or call fetch() and store it.
+        `keep(result)` decides whether a fresh result is worth checkpointing
+        (e.g. skip error dicts so they are retried on resume).
+        """
+        if self.done(unit):
+            self.resumed_units += 1
+            return self.get(unit)
+        result = fetch()
+        if keep is None or keep(result):
+            self.save(unit, result)
+        return result
+
+    def complete(self):
+        """Block finished — drop the checkpoint."""
+        if self.path.exists():
+            self.path.unlink()
+        if self.resumed_units:
+            print(f"   ♻️  {self.resumed_units} work units served from checkpoint")
@@ -0,0 +1,181 @@
+"""
+Contagion Graph — vault ↔ market allocation graph as a sparse matrix.
+
+block6 TASK 6 used to walk `all_allocations` vault by vault and only looked
+one hop away (does this vault hold both toxic and clean markets?), and built
+market ↔ market links with nested Python loops. ContagionGraph stores the
+bipartite allocation graph once as a vaults × markets matrix W weighted by
+supply USD and answers everything with sparse products:
+
+  - propagate(): multi-hop exposure. Hop 1 is each vault's share of assets in
+    toxic markets; the stressed vaults' share of each market's vault-supplied
+    liquidity becomes that market's stress, which reaches the next vaults
+    sharing it (toxic market → vault → clean market → other vaults → ...)
+  - loss_shares(): how a per-market loss vector is socialized across the
+    vaults supplying each market (pro rata to supply)
+  - components(): connected components of the bipartite graph
+  - market_links(): market × market co-supply (markets sharing a vault)
+
+scipy is an optional import: without it the same code runs on dense numpy
+arrays, which is fine for the exposed-vault subset but not for the whole
+vault/market universe.
+
+Used by: block6_contagion (TASK 6 outputs) and shock_simulator.py (vault
+losses per shock scenario).
+"""
+
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import scipy.sparse as sp
+    from scipy.sparse.csgraph import connected_components
+except ImportError:
+    sp = None
+    connected_components = None
+
+DEFAULT_HOPS = 3
+
+
+def _diag_inv(values: np.ndarray):
+    """Diagonal matrix of 1/values (0 where values == 0)."""
+    inv = np.divide(1.0, values, out=np.zeros_like(values, dtype=float), where=values != 0)
+    return sp.diags(inv) if sp is not None else np.diag(inv)
+
+
+def _dense(x) -> np.ndarray:
+    return np.asarray(x.todense() if sp is not None and sp.issparse(x) else x)
+
+
+def _flat(x) -> np.ndarray:
+    return _dense(x).ravel()
+
+
+class ContagionGraph:
+    def __init__(self, df_alloc: pd.DataFrame, toxic_keys: Iterable[str],
+                 vault_col: str = "vault_address", market_col: str = "market_unique_key",
+                 weight_col: str = "supply_assets_usd"):
+        df = df_alloc[[vault_col, market_col, weight_col]].copy()
+        df[weight_col] = pd.to_numeric(df[weight_col], errors="coerce").fillna(0.0)
+        df = df[df[weight_col] > 0]
+
+        v_codes, self.vaults = pd.factorize(df[vault_col])
+        m_codes, self.markets = pd.factorize(df[market_col])
+        shape = (len(self.vaults), len(self.markets))
+        weights = df[weight_col].to_numpy(dtype=float)
+
+        if sp is not None:
+            # Duplicate (vault, market) rows are summed by the COO → CSR conversion
+            self.W = sp.coo_matrix((weights, (v_codes, m_codes)), shape=shape).tocsr()
+        else:
+            self.W = np.zeros(shape)
+            np.add.at(self.W, (v_codes, m_codes), weights)
+
+        toxic = set(toxic_keys)
+        self.toxic = np.array([m in toxic for m in self.markets], dtype=bool)
+        self.vault_supply = _flat(self.W.sum(axis=1))
+        self.market_supply = _flat(self.W.sum(axis=0))
+
+    # ── normalized operators ──
+    def vault_shares(self):
+        """V × M: share of each vault's supply placed in each market (rows sum to 1)."""
+        return _diag_inv(self.vault_supply) @ self.W
+
+    def market_shares(self):
+        """M × V: share of each market's vault-supplied liquidity from each vault (rows sum to 1)."""
+        return _diag_inv(self.market_supply) @ self.W.T
+
+    def toxic_supply(self) -> np.ndarray:
+        """Per-market loss vector assuming every toxic market is a total loss."""
+        return np.where(self.toxic, self.market_supply, 0.0)
+
+    # ── analyses ──
+    def propagate(self, hops: int = DEFAULT_HOPS, seed: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """
+        Multi-hop exposure per vault. `seed` is the initial per-market stress
+        in [0, 1] (default: 1 for toxic markets). At each hop:
+
+            vault_exposure = vault_shares  @ market_stress
+            market_stress  = market_shares @ vault_exposure   (toxic stay at 1)
+
+        `exposure_hop<k>` is the vault's exposure after k hops (fraction of
+        its assets in stressed markets); `first_hop` is the first hop at which
+        it is exposed at all (NaN if never).
+        """
+        stress = self.toxic.astype(float) if seed is None else np.asarray(seed, dtype=float)
+        S, T = self.vault_shares(), self.market_shares()
+
+        out = pd.DataFrame({"vault_address": self.vaults, "supply_usd": self.vault_supply})
+        first_hop = np.full(len(self.vaults), np.nan)
+        for hop in range(1, hops + 1):
+            exposure = _flat(S @ stress)
+            out[f"exposure_hop{hop}"] = exposure
+            first_hop = np.where(np.isnan(first_hop) & (exposure > 0), hop, first_hop)
+            stress = np.maximum(_flat(T @ exposure), self.toxic.astype(float))
+        out["first_hop"] = first_hop
+        return out
+
+    def loss_shares(self, market_loss_usd: np.ndarray) -> pd.DataFrame:
+        """Socialize a per-market loss (USD) across its suppliers, pro rata to supply."""
+        loss = _flat(self.market_shares().T @ np.asarray(market_loss_usd, dtype=float))
+        total = loss.sum()
+        return pd.DataFrame({
+            "vault_address": self.vaults,
+            "loss_usd": loss,
+            "loss_pct_of_supply": np.divide(loss * 100, self.vault_supply,
+                                            out=np.zeros_like(loss), where=self.vault_supply > 0),
+            "loss_share_pct": loss / total * 100 if total > 0 else np.zeros_like(loss),
+        })
+
+    def components(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Connected-component labels for (vaults, markets) of the bipartite graph."""
+        n_v, n_m = len(self.vaults), len(self.markets)
+        if sp is not None:
+            B = (self.W > 0).astype(np.int8)
+            A = sp.bmat([[None, B], [B.T, None]], format="csr")
+            _, labels = connected_components(A, directed=False)
+        else:
+            labels = self._components_dense()
+        return labels[:n_v], labels[n_v:]
+
+    def _components_dense(self) -> np.ndarray:
+        # Min-label propagation over the bipartite adjacency until stable
+        n_v = len(self.vaults)
+        B = self.W > 0
+        labels = np.arange(n_v + len(self.markets))
+        while True:
+            v_lab, m_lab = labels[:n_v], labels[n_v:]
+            m_from_v = np.where(B, v_lab[:, None], np.iinfo(labels.dtype).max).min(axis=0, initial=np.iinfo(labels.dtype).max)
+            v_from_m = np.where(B, m_lab[None, :], np.iinfo(labels.dtype).max).min(axis=1, initial=np.iinfo(labels.dtype).max)
+            new = np.minimum(labels, np.concatenate([v_from_m, m_from_v]))
+            if np.array_equal(new, labels):
+                return pd.factorize(labels)[0]
+            labels = new
+
+    def market_links(self) -> pd.DataFrame:
+        """Per market: how many other markets share at least one supplying vault."""
+        B = (self.W > 0).astype(float)
+        co = B.T @ B                                   # M × M shared-vault counts
+        n_linked = _flat((co > 0).sum(axis=1)) - 1     # minus the market itself
+        n_linked_toxic = _flat((co > 0).astype(float) @ self.toxic.astype(float)) - self.toxic
+        return pd.DataFrame({
+            "market_unique_key": self.markets,
+            "is_toxic_market": self.toxic,
+            "n_connected_markets": n_linked.astype(int),
+            "n_connected_toxic": n_linked_toxic.astype(int),
+            "n_connected_clean": (n_linked - n_linked_toxic).astype(int),
+        })
+
+    def summary(self) -> Dict:
+        vault_comp, market_comp = self.components()
+        toxic_comps = set(market_comp[self.toxic])
+        return {
+            "n_vaults": len(self.vaults),
+            "n_markets": len(self.markets),
+            "n_edges": int((_dense(self.W) > 0).sum()) if sp is None else int(self.W.nnz),
+            "n_components": len(set(vault_comp) | set(market_comp)),
+            "vaults_in_toxic_components": int(np.isin(vault_comp, list(toxic_comps)).sum()),
+            "markets_in_toxic_components": int(np.isin(market_comp, list(toxic_comps)).sum()),
+        }
@@ -0,0 +1,147 @@
+"""
+Drawdown — grouped running max, drawdowns and change points for share prices.
+
+sections/bad_debt.py looped over `prices.groupby(vault)` computing cummax and
+drawdown per vault on every rerun; block2's compute_vault_stats does a
+depeg-anchored version (pre-depeg peak vs post-depeg trough) in Python loops.
+This engine does the running-max version for every vault at once, on the
+merged hourly + daily history, with grouped vectorized operations only:
+
+  - drawdown_table(): per vault — running-max peak, trough, max drawdown,
+    peak/trough timestamps, recovery timestamp (first point back at the
+    peak after the trough) and hours to recover
+  - change_points(): abrupt share-price moves. Each step's log return is
+    turned into a per-hour rate (÷ Δhours, so daily and hourly steps
+    compare), compared with the rolling median rate of the previous
+    BASELINE_STEPS steps and scored against the vault's robust spread (MAD).
+    A step is a change point when |z| ≥ CHANGE_Z and its move beyond the
+    baseline (`excess_pct`) is ≥ CHANGE_MIN_PCT
+
+block2 persists both (block2_share_price_drawdowns.csv,
+block2_share_price_change_points.csv); the dashboard reads them, or recomputes
+them from the block2 share price CSVs when they are missing.
+"""
+
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+KEYS = ["vault_address", "chain_id"]
+META_COLS = ["vault_name", "chain", "curator_name", "asset_symbol"]
+
+# Change point: robust z-score of the per-hour return vs its rolling baseline, and a floor on the excess move
+# (100%-utilization interest ramps reach ~1.5%/day beyond the rolling baseline)
+CHANGE_Z = 8.0
+CHANGE_MIN_PCT = 2.0
+BASELINE_STEPS = 24
+MAD_SCALE = 1.4826
+
+
+def merge_history(df_daily: pd.DataFrame, df_hourly: pd.DataFrame,
+                  keys: Sequence[str] = KEYS, price_col: str = "share_price") -> pd.DataFrame:
+    """Daily and hourly rows as one series per vault (hourly wins on a shared timestamp)."""
+    frames = [df for df in (df_hourly, df_daily) if df is not None and not df.empty]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    df["timestamp"] = pd.to_numeric(df["timestamp"], errors="coerce")
+    df[price_col] = pd.to_numeric(df[price_col], errors="coerce")
+    df = df.dropna(subset=["timestamp", price_col])
+    df = df[df[price_col] > 0]
+    df["timestamp"] = df["timestamp"].astype("int64")
+    df = df.drop_duplicates([*keys, "timestamp"], keep="first")
+    return df.sort_values([*keys, "timestamp"]).reset_index(drop=True)
+
+
+def _sorted(df: pd.DataFrame, keys, price_col) -> pd.DataFrame:
+    out = df.dropna(subset=[price_col]).sort_values([*keys, "timestamp"], kind="mergesort")
+    return out.reset_index(drop=True)
+
+
+def drawdown_table(df: pd.DataFrame, keys: Sequence[str] = KEYS,
+                   price_col: str = "share_price") -> pd.DataFrame:
+    """One row per vault: peak / trough / max drawdown / recovery (drawdowns as negative fractions)."""
+    if df.empty:
+        return pd.DataFrame()
+    keys = list(keys)
+    d = _sorted(df, keys, price_col)
+    g = d.groupby(keys, sort=False)
+    price, ts = d[price_col], d["timestamp"]
+
+    running_max = g[price_col].cummax()
+    d["drawdown"] = price / running_max - 1
+    # Timestamp at which the running max was set, carried forward within the vault
+    d["_peak_ts"] = ts.where(price >= running_max)
+    d["_peak_ts"] = d.groupby(keys, sort=False)["_peak_ts"].ffill()
+    d["_running_max"] = running_max
+
+    trough = d.loc[g["drawdown"].idxmin()].set_index(keys)
+    last = d.loc[g["timestamp"].idxmax()].set_index(keys)
+
+    out = pd.DataFrame({
+        "max_drawdown": trough["drawdown"],
+        "peak_price": trough["_running_max"],
+        "peak_ts": trough["_peak_ts"].astype("int64"),
+        "trough_price": trough[price_col],
+        "trough_ts": trough["timestamp"],
+        "last_price": last[price_col],
+        "last_ts": last["timestamp"],
+        "current_drawdown": last["drawdown"],
+        "n_points": g.size(),
+    })
+    for col in META_COLS:
+        if col in d.columns:
+            out[col] = last[col]
+
+    # Recovery: first point after the trough back at (or above) that drawdown's peak
+    d = d.join(out[["peak_price", "trough_ts"]], on=keys)
+    back = d[(d["timestamp"] > d["trough_ts"]) & (d[price_col] >= d["peak_price"])]
+    out["recovery_ts"] = back.groupby(keys, sort=False)["timestamp"].min()
+    out.loc[out["max_drawdown"] >= 0, "recovery_ts"] = np.nan
+    out["recovery_hours"] = (out["recovery_ts"] - out["trough_ts"]) / 3600
+
+    out = out.reset_index()
+    for col in ["peak_ts", "trough_ts", "last_ts", "recovery_ts"]:
+        out[col.replace("_ts", "_datetime")] = pd.to_datetime(out[col], unit="s")
+    return out.sort_values("max_drawdown").reset_index(drop=True)
+
+
+def change_points(df: pd.DataFrame, keys: Sequence[str] = KEYS, price_col: str = "share_price",
+                  z: float = CHANGE_Z, min_pct: float = CHANGE_MIN_PCT) -> pd.DataFrame:
+    """One row per abrupt share-price step (vault, timestamp, before/after, return, z-score)."""
+    if df.empty:
+        return pd.DataFrame()
+    keys = list(keys)
+    d = _sorted(df, keys, price_col)
+    g = d.groupby(keys, sort=False)
+
+    prev_price = g[price_col].shift()
+    dt_hours = g["timestamp"].diff() / 3600
+    log_ret = np.log(d[price_col] / prev_price)
+    dt = dt_hours.where(dt_hours > 0)
+    d["_r"] = log_ret / dt                      # per-hour rate: accrual is drift, not noise
+
+    # Baseline: the vault's rolling median return over the previous BASELINE_STEPS steps,
+    # so a new regime (e.g. 100%-utilization interest) is flagged at its onset only
+    by = [d[k] for k in keys]
+    prev_r = d.groupby(keys, sort=False)["_r"].shift()
+    base = (prev_r.groupby(by, sort=False).rolling(BASELINE_STEPS, min_periods=3).median()
+            .reset_index(level=list(range(len(keys))), drop=True))
+    d["_dev"] = d["_r"] - base
+    abs_dev = (d["_dev"] - d.groupby(keys, sort=False)["_dev"].transform("median")).abs()
+    mad = abs_dev.groupby(by, sort=False).transform("median") * MAD_SCALE
+    # A flat series has MAD 0; fall back to a tiny scale so any real move stands out
+    d["z_score"] = d["_dev"] / mad.where(mad > 0, 1e-9)
+
+    d["price_before"] = prev_price
+    d["change_pct"] = (np.exp(log_ret) - 1) * 100
+    d["excess_pct"] = (np.exp(d["_dev"] * dt) - 1) * 100    # the step's move beyond its baseline
+    hits = d[(d["z_score"].abs() >= z) & (d["excess_pct"].abs() >= min_pct)]
+
+    cols = [*keys, *[c for c in META_COLS if c in d.columns], "timestamp",
+            "price_before", price_col, "change_pct", "excess_pct", "z_score"]
+    out = hits[cols].rename(columns={price_col: "price_after"})
+    out["datetime"] = pd.to_datetime(out["timestamp"], unit="s")
+    out["direction"] = np.where(out["excess_pct"] < 0, "DROP", "JUMP")
+    return out.sort_values("timestamp").reset_index(drop=True)
@@ -0,0 +1,248 @@
+"""
+HF Replay — reconstruct borrower positions hour by hour from Market* events.
+
+block5 scores positions once, at today's prices; block8 collects the full
+transaction stream and hourly market history for the sdeUSD markets but only
+prints it. The replay turns those into health factors over time:
+
+  - positions: every (market, user) in the transaction stream, anchored to
+    the current snapshot (block8 borrower positions, borrow shares) and
+    walked back through the window's events, then rebuilt forward on an hourly grid as
+    positions × hours arrays of collateral and borrow shares
+      MarketSupplyCollateral / MarketWithdrawCollateral  ±collateral
+      MarketBorrow / MarketRepay                         ±borrow shares
+      MarketLiquidation                                  −seized, −repaid shares
+  - debt: shares × the market's borrow share price (assets/share read off the
+    Borrow/Repay events, interpolated between them)
+  - spot HF: collateral × spot price (block5_asset_prices, hourly) × LLTV / debt
+  - oracle HF: the same with the oracle's price. The API has no oracle price
+    history, so it is modelled: vault-based oracles (ERC4626 conversion, the
+    xUSD/deUSD failure mode) hold the pre-depeg collateral/loan price; feed
+    oracles follow spot (oracle_cube.oracle_path without a snapshot price)
+
+The engine's answer is `masked_from`: the first hour a position was
+liquidatable at spot (HF < 1) while the oracle still had it healthy.
+
+Assumes no position activity between the end of the transaction window and
+the snapshot (the markets sat at 100% utilization after the depeg), so the
+snapshot's borrow shares are the window-end shares. debt_check() tests that
+against the market's recorded borrow at the window end.
+
+Used by: block8_plume_deep_dive (block8_hf_replay_*.csv).
+"""
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from oracle_cube import oracle_path
+from resampling import dedupe_chains
+
+HOUR = 3600
+
+# Debt below this is float residue of shares that cancelled out, not a position
+DUST_USD = 1.0
+
+# Rebuilt vs recorded market debt at the window end, as a share of the
+# window's peak borrow; above this the anchor doesn't match the window
+DEBT_TOLERANCE = 0.05
+
+COLLATERAL_SIGN = {"MarketSupplyCollateral": 1, "MarketWithdrawCollateral": -1}
+BORROW_SIGN = {"MarketBorrow": 1, "MarketRepay": -1}
+
+
+def _num(s: pd.Series) -> pd.Series:
+    return pd.to_numeric(s, errors="coerce").fillna(0.0)
+
+
+def hour_grid(df_history: pd.DataFrame) -> np.ndarray:
+    ts = pd.to_numeric(df_history["timestamp"], errors="coerce").dropna().astype("int64")
+    return np.arange(ts.min() // HOUR * HOUR, ts.max() + 1, HOUR)
+
+
+def borrow_share_price(df_tx: pd.DataFrame, grid: np.ndarray) -> np.ndarray:
+    """Borrow assets per share at each grid hour, from Borrow/Repay events."""
+    ev = df_tx[df_tx["type"].isin(BORROW_SIGN)]
+    assets, shares = _num(ev["assets"]), _num(ev["shares"])
+    ok = (assets > 0) & (shares > 0)
+    if not ok.any():
+        return np.full(len(grid), np.nan)
+    ts = ev.loc[ok, "timestamp"].astype("int64").to_numpy()
+    price = (assets[ok] / shares[ok]).to_numpy()
+    order = np.argsort(ts, kind="mergesort")
+    return np.interp(grid, ts[order], price[order])
+
+
+def position_deltas(df_tx: pd.DataFrame, share_price: np.ndarray, grid: np.ndarray) -> pd.DataFrame:
+    """One row per event: (user, timestamp, d_collateral, d_shares) in raw units."""
+    tx = df_tx.copy()
+    tx["timestamp"] = tx["timestamp"].astype("int64")
+    kind = tx["type"]
+    assets, shares = _num(tx["assets"]), _num(tx["shares"])
+
+    tx["d_collateral"] = assets * kind.map(COLLATERAL_SIGN).fillna(0)
+    tx["d_shares"] = shares * kind.map(BORROW_SIGN).fillna(0)
+
+    liq = kind == "MarketLiquidation"
+    if liq.any():
+        tx.loc[liq, "d_collateral"] = -_num(tx.loc[liq, "seized_assets"])
+        # Older exports have no repaid shares for liquidations — convert repaid assets
+        px = np.interp(tx.loc[liq, "timestamp"], grid, share_price)
+        repaid_shares = np.where(shares[liq] > 0, shares[liq], assets[liq] / np.where(px > 0, px, np.nan))
+        tx.loc[liq, "d_shares"] = -np.nan_to_num(repaid_shares)
+
+    tx = tx[(tx["d_collateral"] != 0) | (tx["d_shares"] != 0)]
+    tx["user_address"] = tx["user_address"].str.lower()
+    return tx[["user_address", "timestamp", "type", "d_collateral", "d_shares"]]
+
+
+def build_paths(deltas: pd.DataFrame, anchors: pd.DataFrame, grid: np.ndarray) -> Tuple[pd.Index, np.ndarray, np.ndarray]:
+    """
+    positions × hours collateral (raw) and borrow shares. State at hour h
+    includes every event at or before h; opening balances are the snapshot
+    minus all of the window's events (clipped at zero).
+    """
+    anchors = anchors.copy()
+    anchors["user_address"] = anchors["user_address"].str.lower()
+    anchors = anchors.groupby("user_address")[["collateral", "borrow_shares"]].sum()
+
+    users = pd.Index(sorted(set(deltas["user_address"]) | set(anchors.index)))
+    p = users.get_indexer(deltas["user_address"])
+    h = np.clip(np.searchsorted(grid, deltas["timestamp"].to_numpy(), side="left"), 0, len(grid) - 1)
+
+    paths = []
+    for col, anchor_col in (("d_collateral", "collateral"), ("d_shares", "borrow_shares")):
+        delta = np.zeros((len(users), len(grid)))
+        np.add.at(delta, (p, h), deltas[col].to_numpy(dtype=float))
+        closing = anchors[anchor_col].reindex(users).fillna(0.0).to_numpy()
+        opening = np.maximum(closing - delta.sum(axis=1), 0.0)
+        paths.append(np.maximum(opening[:, None] + np.cumsum(delta, axis=1), 0.0))
+    return users, paths[0], paths[1]
+
+
+def _first_hour(mask: np.ndarray, grid: np.ndarray) -> np.ndarray:
+    """First grid timestamp where mask is True, per row (NaN if never)."""
+    hit = mask.any(axis=1)
+    return np.where(hit, grid[mask.argmax(axis=1)], np.nan)
+
+
+def replay_market(df_tx: pd.DataFrame, df_history: pd.DataFrame, df_anchor: pd.DataFrame,
+                  spot_usd: pd.Series, cfg: Dict, depeg_ts: int) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Replay one market. `spot_usd` is the collateral's USD price indexed by
+    hourly timestamp; `df_anchor` has user_address, collateral (raw) and
+    borrow_shares (raw). `cfg`: market_unique_key, label, lltv (fraction),
+    collateral_decimals, loan_decimals, is_vault_based.
+
+    Shares, not assets: a snapshot's borrow assets include the interest
+    accrued since the window ended (at 100% utilization, a lot), so they
+    can't be converted at an in-window share price. Check the result with
+    debt_check().
+
+    Returns (positions, hourly): one row per borrower, one row per hour.
+    """
+    if "borrow_shares" not in df_anchor.columns:
+        raise ValueError(f"{cfg['label']}: the anchor needs borrow_shares, not borrow assets")
+    grid = hour_grid(df_history)
+    share_px = borrow_share_price(df_tx, grid)
+
+    anchors = df_anchor.copy()
+    anchors["collateral"] = _num(anchors["collateral"])
+    anchors["borrow_shares"] = _num(anchors["borrow_shares"])
+
+    deltas = position_deltas(df_tx, share_px, grid)
+    users, coll_raw, shares = build_paths(deltas, anchors, grid)
+
+    # Loan asset USD price from the market's own supply (assets vs USD)
+    hist = df_history.assign(timestamp=df_history["timestamp"].astype("int64")).set_index("timestamp")
+    loan_units = _num(hist["supply_assets"]) / 10 ** cfg["loan_decimals"]
+    loan_usd = (_num(hist["supply_usd"]) / loan_units.where(loan_units > 0)).reindex(grid).ffill().bfill()
+    loan_usd = loan_usd.fillna(1.0).to_numpy()
+    coll_usd = spot_usd.reindex(grid).ffill().bfill().to_numpy(dtype=float)
+
+    spot_ratio = coll_usd / loan_usd
+    oracle_ratio, _ = oracle_path(spot_ratio, grid, depeg_ts, cfg["is_vault_based"])
+
+    coll = coll_raw / 10 ** cfg["collateral_decimals"]
+    debt = shares * share_px / 10 ** cfg["loan_decimals"]           # loan units
+    debt_usd = debt * loan_usd
+    debt = np.where(debt_usd >= DUST_USD, debt, 0.0)
+    debt_usd = np.where(debt > 0, debt_usd, 0.0)
+    lltv = cfg["lltv"]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        hf_spot = np.where(debt > 0, coll * spot_ratio * lltv / debt, np.inf)
+        hf_oracle = np.where(debt > 0, coll * oracle_ratio * lltv / debt, np.inf)
+
+    liq_spot = hf_spot < 1
+    liq_oracle = hf_oracle < 1
+    masked = liq_spot & ~liq_oracle
+
+    liquidated = deltas[deltas["type"] == "MarketLiquidation"].groupby("user_address")["timestamp"].min()
+    masked_from = _first_hour(masked, grid)
+    at = np.where(np.isnan(masked_from), 0, masked.argmax(axis=1))
+    rows = np.arange(len(users))
+
+    positions = pd.DataFrame({
+        "market_unique_key": cfg["market_unique_key"],
+        "market": cfg["label"],
+        "user_address": users,
+        "max_debt_usd": debt_usd.max(axis=1, initial=0.0),
+        "min_hf_spot": pd.Series(hf_spot.min(axis=1, initial=np.inf)).replace(np.inf, np.nan).to_numpy(),
+        "first_liquidatable_spot": _first_hour(liq_spot, grid),
+        "first_liquidatable_oracle": _first_hour(liq_oracle, grid),
+        "masked_from": masked_from,
+        "hours_masked": masked.sum(axis=1),
+        "debt_usd_at_masked": np.where(np.isnan(masked_from), np.nan, debt_usd[rows, at]),
+        "hf_spot_at_masked": np.where(np.isnan(masked_from), np.nan, hf_spot[rows, at]),
+        "hf_oracle_at_masked": np.where(np.isnan(masked_from), np.nan, hf_oracle[rows, at]),
+        "liquidated_at": users.map(liquidated).to_numpy(dtype=float),
+    })
+    positions = positions[positions["max_debt_usd"] > 0].sort_values("max_debt_usd", ascending=False)
+
+    borrowing = debt > 0
+    hourly = pd.DataFrame({
+        "timestamp": grid,
+        "market_unique_key": cfg["market_unique_key"],
+        "market": cfg["label"],
+        "collateral_price_usd": coll_usd,
+        "oracle_price_usd": oracle_ratio * loan_usd,
+        "n_borrowers": borrowing.sum(axis=0),
+        "debt_usd": debt_usd.sum(axis=0),
+        "n_liquidatable_spot": (liq_spot & borrowing).sum(axis=0),
+        "n_liquidatable_oracle": (liq_oracle & borrowing).sum(axis=0),
+        "n_masked": masked.sum(axis=0),
+        "debt_masked_usd": np.where(masked, debt_usd, 0.0).sum(axis=0),
+    })
+    return positions.reset_index(drop=True), hourly
+
+
+def debt_check(hourly: pd.DataFrame, df_history: pd.DataFrame) -> Tuple[float, float, float]:
+    """
+    Rebuilt total debt vs the market's recorded borrow_usd at the last history
+    hour: (rebuilt_usd, recorded_usd, error), error as a share of the window's
+    peak recorded borrow. Compare against DEBT_TOLERANCE.
+    """
+    hist = df_history.assign(timestamp=pd.to_numeric(df_history["timestamp"], errors="coerce"))
+    hist = hist.dropna(subset=["timestamp"]).sort_values("timestamp")
+    borrow = _num(hist["borrow_usd"])
+    end = int(hist["timestamp"].iloc[-1]) // HOUR * HOUR
+    rebuilt = float(hourly.loc[hourly["timestamp"] <= end, "debt_usd"].iloc[-1])
+    recorded = float(borrow.iloc[-1])
+    peak = float(borrow.max())
+    error = abs(rebuilt - recorded) / peak if peak > 0 else 0.0
+    return rebuilt, recorded, error
+
+
+def spot_series(df_prices: pd.DataFrame, symbol: str, chain_id: Optional[int] = None) -> pd.Series:
+    """
+    Hourly USD price for `symbol` indexed by timestamp: the market's own
+    chain if block5 priced it there, else one cross-chain series.
+    """
+    px = df_prices[df_prices["symbol"] == symbol]
+    if chain_id is not None and (px["chain_id"] == chain_id).any():
+        px = px[px["chain_id"] == chain_id]
+    px = dedupe_chains(px, keys=["symbol"], bucket="HOUR")
+    px = px.assign(timestamp=px["timestamp"].astype("int64") // HOUR * HOUR)
+    return px.groupby("timestamp")["price_usd"].last()
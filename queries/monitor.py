@@ -0,0 +1,539 @@
+"""
+Live Monitor — poll current market and vault state on a schedule.
+
+Every block backfills a fixed window once; the dashboard then shows static
+CSVs. The monitor is a long-running process that polls `state` for a watchlist
+of markets and vaults every --interval seconds, with the block1 market shape
+(utilization, supply / borrow / liquidity USD, oracle price, bad debt) and the
+block2 vault shape (sharePriceNumber, totalAssetsUsd, totalAssets):
+
+  - watchlist: the markets in block1_markets_graphql.csv and the vaults in
+    block1_vaults_graphql.csv (one batched query per chain and entity type)
+  - deltas only: a point is kept when any metric moved since the entity's
+    last point
+      market deltas → data/_store/live_markets.csv (appended)
+      vault deltas  → the vault history store (vault_history.py), interval
+                      "LIVE", and the bank-run detector (bank_run.py), whose
+                      state block3b saved; onsets → _store/live_bank_run_events.csv
+  - rolling window: the last --window-hours of points per entity stay in
+    memory, so the latest rows carry the change over the window
+  - alerts: every polled row (changed or not, at poll time) goes through the
+    alert rules (alerts.py); alerts → data/_store/alerts.jsonl and, with
+    --webhook, a POST per alert
+  - latest metrics → data/_live/markets.csv, vaults.csv, status.json (atomic
+    rename every poll); the dashboard reads these without a pipeline run
+
+Oracle-vs-spot gap is block1's: (oracle-implied collateral USD - spot) /
+oracle-implied, a fraction.
+
+--url (or MORPHO_GRAPHQL_URL) points it at another endpoint — standin_api.py
+serves a local one built from the block1 snapshot.
+
+Usage:
+    python queries/monitor.py                                   # every 5 min, forever
+    python queries/monitor.py --interval 60 --window-hours 6
+    python queries/standin_api.py --port 8765 --shock xUSD=-80 &
+    python queries/monitor.py --url http://127.0.0.1:8765/graphql --interval 2 --iterations 10 \
+        --webhook http://127.0.0.1:8765/webhook
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+import rate_limiter
+from alerts import AlertEngine, FileSink, WebhookSink, alert_line, entity_key, load_rules
+from bank_run import BankRunDetector, EVENT_COLS
+from vault_history import VaultHistoryStore, KEY_COLS, VALUE_COLS
+
+PROJECT_ROOT = Path(__file__).parent.parent
+load_dotenv(dotenv_path=PROJECT_ROOT / '.env')
+
+GRAPHQL_URL = "https://blue-api.morpho.org/graphql"
+URL_ENV = "MORPHO_GRAPHQL_URL"
+
+DEFAULT_INTERVAL = 300          # seconds between polls
+DEFAULT_WINDOW_HOURS = 24.0     # rolling in-memory window
+LIVE_SUBDIR = "_live"
+STORE_SUBDIR = "_store"
+LIVE_INTERVAL = "LIVE"          # vault history store interval for polled points
+
+MARKET_METRICS = ["utilization", "total_supply_usd", "total_borrow_usd", "liquidity_usd",
+                  "collateral_price_usd", "oracle_collateral_value_usd", "oracle_spot_gap_pct",
+                  "bad_debt_usd", "realized_bad_debt_usd"]
+VAULT_METRICS = ["share_price", "total_assets_usd"]
+
+# block1 market fields the monitor needs (state subset + prices + bad debt)
+MARKET_FIELDS = """
+    uniqueKey
+    lltv
+    loanAsset {
+      symbol
+      decimals
+      priceUsd
+    }
+    collateralAsset {
+      symbol
+      decimals
+      priceUsd
+    }
+    morphoBlue {
+      chain {
+        id
+        network
+      }
+    }
+    state {
+      timestamp
+      supplyAssetsUsd
+      borrowAssetsUsd
+      collateralAssetsUsd
+      liquidityAssetsUsd
+      utilization
+      price
+    }
+    badDebt {
+      usd
+    }
+    realizedBadDebt {
+      usd
+    }
+"""
+
+# block2 vault state fields
+VAULT_FIELDS = """
+    address
+    name
+    chain {
+      id
+      network
+    }
+    state {
+      timestamp
+      totalAssetsUsd
+      totalAssets
+      totalSupply
+      sharePriceNumber
+    }
+"""
+
+
+def query_graphql(url: str, query: str) -> dict:
+    headers = {"Content-Type": "application/json"}
+    resp = rate_limiter.post(url, json={"query": query}, headers=headers, timeout=60)
+    resp.raise_for_status()
+    return resp.json()
+
+
+def safe_float(val, default=np.nan) -> float:
+    try:
+        return float(val) if val is not None else default
+    except (TypeError, ValueError):
+        return default
+
+
+def ts_to_datetime(ts) -> str:
+    return datetime.fromtimestamp(float(ts), tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+# ═══════════════════════════════════════════════════════════════
+#  WATCHLIST + QUERIES
+# ═══════════════════════════════════════════════════════════════
+
+def load_watchlist(data_dir: Path) -> Dict[str, Dict[int, List[str]]]:
+    """{"markets": {chain_id: [uniqueKey]}, "vaults": {chain_id: [address]}} from block1."""
+    watch = {"markets": {}, "vaults": {}}
+    for kind, filename, key_col in (("markets", "block1_markets_graphql.csv", "market_id"),
+                                    ("vaults", "block1_vaults_graphql.csv", "vault_address")):
+        path = data_dir / filename
+        if not path.exists():
+            continue
+        df = pd.read_csv(path, usecols=[key_col, "chain_id"]).dropna().drop_duplicates()
+        for cid, grp in df.groupby("chain_id"):
+            watch[kind][int(cid)] = sorted(grp[key_col].astype(str).unique())
+    return watch
+
+
+def markets_query(chain_id: int, keys: List[str]) -> str:
+    keys_str = ", ".join(f'"{k}"' for k in keys)
+    return f"""
+    {{
+      markets(
+        first: {len(keys)}
+        where: {{
+          chainId_in: [{chain_id}]
+          uniqueKey_in: [{keys_str}]
+        }}
+      ) {{
+        items {{{MARKET_FIELDS}}}
+      }}
+    }}
+    """
+
+
+def vaults_query(chain_id: int, addresses: List[str]) -> str:
+    addr_str = ", ".join(f'"{a}"' for a in addresses)
+    return f"""
+    {{
+      vaults(
+        first: {len(addresses)}
+        where: {{
+          chainId_in: [{chain_id}]
+          address_in: [{addr_str}]
+        }}
+      ) {{
+        items {{{VAULT_FIELDS}}}
+      }}
+    }}
+    """
+
+
+def parse_market(item: Dict, polled_at: int) -> Dict:
+    """Flat metrics row; column names follow block1_markets_graphql.csv."""
+    state = item.get("state") or {}
+    loan = item.get("loanAsset") or {}
+    collateral = item.get("collateralAsset") or {}
+    chain = (item.get("morphoBlue") or {}).get("chain") or {}
+
+    spot = safe_float(collateral.get("priceUsd"), 0.0)
+    loan_px = safe_float(loan.get("priceUsd"), 0.0)
+    oracle_raw = int(float(state.get("price") or 0))
+    oracle_usd, gap = np.nan, np.nan
+    if spot > 0 and loan_px > 0 and oracle_raw > 0:
+        scale = 10 ** (36 + int(loan.get("decimals") or 18) - int(collateral.get("decimals") or 18))
+        oracle_usd = oracle_raw / scale * loan_px
+        if oracle_usd > 0:
+            gap = (oracle_usd - spot) / oracle_usd
+
+    return {
+        "timestamp": int(state.get("timestamp") or polled_at),
+        "market_id": item.get("uniqueKey"),
+        "chain": chain.get("network", ""),
+        "chain_id": int(chain.get("id") or 0),
+        "collateral_symbol": collateral.get("symbol", ""),
+        "loan_symbol": loan.get("symbol", ""),
+        "utilization": safe_float(state.get("utilization")),
+        "total_supply_usd": safe_float(state.get("supplyAssetsUsd")),
+        "total_borrow_usd": safe_float(state.get("borrowAssetsUsd")),
+        "liquidity_usd": safe_float(state.get("liquidityAssetsUsd")),
+        "collateral_price_usd": spot,
+        "oracle_collateral_value_usd": oracle_usd,
+        "oracle_spot_gap_pct": gap,
+        "bad_debt_usd": safe_float((item.get("badDebt") or {}).get("usd"), 0.0),
+        "realized_bad_debt_usd": safe_float((item.get("realizedBadDebt") or {}).get("usd"), 0.0),
+    }
+
+
+def parse_vault(item: Dict, polled_at: int) -> Dict:
+    """Flat metrics row; columns follow the vault history store."""
+    state = item.get("state") or {}
+    chain = item.get("chain") or {}
+    raw = state.get("totalAssets")
+    return {
+        "timestamp": int(state.get("timestamp") or polled_at),
+        "vault_address": str(item.get("address", "")).lower(),
+        "vault_name": item.get("name", ""),
+        "chain": chain.get("network", ""),
+        "chain_id": int(chain.get("id") or 0),
+        "share_price": safe_float(state.get("sharePriceNumber")),
+        "total_assets_usd": safe_float(state.get("totalAssetsUsd")),
+        "total_assets_raw": None if raw is None else str(raw),
+    }
+
+
+def poll(url: str, watch: Dict) -> Tuple[List[Dict], List[Dict], List[str]]:
+    """One round of queries: (market rows, vault rows, errors)."""
+    polled_at = int(time.time())
+    markets, vaults, errors = [], [], []
+    jobs = [("markets", cid, markets_query(cid, keys)) for cid, keys in watch["markets"].items()]
+    jobs += [("vaults", cid, vaults_query(cid, addrs)) for cid, addrs in watch["vaults"].items()]
+    for kind, cid, query in jobs:
+        try:
+            result = query_graphql(url, query)
+        except Exception as e:
+            errors.append(f"{kind} chain {cid}: {e}")
+            continue
+        if "errors" in result:
+            errors.append(f"{kind} chain {cid}: {result['errors'][0].get('message', '')[:100]}")
+            continue
+        items = ((result.get("data") or {}).get(kind) or {}).get("items") or []
+        if kind == "markets":
+            markets += [parse_market(m, polled_at) for m in items]
+        else:
+            vaults += [parse_vault(v, polled_at) for v in items]
+    return markets, vaults, errors
+
+
+# ═══════════════════════════════════════════════════════════════
+#  ROLLING WINDOW + DELTAS
+# ═══════════════════════════════════════════════════════════════
+
+def changed(prev: Optional[Dict], row: Dict, metrics: List[str]) -> bool:
+    """True if any metric differs from the entity's previous point (NaN-aware)."""
+    if prev is None:
+        return True
+    for col in metrics:
+        a, b = prev.get(col), row.get(col)
+        a_nan, b_nan = a is None or np.isnan(a), b is None or np.isnan(b)
+        if a_nan != b_nan or (not a_nan and not np.isclose(a, b, rtol=1e-9, atol=0.0)):
+            return True
+    return False
+
+
+class RollingWindow:
+    """Per-entity deque of (timestamp, row) holding the last `seconds` of points."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.points: Dict[Tuple, deque] = {}
+
+    def last(self, key: Tuple) -> Optional[Dict]:
+        q = self.points.get(key)
+        return q[-1][1] if q else None
+
+    def push(self, key: Tuple, ts: int, row: Dict):
+        q = self.points.setdefault(key, deque())
+        q.append((ts, row))
+        while len(q) > 1 and q[0][0] < ts - self.seconds:
+            q.popleft()
+
+    def first(self, key: Tuple) -> Optional[Dict]:
+        q = self.points.get(key)
+        return q[0][1] if q else None
+
+    def size(self, key: Tuple) -> int:
+        return len(self.points.get(key, ()))
+
+    def __len__(self) -> int:
+        return sum(len(q) for q in self.points.values())
+
+
+def _pct_change(new: float, old: float) -> float:
+    return (new / old - 1) * 100 if old and np.isfinite(old) and old != 0 else np.nan
+
+
+# ═══════════════════════════════════════════════════════════════
+#  MONITOR
+# ═══════════════════════════════════════════════════════════════
+
+class Monitor:
+    def __init__(self, data_dir: Path, url: str, window_hours: float = DEFAULT_WINDOW_HOURS,
+                 rules: Optional[List[str]] = None, webhook: Optional[str] = None):
+        self.data_dir = Path(data_dir)
+        self.url = url
+        self.window_hours = window_hours
+        self.watch = load_watchlist(self.data_dir)
+        self.store = VaultHistoryStore(self.data_dir)
+        self.detector = BankRunDetector.load(self.data_dir)
+        self.alerts = AlertEngine.load(self.data_dir, rules)
+        self.sinks = [FileSink(self.data_dir)] + ([WebhookSink(webhook)] if webhook else [])
+        self.markets = RollingWindow(window_hours * 3600)
+        self.vaults = RollingWindow(window_hours * 3600)
+        self.live_dir = self.data_dir / LIVE_SUBDIR
+        self.polls = 0
+
+    @property
+    def n_markets(self) -> int:
+        return sum(len(v) for v in self.watch["markets"].values())
+
+    @property
+    def n_vaults(self) -> int:
+        return sum(len(v) for v in self.watch["vaults"].values())
+
+    def step(self) -> Dict:
+        """Poll once, store deltas, refresh the latest files. Returns a summary."""
+        started = time.time()
+        markets, vaults, errors = poll(self.url, self.watch)
+        self.polls += 1
+
+        market_deltas = []
+        for row in markets:
+            key = (row["market_id"], row["chain_id"])
+            if changed(self.markets.last(key), row, MARKET_METRICS):
+                market_deltas.append(row)
+                self.markets.push(key, row["timestamp"], row)
+
+        vault_deltas, events = [], []
+        for row in vaults:
+            key = (row["vault_address"], row["chain_id"])
+            if changed(self.vaults.last(key), row, VAULT_METRICS):
+                vault_deltas.append(row)
+                self.vaults.push(key, row["timestamp"], row)
+                event = self.detector.update(row["vault_address"], row["chain_id"], row["timestamp"],
+                                             row["total_assets_usd"], row["share_price"], row["vault_name"])
+                if event:
+                    events.append(event)
+
+        # Alerts see every row at poll time, so `for 6h` runs on even when state doesn't move
+        fired = []
+        for row in markets:
+            label = f"{row['collateral_symbol']}/{row['loan_symbol']} ({row['chain']})"
+            fired += self.alerts.update(entity_key(row["market_id"], row["chain"]), int(started), row, label)
+        for row in vaults:
+            label = f"{row['vault_name']} ({row['chain']})"
+            fired += self.alerts.update(entity_key(row["vault_address"], row["chain"]), int(started), row, label)
+        for alert in fired:
+            for sink in self.sinks:
+                sink.send(alert)
+        self.alerts.save(self.data_dir)
+
+        self._append(STORE_SUBDIR, "live_markets.csv", pd.DataFrame(market_deltas))
+        self._append(STORE_SUBDIR, "live_bank_run_events.csv", pd.DataFrame(events, columns=EVENT_COLS))
+        if vault_deltas:
+            df = pd.DataFrame(vault_deltas).assign(interval=LIVE_INTERVAL)
+            for (addr, cid), grp in df.groupby(["vault_address", "chain_id"]):
+                self.store.upsert(grp[KEY_COLS + VALUE_COLS], addr, cid, LIVE_INTERVAL,
+                                  int(grp["timestamp"].min()), int(grp["timestamp"].max()))
+            self.store.save()
+            self.detector.save(self.data_dir)
+
+        summary = {
+            "polled_at": int(started),
+            "polled_at_utc": ts_to_datetime(started),
+            "url": self.url,
+            "poll": self.polls,
+            "markets": len(markets),
+            "vaults": len(vaults),
+            "market_deltas": len(market_deltas),
+            "vault_deltas": len(vault_deltas),
+            "bank_run_onsets": len(events),
+            "alerts_fired": sum(a["state"] == "FIRING" for a in fired),
+            "alerts_firing": len(self.alerts.firing()),
+            "alert_eval_us": round(self.alerts.mean_eval_us, 1),
+            "window_hours": self.window_hours,
+            "window_points": len(self.markets) + len(self.vaults),
+            "errors": errors,
+            "duration_s": round(time.time() - started, 2),
+        }
+        self._write_latest(summary)
+        for e in events:
+            print(f"  🚨 Bank-run onset: {e['vault_name']} [{e['trigger']}] "
+                  f"step {e['net_flow_pct']:+.1f}%  -{e['outflow_since_peak_pct']:.1f}% since peak")
+        for alert in fired:
+            print(alert_line(alert))
+        return summary
+
+    # ── outputs ──
+    def latest_markets(self) -> pd.DataFrame:
+        rows = []
+        for key in self.markets.points:
+            last, first = self.markets.last(key), self.markets.first(key)
+            window = [r for _, r in self.markets.points[key]]
+            rows.append({
+                **last,
+                "utilization_change_window": last["utilization"] - first["utilization"],
+                "oracle_spot_gap_max_window": np.nanmax([r["oracle_spot_gap_pct"] for r in window])
+                if any(np.isfinite(r["oracle_spot_gap_pct"]) for r in window) else np.nan,
+                "bad_debt_change_usd_window": last["bad_debt_usd"] - first["bad_debt_usd"],
+                "window_points": len(window),
+            })
+        return pd.DataFrame(rows)
+
+    def latest_vaults(self) -> pd.DataFrame:
+        states = self.detector.states
+        rows = []
+        for key in self.vaults.points:
+            last, first = self.vaults.last(key), self.vaults.first(key)
+            run = states.get(BankRunDetector._key(*key))
+            rows.append({
+                **{k: v for k, v in last.items() if k != "total_assets_raw"},
+                "share_price_change_pct_window": _pct_change(last["share_price"], first["share_price"]),
+                "tvl_change_pct_window": _pct_change(last["total_assets_usd"], first["total_assets_usd"]),
+                "in_bank_run": bool(run.in_run) if run else False,
+                "window_points": self.vaults.size(key),
+            })
+        return pd.DataFrame(rows)
+
+    def _append(self, subdir: str, filename: str, df: pd.DataFrame):
+        if df.empty:
+            return
+        path = self.data_dir / subdir / filename
+        path.parent.mkdir(parents=True, exist_ok=True)
+        df.to_csv(path, mode="a", header=not path.exists(), index=False)
+
+    def _write_latest(self, summary: Dict):
+        self.live_dir.mkdir(parents=True, exist_ok=True)
+        for name, df in (("markets.csv", self.latest_markets()), ("vaults.csv", self.latest_vaults())):
+            if df.empty:
+                continue
+            df["polled_at"] = summary["polled_at"]
+            tmp = self.live_dir / f"{name}.partial"
+            df.to_csv(tmp, index=False)
+            tmp.replace(self.live_dir / name)
+        tmp = self.live_dir / "status.json.partial"
+        tmp.write_text(json.dumps(summary, indent=1))
+        tmp.replace(self.live_dir / "status.json")
+
+
+# ═══════════════════════════════════════════════════════════════
+#  MAIN
+# ═══════════════════════════════════════════════════════════════
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Poll market / vault state on a schedule")
+    parser.add_argument("--url", default=os.environ.get(URL_ENV, GRAPHQL_URL),
+                        help=f"GraphQL endpoint (default: ${URL_ENV} or the Morpho API)")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="Seconds between polls")
+    parser.add_argument("--iterations", type=int, default=0, help="Stop after N polls (0 = run forever)")
+    parser.add_argument("--window-hours", type=float, default=DEFAULT_WINDOW_HOURS,
+                        help="Rolling in-memory window per entity")
+    parser.add_argument("--rules", type=Path, help="Alert rules file (one rule per line; default: alerts.DEFAULT_RULES)")
+    parser.add_argument("--webhook", help="POST each alert to this URL")
+    parser.add_argument("--data-dir", type=Path, default=PROJECT_ROOT / "data")
+    args = parser.parse_args(argv)
+
+    try:
+        monitor = Monitor(args.data_dir, args.url, args.window_hours,
+                          load_rules(args.rules) if args.rules else None, args.webhook)
+    except ValueError as e:
+        parser.error(str(e))
+    if not monitor.n_markets and not monitor.n_vaults:
+        print("❌ Empty watchlist — run block1_markets / block1_vaults first")
+        sys.exit(1)
+
+    print(f"\n{'═' * 70}")
+    print(f"  📡 Live Monitor")
+    print(f"{'═' * 70}")
+    print(f"  Endpoint:  {args.url}")
+    print(f"  Watchlist: {monitor.n_markets} markets, {monitor.n_vaults} vaults")
+    print(f"  Interval:  {args.interval:.0f}s   Window: {args.window_hours:g}h   "
+          f"Iterations: {args.iterations or '∞'}")
+    print(f"  Alerts:    {len(monitor.alerts.rules)} rules → {monitor.sinks[0].path}"
+          + (f" + {args.webhook}" if args.webhook else ""))
+    print(f"  Latest:    {monitor.live_dir}")
+
+    next_at = time.monotonic()
+    try:
+        while True:
+            s = monitor.step()
+            icon = "⚠️ " if s["errors"] else "✅"
+            print(f"  {icon} {s['polled_at_utc']}  poll {s['poll']}: "
+                  f"{s['markets']} markets ({s['market_deltas']} Δ), "
+                  f"{s['vaults']} vaults ({s['vault_deltas']} Δ)  {s['duration_s']:.1f}s")
+            for err in s["errors"]:
+                print(f"      ❌ {err}")
+            if args.iterations and monitor.polls >= args.iterations:
+                break
+            next_at += args.interval
+            time.sleep(max(0.0, next_at - time.monotonic()))
+    except KeyboardInterrupt:
+        print("\n  ⏹  Stopped")
+    finally:
+        for sink in monitor.sinks:
+            sink.close()
+
+    print(f"{'═' * 70}")
+
+
+if __name__ == "__main__":
+    main()
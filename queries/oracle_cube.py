@@ -0,0 +1,194 @@
+"""
+Oracle Cube — market × hour oracle-implied price vs spot, persisted as .npy.
+
+block2 (`L3_oracle_spot_gap_pct`) and block5 (`price_gap_pct`) compute one
+oracle/spot gap per market, at snapshot time. The cube holds the whole
+history: for every toxic market and every hour of block5's price history,
+
+    spot[m, h]       collateral spot price (USD, forward-filled)
+    oracle[m, h]     oracle-implied collateral price (USD, modelled below)
+    deviation[m, h]  (oracle - spot) / oracle × 100
+
+The API has no oracle price history, so each market's oracle path comes
+from its configuration and today's on-chain oracle price (oracle_price_raw):
+
+  - snapshot_flat   the oracle reports a price and spot is below half of it
+                    → a hardcoded / sticky feed; that price held over the window
+  - tracks_spot     the oracle reports a price close to spot → follows spot
+  - pre_depeg_flat  no usable oracle price (0 / reverted feed) and a
+                    vault-based oracle → the pre-depeg spot level held flat
+                    (the ERC4626 conversion doesn't see the depeg)
+  - tracks_spot     otherwise
+
+Arrays are saved under data/_store/oracle_cube/ (float32 .npy + markets.csv)
+and loaded with mmap_mode="r", so threshold queries — first hour above X%,
+hours above X%, longest window above X% (per market or per oracle
+architecture) — are vectorized scans over the mapped arrays.
+
+Built by block5_liquidation (TASK 7); read by hf_replay.py, alerts.py and the
+dashboard (utils/data_loader.py).
+"""
+
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+STORE_SUBDIR = "_store"
+CUBE_DIR = "oracle_cube"
+ARRAYS = ("spot", "oracle", "deviation")
+
+# Spot below this fraction of today's oracle price → the oracle is sticky
+STICKY_RATIO = 0.5
+
+MARKET_COLS = ["market_unique_key", "chain", "collateral_symbol", "loan_symbol",
+               "oracle_mechanism", "is_vault_based", "oracle_model"]
+
+
+def oracle_path(spot: np.ndarray, hours: np.ndarray, depeg_ts: int, is_vault_based: bool,
+                snapshot_price: float = np.nan, snapshot_spot: float = np.nan):
+    """
+    Modelled oracle price over `hours` for one market (same units as `spot`).
+    Returns (path, model name) — see the module docstring for the rules.
+    """
+    if np.isfinite(snapshot_price) and snapshot_price > 0:
+        if not np.isfinite(snapshot_spot) or snapshot_spot < STICKY_RATIO * snapshot_price:
+            return np.full(len(hours), snapshot_price), "snapshot_flat"
+        return spot, "tracks_spot"
+    if is_vault_based:
+        pre = spot[(hours < depeg_ts) & np.isfinite(spot)]
+        level = np.median(pre) if len(pre) else 1.0
+        return np.full(len(hours), level), "pre_depeg_flat"
+    return spot, "tracks_spot"
+
+
+def snapshot_oracle_usd(df_oracle: pd.DataFrame) -> pd.Series:
+    """Today's oracle collateral price in USD (NaN where the oracle reports 0 / nothing)."""
+    raw = pd.to_numeric(df_oracle["oracle_price_raw"], errors="coerce")
+    scale = 10.0 ** (36 + pd.to_numeric(df_oracle["loan_decimals"], errors="coerce")
+                     - pd.to_numeric(df_oracle["collateral_decimals"], errors="coerce"))
+    loan = pd.to_numeric(df_oracle["loan_spot_price_usd"], errors="coerce")
+    loan = loan.where(loan > 0, 1.0)
+    px = raw / scale * loan
+    return px.where(px > 0)
+
+
+def _runs(mask: np.ndarray):
+    """(row, start, length) of every run of True along axis 1."""
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    return rows, starts, ends - starts
+
+
+class OracleCube:
+    def __init__(self, markets: pd.DataFrame, hours: np.ndarray,
+                 spot: np.ndarray, oracle: np.ndarray, deviation: np.ndarray):
+        self.markets = markets.reset_index(drop=True)
+        self.hours = np.asarray(hours)
+        self.spot = spot
+        self.oracle = oracle
+        self.deviation = deviation
+
+    # ── build / persist ──
+    @classmethod
+    def build(cls, df_oracle: pd.DataFrame, price_grid: pd.DataFrame, market_series: pd.Series,
+              depeg_ts: int) -> "OracleCube":
+        """
+        `price_grid` is resampling.price_matrix() output (series × hourly
+        timestamps, forward-filled); `market_series` is each df_oracle row's
+        collateral series id in it. Markets without prices are left out.
+        """
+        hours = price_grid.columns.to_numpy(dtype="int64")
+        has = market_series.isin(price_grid.index).to_numpy()
+        m, series = df_oracle[has], market_series[has]
+        snap = snapshot_oracle_usd(m).to_numpy()
+        snap_spot = pd.to_numeric(m["collateral_spot_price_usd"], errors="coerce").to_numpy()
+
+        spot = price_grid.loc[series].to_numpy(dtype=float)
+        oracle = np.empty_like(spot)
+        models = []
+        vault = m["is_vault_based"].astype(str).str.lower().eq("true").to_numpy()
+        for i in range(len(m)):
+            oracle[i], model = oracle_path(spot[i], hours, depeg_ts, vault[i], snap[i], snap_spot[i])
+            models.append(model)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            deviation = np.where(oracle > 0, (oracle - spot) / oracle * 100, np.nan)
+
+        markets = m.assign(is_vault_based=vault, oracle_model=models)
+        return cls(markets[MARKET_COLS], hours, spot.astype(np.float32),
+                   oracle.astype(np.float32), deviation.astype(np.float32))
+
+    @staticmethod
+    def path(data_dir: Path) -> Path:
+        return Path(data_dir) / STORE_SUBDIR / CUBE_DIR
+
+    def save(self, data_dir: Path):
+        out = self.path(data_dir)
+        out.mkdir(parents=True, exist_ok=True)
+        for name in ARRAYS:
+            np.save(out / f"{name}.npy", np.ascontiguousarray(getattr(self, name)))
+        np.save(out / "hours.npy", self.hours)
+        self.markets.to_csv(out / "markets.csv", index=False)
+
+    @classmethod
+    def load(cls, data_dir: Path) -> Optional["OracleCube"]:
+        """Memory-mapped cube, or None if block5 hasn't built one."""
+        src = cls.path(data_dir)
+        if not (src / "markets.csv").exists():
+            return None
+        arrays = {name: np.load(src / f"{name}.npy", mmap_mode="r") for name in ARRAYS}
+        return cls(pd.read_csv(src / "markets.csv"), np.load(src / "hours.npy"), **arrays)
+
+    # ── queries ──
+    def above(self, threshold_pct: float) -> np.ndarray:
+        return np.nan_to_num(self.deviation, nan=-np.inf) > threshold_pct
+
+    def scan(self, threshold_pct: float) -> pd.DataFrame:
+        """Per market: first hour above the threshold, hours above, longest window, peak deviation."""
+        mask = self.above(threshold_pct)
+        hit = mask.any(axis=1)
+        first = np.where(hit, self.hours[mask.argmax(axis=1)], -1)
+
+        rows, starts, lengths = _runs(mask)
+        longest = np.zeros(len(self.markets), dtype=int)
+        longest_start = np.full(len(self.markets), -1)
+        if len(rows):
+            order = np.lexsort((-lengths, rows))                 # longest run first per market
+            best = order[np.r_[True, rows[order][1:] != rows[order][:-1]]]
+            longest[rows[best]] = lengths[best]
+            longest_start[rows[best]] = self.hours[starts[best]]
+
+        df = self.markets.copy()
+        df["first_above"] = pd.to_datetime(np.where(hit, first, np.nan), unit="s")
+        df["hours_above"] = mask.sum(axis=1)
+        df["longest_window_hours"] = longest
+        df["longest_window_start"] = pd.to_datetime(np.where(longest > 0, longest_start, np.nan), unit="s")
+        df["max_deviation_pct"] = np.nanmax(np.where(np.isnan(self.deviation), -np.inf, self.deviation), axis=1)
+        return df.sort_values(["first_above", "max_deviation_pct"], ascending=[True, False])
+
+    def by_architecture(self, threshold_pct: float, by: str = "oracle_mechanism") -> pd.DataFrame:
+        """scan() rolled up per oracle architecture: worst window, earliest breach."""
+        df = self.scan(threshold_pct)
+        return df.groupby(by).agg(
+            markets=("market_unique_key", "size"),
+            markets_above=("first_above", "count"),
+            earliest_above=("first_above", "min"),
+            max_window_hours=("longest_window_hours", "max"),
+            max_deviation_pct=("max_deviation_pct", "max"),
+        ).reset_index().sort_values("max_window_hours", ascending=False)
+
+    def frame(self) -> pd.DataFrame:
+        """Long format (market, hour, spot, oracle, deviation) — for charts."""
+        n_m, n_h = self.deviation.shape
+        return pd.DataFrame({
+            "market_unique_key": np.repeat(self.markets["market_unique_key"].to_numpy(), n_h),
+            "timestamp": pd.to_datetime(np.tile(self.hours, n_m), unit="s"),
+            "spot": np.asarray(self.spot).ravel(),
+            "oracle": np.asarray(self.oracle).ravel(),
+            "deviation_pct": np.asarray(self.deviation).ravel(),
+        })
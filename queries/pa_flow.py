@@ -0,0 +1,269 @@
+"""
+PA Flow — Public Allocator liquidity as a max-flow problem.
+
+block6 TASK 3 records each vault's Public Allocator flow caps (maxIn /
+maxOut per market) and TASK 2 its allocations, but a bridge in
+block6_contagion_bridges.csv only says *that* a vault links a toxic market to
+clean ones. AllocatorNetwork answers how much liquidity the Public Allocator
+could actually route into one stressed market, and through which vaults:
+
+    S ──liquidity──▶ source market ──min(maxOut, supply)──▶ vault ──maxIn──▶ target
+
+  - S → market: the market's withdrawable liquidity (shared by every vault
+    pulling from it — this is what makes it a flow problem, not a sum)
+  - market → vault: the vault's maxOut flow cap, bounded by what it supplies
+  - vault → target: the vault's maxIn flow cap into the stressed market
+
+The max flow is the most a permissionless reallocateTo() caller could move
+into the target before the curators reset caps. One reallocateTo moves one
+vault's flow, so route() also returns the fill curve: cumulative USD after
+the k largest vault transactions. With an observed PA transaction rate
+(pa_tx_rate(), from block6_pa_reallocations.csv) that becomes hours.
+
+Capacities are whole USD. scipy is an optional import: with it the solver is
+csgraph.maximum_flow (Dinic); without it a pure-Python Dinic on the same edge
+list, fine for a few thousand nodes.
+
+Used by: block6_contagion and the dashboard's Contagion section.
+"""
+
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+try:
+    import scipy.sparse as sp
+    from scipy.sparse.csgraph import maximum_flow
+except ImportError:
+    sp = None
+    maximum_flow = None
+
+# int32 ceiling for csgraph capacities; also stands in for "no liquidity limit"
+CAP_MAX = 2**31 - 1
+
+# Older block6 runs didn't record loan decimals / price with the flow caps
+LEGACY_LOAN_DECIMALS = {"USDC": 6, "USDT": 6, "PUSD": 6, "USDT0": 6, "PYUSD": 6}
+
+
+def _num(s: pd.Series) -> pd.Series:
+    return pd.to_numeric(s, errors="coerce").fillna(0.0)
+
+
+def caps_usd(df_pa_config: pd.DataFrame) -> pd.DataFrame:
+    """Flow caps converted from raw loan units to USD (max_in_usd, max_out_usd)."""
+    df = df_pa_config.copy()
+    if "loan_decimals" in df.columns:
+        decimals = _num(df["loan_decimals"])
+    else:
+        decimals = df["loan_symbol"].astype(str).str.upper().map(LEGACY_LOAN_DECIMALS).fillna(18)
+    price = _num(df["loan_price_usd"]) if "loan_price_usd" in df.columns else pd.Series(1.0, index=df.index)
+    price = price.where(price > 0, 1.0)
+    scale = price / 10.0 ** decimals
+    df["max_in_usd"] = _num(df["max_in"]) * scale
+    df["max_out_usd"] = _num(df["max_out"]) * scale
+    return df
+
+
+def max_flow(n: int, tails: np.ndarray, heads: np.ndarray, caps: np.ndarray, s: int, t: int):
+    """Max flow on a graph of n nodes with unique (tail, head) edges. Returns (value, flow per edge)."""
+    caps = np.minimum(np.asarray(caps, dtype=np.int64), CAP_MAX)
+    if len(tails) == 0:
+        return 0, np.zeros(0, dtype=np.int64)
+    if sp is not None:
+        graph = sp.csr_matrix((caps.astype(np.int32), (tails, heads)), shape=(n, n))
+        res = maximum_flow(graph, s, t, method="dinic")
+        flow = np.asarray(res.flow[tails, heads]).ravel()
+        return int(res.flow_value), np.maximum(flow, 0).astype(np.int64)
+    return _dinic(n, tails, heads, caps, s, t)
+
+
+def _dinic(n, tails, heads, caps, s, t):
+    # Residual graph as parallel lists; edge i and i ^ 1 are a forward/backward pair
+    to: List[int] = []
+    cap: List[int] = []
+    adj: List[List[int]] = [[] for _ in range(n)]
+    for u, v, c in zip(tails.tolist(), heads.tolist(), caps.tolist()):
+        adj[u].append(len(to)); to.append(v); cap.append(c)
+        adj[v].append(len(to)); to.append(u); cap.append(0)
+
+    total = 0
+    while True:
+        level = [-1] * n
+        level[s] = 0
+        q = deque([s])
+        while q:
+            u = q.popleft()
+            for e in adj[u]:
+                if cap[e] > 0 and level[to[e]] < 0:
+                    level[to[e]] = level[u] + 1
+                    q.append(to[e])
+        if level[t] < 0:
+            break
+        it = [0] * n
+
+        def push(u, f):
+            if u == t:
+                return f
+            while it[u] < len(adj[u]):
+                e = adj[u][it[u]]
+                v = to[e]
+                if cap[e] > 0 and level[v] == level[u] + 1:
+                    got = push(v, min(f, cap[e]))
+                    if got:
+                        cap[e] -= got
+                        cap[e ^ 1] += got
+                        return got
+                it[u] += 1
+            return 0
+
+        while True:
+            f = push(s, CAP_MAX)
+            if not f:
+                break
+            total += f
+    # Flow on each original edge = its backward residual
+    return total, np.array(cap[1::2], dtype=np.int64)
+
+
+def pa_tx_rate(df_pa_realloc: pd.DataFrame, start_ts: Optional[int] = None,
+               end_ts: Optional[int] = None) -> float:
+    """Observed Public Allocator reallocateTo transactions per hour (distinct tx hashes)."""
+    if df_pa_realloc.empty:
+        return 0.0
+    ts = pd.to_numeric(df_pa_realloc["timestamp"], errors="coerce")
+    keep = ts.notna()
+    if start_ts is not None:
+        keep &= ts >= start_ts
+    if end_ts is not None:
+        keep &= ts < end_ts
+    df = df_pa_realloc[keep]
+    if df.empty:
+        return 0.0
+    hours = max((ts[keep].max() - ts[keep].min()) / 3600, 1.0)
+    return df["hash"].nunique() / hours
+
+
+class AllocatorNetwork:
+    def __init__(self, df_pa_config: pd.DataFrame, df_alloc: pd.DataFrame,
+                 market_liquidity_usd: Optional[pd.Series] = None):
+        """
+        `df_pa_config`: block6_public_allocator_config.csv rows.
+        `df_alloc`: block6_vault_full_allocations.csv rows.
+        `market_liquidity_usd`: withdrawable liquidity per market_unique_key
+        (default: the allocations' market_liquidity_usd column when present,
+        otherwise no market-level limit).
+        """
+        caps = caps_usd(df_pa_config)[["vault_address", "market_unique_key", "max_in_usd", "max_out_usd"]]
+        alloc = df_alloc[["vault_address", "market_unique_key"]].assign(
+            supply_usd=_num(df_alloc["supply_assets_usd"]))
+        alloc = alloc.groupby(["vault_address", "market_unique_key"], as_index=False)["supply_usd"].sum()
+        self.edges = caps.merge(alloc, on=["vault_address", "market_unique_key"], how="left").fillna({"supply_usd": 0.0})
+
+        if market_liquidity_usd is None and "market_liquidity_usd" in df_alloc.columns:
+            market_liquidity_usd = (df_alloc.assign(liq=_num(df_alloc["market_liquidity_usd"]))
+                                    .groupby("market_unique_key")["liq"].max())
+        self.liquidity = market_liquidity_usd
+
+        labels = ["market_unique_key", "collateral_symbol", "loan_symbol"]
+        self.markets = (pd.concat([df_pa_config[labels], df_alloc[labels]])
+                        .drop_duplicates("market_unique_key").set_index("market_unique_key"))
+        names = pd.concat([df_pa_config[["vault_address", "vault_name"]], df_alloc[["vault_address", "vault_name"]]])
+        self.vault_names = names.drop_duplicates("vault_address").set_index("vault_address")["vault_name"]
+
+    def targets(self) -> List[str]:
+        """Markets at least one vault can route into (maxIn > 0)."""
+        return sorted(self.edges.loc[self.edges["max_in_usd"] >= 1, "market_unique_key"].unique())
+
+    def route(self, target: str, liquidity_pct: float = 100.0,
+              exclude_vaults: Sequence[str] = ()) -> Dict:
+        """
+        Max flow into `target`. `liquidity_pct` scales every source market's
+        withdrawable liquidity (a stress haircut); `exclude_vaults` drops
+        vaults from the network (e.g. ones whose curator already reset caps).
+        """
+        e = self.edges[~self.edges["vault_address"].isin(exclude_vaults)]
+        sink_edges = e[(e["market_unique_key"] == target) & (e["max_in_usd"] >= 1)]
+        src_edges = e[(e["market_unique_key"] != target)
+                      & e["vault_address"].isin(sink_edges["vault_address"])]
+        src_edges = src_edges.assign(cap=np.minimum(src_edges["max_out_usd"], src_edges["supply_usd"]))
+        src_edges = src_edges[src_edges["cap"] >= 1]
+
+        vaults = pd.Index(sink_edges["vault_address"].unique())
+        sources = pd.Index(src_edges["market_unique_key"].unique())
+        # Node ids: 0 = S, 1 = T, then source markets, then vaults
+        S, T = 0, 1
+        m_id = 2 + sources.get_indexer(src_edges["market_unique_key"])
+        v_base = 2 + len(sources)
+
+        if self.liquidity is not None:
+            liq = self.liquidity.reindex(sources).fillna(0.0).to_numpy() * liquidity_pct / 100
+        else:
+            liq = np.full(len(sources), float(CAP_MAX))
+        tails = np.concatenate([np.full(len(sources), S), m_id,
+                                v_base + np.arange(len(vaults))])
+        heads = np.concatenate([2 + np.arange(len(sources)),
+                                v_base + vaults.get_indexer(src_edges["vault_address"]),
+                                np.full(len(vaults), T)])
+        in_cap = sink_edges.groupby("vault_address")["max_in_usd"].sum().reindex(vaults).to_numpy()
+        caps = np.floor(np.concatenate([liq, src_edges["cap"].to_numpy(), in_cap])).astype(np.int64)
+
+        value, flow = max_flow(v_base + len(vaults), tails, heads, caps, S, T)
+
+        n_src = len(sources)
+        paths = src_edges[["vault_address", "market_unique_key"]].assign(
+            flow_usd=flow[n_src:n_src + len(src_edges)])
+        paths = paths[paths["flow_usd"] > 0].rename(columns={"market_unique_key": "source_market"})
+        by_vault = pd.DataFrame({
+            "vault_address": vaults,
+            "max_in_usd": in_cap,
+            "flow_usd": flow[n_src + len(src_edges):],
+        })
+        by_vault["vault_name"] = by_vault["vault_address"].map(self.vault_names)
+        by_vault = by_vault.sort_values("flow_usd", ascending=False).reset_index(drop=True)
+
+        moved = by_vault.loc[by_vault["flow_usd"] > 0, "flow_usd"]
+        fill = pd.DataFrame({"n_transactions": np.arange(1, len(moved) + 1),
+                             "cumulative_usd": moved.cumsum().to_numpy()})
+        return {
+            "target": target,
+            "max_flow_usd": float(value),
+            "inflow_cap_usd": float(in_cap.sum()),
+            "outflow_cap_usd": float(src_edges["cap"].sum()),
+            "vaults": by_vault,
+            "paths": paths.reset_index(drop=True),
+            "fill": fill,
+        }
+
+    def route_all(self, targets: Optional[Iterable[str]] = None, liquidity_pct: float = 100.0,
+                  tx_per_hour: float = 0.0, with_paths: bool = False):
+        """
+        route() for every target; one summary row each. With `with_paths`, also
+        returns every target's paths in one frame (target_market column), so
+        callers don't solve each target a second time.
+        """
+        rows, paths = [], []
+        for target in (self.targets() if targets is None else targets):
+            r = self.route(target, liquidity_pct)
+            if with_paths:
+                paths.append(r["paths"].assign(target_market=target))
+            n_tx = len(r["fill"])
+            label = self.markets.reindex([target]).iloc[0]
+            rows.append({
+                "market_unique_key": target,
+                "collateral_symbol": label.get("collateral_symbol"),
+                "loan_symbol": label.get("loan_symbol"),
+                "max_flow_usd": r["max_flow_usd"],
+                "inflow_cap_usd": r["inflow_cap_usd"],
+                "outflow_cap_usd": r["outflow_cap_usd"],
+                "n_vaults_routing": n_tx,
+                "n_source_markets": r["paths"]["source_market"].nunique(),
+                "binding": ("maxIn caps" if r["max_flow_usd"] >= r["inflow_cap_usd"] - 1
+                            else "source liquidity / maxOut"),
+                "hours_at_observed_rate": n_tx / tx_per_hour if tx_per_hour > 0 else np.nan,
+            })
+        summary = pd.DataFrame(rows).sort_values("max_flow_usd", ascending=False) if rows else pd.DataFrame()
+        if with_paths:
+            return summary, (pd.concat(paths, ignore_index=True) if paths else pd.DataFrame())
+        return summary
@@ -0,0 +1,119 @@
+"""
+Paginator — concurrent page fan-out for first/skip GraphQL list queries.
+
+Every Morpho list query returns pageInfo.countTotal with the first page, so once
+page 1 is in we know every remaining offset up front. Instead of walking pages
+one at a time with a sleep in between, fetch_all_pages() fetches page 1, then
+dispatches all remaining offsets on a small thread pool (MAX_WORKERS is the
+concurrency budget) and reassembles the pages in offset order. iter_pages()
+yields the pages one by one in that order, for callers that stream to disk.
+
+Rows can shift between pages while we read (e.g. new events landing during a
+Desc scan). To tolerate that, windows overlap by `overlap` rows
+(stride = page_size - overlap) and rows are de-duplicated by `key`, first
+occurrence wins. Without a key there is no way to dedup, so overlap is off.
+
+Used by: block1_markets, block1_vaults, block3_curator_B, block8_plume_deep_dive
+(through fetch_page callbacks that return (items, countTotal) or None).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+MAX_WORKERS = 4       # concurrent page requests per paginated query
+DEFAULT_OVERLAP = 10  # rows re-read at each page boundary (only when key is given)
+
+# fetch_page(skip, first) → (items, countTotal), or None if the page failed
+PageFetcher = Callable[[int, int], Optional[Tuple[List[Dict], int]]]
+
+
+def page_offsets(count_total: int, page_size: int, overlap: int = 0) -> List[int]:
+    """Offsets of every page after the first, for windows overlapping by `overlap` rows."""
+    stride = max(1, page_size - overlap)
+    # Stop once the previous window already reaches countTotal
+    return list(range(stride, count_total - overlap, stride))
+
+
+def _safe_fetch(fetch_page: PageFetcher, skip: int, first: int) -> Optional[Tuple[List[Dict], int]]:
+    try:
+        return fetch_page(skip, first)
+    except Exception as e:
+        print(f"      ❌ Page at skip={skip} raised: {e}")
+        return None
+
+
+def iter_pages(
+    fetch_page: PageFetcher,
+    page_size: int,
+    key: Optional[Callable[[Dict], Any]] = None,
+    overlap: int = DEFAULT_OVERLAP,
+    max_workers: int = MAX_WORKERS,
+) -> Iterator[List[Dict]]:
+    """
+    Yield each page's items in offset order, de-duplicated by `key` when given.
+
+    Page 1 is fetched alone to learn countTotal; the remaining offsets are then
+    fetched concurrently and yielded as soon as every earlier page is in, so a
+    caller can stream rows to disk without holding the whole result. Failed
+    pages are reported and skipped — rows from pages that did succeed are
+    still yielded (same as the old loops, which kept everything fetched before
+    the failing page).
+    """
+    if key is None:
+        overlap = 0
+    overlap = max(0, min(overlap, page_size - 1))
+    seen = set()
+
+    def dedup(items: List[Dict]) -> List[Dict]:
+        if key is None:
+            return items
+        fresh = []
+        for item in items:
+            k = key(item)
+            if k in seen:
+                continue
+            seen.add(k)
+            fresh.append(item)
+        return fresh
+
+    first_page = _safe_fetch(fetch_page, 0, page_size)
+    if first_page is None:
+        return
+    items, count_total = first_page
+    items = items or []
+    count_total = count_total or 0
+    yield dedup(items)
+
+    if not items or count_total <= len(items):
+        return
+
+    offsets = page_offsets(count_total, page_size, overlap)
+    workers = max(1, min(max_workers, len(offsets)))
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_safe_fetch, fetch_page, skip, page_size) for skip in offsets]
+        # Consume in submission (= offset) order; later pages keep downloading meanwhile
+        for skip, fut in zip(offsets, futures):
+            result = fut.result()
+            if result is None:
+                failed.append(skip)
+                continue
+            yield dedup(result[0] or [])
+
+    if failed:
+        print(f"      ⚠️  {len(failed)}/{len(offsets) + 1} pages failed (skip={failed[:5]}"
+              f"{'...' if len(failed) > 5 else ''})")
+
+
+def fetch_all_pages(
+    fetch_page: PageFetcher,
+    page_size: int,
+    key: Optional[Callable[[Dict], Any]] = None,
+    overlap: int = DEFAULT_OVERLAP,
+    max_workers: int = MAX_WORKERS,
+) -> List[Dict]:
+    """All items of a first/skip query in offset order (see iter_pages)."""
+    all_items: List[Dict] = []
+    for page in iter_pages(fetch_page, page_size, key, overlap, max_workers):
+        all_items.extend(page)
+    return all_items
@@ -0,0 +1,214 @@
+"""
+Rate Limiter — adaptive token bucket shared by every block (and every process).
+
+Replaces the fixed REQUEST_DELAY / API_DELAY / DELAY sleeps. Instead of sleeping
+0.3s after every call whether or not the API is under pressure, each request
+takes a token from a bucket refilled at `rate` requests/second:
+
+  - healthy responses ramp the rate up additively (RATE_STEP per success)
+  - HTTP 429 / 503 or a GraphQL "rate limit" error halves the rate and blocks
+    all callers until Retry-After has passed (DEFAULT_RETRY_AFTER if absent)
+
+The bucket state lives in a small JSON file guarded by an flock, so blocks run
+in parallel processes share one budget against the Morpho API. Where fcntl is
+not available (Windows) the bucket is process-wide only.
+
+Every block's post_graphql goes through post(); stats() feeds the runner's
+per-block summary.
+
+Environment overrides: MORPHO_RATE_INITIAL, MORPHO_RATE_MAX, MORPHO_RATE_STATE.
+"""
+
+import os
+import json
+import time
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+import requests
+
+import telemetry
+
+try:
+    import fcntl
+except ImportError:  # Windows — fall back to an in-process bucket
+    fcntl = None
+
+INITIAL_RATE = float(os.environ.get("MORPHO_RATE_INITIAL", "4.0"))  # req/s at start
+MAX_RATE = float(os.environ.get("MORPHO_RATE_MAX", "15.0"))  # API allows 5000 req / 5 min
+MIN_RATE = 0.5
+RATE_STEP = 0.1             # additive increase per healthy response
+BACKOFF_FACTOR = 0.5        # multiplicative decrease on a rate-limit hit
+BURST = 5.0                 # bucket capacity (tokens)
+DEFAULT_RETRY_AFTER = 2.0   # seconds, when the server doesn't say
+MAX_RATE_LIMIT_RETRIES = 5  # post() retries on 429 before handing the response back
+
+STATE_PATH = Path(os.environ.get(
+    "MORPHO_RATE_STATE",
+    Path(tempfile.gettempdir()) / "morpho_rate_limiter.json",
+))
+
+_lock = threading.Lock()
+_local_state: Dict = {}
+_stats = {"requests": 0, "rate_limit_hits": 0, "wait_s": 0.0}
+_stats_lock = threading.Lock()   # worker threads bump _stats concurrently
+
+
+# ═══════════════════════════════════════════════════════════════
+#  BUCKET STATE (file-backed, flock-guarded)
+# ═══════════════════════════════════════════════════════════════
+
+def _fresh_state(now: float) -> Dict:
+    return {"tokens": BURST, "updated": now, "rate": INITIAL_RATE, "blocked_until": 0.0}
+
+
+def _with_state(update):
+    """Run update(state, now) under the thread + file lock and persist the result."""
+    with _lock:
+        now = time.time()
+        if fcntl is None:
+            global _local_state
+            if not _local_state:
+                _local_state = _fresh_state(now)
+            return update(_local_state, now)
+
+        STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(STATE_PATH, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or "{}")
+                except ValueError:
+                    state = {}
+                if not state:
+                    state = _fresh_state(now)
+                result = update(state, now)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _count(key: str, amount: float = 1):
+    with _stats_lock:
+        _stats[key] += amount
+
+
+def _refill(state: Dict, now: float):
+    elapsed = max(0.0, now - state["updated"])
+    state["tokens"] = min(BURST, state["tokens"] + elapsed * state["rate"])
+    state["updated"] = now
+
+
+# ═══════════════════════════════════════════════════════════════
+#  PUBLIC API
+# ═══════════════════════════════════════════════════════════════
+
+def acquire():
+    """Block until a token is available (or a Retry-After window has passed)."""
+    def take(state, now):
+        _refill(state, now)
+        if now < state["blocked_until"]:
+            return state["blocked_until"] - now
+        if state["tokens"] >= 1.0:
+            state["tokens"] -= 1.0
+            return 0.0
+        return (1.0 - state["tokens"]) / state["rate"]
+
+    while True:
+        wait = _with_state(take)
+        if wait <= 0:
+            return
+        _count("wait_s", wait)
+        time.sleep(wait)
+
+
+def on_success():
+    """Healthy response — ramp the rate up."""
+    def bump(state, now):
+        _refill(state, now)
+        state["rate"] = min(MAX_RATE, state["rate"] + RATE_STEP)
+    _with_state(bump)
+
+
+def on_rate_limited(retry_after: Optional[float] = None):
+    """Rate-limit hit — halve the rate and hold every caller until Retry-After."""
+    _count("rate_limit_hits")
+    telemetry.record_rate_limit()
+    wait = retry_after if retry_after and retry_after > 0 else DEFAULT_RETRY_AFTER
+
+    def back_off(state, now):
+        _refill(state, now)
+        state["rate"] = max(MIN_RATE, state["rate"] * BACKOFF_FACTOR)
+        state["tokens"] = 0.0
+        state["blocked_until"] = max(state["blocked_until"], now + wait)
+    _with_state(back_off)
+    print(f"      ⏳ Rate limited — backing off {wait:.1f}s (rate now {current_rate():.2f} req/s)")
+
+
+def current_rate() -> float:
+    """Current bucket refill rate in requests/second."""
+    return _with_state(lambda state, now: state["rate"])
+
+
+def stats() -> Dict:
+    """Counters for this process, plus the current shared rate."""
+    with _stats_lock:
+        counters = dict(_stats)
+    return {**counters, "rate": current_rate()}
+
+
+def _retry_after(resp: requests.Response) -> Optional[float]:
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def is_rate_limited(resp: requests.Response) -> bool:
+    """HTTP 429/503, or a GraphQL error body that mentions rate limiting."""
+    if resp.status_code in (429, 503):
+        return True
+    if b'"errors"' not in resp.content:
+        return False
+    try:
+        errors = resp.json().get("errors") or []
+    except ValueError:
+        return False
+    for err in errors:
+        msg = str(err.get("message", "")).lower()
+        if "rate limit" in msg or "too many requests" in msg:
+            return True
+    return False
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    """
+    Drop-in for requests.post: waits for a token, sends, and adapts the rate
+    to the response. Rate-limited responses are retried after Retry-After up to
+    MAX_RATE_LIMIT_RETRIES times; the last response is returned either way so
+    the caller's own error handling still applies.
+    """
+    body = kwargs.get("json")
+    request_key = hash((url, json.dumps(body, sort_keys=True, default=str))) if body is not None else None
+
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        acquire()
+        _count("requests")
+        started = time.perf_counter()
+        resp = requests.post(url, **kwargs)
+        telemetry.record_call(time.perf_counter() - started, len(resp.content), request_key)
+        if not is_rate_limited(resp):
+            on_success()
+            return resp
+        on_rate_limited(_retry_after(resp))
+    return resp
@@ -0,0 +1,139 @@
+"""
+Resampling — regular-grid alignment for price (and other) histories.
+
+block5 used to forward-fill sparse daily prices with a per-asset Python loop
+(one dict per missing day, daily data only), and the dashboard separately
+sorted + de-duplicated cross-chain prices. These helpers do the same jobs as
+vectorized operations over the whole long-format table:
+
+  - dedupe_chains(): one row per (series, timestamp bucket) when the same
+    asset is priced on several chains, preferring PREFERRED_CHAIN_ID then the
+    lowest chain id
+  - regular_grid(): reindex every series onto a regular HOUR / DAY grid with
+    a backward as-of join, forward-filling at most `max_gap` steps. On hourly
+    input with interval="DAY" this is the daily alignment (day D = last
+    observation at or before D 00:00 UTC, same as vault_history.resample_daily)
+  - price_matrix(): the gridded table pivoted to series × timestamp, for
+    engines that evaluate every market at every hour in one call
+
+Used by: block5_liquidation (daily asset prices), hf_replay.py and the
+dashboard's price loaders (utils/data_loader.py).
+"""
+
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+INTERVAL_SECONDS = {"HOUR": 3600, "DAY": 86400}
+
+PREFERRED_CHAIN_ID = 1  # Ethereum
+
+
+def floor_ts(ts, interval: str):
+    step = INTERVAL_SECONDS[interval]
+    return ts // step * step
+
+
+def dedupe_chains(df: pd.DataFrame, keys: Sequence[str], ts_col: str = "timestamp",
+                  chain_col: str = "chain_id", bucket: Optional[str] = None) -> pd.DataFrame:
+    """
+    Keep one row per (keys, timestamp) — or per (keys, `bucket` period) — when
+    a series is reported by several chains. Within a bucket the earliest
+    observation wins; ties go to PREFERRED_CHAIN_ID, then the lowest chain id.
+    """
+    if df.empty or chain_col not in df.columns:
+        return df
+    out = df.copy()
+    ts = out[ts_col]
+    if pd.api.types.is_datetime64_any_dtype(ts):
+        # Resolution-independent (pandas 3 parses to datetime64[us], not [ns])
+        secs = (ts - pd.Timestamp(0, tz=ts.dt.tz)) // pd.Timedelta("1s")
+    else:
+        secs = ts.astype("int64")
+    out["_bucket"] = floor_ts(secs, bucket) if bucket else secs
+    chain = pd.to_numeric(out[chain_col], errors="coerce")
+    out["_chain_rank"] = np.where(chain == PREFERRED_CHAIN_ID, -1, chain)
+    out = out.sort_values([*keys, "_bucket", ts_col, "_chain_rank"], kind="mergesort")
+    out = out.drop_duplicates([*keys, "_bucket"], keep="first")
+    return out.drop(columns=["_bucket", "_chain_rank"]).reset_index(drop=True)
+
+
+def regular_grid(df: pd.DataFrame, interval: str, keys: Sequence[str],
+                 value_cols: Sequence[str] = ("price_usd",), ts_col: str = "timestamp",
+                 start: Optional[int] = None, end: Optional[int] = None,
+                 max_gap: Optional[int] = None) -> pd.DataFrame:
+    """
+    Reindex each `keys` series onto a regular grid (unix seconds, aligned to
+    `interval`), carrying the last observation forward for at most `max_gap`
+    grid steps (None = no limit). Each series' grid runs from its first
+    observation to its last, or over [start, end] when given (so `end` can
+    carry a series past its last point); grid points with no observation in
+    reach are dropped.
+
+    All other columns of the observation are carried along. `filled` marks
+    grid points that are not an observation of their own; `source_ts` is the
+    timestamp of the observation used.
+    """
+    if df.empty:
+        return df.assign(filled=pd.Series(dtype=bool), source_ts=pd.Series(dtype="int64"))
+    step = INTERVAL_SECONDS[interval]
+    keys = list(keys)
+
+    obs = df.dropna(subset=list(value_cols), how="all").copy()
+    obs[ts_col] = obs[ts_col].astype("int64")
+    obs = obs.sort_values(ts_col).drop_duplicates([*keys, ts_col], keep="last")
+
+    # One grid per series: [ceil(first), floor(last)], or [start, end] when given
+    bounds = obs.groupby(keys, sort=False)[ts_col].agg(["min", "max"]).reset_index()
+    lo = -(-bounds["min"] // step) * step
+    hi = bounds["max"] // step * step
+    if start is not None:
+        lo = pd.Series(-(-start // step) * step, index=bounds.index)
+    if end is not None:
+        hi = pd.Series(end // step * step, index=bounds.index)
+    counts = np.maximum(((hi - lo) // step + 1).to_numpy(), 0)
+    if counts.sum() == 0:
+        return obs.iloc[0:0].assign(filled=pd.Series(dtype=bool), source_ts=pd.Series(dtype="int64"))
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    grid = bounds.loc[np.repeat(bounds.index, counts), keys].reset_index(drop=True)
+    grid = grid.astype(obs[keys].dtypes.to_dict())   # groupby may infer str for object keys
+    grid[ts_col] = np.repeat(lo.to_numpy(), counts) + offsets * step
+
+    obs = obs.rename(columns={ts_col: "source_ts"})
+    obs[ts_col] = obs["source_ts"]
+    out = pd.merge_asof(
+        grid.sort_values(ts_col), obs.sort_values(ts_col),
+        on=ts_col, by=keys, direction="backward",
+        tolerance=None if max_gap is None else max_gap * step,
+    )
+    out = out.dropna(subset=["source_ts"])
+    out["source_ts"] = out["source_ts"].astype("int64")
+    out["filled"] = out["source_ts"] != out[ts_col]
+    return out.sort_values([*keys, ts_col]).reset_index(drop=True)
+
+
+def price_matrix(df: pd.DataFrame, interval: str, keys: Sequence[str],
+                 value_col: str = "price_usd", ts_col: str = "timestamp",
+                 start: Optional[int] = None, end: Optional[int] = None,
+                 max_gap: Optional[int] = None) -> pd.DataFrame:
+    """
+    Gridded series pivoted wide: one row per series ("|"-joined `keys`,
+    lowercased), one column per grid timestamp. Missing points are NaN.
+    """
+    gridded = regular_grid(df, interval, keys, (value_col,), ts_col, start, end, max_gap)
+    if gridded.empty:
+        return pd.DataFrame()
+    series = series_id(gridded, keys)
+    return gridded.assign(series=series).pivot_table(
+        index="series", columns=ts_col, values=value_col, aggfunc="last"
+    )
+
+
+def series_id(df: pd.DataFrame, keys: Sequence[str]) -> pd.Series:
+    """"|"-joined, lowercased key columns — the row label used by price_matrix()."""
+    parts: List[pd.Series] = [df[k].astype(str).str.lower() for k in keys]
+    out = parts[0]
+    for p in parts[1:]:
+        out = out + "|" + p
+    return out
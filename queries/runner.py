@@ -3,15 +3,19 @@ Query Runner — Runs block query scripts in dependency order.
 
 Scripts read/write from: PROJECT_ROOT / data / <file>.csv
 Runner patches PROJECT_ROOT to repo root so scripts find the right path.
+Each run writes a JSON run report to data/_runs/ (see telemetry.py).
 
 Usage:
     python queries/runner.py                    # Run all blocks
     python queries/runner.py block1_markets     # Run single block
     python queries/runner.py --from block2_bad_debt
+    python queries/runner.py --resume           # Continue an interrupted run
     python queries/runner.py --list
 """
 
+import os
 import sys
+import json
 import time
 import argparse
 import importlib
@@ -20,6 +24,13 @@ from pathlib import Path
 QUERIES_DIR = Path(__file__).parent
 REPO_ROOT = QUERIES_DIR.parent
 DATA_DIR = REPO_ROOT / "data"
+# Blocks completed by the current/last run — lets --resume skip them
+RUN_STATE_PATH = DATA_DIR / "_checkpoints" / "runner.json"
+
+if str(QUERIES_DIR) not in sys.path:
+    sys.path.insert(0, str(QUERIES_DIR))
+
+import telemetry
 
 BLOCKS = [
     {
@@ -51,6 +62,8 @@ BLOCKS = [
             "block2_share_prices_daily.csv",
             "block2_share_prices_hourly.csv",
             "block2_share_price_summary.csv",
+            "block2_share_price_drawdowns.csv",
+            "block2_share_price_change_points.csv",
         ],
         "inputs": ["block1_vaults_graphql.csv"],
     },
@@ -88,6 +101,8 @@ BLOCKS = [
             "block3_market_utilization_hourly.csv",
             "block3_market_utilization_daily.csv",
             "block3_vault_net_flows.csv",
+            "block3_vault_net_flows_hourly.csv",
+            "block3_bank_run_events.csv",
             "block3_stress_comparison.csv",
         ],
         "inputs": [
@@ -109,6 +124,7 @@ BLOCKS = [
             "block5_borrower_positions.csv",
             "block5_liquidation_events.csv",
             "block5_ltv_analysis.csv",
+            "block5_ltv_history.csv",
         ],
         "inputs": ["block1_markets_graphql.csv"],
     },
@@ -122,7 +138,9 @@ BLOCKS = [
             "block6_public_allocator_config.csv",
             "block6_vault_reallocations.csv",
             "block6_pa_reallocations.csv",
-            "block6_contagion_summary.csv",
+            "block6_contagion_exposure.csv",
+            "block6_pa_max_flow.csv",
+            "block6_pa_flow_paths.csv",
         ],
         "inputs": ["block1_vaults_graphql.csv", "block1_markets_graphql.csv"],
     },
@@ -145,24 +163,46 @@ BLOCKS = [
             "block8_plume_borrower_positions.csv",
             "block8_eth_transactions.csv",
             "block8_eth_market_history.csv",
+            "block8_eth_borrower_positions.csv",
             "block8_oracle_comparison.csv",
+            "block8_hf_replay_positions.csv",
+            "block8_hf_replay_hourly.csv",
         ],
-        "inputs": [],
+        "inputs": [],  # HF replay also reads block5 asset prices when present
     },
 ]
 
 
-def patch_and_run(block: dict):
+def block_report_entry(block: dict, status: str, start: float, wait_before: float) -> dict:
+    """Telemetry for one block: API counters, wall time, rows per output, peak RSS."""
+    import rate_limiter
+    rl = rate_limiter.stats()
+    rows_written = {}
+    for name in block["outputs"]:
+        path = DATA_DIR / name
+        # Only count outputs this run actually (re)wrote
+        if path.exists() and path.stat().st_mtime >= start:
+            rows_written[name] = telemetry.count_rows(path)
+    rss = telemetry.peak_rss_mb()
+    return {
+        "name": block["name"],
+        "status": status,
+        "wall_s": round(time.time() - start, 2),
+        **telemetry.snapshot(),
+        "rate_wait_s": round(rl["wait_s"] - wait_before, 2),
+        "rate_end": round(rl["rate"], 2),
+        "rows_written": rows_written,
+        "peak_rss_mb": round(rss, 1) if rss is not None else None,
+    }
+
+
+def patch_and_run(block: dict, report: telemetry.RunReport = None):
     """Import block module, ensure PROJECT_ROOT points to repo root, call main()."""
     module_name = block["module"]
     print(f"\n{'=' * 70}")
     print(f"▶ Running: {block['name']} — {block['description']}")
     print(f"{'=' * 70}")
 
-    queries_dir = str(QUERIES_DIR)
-    if queries_dir not in sys.path:
-        sys.path.insert(0, queries_dir)
-
     if module_name in sys.modules:
         mod = importlib.reload(sys.modules[module_name])
     else:
@@ -174,35 +214,85 @@ def patch_and_run(block: dict):
 
     DATA_DIR.mkdir(parents=True, exist_ok=True)
 
+    import rate_limiter
+    telemetry.reset()
+    wait_before = rate_limiter.stats()["wait_s"]
     start = time.time()
+    status = "failed"
     try:
         mod.main()
+        status = "ok"
         elapsed = time.time() - start
-        print(f"\n  ✅ {block['name']} completed in {elapsed:.1f}s")
-    except Exception as e:
+        print(f"\n  ✅ {block['name']} completed in {elapsed:.1f}s "
+              f"(API rate now {rate_limiter.current_rate():.1f} req/s)")
+    except BaseException as e:
         elapsed = time.time() - start
         print(f"\n  ❌ {block['name']} FAILED after {elapsed:.1f}s: {e}")
         raise
+    finally:
+        entry = block_report_entry(block, status, start, wait_before)
+        print(f"  📈 {entry['api_calls']} API calls, {entry['bytes_received'] / 1e6:.1f} MB, "
+              f"p90 {entry['latency_ms']['p90']:.0f} ms, {entry['retries']} retries, "
+              f"{entry['rate_limit_hits']} rate-limit hits")
+        if report is not None:
+            report.add_block(entry)
 
 
 def check_inputs(block: dict) -> list:
     return [f for f in block["inputs"] if not (DATA_DIR / f).exists()]
 
 
-def run_blocks(block_names: list, skip_missing: bool = False):
+def load_run_state() -> dict:
+    if not RUN_STATE_PATH.exists():
+        return {}
+    try:
+        return json.loads(RUN_STATE_PATH.read_text())
+    except ValueError:
+        return {}
+
+
+def save_run_state(state: dict):
+    RUN_STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    RUN_STATE_PATH.write_text(json.dumps(state, indent=2))
+
+
+def run_blocks(block_names: list, skip_missing: bool = False, resume: bool = False):
     DATA_DIR.mkdir(parents=True, exist_ok=True)
-    for block in BLOCKS:
-        if block["name"] not in block_names:
-            continue
-        missing = check_inputs(block)
-        if missing:
-            if skip_missing:
-                print(f"\n⚠️  Skipping {block['name']} — missing inputs: {missing}")
+
+    # --resume: skip blocks the interrupted run already finished, and let
+    # blocks with checkpoints (see checkpoint.py) skip finished work units
+    completed = []
+    if resume:
+        os.environ["MORPHO_RESUME"] = "1"
+        completed = load_run_state().get("completed", [])
+    run_state = {"blocks": block_names, "completed": list(completed)}
+    report = telemetry.RunReport(DATA_DIR)
+    run_status = "failed"
+
+    try:
+        for block in BLOCKS:
+            if block["name"] not in block_names:
                 continue
-            else:
-                print(f"\n❌ Cannot run {block['name']} — missing inputs: {missing}")
-                sys.exit(1)
-        patch_and_run(block)
+            if block["name"] in completed:
+                print(f"\n⏭️  Skipping {block['name']} — completed in previous run")
+                continue
+            missing = check_inputs(block)
+            if missing:
+                if skip_missing:
+                    print(f"\n⚠️  Skipping {block['name']} — missing inputs: {missing}")
+                    continue
+                else:
+                    print(f"\n❌ Cannot run {block['name']} — missing inputs: {missing}")
+                    sys.exit(1)
+            patch_and_run(block, report)
+            run_state["completed"].append(block["name"])
+            save_run_state(run_state)
+        run_status = "ok"
+    finally:
+        report.finish(run_status)
+
+    if RUN_STATE_PATH.exists():
+        RUN_STATE_PATH.unlink()
     print(f"\n{'=' * 70}")
     print(f"✅ Pipeline complete. CSVs in: {DATA_DIR}")
     print(f"{'=' * 70}")
@@ -224,6 +314,8 @@ def main():
     parser.add_argument("--list", action="store_true", help="List available blocks")
     parser.add_argument("--from", dest="from_block", help="Run from this block onwards")
     parser.add_argument("--skip-missing", action="store_true", help="Skip blocks with missing inputs")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted run: skip finished blocks and checkpointed work units")
 
     args = parser.parse_args()
 
@@ -252,7 +344,7 @@ def main():
 
     print(f"📋 Will run: {' → '.join(block_names)}")
     print(f"📁 Data dir: {DATA_DIR}")
-    run_blocks(block_names, skip_missing=args.skip_missing)
+    run_blocks(block_names, skip_missing=args.skip_missing, resume=args.resume)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,348 @@
+"""
+Shock Simulator — Monte Carlo collateral-price stress test over borrower positions.
+
+block5 explains the last incident after the fact (static LTV table). This
+asks the same question before the next one: apply thousands of correlated
+collateral price-shock scenarios to every borrower position at once and see
+which debt becomes liquidatable, how much bad debt each market books, and how
+much of it lands on each vault through its allocations.
+
+Inputs (all written by the pipeline, no API calls):
+  - block5_borrower_positions.csv     per-position collateral / borrow USD, HF
+  - block5_oracle_configs.csv         LLTV, oracle mechanism, market supply
+  - block6_vault_full_allocations.csv vault → market supply (loss pass-through)
+
+Scenario model (per collateral asset, over the shock horizon):
+
+    r = mean + vol * (sqrt(corr) * z_common + sqrt(1 - corr) * z_asset)
+
+one-factor Gaussian, so every pair of assets has correlation `corr`.
+`--shock SYMBOL=PCT` sets an asset's mean shock (e.g. sdeUSD=-30). Collateral
+value becomes collateral_usd * max(1 + r, 0).
+
+Per position and scenario (arrays: scenarios × positions):
+  - oracle tracks market (not vault-based): liquidatable when shocked
+    LTV > LLTV; bad debt = debt the seized collateral can't cover at the
+    Morpho Blue liquidation incentive (LIF)
+  - vault-based oracle: the oracle doesn't see the shock, so only positions
+    already below HF 1 are liquidatable; the rest of the shortfall
+    (debt - collateral) is hidden — the xUSD/deUSD failure mode
+  - market loss = bad debt + hidden shortfall, socialized pro rata across
+    suppliers; the vault-supplied part goes to vaults by allocation weight
+    (ContagionGraph.market_shares)
+
+Scenarios run in fixed-size shards, each with its own child seed
+(SeedSequence(seed).spawn), across worker processes. Results depend only on
+--seed and --scenarios, not on --workers.
+
+Usage:
+    python queries/shock_simulator.py --shock sdeUSD=-30
+    python queries/shock_simulator.py --shock xUSD=-50 --shock deUSD=-20 \\
+        --scenarios 20000 --vol 0.15 --corr 0.8 --seed 7 --workers 4
+
+Outputs (data/):
+  - shock_sim_scenarios.csv   one row per scenario: shocks, liquidatable debt, losses
+  - shock_sim_markets.csv     per market: mean / p95 / p99 bad debt, P(loss)
+  - shock_sim_vaults.csv      per vault: mean / p95 / p99 loss, % of vault TVL
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from contagion_graph import ContagionGraph
+
+# ── Project paths ──
+PROJECT_ROOT = Path(__file__).parent.parent
+
+POSITIONS_CSV = "block5_borrower_positions.csv"
+ORACLE_CSV = "block5_oracle_configs.csv"
+ALLOCATIONS_CSV = "block6_vault_full_allocations.csv"
+
+DEFAULT_SCENARIOS = 10_000
+DEFAULT_VOL = 0.10        # shock std dev over the horizon (10%)
+DEFAULT_CORR = 0.8        # pairwise correlation between collateral assets
+DEFAULT_SEED = 42
+SHARD_SIZE = 2_000        # scenarios per shard (fixed → results independent of workers)
+
+# Morpho Blue liquidation incentive: LIF = min(M, 1 / (β·LLTV + 1 − β))
+LIF_CAP = 1.15
+LIF_BETA = 0.3
+
+QUANTILES = [0.5, 0.95, 0.99]
+
+
+def liquidation_incentive(lltv: np.ndarray) -> np.ndarray:
+    return np.minimum(LIF_CAP, 1.0 / (LIF_BETA * lltv + (1.0 - LIF_BETA)))
+
+
+# ═══════════════════════════════════════════════════════════════
+#  INPUTS
+# ═══════════════════════════════════════════════════════════════
+
+def load_book(data_dir: Path) -> Dict:
+    """
+    Positions and markets as flat arrays, positions sorted by market so
+    per-market sums are one np.add.reduceat per shard.
+    """
+    pos = pd.read_csv(data_dir / POSITIONS_CSV)
+    pos = pos[pd.to_numeric(pos["borrow_assets_usd"], errors="coerce").fillna(0) > 0].copy()
+    oracle = pd.read_csv(data_dir / ORACLE_CSV).drop_duplicates("market_unique_key")
+    oracle = oracle.set_index("market_unique_key")
+
+    pos = pos[pos["market_unique_key"].isin(oracle.index)]
+    pos = pos.sort_values("market_unique_key", kind="mergesort").reset_index(drop=True)
+
+    markets = pd.Index(pos["market_unique_key"].unique())
+    market_idx = markets.get_indexer(pos["market_unique_key"])
+    assets = pd.Index(sorted(pos["collateral_symbol"].astype(str).unique()))
+
+    lltv = pos["market_unique_key"].map(oracle["lltv_pct"]).to_numpy(dtype=float) / 100
+    vault_based = pos["market_unique_key"].map(oracle["is_vault_based"]).astype(str).str.lower() == "true"
+    hf = pd.to_numeric(pos["health_factor"], errors="coerce")
+
+    return {
+        "markets": markets,
+        "assets": assets,
+        "market_starts": np.flatnonzero(np.r_[True, market_idx[1:] != market_idx[:-1]]),
+        "asset_idx": assets.get_indexer(pos["collateral_symbol"].astype(str)),
+        "collateral": pos["collateral_usd"].to_numpy(dtype=float),
+        "borrow": pos["borrow_assets_usd"].to_numpy(dtype=float),
+        "lltv": lltv,
+        "lif": liquidation_incentive(lltv),
+        "oracle_tracks": ~vault_based.to_numpy(),
+        "liquidatable_now": (hf.notna() & (hf < 1)).to_numpy(),
+        "market_supply": markets.map(oracle["supply_assets_usd"]).to_numpy(dtype=float),
+        "market_info": oracle.loc[markets, ["chain", "collateral_symbol", "loan_symbol", "lltv_pct",
+                                            "oracle_mechanism", "is_vault_based"]],
+        "n_positions": len(pos),
+    }
+
+
+def load_vault_weights(data_dir: Path, book: Dict):
+    """
+    Markets × vaults pass-through matrix: share of each market's total supply
+    held by each vault (rows sum to the vault-supplied fraction, ≤ 1).
+    """
+    path = data_dir / ALLOCATIONS_CSV
+    if not path.exists():
+        return None, pd.DataFrame()
+    df_alloc = pd.read_csv(path)
+    df_alloc = df_alloc[df_alloc["market_unique_key"].isin(book["markets"])]
+    graph = ContagionGraph(df_alloc, [])
+    if len(graph.vaults) == 0:
+        return None, pd.DataFrame()
+
+    shares = np.zeros((len(book["markets"]), len(graph.vaults)))
+    rows = book["markets"].get_indexer(graph.markets)
+    market_shares = graph.market_shares()
+    shares[rows] = market_shares.toarray() if hasattr(market_shares, "toarray") else market_shares
+    # Vaults only carry their slice of the market; direct suppliers take the rest
+    total = np.fmax(book["market_supply"], 0)
+    vault_supplied = np.zeros(len(book["markets"]))
+    vault_supplied[rows] = graph.market_supply
+    frac = np.divide(vault_supplied, total, out=np.ones_like(total), where=total > 0)
+    shares *= np.clip(frac, 0, 1)[:, None]
+
+    vaults = (df_alloc.drop_duplicates("vault_address").set_index("vault_address")
+              .loc[graph.vaults, ["vault_name", "chain_id", "vault_total_usd"]]
+              .rename_axis("vault_address").reset_index())
+    return shares, vaults
+
+
+# ═══════════════════════════════════════════════════════════════
+#  SIMULATION
+# ═══════════════════════════════════════════════════════════════
+
+def draw_shocks(rng: np.random.Generator, n: int, means: np.ndarray, vol: float, corr: float) -> np.ndarray:
+    """Scenarios × assets one-factor correlated returns."""
+    z_common = rng.standard_normal((n, 1))
+    z_asset = rng.standard_normal((n, len(means)))
+    return means + vol * (np.sqrt(corr) * z_common + np.sqrt(1 - corr) * z_asset)
+
+
+def simulate_shard(book: Dict, shocks: np.ndarray) -> Dict[str, np.ndarray]:
+    """Every position under every scenario of the shard (arrays scenarios × positions)."""
+    coll = book["collateral"] * np.maximum(1.0 + shocks[:, book["asset_idx"]], 0.0)
+    debt = book["borrow"]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ltv = np.where(coll > 0, debt / coll, np.inf)
+    liquidatable = np.where(book["oracle_tracks"], ltv > book["lltv"], book["liquidatable_now"])
+
+    bad = np.where(liquidatable, np.maximum(debt - coll / book["lif"], 0.0), 0.0)
+    hidden = np.where(liquidatable, 0.0, np.maximum(debt - coll, 0.0))
+    liq_debt = np.where(liquidatable, debt, 0.0)
+
+    starts = book["market_starts"]
+    return {
+        "liquidatable_debt": np.add.reduceat(liq_debt, starts, axis=1),
+        "bad_debt": np.add.reduceat(bad, starts, axis=1),
+        "hidden_shortfall": np.add.reduceat(hidden, starts, axis=1),
+    }
+
+
+def run_shard(book: Dict, seed_seq: np.random.SeedSequence, n: int,
+              means: np.ndarray, vol: float, corr: float) -> Dict[str, np.ndarray]:
+    rng = np.random.default_rng(seed_seq)
+    shocks = draw_shocks(rng, n, means, vol, corr)
+    return {"shocks": shocks, **simulate_shard(book, shocks)}
+
+
+def run_simulation(book: Dict, n_scenarios: int, means: np.ndarray, vol: float, corr: float,
+                   seed: int, workers: int) -> Dict[str, np.ndarray]:
+    sizes = [SHARD_SIZE] * (n_scenarios // SHARD_SIZE)
+    if n_scenarios % SHARD_SIZE:
+        sizes.append(n_scenarios % SHARD_SIZE)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [(book, s, n, means, vol, corr) for s, n in zip(seeds, sizes)]
+
+    if workers > 1 and len(args) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            shards = list(pool.map(run_shard, *zip(*args)))
+    else:
+        shards = [run_shard(*a) for a in args]
+    return {k: np.concatenate([s[k] for s in shards]) for k in shards[0]}
+
+
+# ═══════════════════════════════════════════════════════════════
+#  SUMMARIES
+# ═══════════════════════════════════════════════════════════════
+
+def _quantile_cols(values: np.ndarray, prefix: str) -> Dict[str, np.ndarray]:
+    q = np.quantile(values, QUANTILES, axis=0)
+    return {f"{prefix}_p{int(p * 100)}": q[i] for i, p in enumerate(QUANTILES)}
+
+
+def summarize_scenarios(book: Dict, result: Dict, vault_loss: Optional[np.ndarray]) -> pd.DataFrame:
+    df = pd.DataFrame(result["shocks"] * 100, columns=[f"shock_{a}_pct" for a in book["assets"]])
+    df.insert(0, "scenario", np.arange(len(df)))
+    df["liquidatable_debt_usd"] = result["liquidatable_debt"].sum(axis=1)
+    df["bad_debt_usd"] = result["bad_debt"].sum(axis=1)
+    df["hidden_shortfall_usd"] = result["hidden_shortfall"].sum(axis=1)
+    df["total_loss_usd"] = df["bad_debt_usd"] + df["hidden_shortfall_usd"]
+    df["vault_loss_usd"] = vault_loss.sum(axis=1) if vault_loss is not None else np.nan
+    return df
+
+
+def summarize_markets(book: Dict, result: Dict) -> pd.DataFrame:
+    loss = result["bad_debt"] + result["hidden_shortfall"]
+    df = book["market_info"].rename_axis("market_unique_key").reset_index()
+    df["supply_usd"] = book["market_supply"]
+    df["liquidatable_debt_mean"] = result["liquidatable_debt"].mean(axis=0)
+    df["bad_debt_mean"] = result["bad_debt"].mean(axis=0)
+    df["hidden_shortfall_mean"] = result["hidden_shortfall"].mean(axis=0)
+    for k, v in _quantile_cols(loss, "loss").items():
+        df[k] = v
+    df["prob_loss"] = (loss > 0).mean(axis=0)
+    return df.sort_values("loss_p99", ascending=False)
+
+
+def summarize_vaults(vaults: pd.DataFrame, vault_loss: np.ndarray) -> pd.DataFrame:
+    df = vaults.copy()
+    df["loss_mean"] = vault_loss.mean(axis=0)
+    for k, v in _quantile_cols(vault_loss, "loss").items():
+        df[k] = v
+    tvl = pd.to_numeric(df["vault_total_usd"], errors="coerce")
+    df["loss_p99_pct_of_tvl"] = (df["loss_p99"] / tvl.where(tvl > 0) * 100).round(2)
+    df["prob_loss"] = (vault_loss > 0).mean(axis=0)
+    return df.sort_values("loss_p99", ascending=False)
+
+
+# ═══════════════════════════════════════════════════════════════
+#  CLI
+# ═══════════════════════════════════════════════════════════════
+
+def parse_shocks(items: List[str]) -> Dict[str, float]:
+    """["sdeUSD=-30", ...] → {"sdeUSD": -0.30}"""
+    shocks = {}
+    for item in items or []:
+        symbol, sep, pct = item.partition("=")
+        if not sep:
+            raise argparse.ArgumentTypeError(f"--shock expects SYMBOL=PCT, got {item!r}")
+        shocks[symbol.strip()] = float(pct) / 100
+    return shocks
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Monte Carlo collateral-shock simulator")
+    parser.add_argument("--shock", action="append", metavar="SYMBOL=PCT",
+                        help="Mean shock for a collateral asset in %% (repeatable), e.g. sdeUSD=-30")
+    parser.add_argument("--scenarios", type=int, default=DEFAULT_SCENARIOS)
+    parser.add_argument("--vol", type=float, default=DEFAULT_VOL, help="Shock std dev (fraction)")
+    parser.add_argument("--corr", type=float, default=DEFAULT_CORR, help="Pairwise asset correlation [0, 1]")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--data-dir", type=Path, default=PROJECT_ROOT / "data")
+    args = parser.parse_args(argv)
+
+    if not 0 <= args.corr <= 1:
+        parser.error("--corr must be within [0, 1]")
+    data_dir = args.data_dir
+    missing = [f for f in (POSITIONS_CSV, ORACLE_CSV) if not (data_dir / f).exists()]
+    if missing:
+        print(f"❌ Missing inputs: {missing} — run block5_liquidation first")
+        sys.exit(1)
+
+    print(f"\n{'═' * 70}")
+    print(f"  🎲 Collateral Shock Simulator")
+    print(f"{'═' * 70}")
+
+    book = load_book(data_dir)
+    if book["n_positions"] == 0:
+        print("  ⚠️  No borrower positions with debt — nothing to simulate")
+        return
+    shares, vaults = load_vault_weights(data_dir, book)
+
+    shocks = parse_shocks(args.shock)
+    unknown = sorted(set(shocks) - set(book["assets"]))
+    if unknown:
+        print(f"  ⚠️  No positions use {', '.join(unknown)} as collateral — shock ignored")
+    means = np.array([shocks.get(a, 0.0) for a in book["assets"]])
+
+    print(f"\n  📂 {book['n_positions']} positions in {len(book['markets'])} markets, "
+          f"{len(vaults)} supplying vaults")
+    print(f"  Assets: " + ", ".join(f"{a} {m * 100:+.0f}%" for a, m in zip(book["assets"], means)))
+    print(f"  {args.scenarios:,} scenarios, vol {args.vol:.0%}, corr {args.corr:.2f}, "
+          f"seed {args.seed}, {args.workers} workers")
+
+    start = time.time()
+    result = run_simulation(book, args.scenarios, means, args.vol, args.corr, args.seed, args.workers)
+    vault_loss = None
+    if shares is not None:
+        vault_loss = (result["bad_debt"] + result["hidden_shortfall"]) @ shares
+    print(f"  ✅ Simulated in {time.time() - start:.1f}s")
+
+    df_scen = summarize_scenarios(book, result, vault_loss)
+    df_scen.to_csv(data_dir / "shock_sim_scenarios.csv", index=False)
+    df_markets = summarize_markets(book, result)
+    df_markets.to_csv(data_dir / "shock_sim_markets.csv", index=False)
+    if vault_loss is not None:
+        summarize_vaults(vaults, vault_loss).to_csv(data_dir / "shock_sim_vaults.csv", index=False)
+
+    print(f"\n  📊 Across scenarios (USD):")
+    for col in ["liquidatable_debt_usd", "bad_debt_usd", "hidden_shortfall_usd", "vault_loss_usd"]:
+        q = df_scen[col].quantile([0.5, 0.95, 0.99])
+        print(f"  {col:24s} p50 ${q[0.5]:>14,.0f}   p95 ${q[0.95]:>14,.0f}   p99 ${q[0.99]:>14,.0f}")
+
+    print(f"\n  Worst markets (p99 loss):")
+    for _, r in df_markets.head(5).iterrows():
+        print(f"  {r['collateral_symbol']}/{r['loan_symbol']} ({r['chain']}) "
+              f"{r['market_unique_key'][:10]}... p99 ${r['loss_p99']:,.0f} | P(loss) {r['prob_loss']:.0%}")
+
+    print(f"\n  Outputs:")
+    print(f"    shock_sim_scenarios.csv")
+    print(f"    shock_sim_markets.csv")
+    if vault_loss is not None:
+        print(f"    shock_sim_vaults.csv")
+    print(f"{'═' * 70}")
+
+
+if __name__ == "__main__":
+    main()
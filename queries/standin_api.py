@@ -0,0 +1,264 @@
+"""
+Stand-in API — a local GraphQL endpoint for the live monitor.
+
+Serves the two queries monitor.py sends — `markets(where: {chainId_in,
+uniqueKey_in})` and `vaults(where: {chainId_in, address_in})` — from the
+block1 snapshot CSVs, so the monitor can be exercised end to end without the
+Morpho API. Every request moves the state one tick, so each poll sees deltas:
+
+  - a seeded random walk on utilization, vault TVL and collateral spot price;
+    share prices accrue a little interest
+  - --shock SYMBOL=PCT: that collateral's spot price falls by PCT over --ramp
+    ticks while the oracle price (state.price) stays put; its markets run to
+    100% utilization and zero liquidity, bad debt grows to debt - collateral
+    value, and vaults exposed to it lose --outflow % of TVL per tick (a bank run)
+
+Anything else gets a GraphQL error, like the real API on an unknown query.
+POST /webhook is an alert receiver for alerts.py's WebhookSink: each alert is
+printed and kept, and GET /webhook returns the ones received so far.
+Standard library HTTP server, one process, state shared across requests.
+
+Usage:
+    python queries/standin_api.py --port 8765
+    python queries/standin_api.py --port 8765 --shock xUSD=-80 --ramp 5 --outflow 3
+    python queries/monitor.py --url http://127.0.0.1:8765/graphql --interval 2 --iterations 10
+"""
+
+import re
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+DEFAULT_PORT = 8765
+DEFAULT_SEED = 42
+DEFAULT_RAMP = 10           # ticks for a shock to play out
+DEFAULT_OUTFLOW_PCT = 2.0   # exposed vault TVL lost per tick while shocked
+
+# Random-walk step sizes per tick
+UTIL_STEP = 0.002
+TVL_STEP = 0.001
+PRICE_STEP = 0.0005
+SHARE_PRICE_ACCRUAL = 1e-6
+
+
+def _in_list(query: str, field: str) -> Optional[List[str]]:
+    """Values of `field: [...]` in the query text (quotes stripped), or None."""
+    m = re.search(rf"{field}\s*:\s*\[([^\]]*)\]", query)
+    if not m:
+        return None
+    return [v.strip().strip('"').lower() for v in m.group(1).split(",") if v.strip()]
+
+
+class StandinState:
+    def __init__(self, data_dir: Path, seed: int = DEFAULT_SEED, shocks: Optional[Dict[str, float]] = None,
+                 ramp: int = DEFAULT_RAMP, outflow_pct: float = DEFAULT_OUTFLOW_PCT):
+        self.rng = np.random.default_rng(seed)
+        self.shocks = shocks or {}
+        self.ramp = max(int(ramp), 1)
+        self.outflow = outflow_pct / 100
+        self.ticks = 0
+        self.lock = threading.Lock()
+        self.alerts: List[Dict] = []
+
+        markets = pd.read_csv(data_dir / "block1_markets_graphql.csv", dtype={"oracle_price_raw": str})
+        self.markets = markets.drop_duplicates(["market_id", "chain_id"]).reset_index(drop=True)
+        for col in ["utilization", "total_supply_usd", "total_borrow_usd", "total_collat_usd",
+                    "liquidity_usd", "collateral_price_usd", "loan_price_usd", "bad_debt_usd",
+                    "realized_bad_debt_usd"]:
+            self.markets[col] = pd.to_numeric(self.markets[col], errors="coerce").fillna(0.0)
+        self.base = self.markets.copy()
+
+        vaults = pd.read_csv(data_dir / "block1_vaults_graphql.csv")
+        vaults["vault_address"] = vaults["vault_address"].str.lower()
+        exposed = vaults[pd.to_numeric(vaults["supply_assets_usd"], errors="coerce").fillna(0) > 0]
+        self.exposure = exposed.groupby(["vault_address", "chain_id"])["collateral_symbol"].agg(set).to_dict()
+        self.vaults = vaults.drop_duplicates(["vault_address", "chain_id"]).reset_index(drop=True)
+        for col in ["vault_total_assets_usd", "vault_total_assets", "vault_total_supply_shares", "vault_share_price"]:
+            self.vaults[col] = pd.to_numeric(self.vaults[col], errors="coerce").fillna(0.0)
+
+    # ── state ──
+    def tick(self):
+        self.ticks += 1
+        m, v, rng = self.markets, self.vaults, self.rng
+
+        m["utilization"] = (m["utilization"] + rng.normal(0, UTIL_STEP, len(m))).clip(0, 1)
+        m["collateral_price_usd"] *= np.exp(rng.normal(0, PRICE_STEP, len(m)))
+        v["vault_total_assets_usd"] *= np.exp(rng.normal(0, TVL_STEP, len(v)))
+        v["vault_share_price"] *= 1 + SHARE_PRICE_ACCRUAL
+
+        progress = min(self.ticks / self.ramp, 1.0)
+        for symbol, pct in self.shocks.items():
+            hit = m["collateral_symbol"] == symbol
+            base = self.base[hit]
+            m.loc[hit, "collateral_price_usd"] = base["collateral_price_usd"] * (1 + pct * progress)
+            m.loc[hit, "utilization"] = base["utilization"] + (1 - base["utilization"]) * progress
+            m.loc[hit, "liquidity_usd"] = base["liquidity_usd"] * (1 - progress)
+            collat_usd = base["total_collat_usd"] * (1 + pct * progress)
+            m.loc[hit, "bad_debt_usd"] = np.maximum(base["bad_debt_usd"], base["total_borrow_usd"] - collat_usd)
+
+            run = [k in self.exposure and symbol in self.exposure[k]
+                   for k in zip(v["vault_address"], v["chain_id"])]
+            v.loc[run, "vault_total_assets_usd"] *= 1 - self.outflow
+
+        m["total_borrow_usd"] = m["total_supply_usd"] * m["utilization"]
+        m.loc[~m["collateral_symbol"].isin(self.shocks), "liquidity_usd"] = \
+            m["total_supply_usd"] - m["total_borrow_usd"]
+
+    # ── responses ──
+    def market_items(self, chain_ids, keys) -> List[Dict]:
+        m = self.markets
+        mask = pd.Series(True, index=m.index)
+        if chain_ids is not None:
+            mask &= m["chain_id"].astype(str).isin(chain_ids)
+        if keys is not None:
+            mask &= m["market_id"].str.lower().isin(keys)
+        now = int(time.time())
+        return [{
+            "uniqueKey": r.market_id,
+            "lltv": str(r.lltv),
+            "loanAsset": {"symbol": r.loan_symbol, "decimals": int(r.loan_decimals),
+                          "priceUsd": r.loan_price_usd},
+            "collateralAsset": {"symbol": r.collateral_symbol, "decimals": int(r.collateral_decimals),
+                                "priceUsd": r.collateral_price_usd},
+            "morphoBlue": {"chain": {"id": int(r.chain_id), "network": r.chain}},
+            "state": {
+                "timestamp": now,
+                "supplyAssetsUsd": r.total_supply_usd,
+                "borrowAssetsUsd": r.total_borrow_usd,
+                "collateralAssetsUsd": r.total_collat_usd,
+                "liquidityAssetsUsd": r.liquidity_usd,
+                "utilization": r.utilization,
+                "price": r.oracle_price_raw if isinstance(r.oracle_price_raw, str) else "0",
+            },
+            "badDebt": {"usd": r.bad_debt_usd},
+            "realizedBadDebt": {"usd": r.realized_bad_debt_usd},
+        } for r in m[mask].itertuples()]
+
+    def vault_items(self, chain_ids, addresses) -> List[Dict]:
+        v = self.vaults
+        mask = pd.Series(True, index=v.index)
+        if chain_ids is not None:
+            mask &= v["chain_id"].astype(str).isin(chain_ids)
+        if addresses is not None:
+            mask &= v["vault_address"].isin(addresses)
+        now = int(time.time())
+        return [{
+            "address": r.vault_address,
+            "name": r.vault_name,
+            "chain": {"id": int(r.chain_id), "network": r.blockchain},
+            "state": {
+                "timestamp": now,
+                "totalAssetsUsd": r.vault_total_assets_usd,
+                "totalAssets": str(int(r.vault_total_assets)),
+                "totalSupply": str(int(r.vault_total_supply_shares)),
+                "sharePriceNumber": r.vault_share_price,
+            },
+        } for r in v[mask].itertuples()]
+
+    def answer(self, query: str) -> Dict:
+        with self.lock:
+            self.tick()
+            chain_ids = _in_list(query, "chainId_in")
+            if re.search(r"\bmarkets\s*\(", query):
+                items = self.market_items(chain_ids, _in_list(query, "uniqueKey_in"))
+                return {"data": {"markets": {"items": items}}}
+            if re.search(r"\bvaults\s*\(", query):
+                items = self.vault_items(chain_ids, _in_list(query, "address_in"))
+                return {"data": {"vaults": {"items": items}}}
+        return {"errors": [{"message": "Stand-in API only serves markets(...) and vaults(...)"}]}
+
+
+def make_handler(state: StandinState):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            if self.path.startswith("/webhook"):
+                try:
+                    alert = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    return self._reply({"ok": False}, 400)
+                with state.lock:
+                    state.alerts.append(alert)
+                print(f"  📨 {alert.get('state', '?')} {alert.get('rule', '?')}: {alert.get('label') or alert.get('key')}")
+                return self._reply({"ok": True})
+            try:
+                query = json.loads(self.rfile.read(length) or b"{}").get("query", "")
+                body = state.answer(query)
+            except ValueError:
+                body = {"errors": [{"message": "Invalid JSON body"}]}
+            self._reply(body)
+
+        def do_GET(self):
+            if self.path.startswith("/webhook"):
+                with state.lock:
+                    return self._reply({"alerts": list(state.alerts)})
+            self._reply({"errors": [{"message": "POST a GraphQL query to /graphql"}]}, 404)
+
+        def _reply(self, body: Dict, status: int = 200):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+def parse_shocks(items: List[str]) -> Dict[str, float]:
+    """["xUSD=-80", ...] → {"xUSD": -0.80}"""
+    shocks = {}
+    for item in items or []:
+        symbol, sep, pct = item.partition("=")
+        if not sep:
+            raise argparse.ArgumentTypeError(f"--shock expects SYMBOL=PCT, got {item!r}")
+        shocks[symbol.strip()] = float(pct) / 100
+    return shocks
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the Morpho GraphQL API (monitor testing)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--shock", action="append", metavar="SYMBOL=PCT",
+                        help="Collateral spot shock in %% (repeatable), e.g. xUSD=-80")
+    parser.add_argument("--ramp", type=int, default=DEFAULT_RAMP, help="Ticks (requests) for the shock to play out")
+    parser.add_argument("--outflow", type=float, default=DEFAULT_OUTFLOW_PCT,
+                        help="%% of TVL exposed vaults lose per tick while shocked")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--data-dir", type=Path, default=PROJECT_ROOT / "data")
+    args = parser.parse_args(argv)
+
+    missing = [f for f in ("block1_markets_graphql.csv", "block1_vaults_graphql.csv")
+               if not (args.data_dir / f).exists()]
+    if missing:
+        parser.error(f"missing {missing} in {args.data_dir} — run block1 first")
+
+    state = StandinState(args.data_dir, args.seed, parse_shocks(args.shock), args.ramp, args.outflow)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    print(f"  🧪 Stand-in API on http://{args.host}:{args.port}/graphql "
+          f"({len(state.markets)} markets, {len(state.vaults)} vaults"
+          + (f", shock {', '.join(f'{s} {p:+.0%}' for s, p in state.shocks.items())}" if state.shocks else "")
+          + ")")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Stream Writer — append-as-you-go CSV / Parquet output for query blocks.
+
+Blocks used to collect every row in a Python list and call to_csv() at the end
+of main(): peak memory grows with the dataset and a crash at page 900 loses
+everything. A StreamWriter instead takes row batches as they arrive and flushes
+them to `<name>.partial` next to the final file:
+
+  - on success the partial file is fsynced and atomically renamed over the
+    final path, so readers never see a half-written CSV
+  - on failure the partial file is kept (rows fetched so far survive) and the
+    previous final file is left untouched
+  - if no rows were written, nothing is created (same as the old
+    `if all_rows: df.to_csv(...)` guards)
+
+The backend is picked from the file suffix: `.csv` (default) or `.parquet`.
+Parquet needs pyarrow; without it the writer warns and falls back to CSV at
+the same path with a `.csv` suffix. A Parquet file has one schema: pass
+`schema=` to fix it up front, otherwise it is inferred and widened as chunks
+arrive (an all-null column takes its type from a later chunk, ints widen to
+floats) — rows already written are rewritten once with the promoted schema.
+
+Used by: block3_curator_A2, block6_contagion, block8_plume_deep_dive.
+"""
+
+import os
+import csv
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+PARQUET_CHUNK_ROWS = 50_000  # rows per Parquet row group
+
+
+class StreamWriter:
+    """Base class: temp-file lifecycle and row accounting. Backends implement _open/_write/_close."""
+
+    def __init__(self, path, columns: Optional[List[str]] = None):
+        self.path = Path(path)
+        self.partial_path = self.path.with_name(self.path.name + ".partial")
+        self.columns = list(columns) if columns else None
+        self.rows_written = 0
+        self._opened = False
+        self._closed = False
+
+    # ── backend hooks ──
+    def _open(self):
+        raise NotImplementedError
+
+    def _write(self, rows: List[Dict]):
+        raise NotImplementedError
+
+    def _close(self):
+        raise NotImplementedError
+
+    # ── public API ──
+    def write_rows(self, rows: List[Dict]):
+        """Append a batch of row dicts. Columns default to the first row's keys."""
+        if not rows:
+            return
+        if not self._opened:
+            if self.columns is None:
+                self.columns = list(rows[0].keys())
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._open()
+            self._opened = True
+        self._write(rows)
+        self.rows_written += len(rows)
+
+    def write_row(self, row: Dict):
+        self.write_rows([row])
+
+    def close(self):
+        """Flush and atomically move the partial file into place."""
+        if self._closed:
+            return
+        self._closed = True
+        if not self._opened:
+            return
+        self._close()
+        os.replace(self.partial_path, self.path)
+
+    def abort(self):
+        """Stop writing but keep the partial file for inspection / resume."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._opened:
+            self._close()
+            print(f"   ⚠️  Kept {self.rows_written} partial rows in {self.partial_path.name}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class CsvStreamWriter(StreamWriter):
+    """CSV backend: header on first batch, flushed after every batch."""
+
+    def _open(self):
+        self._file = open(self.partial_path, "w", newline="", encoding="utf-8")
+        self._csv = csv.DictWriter(self._file, fieldnames=self.columns, extrasaction="ignore")
+        self._csv.writeheader()
+
+    def _write(self, rows: List[Dict]):
+        self._csv.writerows(rows)
+        self._file.flush()
+
+    def _close(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+
+class ParquetStreamWriter(StreamWriter):
+    """Parquet backend: rows buffered into row groups of `chunk_rows`."""
+
+    def __init__(self, path, columns: Optional[List[str]] = None,
+                 chunk_rows: int = PARQUET_CHUNK_ROWS, schema: Optional["pa.Schema"] = None):
+        if schema is not None and columns is None:
+            columns = schema.names
+        super().__init__(path, columns)
+        self.chunk_rows = chunk_rows
+        self.fixed_schema = schema
+        self._buffer: List[Dict] = []
+        self._writer = None
+        self._schema = None
+
+    def _open(self):
+        pass  # writer opens on the first flushed chunk
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        cols = {c: [r.get(c) for r in self._buffer] for c in self.columns}
+        table = pa.table(cols, schema=self.fixed_schema) if self.fixed_schema is not None else pa.table(cols)
+        if self._writer is None:
+            self._schema = table.schema
+            self._writer = pq.ParquetWriter(str(self.partial_path), self._schema)
+        elif not table.schema.equals(self._schema):
+            unified = pa.unify_schemas([self._schema, table.schema], promote_options="permissive")
+            if not unified.equals(self._schema):
+                self._rewrite(unified)
+            table = table.cast(self._schema)
+        self._writer.write_table(table)
+        self._buffer = []
+
+    def _rewrite(self, schema: "pa.Schema"):
+        """Re-open the partial file with a promoted schema, carrying over the rows written so far."""
+        self._writer.close()
+        written = pq.read_table(self.partial_path).cast(schema)
+        self._schema = schema
+        self._writer = pq.ParquetWriter(str(self.partial_path), schema)
+        self._writer.write_table(written, row_group_size=self.chunk_rows)
+
+    def _write(self, rows: List[Dict]):
+        self._buffer.extend(rows)
+        if len(self._buffer) >= self.chunk_rows:
+            self._flush()
+
+    def _close(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+
+
+def open_writer(path, columns: Optional[List[str]] = None, **kwargs) -> StreamWriter:
+    """
+    Pick the backend from the path suffix (.parquet → Parquet, anything else → CSV).
+    kwargs (chunk_rows, schema) go to the Parquet backend only.
+    """
+    path = Path(path)
+    if path.suffix == ".parquet":
+        if pa is not None:
+            return ParquetStreamWriter(path, columns, **kwargs)
+        print(f"   ⚠️  pyarrow not installed — writing {path.with_suffix('.csv').name} instead")
+        path = path.with_suffix(".csv")
+    return CsvStreamWriter(path, columns)
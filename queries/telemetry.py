@@ -0,0 +1,152 @@
+"""
+Telemetry — per-block API metrics and machine-readable run reports.
+
+rate_limiter.post() is the single choke point for Morpho API calls, so it
+reports every call here: latency, bytes received, whether it was a retry of
+the previous request on the same thread, and rate-limit hits. The runner
+resets the counters before each block and snapshots them after, then writes
+one JSON report per run to data/_runs/run_<UTC timestamp>.json:
+
+    {
+      "run_id": "20260208T101500Z", "started": ..., "finished": ...,
+      "status": "ok" | "failed", "wall_s": ...,
+      "blocks": [
+        {"name": "block1_markets", "status": "ok", "wall_s": 12.4,
+         "api_calls": 9, "bytes_received": 812345, "retries": 0,
+         "rate_limit_hits": 0, "rate_wait_s": 0.8, "rate_end": 4.9,
+         "latency_ms": {"p50": .., "p90": .., "p99": .., "max": ..},
+         "rows_written": {"block1_markets_graphql.csv": 20},
+         "peak_rss_mb": 143.2}
+      ]
+    }
+
+The Data Management page (sections/admin.py) reads these reports.
+"""
+
+import sys
+import json
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RUNS_SUBDIR = "_runs"
+
+_lock = threading.Lock()
+_local = threading.local()
+_counters: Dict = {}
+_latencies: List[float] = []
+
+
+def reset():
+    """Zero the per-block counters (called by the runner before each block)."""
+    global _counters, _latencies
+    with _lock:
+        _counters = {"api_calls": 0, "bytes_received": 0, "retries": 0, "rate_limit_hits": 0}
+        _latencies = []
+
+
+reset()
+
+
+def record_call(latency_s: float, nbytes: int, request_key: Optional[int] = None):
+    """
+    One HTTP call. `request_key` identifies the request body; the same key
+    twice in a row on one thread is counted as a retry.
+    """
+    is_retry = request_key is not None and getattr(_local, "last_key", None) == request_key
+    _local.last_key = request_key
+    with _lock:
+        _counters["api_calls"] += 1
+        _counters["bytes_received"] += nbytes
+        _counters["retries"] += int(is_retry)
+        _latencies.append(latency_s)
+
+
+def record_rate_limit():
+    with _lock:
+        _counters["rate_limit_hits"] += 1
+
+
+def _percentile(sorted_vals: List[float], pct: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    idx = min(len(sorted_vals) - 1, int(round(pct / 100 * (len(sorted_vals) - 1))))
+    return sorted_vals[idx]
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far (MB), None where unsupported."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def snapshot() -> Dict:
+    """Counters + latency percentiles (ms) for the current block."""
+    with _lock:
+        lat = sorted(_latencies)
+        snap = dict(_counters)
+    snap["latency_ms"] = {
+        "p50": round(_percentile(lat, 50) * 1000, 1),
+        "p90": round(_percentile(lat, 90) * 1000, 1),
+        "p99": round(_percentile(lat, 99) * 1000, 1),
+        "max": round((lat[-1] if lat else 0.0) * 1000, 1),
+    }
+    return snap
+
+
+def count_rows(path: Path) -> int:
+    """Data rows in a CSV (line count minus header), without parsing it."""
+    n = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            n += chunk.count(b"\n")
+    return max(0, n - 1)
+
+
+def utc_now_iso() -> str:
+    return datetime.now(tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class RunReport:
+    """Accumulates block results for one runner invocation and writes them as JSON."""
+
+    def __init__(self, data_dir: Path):
+        now = datetime.now(tz=timezone.utc)
+        self.run_id = now.strftime("%Y%m%dT%H%M%SZ")
+        self.path = Path(data_dir) / RUNS_SUBDIR / f"run_{self.run_id}.json"
+        self._t0 = now.timestamp()
+        self.report = {
+            "run_id": self.run_id,
+            "started": utc_now_iso(),
+            "finished": None,
+            "status": "running",
+            "wall_s": None,
+            "blocks": [],
+        }
+
+    def add_block(self, entry: Dict):
+        self.report["blocks"].append(entry)
+        self.write()
+
+    def finish(self, status: str):
+        self.report["finished"] = utc_now_iso()
+        self.report["status"] = status
+        self.report["wall_s"] = round(datetime.now(tz=timezone.utc).timestamp() - self._t0, 2)
+        self.write()
+        print(f"📈 Run report: {self.path}")
+
+    def write(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".partial")
+        tmp.write_text(json.dumps(self.report, indent=2))
+        tmp.replace(self.path)
+
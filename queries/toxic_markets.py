@@ -0,0 +1,248 @@
+"""
+Toxic Markets — one registry of the toxic-collateral markets for every block.
+
+block1_markets writes the authoritative list to block1_markets_graphql.csv.
+Every later block used to re-read that CSV row by row (or, when it was
+missing, rescan `markets(first: 500)` on every chain and filter by symbol
+client-side). The registry loads the set once per process and serves it from
+memory; the runner runs all blocks in one process, so that is once per run.
+
+Sources, in priority order:
+  1. block1_markets_graphql.csv
+  2. block1_vaults_graphql.csv (unique toxic market rows)
+  3. one server-side filtered query: markets whose collateral is one of the
+     known TOXIC_COLLATERAL_ADDRESSES, on all chains at once. If the API
+     rejects that filter, or it matches nothing, the old per-chain full scan
+     (symbol match) runs instead.
+
+The cache is keyed on the source file's mtime, so when block1_markets rewrites
+the CSV mid-run, the next caller picks up the fresh list.
+
+load() returns { uniqueKey: {chain_id, chain, collateral_symbol, collateral_address,
+loan_symbol} }; keys(), keys_by_chain() and frame() are views of the same set.
+"""
+
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+import pandas as pd
+
+import rate_limiter
+from paginator import fetch_all_pages
+
+GRAPHQL_URL = "https://blue-api.morpho.org/graphql"
+
+MARKETS_CSV = "block1_markets_graphql.csv"
+VAULTS_CSV = "block1_vaults_graphql.csv"
+
+CHAIN_IDS = {
+    'ethereum': 1,
+    'base': 8453,
+    'arbitrum': 42161,
+    'optimism': 10,
+    'plume': 98866,
+    'unichain': 130,
+    'polygon': 137,
+    'hyperevm': 999,
+}
+CHAIN_NAMES = {v: k for k, v in CHAIN_IDS.items()}
+
+# Toxic collateral — filter by symbol (primary) and exclude false positives
+TOXIC_COLLATERAL = ['xUSD', 'XUSD', 'deUSD', 'sdeUSD', 'deusd']
+FALSE_POSITIVES = [
+    'AA_FalconXUSDC', 'stakedao-crvfrxUSD', 'crvfrxUSD', 'sfrxUSD', 'fxUSD',
+]
+
+# Known collateral token addresses (xUSD / deUSD / sdeUSD across chains).
+# block1_markets and the API fallback below push this filter to the API, so
+# discovery cost scales with matching markets — add a new incident's tokens here.
+TOXIC_COLLATERAL_ADDRESSES = [
+    '0xE2Fc85BfB48C4cF147921fBE110cf92Ef9f26F94',  # xUSD — ethereum
+    '0x6eAf19b2FC24552925dB245F9Ff613157a7dbb4C',  # xUSD — arbitrum, plume
+    '0x15700B564Ca08D9439C58cA5053166E8317aa138',  # deUSD — ethereum
+    '0x1271656F45e251f588847721BA2C561dd1F0223F',  # deUSD — plume
+    '0x5C5b196aBE0d54485975D1Ec29617D42D9198326',  # sdeUSD — ethereum
+    '0x3f6c8f2Efb8cc78C3baB5353E2Ad5f19De56D856',  # sdeUSD — plume
+]
+
+_cache: Dict = {"source": None, "markets": None, "frame": None}
+
+
+def is_toxic_symbol(symbol: Optional[str]) -> bool:
+    return bool(symbol) and symbol in TOXIC_COLLATERAL and symbol not in FALSE_POSITIVES
+
+
+def query_graphql(query: str) -> dict:
+    """Execute GraphQL query against Morpho API"""
+    headers = {"Content-Type": "application/json"}
+    response = rate_limiter.post(GRAPHQL_URL, json={"query": query}, headers=headers)
+    response.raise_for_status()
+    return response.json()
+
+
+# ═══════════════════════════════════════════════════════════════
+#  SOURCES
+# ═══════════════════════════════════════════════════════════════
+
+def _from_markets_frame(df: pd.DataFrame) -> Dict[str, Dict]:
+    chain_col = "blockchain" if "blockchain" in df.columns else "chain"
+    df = df.dropna(subset=["market_id"]).drop_duplicates("market_id")
+    markets = {}
+    for rec in df.to_dict("records"):
+        markets[rec["market_id"]] = {
+            "chain_id": int(rec.get("chain_id", 1)),
+            "chain": rec.get(chain_col, "ethereum"),
+            "collateral_symbol": rec.get("collateral_symbol", "?"),
+            "collateral_address": rec.get("collateral_address", ""),
+            "loan_symbol": rec.get("loan_symbol", "?"),
+        }
+    return markets
+
+
+def _from_vaults_frame(df: pd.DataFrame) -> Dict[str, Dict]:
+    df = df.dropna(subset=["market_id"]).drop_duplicates("market_id")
+    df = df[df["collateral_symbol"].map(is_toxic_symbol)]
+    return _from_markets_frame(df)
+
+
+def _api_item_to_info(m: Dict, chain_id: int) -> Dict:
+    collat = m.get("collateralAsset") or {}
+    return {
+        "chain_id": chain_id,
+        "chain": CHAIN_NAMES.get(chain_id, str(chain_id)),
+        "collateral_symbol": collat.get("symbol", ""),
+        "collateral_address": collat.get("address", ""),
+        "loan_symbol": (m.get("loanAsset") or {}).get("symbol", ""),
+    }
+
+
+MARKET_FIELDS = """
+              uniqueKey
+              collateralAsset { address symbol }
+              loanAsset { symbol }
+              morphoBlue { chain { id } }
+"""
+
+
+def _from_api_filtered() -> Optional[Dict[str, Dict]]:
+    """One query for every chain, filtered server-side by collateral address. None if unsupported."""
+    addresses = ", ".join(f'"{a}"' for a in TOXIC_COLLATERAL_ADDRESSES)
+    chain_ids = ", ".join(str(c) for c in CHAIN_IDS.values())
+
+    def fetch_page(skip: int, first: int):
+        query = f"""
+        {{
+          markets(first: {first}, skip: {skip}, where: {{
+            chainId_in: [{chain_ids}]
+            collateralAssetAddress_in: [{addresses}]
+          }}) {{
+            items {{ {MARKET_FIELDS} }}
+            pageInfo {{ countTotal }}
+          }}
+        }}
+        """
+        result = query_graphql(query)
+        if "errors" in result:
+            raise ValueError(result["errors"][0].get("message", "GraphQL error"))
+        data = result["data"]["markets"]
+        return data["items"], data["pageInfo"]["countTotal"]
+
+    try:
+        fetch_page(0, 1)
+    except Exception as e:
+        print(f"   ⚠️  Server-side collateral filter rejected ({e})")
+        return None
+
+    markets = {}
+    for m in fetch_all_pages(fetch_page, page_size=100, key=lambda m: m["uniqueKey"]):
+        symbol = (m.get("collateralAsset") or {}).get("symbol", "")
+        if not is_toxic_symbol(symbol):
+            continue
+        chain_id = int(((m.get("morphoBlue") or {}).get("chain") or {}).get("id", 1))
+        markets[m["uniqueKey"]] = _api_item_to_info(m, chain_id)
+    return markets
+
+
+def _from_api_full_scan() -> Dict[str, Dict]:
+    """Last resort: scan every market on every chain and filter by symbol."""
+    markets = {}
+    for chain_name, chain_id in CHAIN_IDS.items():
+        def fetch_page(skip: int, first: int, chain_id=chain_id):
+            query = f"""
+            {{
+              markets(first: {first}, skip: {skip}, where: {{ chainId_in: [{chain_id}] }}) {{
+                items {{ {MARKET_FIELDS} }}
+                pageInfo {{ countTotal }}
+              }}
+            }}
+            """
+            result = query_graphql(query)
+            if "errors" in result:
+                print(f"   ❌ Error querying {chain_name}: {result['errors'][0].get('message')}")
+                return None
+            data = result["data"]["markets"]
+            return data["items"], data["pageInfo"]["countTotal"]
+
+        for m in fetch_all_pages(fetch_page, page_size=500, key=lambda m: m["uniqueKey"]):
+            if is_toxic_symbol((m.get("collateralAsset") or {}).get("symbol", "")):
+                markets[m["uniqueKey"]] = _api_item_to_info(m, chain_id)
+    return markets
+
+
+# ═══════════════════════════════════════════════════════════════
+#  PUBLIC API
+# ═══════════════════════════════════════════════════════════════
+
+def _source_of(data_dir: Path):
+    for name in (MARKETS_CSV, VAULTS_CSV):
+        path = data_dir / name
+        if path.exists():
+            return (str(path), path.stat().st_mtime)
+    return ("api", None)
+
+
+def load(data_dir: Path, refresh: bool = False) -> Dict[str, Dict]:
+    """Toxic markets keyed by uniqueKey (see module docstring for the source order)."""
+    data_dir = Path(data_dir)
+    source = _source_of(data_dir)
+    if not refresh and _cache["source"] == source and _cache["markets"] is not None:
+        return _cache["markets"]
+
+    frame = pd.DataFrame()
+    if source[0].endswith(MARKETS_CSV):
+        frame = pd.read_csv(source[0])
+        markets = _from_markets_frame(frame)
+        print(f"\n📂 Loaded {len(markets)} toxic markets from {MARKETS_CSV}")
+    elif source[0].endswith(VAULTS_CSV):
+        markets = _from_vaults_frame(pd.read_csv(source[0]))
+        print(f"\n📂 Extracted {len(markets)} toxic markets from {VAULTS_CSV}")
+    else:
+        print("\n⚠️  No block1 CSV found — discovering toxic markets via the API...")
+        markets = _from_api_filtered()
+        if not markets:
+            if markets is not None:
+                print("   ⚠️  Collateral address filter matched nothing — full scan by symbol")
+            markets = _from_api_full_scan()
+        print(f"   Found {len(markets)} toxic markets")
+
+    _cache.update(source=source, markets=markets, frame=frame)
+    return markets
+
+
+def keys(data_dir: Path) -> Set[str]:
+    return set(load(data_dir))
+
+
+def keys_by_chain(data_dir: Path) -> Dict[int, Set[str]]:
+    by_chain: Dict[int, Set[str]] = {}
+    for key, info in load(data_dir).items():
+        by_chain.setdefault(info["chain_id"], set()).add(key)
+    return by_chain
+
+
+def frame(data_dir: Path) -> pd.DataFrame:
+    """The block1 markets CSV as a DataFrame (empty if it doesn't exist — no API fallback)."""
+    if not (Path(data_dir) / MARKETS_CSV).exists():
+        return pd.DataFrame()
+    load(data_dir)
+    return _cache["frame"].copy()
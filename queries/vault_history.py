@@ -0,0 +1,217 @@
+"""
+Vault History — one columnar store of vault historicalState series.
+
+block2_share_prices fetched sharePriceNumber / totalAssetsUsd / totalAssets per
+vault, and block7_withdrawals then re-fetched totalAssetsUsd / totalAssets at
+DAY interval for the damaged vaults. Both now go through this store:
+
+  - every fetched point lands in data/_store/vault_history.parquet, one row
+    per (vault_address, chain_id, interval, timestamp) with share_price,
+    total_assets_usd and total_assets_raw (BigInt kept as a string)
+  - data/_store/vault_history.json holds the high-water marks (watermarks.py)
+    per (vault, chain, interval), so a block fetches only the part of its
+    window the store doesn't hold yet, plus a small overlap for late
+    corrections, and skips the API call entirely when nothing is missing
+  - views (share price / TVL, daily / hourly) are read back from the store;
+    daily() derives every day inside the HOUR span from the HOUR points and
+    uses API DAY points only outside it, so a DAY fetch over the hourly window
+    (block7, or block2's "both" mode) can't mix into the daily view (see
+    resample_daily for the as-of / close semantics)
+
+Parquet needs pyarrow; without it the store is a CSV
+at the same path with a `.csv` suffix.
+
+Used by: block2_share_prices, block7_withdrawals and monitor.py (live vault
+points).
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from resampling import regular_grid
+from watermarks import Watermarks, LATE_OVERLAP
+
+try:
+    import pyarrow  # noqa: F401 — only needed by DataFrame.to_parquet / read_parquet
+except ImportError:
+    pyarrow = None
+
+STORE_SUBDIR = "_store"
+STORE_NAME = "vault_history"
+
+INTERVAL_SECONDS = {"HOUR": 3600, "DAY": 86400}
+
+KEY_COLS = ["vault_address", "chain_id", "interval", "timestamp"]
+VALUE_COLS = ["share_price", "total_assets_usd", "total_assets_raw"]
+
+# historicalState field → store column
+SERIES_FIELDS = {
+    "sharePriceNumber": "share_price",
+    "totalAssetsUsd": "total_assets_usd",
+    "totalAssets": "total_assets_raw",
+}
+
+
+def history_fields(start_ts: int, end_ts: int, interval: str, alias: str = "") -> str:
+    """
+    The historicalState selection for every series the store keeps. With
+    `alias`, fields are aliased `<alias>_<field>` so several windows/intervals
+    fit in one request.
+    """
+    prefix = f"{alias}_" if alias else ""
+    return "\n".join(
+        f"""          {prefix + field + ": " if alias else ""}{field}(options: {{
+            startTimestamp: {start_ts}
+            endTimestamp: {end_ts}
+            interval: {interval}
+          }}) {{ x y }}"""
+        for field in SERIES_FIELDS
+    )
+
+
+def points_to_frame(hist: Dict, address: str, chain_id: int, interval: str,
+                    alias: str = "") -> pd.DataFrame:
+    """historicalState {field: [{x, y}]} → one store row per timestamp."""
+    prefix = f"{alias}_" if alias else ""
+    columns = {}
+    for field, col in SERIES_FIELDS.items():
+        points = (hist or {}).get(prefix + field) or []
+        columns[col] = {int(p["x"]): p.get("y") for p in points if p.get("x") is not None}
+    df = pd.DataFrame(columns)
+    for col in VALUE_COLS:
+        if col not in df.columns:
+            df[col] = None
+    df = df.rename_axis("timestamp").reset_index()
+    df["total_assets_raw"] = df["total_assets_raw"].map(lambda v: None if v is None or pd.isna(v) else str(v))
+    df["vault_address"] = address.lower()
+    df["chain_id"] = int(chain_id)
+    df["interval"] = interval
+    return df[KEY_COLS + VALUE_COLS]
+
+
+def resample_daily(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Derive DAY points from finer (HOUR) points.
+
+    The API stamps a DAY point at 00:00 UTC with the state at that instant, so
+    the derived point for day D is the last observation at or before D 00:00,
+    i.e. the previous day's close (backward as-of join, never looking ahead).
+    Only days whose 00:00 falls inside the fine series' span are produced, and
+    each value column takes its own latest non-null observation (forward-filled
+    per vault before the one regular_grid call over all vaults).
+    """
+    if df.empty:
+        return df
+    keys = ["vault_address", "chain_id"]
+    fine = df.sort_values([*keys, "timestamp"]).copy()
+    fine["timestamp"] = fine["timestamp"].astype("int64")
+    fine[VALUE_COLS] = fine.groupby(keys, sort=False)[VALUE_COLS].ffill()
+    days = regular_grid(fine, "DAY", keys=keys, value_cols=VALUE_COLS)
+    if days.empty:
+        return pd.DataFrame(columns=KEY_COLS + VALUE_COLS)
+    days["interval"] = "DAY"
+    return days[KEY_COLS + VALUE_COLS].reset_index(drop=True)
+
+
+class VaultHistoryStore:
+    def __init__(self, data_dir: Path):
+        self.dir = Path(data_dir) / STORE_SUBDIR
+        suffix = ".parquet" if pyarrow is not None else ".csv"
+        self.path = self.dir / f"{STORE_NAME}{suffix}"
+        self.marks = Watermarks(data_dir, STORE_NAME, path=self.dir / f"{STORE_NAME}.json")
+        self._df: Optional[pd.DataFrame] = None
+        self._dirty = False
+
+    @staticmethod
+    def _key(address: str, chain_id: int, interval: str) -> Tuple:
+        return (address.lower(), int(chain_id), interval)
+
+    # ── persistence ──
+    def frame(self) -> pd.DataFrame:
+        if self._df is None:
+            if self.path.exists() and self.path.suffix == ".parquet":
+                self._df = pd.read_parquet(self.path)
+            elif self.path.exists():
+                self._df = pd.read_csv(self.path, dtype={"total_assets_raw": str, "interval": str})
+            else:
+                self._df = pd.DataFrame(columns=KEY_COLS + VALUE_COLS)
+        return self._df
+
+    def save(self):
+        """Write the store (atomic rename) and its watermarks, if anything changed."""
+        self.marks.save()
+        if not self._dirty:
+            return
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".partial")
+        if self.path.suffix == ".parquet":
+            self.frame().to_parquet(tmp, index=False)
+        else:
+            self.frame().to_csv(tmp, index=False)
+        tmp.replace(self.path)
+        self._dirty = False
+        print(f"   💾 Vault history store: {len(self.frame()):,} points → {self.path.name}")
+
+    # ── coverage ──
+    def coverage(self, address: str, chain_id: int, interval: str) -> Optional[List[Tuple[int, int]]]:
+        return self.marks.get(self._key(address, chain_id, interval))
+
+    def covers(self, address: str, chain_id: int, interval: str, start_ts: int, end_ts: int) -> bool:
+        """True if [start_ts, end_ts] was already fetched (to within one interval step)."""
+        return self.marks.covers(self._key(address, chain_id, interval), start_ts, end_ts,
+                                 step=INTERVAL_SECONDS.get(interval, 0))
+
+    def fetch_window(self, address: str, chain_id: int, interval: str,
+                     start_ts: int, end_ts: int) -> Optional[Tuple[int, int]]:
+        """What is still missing of [start_ts, end_ts] (with late-correction overlap), or None."""
+        return self.marks.fetch_window(self._key(address, chain_id, interval), start_ts, end_ts,
+                                       step=INTERVAL_SECONDS.get(interval, 0),
+                                       overlap=LATE_OVERLAP.get(interval, 0))
+
+    def get_meta(self, address: str, chain_id: int) -> Dict:
+        """Vault facts (name, decimals, ...) saved by the last fetch."""
+        return self.marks.get_meta((address.lower(), int(chain_id)))
+
+    def set_meta(self, address: str, chain_id: int, meta: Dict):
+        self.marks.set_meta((address.lower(), int(chain_id)), meta)
+
+    # ── writes ──
+    def upsert(self, df: pd.DataFrame, address: str, chain_id: int, interval: str,
+               start_ts: int, end_ts: int):
+        """Merge fetched points (newer wins on the same timestamp) and advance the watermark."""
+        if not df.empty:
+            merged = pd.concat([self.frame(), df], ignore_index=True)
+            self._df = merged.drop_duplicates(KEY_COLS, keep="last").reset_index(drop=True)
+            self._dirty = True
+        self.marks.advance(self._key(address, chain_id, interval), start_ts, end_ts)
+
+    # ── views ──
+    def series(self, address: str, chain_id: int, interval: str,
+               start_ts: Optional[int] = None, end_ts: Optional[int] = None) -> pd.DataFrame:
+        df = self.frame()
+        mask = (
+            (df["vault_address"] == address.lower())
+            & (df["chain_id"].astype(int) == int(chain_id))
+            & (df["interval"] == interval)
+        )
+        if start_ts is not None:
+            mask &= df["timestamp"] >= start_ts
+        if end_ts is not None:
+            mask &= df["timestamp"] <= end_ts
+        return df[mask].sort_values("timestamp").reset_index(drop=True)
+
+    def daily(self, address: str, chain_id: int,
+              start_ts: Optional[int] = None, end_ts: Optional[int] = None) -> pd.DataFrame:
+        """
+        Days derived from HOUR points (daily close) inside the HOUR span, API DAY
+        points outside it. In-window days come from HOUR data only, so the daily
+        view agrees with the hourly one even when DAY points were fetched there.
+        """
+        day = self.series(address, chain_id, "DAY", start_ts, end_ts)
+        hour = resample_daily(self.series(address, chain_id, "HOUR", start_ts, end_ts))
+        if hour.empty:
+            return day
+        day = day[(day["timestamp"] < hour["timestamp"].min()) | (day["timestamp"] > hour["timestamp"].max())]
+        return pd.concat([day, hour], ignore_index=True).sort_values("timestamp").reset_index(drop=True)
@@ -0,0 +1,147 @@
+"""
+Watermarks — high-water marks for incremental history refreshes.
+
+History-fetching blocks used to re-download their full fixed windows on every
+refresh even though only the tail is new. A Watermarks file records, per
+(entity, series, interval) key, the [start, end] windows already fetched — a
+sorted list of disjoint intervals, merged only where they overlap or touch —
+so a block asks fetch_window() what is still missing:
+
+  - nothing fetched yet           → the whole requested window
+  - requested window already held → None (skip the API call)
+  - window extends past the mark  → [mark - overlap, end]; the overlap
+                                    re-reads a few recent points so late
+                                    corrections from the indexer land too
+  - window starts before the mark → the whole window (backfill)
+
+"The mark" is the interval holding the window start; a gap after it (e.g. a
+DAY series fetched for Oct and Dec only) is fetched, never skipped.
+
+Callers merge the new points into their existing store / CSV, de-duplicating
+on their natural key (newer rows win), then advance() the mark. Ends are
+clamped to now, so a window reaching into the future is picked up on the next
+refresh.
+
+Window ends default to each block's constants; MORPHO_HISTORY_END=now (or a
+unix timestamp) moves them forward for a daily refresh. MORPHO_FULL_REFRESH=1
+ignores the marks and refetches everything.
+
+Used by: vault_history.py, block3b_liquidity, block6_contagion,
+block7_withdrawals; each keeps its own _store/<name>.json.
+"""
+
+import os
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+HISTORY_END_ENV = "MORPHO_HISTORY_END"
+FULL_REFRESH_ENV = "MORPHO_FULL_REFRESH"
+STORE_SUBDIR = "_store"
+
+# Re-read this much before the mark on every incremental fetch (late corrections)
+LATE_OVERLAP = {
+    "HOUR": 6 * 3600,
+    "DAY": 2 * 86400,
+    "EVENT": 86400,
+}
+
+Key = Tuple
+
+
+def history_end(default_ts: int) -> int:
+    """Window end: the block's constant, or MORPHO_HISTORY_END (`now` or a unix ts)."""
+    value = os.environ.get(HISTORY_END_ENV, "").strip().lower()
+    if value == "now":
+        return int(time.time())
+    if value.isdigit():
+        return int(value)
+    return default_ts
+
+
+def full_refresh() -> bool:
+    return os.environ.get(FULL_REFRESH_ENV, "") == "1"
+
+
+class Watermarks:
+    def __init__(self, data_dir: Path, name: str, path: Optional[Path] = None):
+        self.path = Path(path) if path else Path(data_dir) / STORE_SUBDIR / f"{name}.json"
+        self._marks: Dict[str, list] = {}
+        self._meta: Dict[str, Dict] = {}
+        self._dirty = False
+        if self.path.exists() and not full_refresh():
+            try:
+                state = json.loads(self.path.read_text())
+            except ValueError:
+                state = {}
+            # Bare {key: [start, end]} files predate the meta section
+            if "marks" in state or "meta" in state:
+                self._marks = state.get("marks", {})
+                self._meta = state.get("meta", {})
+            else:
+                self._marks = state
+            # Single [start, end] marks predate interval lists
+            self._marks = {k: [m] if m and not isinstance(m[0], list) else m for k, m in self._marks.items()}
+
+    @staticmethod
+    def _key(key: Key) -> str:
+        return "|".join(str(p).lower() for p in key)
+
+    def get(self, key: Key) -> Optional[List[Tuple[int, int]]]:
+        """Fetched intervals, sorted and disjoint (None if nothing was fetched)."""
+        marks = self._marks.get(self._key(key))
+        return [tuple(m) for m in marks] if marks else None
+
+    def _mark_at(self, key: Key, ts: int, step: int) -> Optional[Tuple[int, int]]:
+        """The fetched interval holding `ts` (to within one step), if any."""
+        for start, end in self.get(key) or ():
+            if start <= ts + step and end >= ts - step:
+                return start, end
+        return None
+
+    def covers(self, key: Key, start_ts: int, end_ts: int, step: int = 0) -> bool:
+        """True if [start_ts, end_ts] was already fetched in one piece (to within one step)."""
+        mark = self._mark_at(key, start_ts, step)
+        return bool(mark) and mark[1] >= min(end_ts, int(time.time())) - step
+
+    def fetch_window(self, key: Key, start_ts: int, end_ts: int,
+                     step: int = 0, overlap: int = 0) -> Optional[Tuple[int, int]]:
+        """The part of [start_ts, end_ts] still to fetch, or None if already held."""
+        end_ts = min(end_ts, int(time.time()))
+        mark = self._mark_at(key, start_ts, step)
+        if not mark:
+            return (start_ts, end_ts)
+        if mark[1] >= end_ts - step:
+            return None
+        return (max(start_ts, mark[1] - overlap), end_ts)
+
+    def advance(self, key: Key, start_ts: int, end_ts: int):
+        """Record [start_ts, end_ts] as fetched (merged with the intervals it overlaps or touches)."""
+        end_ts = min(end_ts, int(time.time()))
+        k = self._key(key)
+        merged: List[list] = []
+        for start, end in sorted([*self._marks.get(k, []), [start_ts, end_ts]]):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        self._marks[k] = merged
+        self._dirty = True
+
+    def get_meta(self, key: Key) -> Dict:
+        return self._meta.get(self._key(key), {})
+
+    def set_meta(self, key: Key, meta: Dict):
+        """Small per-entity facts a skipped fetch would otherwise have returned (names, decimals)."""
+        self._meta[self._key(key)] = meta
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".partial")
+        tmp.write_text(json.dumps({"marks": self._marks, "meta": self._meta}, indent=1, sort_keys=True))
+        tmp.replace(self.path)
+        self._dirty = False
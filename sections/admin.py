@@ -5,15 +5,18 @@ import pandas as pd
 import subprocess
 import sys
 import html
+import json
 from pathlib import Path
 from datetime import datetime, timezone
 
-from utils.data_loader import load_csv
+from utils.data_loader import load_csv, load_live_markets, load_live_vaults, load_live_status, load_alerts
+from utils.charts import time_series
 
 DATA_DIR = Path(__file__).resolve().parent.parent / "data"
 REPO_ROOT = Path(__file__).resolve().parent.parent
 QUERIES_DIR = REPO_ROOT / "queries"
 RUNNER_PATH = QUERIES_DIR / "runner.py"
+RUNS_DIR = DATA_DIR / "_runs"  # JSON run reports written by runner.py (see queries/telemetry.py)
 
 # ── Mapping: admin block_id → runner block name(s) ──
 # Each admin card may map to multiple runner blocks (e.g. block3 = A1 + A2 + B + 3b)
@@ -55,6 +58,103 @@ def _file_mtime_iso(path: Path) -> str:
     return mtime.strftime("%Y-%m-%d %H:%M UTC")
 
 
+def _load_run_reports(limit: int = 50) -> list:
+    """Run reports from data/_runs/, most recent first, each with its file path."""
+    if not RUNS_DIR.exists():
+        return []
+    reports = []
+    for path in sorted(RUNS_DIR.glob("run_*.json"), reverse=True)[:limit]:
+        try:
+            report = json.loads(path.read_text(encoding="utf-8"))
+        except (ValueError, OSError):
+            continue
+        report["_path"] = path
+        reports.append(report)
+    return reports
+
+
+def _last_block_runs(reports: list) -> dict:
+    """Most recent report entry per runner block name."""
+    latest = {}
+    for report in reports:
+        for entry in report.get("blocks", []):
+            latest.setdefault(entry["name"], entry)
+    return latest
+
+
+def _block_perf_row(entry: dict) -> dict:
+    latency = entry.get("latency_ms") or {}
+    rows = entry.get("rows_written") or {}
+    rss = entry.get("peak_rss_mb")
+    return {
+        "Block": entry["name"],
+        "Status": "✅" if entry.get("status") == "ok" else "❌",
+        "Wall (s)": entry.get("wall_s"),
+        "API Calls": entry.get("api_calls"),
+        "MB Received": round((entry.get("bytes_received") or 0) / 1e6, 2),
+        "p50 ms": latency.get("p50"),
+        "p90 ms": latency.get("p90"),
+        "p99 ms": latency.get("p99"),
+        "Retries": entry.get("retries"),
+        "Rate-Limit Hits": entry.get("rate_limit_hits"),
+        "Rate Wait (s)": entry.get("rate_wait_s"),
+        "Rows Written": sum(rows.values()),
+        "Peak RSS (MB)": rss,
+    }
+
+
+def _render_pipeline_performance(reports: list):
+    if not reports:
+        st.info(
+            "No run reports yet. Each `queries/runner.py` run writes one to `data/_runs/`."
+        )
+        return
+
+    latest = reports[0]
+    st.caption(
+        f"Latest run `{latest.get('run_id')}` — status **{latest.get('status')}**, "
+        f"{latest.get('wall_s') or 0:.1f}s total, report written "
+        f"{_file_age_str(latest['_path'])}. {len(reports)} runs on record."
+    )
+
+    if latest.get("blocks"):
+        st.dataframe(
+            pd.DataFrame([_block_perf_row(e) for e in latest["blocks"]]),
+            hide_index=True, use_container_width=True,
+        )
+
+    # History: one row per (run, block) so regressions show up as a jump in one line
+    history = []
+    for report in reports:
+        for entry in report.get("blocks", []):
+            history.append({
+                "run": pd.to_datetime(report.get("started"), errors="coerce"),
+                "block": entry["name"],
+                "wall_s": entry.get("wall_s"),
+                "api_calls": entry.get("api_calls"),
+                "p90_ms": (entry.get("latency_ms") or {}).get("p90"),
+            })
+    if not history:
+        return
+    hist = pd.DataFrame(history).dropna(subset=["run"])
+    if hist["run"].nunique() < 2:
+        return
+
+    hist = hist.sort_values("run")
+    metric = st.radio(
+        "History metric",
+        ["wall_s", "api_calls", "p90_ms"],
+        format_func={"wall_s": "Wall time (s)", "api_calls": "API calls",
+                     "p90_ms": "p90 latency (ms)"}.get,
+        horizontal=True,
+        key="perf_history_metric",
+    )
+    fig = time_series(hist, x="run", y=metric, color="block",
+                      title="Per-block history across runs", height=380)
+    fig.update_traces(mode="lines+markers")
+    st.plotly_chart(fig, use_container_width=True)
+
+
 def _run_pipeline_streaming(block_names: list, log_widget) -> tuple:
     """
     Run the query pipeline via subprocess with live-streaming output.
@@ -107,6 +207,96 @@ def _run_pipeline_streaming(block_names: list, log_widget) -> tuple:
         return False, full_output
 
 
+def _render_live_monitor(status: dict, markets: pd.DataFrame, vaults: pd.DataFrame, alerts: pd.DataFrame):
+    if not status:
+        st.info("The live monitor hasn't run yet. Start it next to the dashboard:")
+        st.code(
+            "python queries/monitor.py --interval 300\n"
+            "# or against the local stand-in API\n"
+            "python queries/standin_api.py --port 8765 --shock xUSD=-80 &\n"
+            "python queries/monitor.py --url http://127.0.0.1:8765/graphql --interval 5",
+            language="bash",
+        )
+        return
+
+    polled = datetime.fromtimestamp(status["polled_at"], tz=timezone.utc)
+    age_s = int((datetime.now(tz=timezone.utc) - polled).total_seconds())
+    age = f"{age_s}s ago" if age_s < 120 else (f"{age_s // 60}m ago" if age_s < 7200 else f"{age_s // 3600}h ago")
+
+    c1, c2, c3, c4, c5 = st.columns(5)
+    c1.metric("Last Poll", age, help=f"{polled:%Y-%m-%d %H:%M:%S} UTC · {status.get('url', '')}")
+    c2.metric("Markets", status.get("markets", 0), delta=f"{status.get('market_deltas', 0)} changed",
+              delta_color="off")
+    c3.metric("Vaults", status.get("vaults", 0), delta=f"{status.get('vault_deltas', 0)} changed",
+              delta_color="off")
+    c4.metric("Bank-Run Onsets", status.get("bank_run_onsets", 0), help="In the last poll (queries/bank_run.py)")
+    c5.metric("Alerts Firing", status.get("alerts_firing", 0),
+              help=f"Rule × entity pairs currently firing (queries/alerts.py) · "
+                   f"{status.get('alert_eval_us', 0):g} µs per point to evaluate")
+    for err in status.get("errors") or []:
+        st.warning(f"Last poll error: {err}")
+
+    window = status.get("window_hours", 24)
+    tab_m, tab_v, tab_a = st.tabs(["Markets", "Vaults", f"Alerts ({len(alerts)})"])
+    with tab_m:
+        if not markets.empty:
+            st.dataframe(
+                markets[["market", "chain", "utilization", "utilization_change_window", "liquidity_usd",
+                         "oracle_spot_gap_pct", "bad_debt_usd", "bad_debt_change_usd_window", "timestamp"]],
+                column_config={
+                    "market": "Market",
+                    "chain": "Chain",
+                    "utilization": st.column_config.NumberColumn("Utilization", format="%.2f"),
+                    "utilization_change_window": st.column_config.NumberColumn(f"Δ Util ({window:g}h)", format="%+.3f"),
+                    "liquidity_usd": st.column_config.NumberColumn("Liquidity", format="$%,.0f"),
+                    "oracle_spot_gap_pct": st.column_config.NumberColumn("Oracle vs Spot", format="%.3f"),
+                    "bad_debt_usd": st.column_config.NumberColumn("Bad Debt", format="$%,.0f"),
+                    "bad_debt_change_usd_window": st.column_config.NumberColumn(f"Δ Bad Debt ({window:g}h)", format="$%,.0f"),
+                    "timestamp": st.column_config.DatetimeColumn("State At", format="YYYY-MM-DD HH:mm:ss"),
+                },
+                hide_index=True,
+                use_container_width=True,
+            )
+    with tab_v:
+        if not vaults.empty:
+            st.dataframe(
+                vaults[["vault_name", "chain", "share_price", "share_price_change_pct_window",
+                        "total_assets_usd", "tvl_change_pct_window", "in_bank_run", "timestamp"]],
+                column_config={
+                    "vault_name": "Vault",
+                    "chain": "Chain",
+                    "share_price": st.column_config.NumberColumn("Share Price", format="%.6f"),
+                    "share_price_change_pct_window": st.column_config.NumberColumn(f"Δ Price ({window:g}h)", format="%+.3f%%"),
+                    "total_assets_usd": st.column_config.NumberColumn("TVL", format="$%,.0f"),
+                    "tvl_change_pct_window": st.column_config.NumberColumn(f"Δ TVL ({window:g}h)", format="%+.1f%%"),
+                    "in_bank_run": st.column_config.CheckboxColumn("Bank Run"),
+                    "timestamp": st.column_config.DatetimeColumn("State At", format="YYYY-MM-DD HH:mm:ss"),
+                },
+                hide_index=True,
+                use_container_width=True,
+            )
+    with tab_a:
+        if alerts.empty:
+            st.caption("No alerts yet. Rules: `queries/alerts.py` DEFAULT_RULES, or `monitor.py --rules FILE`.")
+        else:
+            st.dataframe(
+                alerts[["datetime", "state", "severity", "rule", "label", "metric", "value", "threshold", "held_hours"]],
+                column_config={
+                    "datetime": st.column_config.DatetimeColumn("At", format="YYYY-MM-DD HH:mm:ss"),
+                    "state": "State",
+                    "severity": "Severity",
+                    "rule": "Rule",
+                    "label": "Market / Vault",
+                    "metric": "Metric",
+                    "value": st.column_config.NumberColumn("Value", format="%.4g"),
+                    "threshold": st.column_config.NumberColumn("Threshold", format="%.4g"),
+                    "held_hours": st.column_config.NumberColumn("Held (h)", format="%.2f"),
+                },
+                hide_index=True,
+                use_container_width=True,
+            )
+
+
 def render():
     st.title("Data Management")
 
@@ -226,6 +416,8 @@ def render():
          ["timeline_events.csv"]),
     ]
 
+    last_runs = _last_block_runs(_load_run_reports())
+
     for title, block_id, description, files in blocks:
         with st.container(border=True):
             col_info, col_action = st.columns([5, 1])
@@ -252,6 +444,14 @@ def render():
                         "⚠️ Missing: " + " · ".join(f"`{f}`" for f in missing)
                     )
 
+                runs = [last_runs[b] for b in BLOCK_RUNNER_MAP.get(block_id, []) if b in last_runs]
+                if runs:
+                    st.caption("Last run: " + " · ".join(
+                        f"{e['name']} {'✅' if e.get('status') == 'ok' else '❌'} "
+                        f"{e.get('wall_s', 0):.1f}s, {e.get('api_calls', 0)} calls"
+                        for e in runs
+                    ))
+
             with col_action:
                 # Only show run button for blocks that have runner mappings
                 runner_blocks = BLOCK_RUNNER_MAP.get(block_id, [])
@@ -280,6 +480,26 @@ def render():
             st.session_state[f"_running_{block_id}"] = False
             st.cache_data.clear()
 
+    # ── Pipeline Performance ─────────────────────────────────
+    st.markdown('<div class="section-divider"></div>', unsafe_allow_html=True)
+    st.subheader("Pipeline Performance")
+    st.caption(
+        "Per-block telemetry from the runner's JSON run reports: wall time, API calls, "
+        "bytes received, latency percentiles, retries, rate-limit hits, rows written "
+        "and peak memory."
+    )
+    _render_pipeline_performance(_load_run_reports())
+
+    # ── Live Monitor ─────────────────────────────────────────
+    st.markdown('<div class="section-divider"></div>', unsafe_allow_html=True)
+    st.subheader("Live Monitor")
+    st.caption(
+        "`queries/monitor.py` polls current market and vault state for the block1 watchlist on an "
+        "interval, appends changed points to the time-series store and rewrites `data/_live/` after "
+        "every poll. Reload this page to see the latest poll; no pipeline run needed."
+    )
+    _render_live_monitor(load_live_status(), load_live_markets(), load_live_vaults(), load_alerts())
+
     # ── Data Files ───────────────────────────────────────────
     st.markdown('<div class="section-divider"></div>', unsafe_allow_html=True)
     st.subheader("Loaded Data Files")
@@ -4,7 +4,10 @@ import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
-from utils.data_loader import load_markets, load_vaults, load_share_prices, load_bad_debt_detail
+from utils.data_loader import (
+    load_markets, load_vaults, load_share_prices, load_bad_debt_detail,
+    load_drawdowns, load_change_points,
+)
 from utils.charts import apply_layout, depeg_vline, RED, GREEN, BLUE, YELLOW, ORANGE, format_usd
 
 
@@ -19,6 +22,8 @@ def render():
     markets = load_markets()
     vaults = load_vaults()
     prices = load_share_prices()
+    drawdowns = load_drawdowns()
+    change_points = load_change_points()
 
     if markets.empty:
         st.error("⚠️ Market data not available. Run the pipeline to generate `block1_markets_graphql.csv`.")
@@ -103,32 +108,22 @@ def render():
         damaged_info = []
         if prices.empty:
             st.error("⚠️ Share price data not available. Run the pipeline to generate `block2_share_prices_daily.csv`.")
+        elif drawdowns.empty:
+            st.warning("⚠️ Drawdowns not available: no valid share prices in `block2_share_prices_*.csv`.")
         else:
-            group_key = "vault_address" if "vault_address" in prices.columns else "vault_name"
-
-            for gid, vp in prices.groupby(group_key):
-                vp = vp.sort_values("date")
-                vault_name = vp["vault_name"].iloc[0] if "vault_name" in vp.columns else str(gid)
-                chain = vp["chain"].iloc[0] if "chain" in vp.columns else ""
-
-                cummax = vp["share_price"].cummax()
-                dd_series = (vp["share_price"] - cummax) / cummax
-                max_dd = dd_series.min()
-
-                if max_dd < -0.01:
-                    dd_idx = dd_series.idxmin()
-                    peak_idx = cummax[:dd_idx + 1].idxmax() if dd_idx is not None else vp.index[0]
-                    damaged_info.append({
-                        "vault_name": vault_name,
-                        "chain": chain,
-                        "group_key": gid,
-                        "haircut": max_dd,
-                        "peak": cummax.loc[dd_idx],
-                        "peak_date": vp.loc[peak_idx, "date"] if peak_idx in vp.index else vp["date"].iloc[0],
-                        "trough": vp.loc[dd_idx, "share_price"],
-                        "trough_date": vp.loc[dd_idx, "date"],
-                        "last": vp["share_price"].iloc[-1],
-                    })
+            # Running-max drawdowns (queries/drawdown.py, hourly + daily): block2's CSV, or computed by the loader
+            for _, r in drawdowns[drawdowns["max_drawdown"] < -0.01].iterrows():
+                damaged_info.append({
+                    "vault_name": r["vault_name"],
+                    "chain": r.get("chain", "") if pd.notna(r.get("chain")) else "",
+                    "group_key": r["vault_address"],
+                    "haircut": r["max_drawdown"],
+                    "peak": r["peak_price"],
+                    "peak_date": r["peak_datetime"],
+                    "trough": r["trough_price"],
+                    "trough_date": r["trough_datetime"],
+                    "last": r["last_price"],
+                })
 
         if damaged_info:
             df_dam = pd.DataFrame(damaged_info)
@@ -218,6 +213,8 @@ def render():
             group_key = "vault_address" if "vault_address" in prices.columns else "vault_name"
             for di in damaged_info:
                 vdata = prices[prices[group_key] == di["group_key"]].sort_values("date").copy()
+                vcp = (change_points[change_points["vault_address"] == di["group_key"]]
+                       if not change_points.empty else pd.DataFrame())
                 if vdata.empty:
                     continue
 
@@ -249,6 +246,15 @@ def render():
                     showarrow=True, arrowhead=2, ax=60, ay=-25,
                     font=dict(size=10, color=RED),
                 )
+                if not vcp.empty:
+                    fig.add_trace(go.Scatter(
+                        x=vcp["datetime"], y=vcp["price_after"],
+                        mode="markers",
+                        marker=dict(symbol="x", size=9, color=[RED if d == "DROP" else GREEN for d in vcp["direction"]]),
+                        customdata=vcp[["change_pct"]],
+                        hovertemplate="Change point %{x}<br>$%{y:.4f} (%{customdata[0]:+.2f}%)<extra></extra>",
+                        showlegend=False,
+                    ))
 
                 st.plotly_chart(fig, use_container_width=True)
         else:
@@ -4,7 +4,9 @@ import math
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
-from utils.data_loader import load_bridges, load_exposure_summary, load_vaults, load_csv
+from utils.data_loader import (load_bridges, load_exposure_summary, load_vaults, load_csv, load_pa_network,
+                               DEPEG_TS, STRESS_END_TS)
+from queries.pa_flow import pa_tx_rate
 from utils.charts import apply_layout, donut_chart, RED, BLUE, ORANGE, GREEN, YELLOW, format_usd
 
 
@@ -230,6 +232,68 @@ def render():
                              "risk_class": "Risk Class",
                          })
 
+    # ── Public Allocator Liquidity Routing ─────────────────
+    network = load_pa_network()
+    if network is not None and network.targets():
+        st.markdown('<div class="section-divider"></div>', unsafe_allow_html=True)
+        st.subheader("Public Allocator: How Much Liquidity Could Flow In?")
+
+        targets = network.targets()
+        toxic_keys = set(markets_gql["market_id"]) if "market_id" in markets_gql.columns else set()
+        targets = sorted(targets, key=lambda k: (k not in toxic_keys, k))
+        label = lambda k: (f"{'🔴 ' if k in toxic_keys else ''}"
+                           f"{network.markets.at[k, 'collateral_symbol']}/{network.markets.at[k, 'loan_symbol']} "
+                           f"({k[:8]})")
+
+        col1, col2 = st.columns([2, 1])
+        target = col1.selectbox("Stressed market", targets, format_func=label, key="pa_flow_target")
+        if network.liquidity is not None:
+            liquidity_pct = col2.slider("Source-market liquidity available (%)", 0, 100, 100, step=5,
+                                        key="pa_flow_liquidity")
+        else:
+            # No market_liquidity_usd in the block6 allocations: a haircut would scale nothing
+            liquidity_pct = 100
+            col2.caption("Liquidity haircut unavailable: no market liquidity recorded in the block6 allocations.")
+        r = network.route(target, liquidity_pct)
+
+        pa_events = load_csv("block6_pa_reallocations.csv")
+        rate = pa_tx_rate(pa_events, DEPEG_TS, STRESS_END_TS) if not pa_events.empty else 0.0   # Nov 4–15
+        n_tx = len(r["fill"])
+
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Max Routable", format_usd(r["max_flow_usd"]))
+        c2.metric("maxIn Headroom", format_usd(r["inflow_cap_usd"]))
+        c3.metric("reallocateTo Txs", n_tx)
+        c4.metric("At Observed PA Rate", f"~{n_tx / rate:.1f}h" if rate > 0 and n_tx else "n/a")
+
+        if not r["paths"].empty:
+            paths = r["paths"].copy()
+            paths["vault"] = paths["vault_address"].map(network.vault_names)
+            paths["source"] = paths["source_market"].map(
+                lambda k: f"{network.markets.at[k, 'collateral_symbol']}/{network.markets.at[k, 'loan_symbol']}")
+            fig = go.Figure()
+            for vault, g in paths.groupby("vault"):
+                fig.add_trace(go.Bar(x=g["source"], y=g["flow_usd"], name=str(vault)))
+            fig = apply_layout(fig, title=f"Liquidity pulled from each source market into {label(target)}",
+                               height=360)
+            fig.update_layout(barmode="stack")
+            fig.update_yaxes(tickformat="$,.0s")
+            st.plotly_chart(fig, use_container_width=True)
+
+        bound = ("the vaults' **maxIn** flow caps into this market"
+                 if r["max_flow_usd"] >= r["inflow_cap_usd"] - 1
+                 else "the **maxOut** caps and liquidity of the source markets")
+        st.markdown(
+            f"A permissionless caller could route up to **{format_usd(r['max_flow_usd'])}** into this market "
+            f"through {n_tx} vault{'s' if n_tx != 1 else ''}, limited by {bound}.".replace("$", "\\$")
+        )
+        st.caption(
+            "Max flow over source market liquidity → vault maxOut (≤ vault supply) → vault maxIn → target, "
+            "from block6 flow caps and allocations (queries/pa_flow.py). One reallocateTo per vault; hours use "
+            "the observed Public Allocator transaction rate Nov 4–15. Without recorded market liquidity, "
+            "source markets are limited only by the vault's own supply."
+        )
+
     # ── Key Finding: Credit vs. Liquidity Contagion ──────────
     st.markdown('<div class="section-divider"></div>', unsafe_allow_html=True)
     st.subheader("Bottom Line: Credit Risk Stayed Put, Liquidity Risk Spread")
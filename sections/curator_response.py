@@ -4,7 +4,9 @@ import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
-from utils.data_loader import load_vaults
+from datetime import datetime, timedelta, timezone
+from utils.data_loader import load_vaults, load_asof, DEPEG_TS
+from queries.asof import MAX_AGE
 from utils.charts import apply_layout, RESPONSE_COLORS, RED, GREEN, BLUE, YELLOW, format_usd
 
 
@@ -80,6 +82,84 @@ def render():
     fig.update_yaxes(title="", autorange="reversed")
     st.plotly_chart(fig, use_container_width=True)
 
+    # ── Exposure at a Point in Time ─────────────────────────
+    alloc = load_asof("allocation")
+    if alloc is not None and len(alloc):
+        st.markdown('<div class="section-divider"></div>', unsafe_allow_html=True)
+        st.subheader("Exposure at a Point in Time")
+
+        first_ts, last_ts = alloc.span
+        to_dt = lambda ts: datetime.fromtimestamp(ts, tz=timezone.utc).replace(tzinfo=None)
+        as_of = st.slider(
+            "As of (UTC)", min_value=to_dt(first_ts), max_value=to_dt(last_ts),
+            value=to_dt(min(max(DEPEG_TS, first_ts), last_ts)), step=timedelta(days=1),
+            format="MMM DD, YYYY", key="curator_asof",
+        )
+        t = int(as_of.replace(tzinfo=timezone.utc).timestamp())
+
+        # Whole history in one as-of call, for the curve behind the slider
+        days = range(first_ts - first_ts % 86400, last_ts + 1, 86400)
+        curve = alloc.total_at(days, by="chain", max_age=MAX_AGE)
+        curve["as_of"] = pd.to_datetime(curve["as_of"], unit="s")
+
+        # Series silent for more than MAX_AGE have exited (several stopped on Nov 11–14
+        # with a balance that would otherwise be carried to the end of the range)
+        state = alloc.at(t, max_age=MAX_AGE)
+        by_vault = state.groupby(["vault_address", "vault_name", "curator_name"], as_index=False, dropna=False).agg(
+            toxic_alloc_usd=("supply_assets_usd", "sum"),
+            n_markets=("supply_assets_usd", lambda x: int((x > 1).sum())),
+            last_update=("timestamp", "max"),
+        )
+        share = load_asof("share_prices")
+        if share is not None:
+            px_at = share.at(t).drop_duplicates("vault_address")[["vault_address", "share_price"]]
+            by_vault = by_vault.merge(px_at, on="vault_address", how="left")
+        admin = load_asof("admin_events")
+        if admin is not None:
+            last_evt = admin.at(t)[["vault_address", "event_type", "datetime"]].rename(
+                columns={"event_type": "last_admin_event", "datetime": "last_admin_at"})
+            by_vault = by_vault.merge(last_evt, on="vault_address", how="left")
+        by_vault["last_update"] = pd.to_datetime(by_vault["last_update"], unit="s")
+        by_vault = by_vault.sort_values("toxic_alloc_usd", ascending=False)
+
+        exposed = by_vault[by_vault["toxic_alloc_usd"] > 1]
+        c1, c2 = st.columns(2)
+        c1.metric("Toxic Allocation", format_usd(exposed["toxic_alloc_usd"].sum()))
+        c2.metric("Vaults Exposed", len(exposed))
+
+        fig = go.Figure()
+        for chain, g in curve.groupby("chain"):
+            fig.add_trace(go.Scatter(
+                x=g["as_of"], y=g["supply_assets_usd"], name=str(chain).title(),
+                stackgroup="alloc", mode="lines",
+            ))
+        fig.add_vline(x=as_of, line_dash="dot", line_color=YELLOW)
+        fig = apply_layout(fig, title="Vault allocation to toxic markets", height=340)
+        fig.update_yaxes(tickformat="$,.0s")
+        st.plotly_chart(fig, use_container_width=True)
+
+        st.dataframe(
+            by_vault[[c for c in ["vault_name", "curator_name", "toxic_alloc_usd", "n_markets", "share_price",
+                                  "last_admin_event", "last_admin_at", "last_update"] if c in by_vault.columns]],
+            column_config={
+                "vault_name": "Vault",
+                "curator_name": "Curator",
+                "toxic_alloc_usd": st.column_config.NumberColumn("Toxic Allocation", format="$%,.0f"),
+                "n_markets": st.column_config.NumberColumn("Toxic Markets", format="%d"),
+                "share_price": st.column_config.NumberColumn("Share Price", format="%.4f"),
+                "last_admin_event": "Last Admin Action",
+                "last_admin_at": "Admin Action At",
+                "last_update": st.column_config.DatetimeColumn("Data As Of", format="MMM DD"),
+            },
+            hide_index=True,
+            use_container_width=True,
+        )
+        st.caption(
+            "Each vault's latest allocation, share price and admin action at or before the selected date "
+            "(block3 allocation timeseries, block2 share prices, block3 admin events). Allocations not "
+            "reported in the 2 days before the date count as exited."
+        )
+
     # ── Response Matrix ─────────────────────────────────────
     st.subheader("Response Classification")
 
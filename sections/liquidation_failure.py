@@ -4,7 +4,9 @@ import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
-from utils.data_loader import load_ltv, load_borrowers, load_asset_prices
+from utils.data_loader import (
+    load_ltv, load_borrowers, load_asset_prices, load_hf_replay, load_hf_replay_hourly, load_oracle_cube,
+)
 from utils.charts import apply_layout, depeg_vline, RED, BLUE, ORANGE, GREEN, YELLOW, format_usd
 
 
@@ -14,6 +16,9 @@ def render():
     ltv = load_ltv()
     borrowers = load_borrowers()
     prices = load_asset_prices()
+    replay = load_hf_replay()
+    replay_hourly = load_hf_replay_hourly()
+    cube = load_oracle_cube()
 
     if ltv.empty and prices.empty:
         st.error("⚠️ Data not available. Run the pipeline to generate `block5_ltv_analysis.csv` and `block5_asset_prices.csv`.")
@@ -72,6 +77,15 @@ def render():
         " Chainlink oracle adapters continued reporting approximately \\$1.00, "
         "preventing the liquidation engine from clearing underwater positions."
     )
+    masked = replay[replay["masked_from"].notna()] if "masked_from" in replay.columns else pd.DataFrame()
+    if not masked.empty:
+        first = masked.sort_values("masked_from").iloc[0]
+        caption_parts.append(
+            f" Replaying every borrower hour by hour, {len(masked)} positions in "
+            f"{masked['market'].nunique()} sdeUSD market{'s' if masked['market'].nunique() != 1 else ''} "
+            f"were liquidatable at spot while the oracle still had them healthy, "
+            f"the first from {first['masked_from']:%b %d %H:00} UTC."
+        )
     st.caption("".join(caption_parts).replace("$", r"\$"))
 
     # Oracle price from LTV data (what the oracle reports)
@@ -208,6 +222,132 @@ def render():
             )
             st.plotly_chart(fig, use_container_width=True)
 
+    # ── Health-Factor Replay ────────────────────────────────
+    if not replay.empty and not replay_hourly.empty:
+        st.markdown('<div class="section-divider"></div>', unsafe_allow_html=True)
+        st.subheader("Health-Factor Replay: Spot vs Oracle")
+
+        markets = list(replay_hourly["market"].unique())
+        market = st.selectbox("Market", markets, key="hf_replay_market") if len(markets) > 1 else markets[0]
+        hourly = replay_hourly[replay_hourly["market"] == market]
+        positions = replay[replay["market"] == market]
+
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(
+            x=hourly["timestamp"], y=hourly["n_liquidatable_spot"],
+            name="Liquidatable at spot", line=dict(color=RED, width=2), line_shape="hv",
+        ))
+        fig.add_trace(go.Scatter(
+            x=hourly["timestamp"], y=hourly["n_liquidatable_oracle"],
+            name="Liquidatable at oracle", line=dict(color=GREEN, width=2, dash="dash"), line_shape="hv",
+        ))
+        fig.add_trace(go.Scatter(
+            x=hourly["timestamp"], y=hourly["n_borrowers"],
+            name="Open borrow positions", line=dict(color=BLUE, width=1, dash="dot"), line_shape="hv",
+        ))
+        fig = apply_layout(fig, title=f"{market}: borrowers below HF 1", height=380)
+        fig = depeg_vline(fig)
+        st.plotly_chart(fig, use_container_width=True)
+
+        pos_masked = positions[positions["masked_from"].notna()].sort_values("masked_from")
+        liq_oracle_not_done = positions[positions["first_liquidatable_oracle"].notna() & positions["liquidated_at"].isna()]
+        lines = []
+        if not pos_masked.empty:
+            first = pos_masked.iloc[0]
+            lines.append(
+                f"**{len(pos_masked)} of {len(positions)}** borrowers crossed HF 1 at spot while the oracle "
+                f"still reported them healthy. The first, `{first['user_address'][:10]}…`, at "
+                f"**{first['masked_from']:%b %d %H:00} UTC** with {format_usd(first['debt_usd_at_masked'])} debt; "
+                f"masked for up to {int(pos_masked['hours_masked'].max())} hours."
+            )
+        else:
+            lines.append("No borrower in this market was liquidatable at spot while the oracle said healthy.")
+        if not liq_oracle_not_done.empty:
+            lines.append(
+                f"{len(liq_oracle_not_done)} position{'s' if len(liq_oracle_not_done) != 1 else ''} "
+                f"({format_usd(liq_oracle_not_done['max_debt_usd'].sum())} peak debt) were below HF 1 even at the "
+                f"oracle price and were never liquidated."
+            )
+        n_liquidated = int(positions["liquidated_at"].notna().sum())
+        lines.append(f"{n_liquidated} borrower{'s' if n_liquidated != 1 else ''} in the window were actually liquidated.")
+        st.markdown("\n\n".join(lines).replace("$", "\\$"))
+        st.caption(
+            "Positions rebuilt from the market's Borrow/Repay/Collateral/Liquidation events (block8) and "
+            "scored hourly. Spot uses block5 hourly prices; the oracle price is modelled: vault-based "
+            "oracles hold the pre-depeg collateral/loan price, feed oracles follow spot."
+        )
+
+    # ── Oracle Deviation Scanner ────────────────────────────
+    if cube is not None and len(cube.markets):
+        st.markdown('<div class="section-divider"></div>', unsafe_allow_html=True)
+        st.subheader("Oracle Deviation Scanner")
+
+        threshold = st.slider("Deviation threshold (oracle above spot, %)", 1, 99, 10, key="oracle_cube_threshold")
+        scan = cube.scan(threshold)
+        arch = cube.by_architecture(threshold)
+
+        hit = scan[scan["first_above"].notna()]
+        if not hit.empty:
+            first = hit.iloc[0]
+            worst = arch.iloc[0]
+            st.markdown(
+                f"**{len(hit)} of {len(scan)}** toxic markets had an oracle more than {threshold}% above spot. "
+                f"First: **{first['market']}** at **{first['first_above']:%b %d %H:00} UTC**. "
+                f"Longest window: **{worst['oracle_mechanism']}** oracles, "
+                f"{int(worst['max_window_hours'])} consecutive hours."
+            )
+        else:
+            st.markdown(f"No market's oracle was more than {threshold}% above spot in the hourly window.")
+
+        col1, col2 = st.columns([3, 2])
+        with col1:
+            st.dataframe(
+                scan[["market", "oracle_mechanism", "oracle_model", "first_above", "hours_above",
+                      "longest_window_hours", "max_deviation_pct"]],
+                column_config={
+                    "market": "Market",
+                    "oracle_mechanism": "Oracle Type",
+                    "oracle_model": "Oracle Path",
+                    "first_above": st.column_config.DatetimeColumn("First Above", format="MMM DD HH:mm"),
+                    "hours_above": st.column_config.NumberColumn("Hours Above", format="%d"),
+                    "longest_window_hours": st.column_config.NumberColumn("Longest Window (h)", format="%d"),
+                    "max_deviation_pct": st.column_config.NumberColumn("Peak Deviation", format="%.1f%%"),
+                },
+                hide_index=True,
+                use_container_width=True,
+            )
+        with col2:
+            st.dataframe(
+                arch,
+                column_config={
+                    "oracle_mechanism": "Oracle Type",
+                    "markets": st.column_config.NumberColumn("Markets", format="%d"),
+                    "markets_above": st.column_config.NumberColumn("Above", format="%d"),
+                    "earliest_above": st.column_config.DatetimeColumn("Earliest", format="MMM DD HH:mm"),
+                    "max_window_hours": st.column_config.NumberColumn("Longest (h)", format="%d"),
+                    "max_deviation_pct": st.column_config.NumberColumn("Peak", format="%.1f%%"),
+                },
+                hide_index=True,
+                use_container_width=True,
+            )
+
+        # Hours above the threshold, one row per market
+        mask = cube.above(threshold)
+        fig = go.Figure(go.Heatmap(
+            z=mask.astype(int), x=pd.to_datetime(cube.hours, unit="s"), y=cube.markets["market"],
+            colorscale=[[0, "rgba(0,0,0,0)"], [1, RED]], showscale=False,
+            hovertemplate="%{y}<br>%{x}<extra></extra>",
+        ))
+        fig = apply_layout(fig, title=f"Hours with oracle > {threshold}% above spot", height=120 + 28 * len(cube.markets))
+        fig = depeg_vline(fig)
+        st.plotly_chart(fig, use_container_width=True)
+        st.caption(
+            "Market × hour cube built by block5 (queries/oracle_cube.py). The API has no oracle price "
+            "history, so each oracle path is modelled: oracles whose current price sits far above spot are "
+            "held at that price, vault-based oracles reporting nothing hold the pre-depeg spot level, the "
+            "rest follow spot."
+        )
+
     # ── LTV Analysis ────────────────────────────────────────
     st.markdown('<div class="section-divider"></div>', unsafe_allow_html=True)
     st.subheader("LTV Analysis: Why Liquidations Failed")
@@ -278,11 +418,37 @@ def render():
     with col2:
         with st.container(border=True):
             st.markdown("**2. Depeg Occurs**")
-            st.markdown(
-                "Oracle price = \\$1.00 (unchanged)\n\n"
-                "Market price → \\$0.05\n\n"
-                "Oracle LTV still < LLTV"
-            )
+            if not replay_hourly.empty:
+                # Per replay market: last oracle print before the depeg vs the post-depeg range
+                depeg = replay_hourly["timestamp"] >= "2025-11-04"
+                pre = replay_hourly[~depeg].groupby("market")["oracle_price_usd"].last()
+                post = replay_hourly[depeg].groupby("market").agg(
+                    oracle_min=("oracle_price_usd", "min"),
+                    oracle_max=("oracle_price_usd", "max"),
+                    spot_min=("collateral_price_usd", "min"),
+                    n_masked=("n_masked", "max"),
+                )
+                lines = []
+                for market, r in post.iterrows():
+                    before = pre.get(market)
+                    if pd.notna(before) and before > 0:
+                        move = (r["oracle_min"] / before - 1) * 100
+                        oracle = (f"Oracle \\${before:.3f} → \\${r['oracle_min']:.3f}–\\${r['oracle_max']:.3f} "
+                                  f"({move:+.1f}%)")
+                    else:
+                        oracle = f"Oracle \\${r['oracle_min']:.3f}–\\${r['oracle_max']:.3f}"
+                    lines.append(
+                        f"**{market}**: {oracle}; market → \\${r['spot_min']:.3f}; "
+                        f"oracle HF still ≥ 1 for {int(r['n_masked'])} spot-liquidatable "
+                        f"borrower{'s' if int(r['n_masked']) != 1 else ''}"
+                    )
+                st.markdown("\n\n".join(lines))
+            else:
+                st.markdown(
+                    "Oracle price = \\$1.00 (unchanged)\n\n"
+                    "Market price → \\$0.05\n\n"
+                    "Oracle LTV still < LLTV"
+                )
             st.caption("Oracle does not reflect the price decline. Protocol considers positions healthy.")
 
     with col3:
@@ -4,7 +4,7 @@ import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
-from utils.data_loader import load_utilization, load_net_flows
+from utils.data_loader import load_utilization, load_net_flows, load_bank_runs
 from utils.charts import apply_layout, depeg_vline, RED, BLUE, ORANGE, GREEN, format_usd
 
 
@@ -13,6 +13,7 @@ def render():
 
     utilization = load_utilization()
     net_flows = load_net_flows()
+    bank_runs = load_bank_runs()
 
     if utilization.empty and net_flows.empty:
         st.error("⚠️ Data not available. Run the pipeline to generate `block3_market_utilization_hourly.csv` and `block3_vault_net_flows.csv`.")
@@ -29,6 +30,8 @@ def render():
     # Clean net_flows early (used in multiple places)
     if not net_flows.empty:
         net_flows = net_flows[~net_flows["vault_name"].str.contains("Duplicated Key", case=False, na=False)]
+    if not bank_runs.empty:
+        bank_runs = bank_runs[~bank_runs["vault_name"].str.contains("Duplicated Key", case=False, na=False)]
 
     # Metric 2: Peak single-day outflow
     if not net_flows.empty and "daily_flow_usd" in net_flows.columns:
@@ -156,6 +159,53 @@ def render():
             fig.update_yaxes(title="Net Flow (USD)", tickformat="$,.0f")
             st.plotly_chart(fig, use_container_width=True)
 
+    # ── Bank-Run Onsets ─────────────────────────────────────
+    st.subheader("Bank-Run Onsets")
+
+    if not bank_runs.empty:
+        st.caption(
+            "Hourly TVL and share price replayed through a streaming detector: the net flow is the TVL "
+            "change the share price doesn't explain, scored against each vault's own EWMA flow history. "
+            "A run starts on an outflow z-score ≤ -4 that also loses ≥ 2% of TVL in a step (`flow_z`), "
+            "or once 10% of TVL has left since the last peak (`cumulative`)."
+        )
+        fig = go.Figure(go.Scatter(
+            x=bank_runs["datetime"],
+            y=bank_runs["vault_name"],
+            mode="markers",
+            marker=dict(
+                size=(bank_runs["tvl_usd"].clip(lower=1).pow(0.5) / 1000).clip(6, 40),
+                color=[RED if t == "flow_z" else ORANGE for t in bank_runs["trigger"]],
+                line=dict(width=1, color="white"),
+            ),
+            customdata=bank_runs[["trigger", "net_flow_pct", "outflow_since_peak_pct", "tvl_usd"]],
+            hovertemplate="%{y}<br>%{x}<br>%{customdata[0]}: step %{customdata[1]:+.1f}%, "
+                          "-%{customdata[2]:.1f}% since peak<br>TVL $%{customdata[3]:,.0f}<extra></extra>",
+        ))
+        fig = apply_layout(fig, height=max(320, 22 * bank_runs["vault_name"].nunique()), show_legend=False)
+        fig = depeg_vline(fig)
+        fig.update_xaxes(title="")
+        fig.update_yaxes(title="")
+        st.plotly_chart(fig, use_container_width=True)
+
+        st.dataframe(
+            bank_runs[["datetime", "vault_name", "trigger", "tvl_usd", "net_flow_pct",
+                       "z_score", "outflow_since_peak_pct"]],
+            column_config={
+                "datetime": st.column_config.DatetimeColumn("Onset (UTC)", format="YYYY-MM-DD HH:mm"),
+                "vault_name": "Vault",
+                "trigger": "Trigger",
+                "tvl_usd": st.column_config.NumberColumn("TVL Before", format="$%,.0f"),
+                "net_flow_pct": st.column_config.NumberColumn("Step Flow", format="%.1f%%"),
+                "z_score": st.column_config.NumberColumn("Flow z", format="%.1f"),
+                "outflow_since_peak_pct": st.column_config.NumberColumn("Out Since Peak", format="%.1f%%"),
+            },
+            hide_index=True,
+            use_container_width=True,
+        )
+    else:
+        st.info("Bank-run events not available. Re-run block3b to generate `block3_bank_run_events.csv`.")
+
     # ── Stress Rankings ─────────────────────────────────────
     st.subheader("Vault Stress Rankings")
 
@@ -170,6 +220,9 @@ def render():
             total_days=("daily_flow_usd", "count"),
         ).reset_index()
         stress["net_change_pct"] = ((stress["end_tvl"] - stress["start_tvl"]) / stress["start_tvl"].clip(lower=1)) * 100
+        if not bank_runs.empty:
+            first_onset = bank_runs.groupby("vault_name")["datetime"].min().rename("run_onset")
+            stress = stress.merge(first_onset, on="vault_name", how="left")
         stress = stress.sort_values("net_change_pct")
 
         st.dataframe(
@@ -181,6 +234,7 @@ def render():
                 "net_change_pct": st.column_config.NumberColumn("Net Change", format="%.1f%%"),
                 "min_flow": st.column_config.NumberColumn("Max Daily Outflow", format="$%,.0f"),
                 "withdrawal_days": st.column_config.NumberColumn("Withdrawal Days", format="%d"),
+                "run_onset": st.column_config.DatetimeColumn("Bank-Run Onset", format="YYYY-MM-DD HH:mm"),
             },
             hide_index=True,
             use_container_width=True,
@@ -0,0 +1,38 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "queries"))
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.parquet as pq  # noqa: E402
+
+from stream_writer import open_writer  # noqa: E402
+
+
+def test_parquet_null_first_chunk_takes_type_from_later_chunk(tmp_path):
+    path = tmp_path / "out.parquet"
+    with open_writer(path, chunk_rows=2) as w:
+        w.write_rows([{"id": 1, "name": None, "amount": 1}, {"id": 2, "name": None, "amount": 2}])
+        w.write_rows([{"id": 3, "name": "xUSD", "amount": 2.5}, {"id": 4, "name": "deUSD", "amount": 3}])
+
+    assert path.exists()
+    assert not (tmp_path / "out.parquet.partial").exists()
+    table = pq.read_table(path)
+    assert table.schema.field("name").type == pa.string()
+    assert table.schema.field("amount").type == pa.float64()
+    assert table.column("name").to_pylist() == [None, None, "xUSD", "deUSD"]
+    assert table.column("amount").to_pylist() == [1.0, 2.0, 2.5, 3.0]
+
+
+def test_parquet_explicit_schema(tmp_path):
+    path = tmp_path / "out.parquet"
+    schema = pa.schema([("id", pa.int64()), ("name", pa.string())])
+    with open_writer(path, schema=schema, chunk_rows=1) as w:
+        w.write_rows([{"id": 1, "name": None}])
+        w.write_rows([{"id": 2, "name": "sdeUSD"}])
+
+    table = pq.read_table(path)
+    assert table.schema.equals(schema)
+    assert table.num_rows == 2
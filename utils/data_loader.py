@@ -12,15 +12,30 @@ Block file mapping:
     block1_vaults_graphql.csv       → load_vaults()
     block2_share_prices_daily.csv   → load_share_prices()
     block2_share_price_summary.csv  → merged into load_vaults()
+    block2_share_price_drawdowns.csv → load_drawdowns()  (queries/drawdown.py)
+    block2_share_price_change_points.csv → load_change_points()
     block3_curator_profiles.csv     → merged into load_vaults()
     block3_vault_net_flows.csv      → load_net_flows()
+    block3_bank_run_events.csv      → load_bank_runs()  (queries/bank_run.py)
     block3_market_utilization_hourly.csv → load_utilization()
     block5_asset_prices.csv         → load_asset_prices()
     block5_ltv_analysis.csv         → load_ltv()
     block5_borrower_positions.csv   → load_borrowers()
     block6_contagion_bridges.csv    → load_bridges()
     block6_vault_allocation_summary.csv → load_exposure_summary()
+    block6_public_allocator_config.csv + block6_vault_full_allocations.csv
+                                    → load_pa_network()  (max-flow, recomputed live)
+    block8_hf_replay_positions.csv  → load_hf_replay()
+    block8_hf_replay_hourly.csv     → load_hf_replay_hourly()
+    _store/oracle_cube/*.npy        → load_oracle_cube()  (memory-mapped, block5)
+    block3_allocation_timeseries.csv, block2_share_prices_daily.csv,
+    block3_market_utilization_hourly.csv, block3_admin_events.csv
+                                    → load_asof(name)  (point-in-time lookups)
     timeline_events.csv             → load_timeline()  (editorial)
+    _live/markets.csv, _live/vaults.csv, _live/status.json
+                                    → load_live_markets() / load_live_vaults() / load_live_status()
+                                      (queries/monitor.py, latest poll — no pipeline run needed)
+    _store/alerts.jsonl             → load_alerts()  (queries/alerts.py rules, evaluated by monitor.py)
 
     block8 files (reference only, not loaded by dashboard):
     block8_plume_transactions.csv       Plume sdeUSD/pUSD market events
@@ -33,14 +48,28 @@ Block file mapping:
     (borrower repaid voluntarily). See block8_query_plume_deep_dive.py.
 """
 
+import json
 import streamlit as st
 import pandas as pd
 import numpy as np
 from pathlib import Path
 
+from queries.alerts import BAD_DEBT_USD, UTIL_FULL, UTIL_HIGH, concentration_level
+from queries.drawdown import merge_history, drawdown_table, change_points
+from queries.asof import AsOfIndex, TABLES as ASOF_TABLES, MAX_AGE
+from queries.oracle_cube import OracleCube
+from queries.pa_flow import AllocatorNetwork
+from queries.resampling import dedupe_chains
+
 # Dashboard reads from data/, the runner syncs pipeline outputs here.
 DATA_DIR = Path(__file__).parent.parent / "data"
 
+# xUSD depeg (Nov 4 2025 00:00 UTC) and the last full day before it
+DEPEG_TS = 1762214400
+# End of the acute post-depeg window (Nov 15 2025 00:00 UTC)
+STRESS_END_TS = 1763164800
+PRE_DEPEG_DATE = "2025-11-03"
+
 # All block files the dashboard expects
 _EXPECTED_FILES = [
     "block1_markets_graphql.csv",
@@ -104,7 +133,7 @@ def load_markets() -> pd.DataFrame:
     if "market_label" not in df.columns:
         df["market_label"] = df.apply(_market_label, axis=1)
 
-    # Status: derive from utilization + bad debt
+    # Status: derive from utilization + bad debt (thresholds shared with queries/alerts.py)
     if "status" not in df.columns:
         if "bad_debt_status" in df.columns:
             df["status"] = df["bad_debt_status"]
@@ -112,11 +141,11 @@ def load_markets() -> pd.DataFrame:
             def _status(r):
                 util = float(r.get("utilization", 0) or 0)
                 bd = float(r.get("bad_debt_usd", 0) or 0)
-                if bd > 1000:
+                if bd > BAD_DEBT_USD:
                     return "BAD_DEBT"
-                if util >= 0.99:
+                if util >= UTIL_FULL:
                     return "AT_RISK_100PCT"
-                if util >= 0.90:
+                if util >= UTIL_HIGH:
                     return "AT_RISK_HIGH"
                 return "ACTIVE"
             df["status"] = df.apply(_status, axis=1)
@@ -183,22 +212,13 @@ def load_markets() -> pd.DataFrame:
     # utilization since the depeg. The allocation timeseries gives us the
     # actual vault supply on Nov 4. We use this as the real capital at risk.
     df["supply_at_depeg"] = 0.0
-    ts = _read("block3_allocation_timeseries.csv")
-    if not ts.empty and "market_unique_key" in ts.columns and "market_id" in df.columns:
-        ts["supply_assets_usd"] = pd.to_numeric(
-            ts.get("supply_assets_usd", pd.Series(dtype=float)), errors="coerce"
-        ).fillna(0)
-        # Nov 4 snapshot (depeg day); fall back to Nov 3 if Nov 4 missing
-        nov4 = ts[ts["date"] == "2025-11-04"]
-        if nov4.empty:
-            nov4 = ts[ts["date"] == "2025-11-03"]
-        if not nov4.empty:
-            depeg_by_mkt = nov4.groupby("market_unique_key")["supply_assets_usd"].sum()
-            for idx, row in df.iterrows():
-                mk = row.get("market_id", "")
-                ds = depeg_by_mkt.get(mk, 0)
-                if ds > 0:
-                    df.at[idx, "supply_at_depeg"] = ds
+    alloc = load_asof("allocation")
+    if alloc is not None and "market_id" in df.columns:
+        # Nov 4 snapshot (depeg day); per series, fall back to Nov 2–3 if Nov 4 is missing
+        at_depeg = alloc.at(DEPEG_TS, max_age=MAX_AGE)
+        depeg_by_mkt = at_depeg.groupby("market_unique_key")["supply_assets_usd"].sum()
+        ds = df["market_id"].map(depeg_by_mkt).fillna(0.0)
+        df["supply_at_depeg"] = ds.where(ds > 0, 0.0)
 
     # ── Plume sdeUSD/pUSD: resolved, no funds locked ────────
     # block8 transaction data confirmed the sole borrower (0x1Ae4...)
@@ -497,6 +517,44 @@ def load_share_prices() -> pd.DataFrame:
         df["share_price"] = pd.to_numeric(df["share_price"], errors="coerce")
     return df
 
+def _share_price_history() -> pd.DataFrame:
+    """block2 daily + hourly share prices as one series per vault (queries/drawdown.py)."""
+    return merge_history(_read("block2_share_prices_daily.csv"), _read("block2_share_prices_hourly.csv"))
+
+def load_drawdowns() -> pd.DataFrame:
+    """
+    Source: block2_share_price_drawdowns.csv (queries/drawdown.py); computed from
+    block2_share_prices_daily/hourly.csv when a block2 run predates it
+    Section expects: vault_address, vault_name, chain, max_drawdown (negative fraction),
+    peak_price, peak_datetime, trough_price, trough_datetime, last_price,
+    recovery_datetime, recovery_hours
+    """
+    df = _read("block2_share_price_drawdowns.csv")
+    if df.empty:
+        history = _share_price_history()
+        return drawdown_table(history) if not history.empty else history
+    for col in ["peak_datetime", "trough_datetime", "last_datetime", "recovery_datetime"]:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col])
+    for col in ["max_drawdown", "current_drawdown", "peak_price", "trough_price", "last_price", "recovery_hours"]:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+def load_change_points() -> pd.DataFrame:
+    """
+    Source: block2_share_price_change_points.csv (queries/drawdown.py); computed from
+    block2_share_prices_daily/hourly.csv when a block2 run predates it
+    Section expects: vault_address, vault_name, chain, datetime, price_before,
+    price_after, change_pct, z_score, direction (DROP / JUMP)
+    """
+    df = _read("block2_share_price_change_points.csv")
+    if df.empty:
+        history = _share_price_history()
+        return change_points(history) if not history.empty else history
+    df["datetime"] = pd.to_datetime(df["datetime"])
+    return df
+
 def load_asset_prices() -> pd.DataFrame:
     """
     Source: block5_asset_prices.csv
@@ -521,8 +579,7 @@ def load_asset_prices() -> pd.DataFrame:
     # Some assets (xUSD) exist on multiple chains, deduplicate by
     # keeping one price per (asset, date), preferring chain_id=1 (Ethereum)
     if "chain_id" in df.columns and "date" in df.columns:
-        df = df.sort_values(["asset", "timestamp", "chain_id"])
-        df = df.drop_duplicates(subset=["asset", "date"], keep="first")
+        df = dedupe_chains(df, keys=["asset"], bucket="DAY")
 
     # Sort by asset + time to avoid Plotly drawing diagonals across gaps
     df = df.sort_values(["asset", "timestamp"]).reset_index(drop=True)
@@ -554,6 +611,18 @@ def load_net_flows() -> pd.DataFrame:
 
     return df
 
+def load_bank_runs() -> pd.DataFrame:
+    """
+    Source: block3_bank_run_events.csv (queries/bank_run.py, replayed by block3b)
+    Section expects: vault_name, datetime, trigger (flow_z / cumulative), tvl_usd,
+    net_flow_pct, z_score, outflow_since_peak_pct
+    """
+    df = _read("block3_bank_run_events.csv")
+    if df.empty:
+        return df
+    df["datetime"] = pd.to_datetime(df["datetime"])
+    return df
+
 def load_utilization() -> pd.DataFrame:
     """
     Source: block3_market_utilization_hourly.csv
@@ -665,15 +734,7 @@ def load_borrowers() -> pd.DataFrame:
         top = grp["borrow_assets_usd"].max()
         top_pct = (top / total * 100) if total > 0 else 0
         n = len(grp)
-
-        if top_pct >= 90:
-            conc = "EXTREME"
-        elif top_pct >= 70:
-            conc = "HIGH"
-        elif top_pct >= 50:
-            conc = "MODERATE"
-        else:
-            conc = "LOW"
+        conc = concentration_level(top_pct)
 
         groups.append({
             "market": market,
@@ -685,6 +746,63 @@ def load_borrowers() -> pd.DataFrame:
 
     return pd.DataFrame(groups)
 
+def load_hf_replay() -> pd.DataFrame:
+    """
+    Source: block8_hf_replay_positions.csv (queries/hf_replay.py)
+    Section expects: market, user_address, max_debt_usd, masked_from,
+    first_liquidatable_spot, first_liquidatable_oracle, liquidated_at, hours_masked
+    """
+    df = _read("block8_hf_replay_positions.csv")
+    if df.empty:
+        return df
+
+    for col in ["masked_from", "first_liquidatable_spot", "first_liquidatable_oracle", "liquidated_at"]:
+        if col in df.columns:
+            df[col] = pd.to_datetime(pd.to_numeric(df[col], errors="coerce"), unit="s")
+    for col in ["max_debt_usd", "debt_usd_at_masked", "hours_masked"]:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
+
+    return df
+
+def load_hf_replay_hourly() -> pd.DataFrame:
+    """
+    Source: block8_hf_replay_hourly.csv
+    Section expects: timestamp (datetime), market, n_borrowers, n_liquidatable_spot,
+    n_liquidatable_oracle, n_masked, debt_masked_usd, collateral_price_usd, oracle_price_usd
+    """
+    df = _read("block8_hf_replay_hourly.csv")
+    if df.empty:
+        return df
+    df["timestamp"] = pd.to_datetime(df["timestamp"], unit="s")
+    return df
+
+def load_asof(name: str):
+    """
+    Source: queries/asof.py TABLES[name] (allocation, share_prices, utilization, admin_events)
+    Section expects: AsOfIndex with at(T) / at_many([T1..Tn]) / total_at(...).
+    None if the block file is missing.
+    """
+    filename, keys = ASOF_TABLES[name]
+    df = _read(filename)
+    if df.empty or not set(keys) <= set(df.columns):
+        return None
+    if "supply_assets_usd" in df.columns:
+        df["supply_assets_usd"] = pd.to_numeric(df["supply_assets_usd"], errors="coerce").fillna(0)
+    return AsOfIndex(df, keys)
+
+def load_oracle_cube():
+    """
+    Source: data/_store/oracle_cube/ (queries/oracle_cube.py, built by block5)
+    Section expects: OracleCube with scan(threshold_pct) / by_architecture(threshold_pct);
+    markets gain a `market` label. None if block5 hasn't built the cube.
+    """
+    cube = OracleCube.load(DATA_DIR)
+    if cube is None:
+        return None
+    cube.markets["market"] = cube.markets.apply(_market_label, axis=1)
+    return cube
+
 def load_bridges() -> pd.DataFrame:
     """
     Source: block6_contagion_bridges.csv
@@ -710,6 +828,19 @@ def load_bridges() -> pd.DataFrame:
 
     return df
 
+def load_pa_network():
+    """
+    Source: block6_public_allocator_config.csv, block6_vault_full_allocations.csv
+    (queries/pa_flow.py)
+    Section expects: AllocatorNetwork with targets() / route(target, liquidity_pct).
+    None if either file is missing.
+    """
+    caps = _read("block6_public_allocator_config.csv")
+    alloc = _read("block6_vault_full_allocations.csv")
+    if caps.empty or alloc.empty:
+        return None
+    return AllocatorNetwork(caps, alloc)
+
 def load_exposure_summary() -> pd.DataFrame:
     """
     Source: block6_vault_allocation_summary.csv
@@ -770,27 +901,22 @@ def load_pre_depeg_exposure() -> pd.DataFrame:
         return pd.DataFrame()
 
     alloc["supply_assets_usd"] = pd.to_numeric(alloc["supply_assets_usd"], errors="coerce").fillna(0)
-    if "date" not in alloc.columns:
+    if "timestamp" not in alloc.columns:
         return pd.DataFrame()
 
     # Normalize chain column
     if "blockchain" in alloc.columns and "chain" not in alloc.columns:
         alloc.rename(columns={"blockchain": "chain"}, inplace=True)
 
-    # Pre-depeg: latest data point on or before Nov 3 2025
-    pre_depeg = alloc[alloc["date"] <= "2025-11-03"]
+    # Pre-depeg: latest data point on or before Nov 3 2025, per vault × market
+    # (series that stopped reporting more than MAX_AGE earlier have exited)
+    group_key = "vault_address" if "vault_address" in alloc.columns else "vault_name"
+    index = AsOfIndex(alloc, [group_key, "market_unique_key"])
+    pre_depeg = index.at(PRE_DEPEG_DATE, max_age=MAX_AGE).groupby(group_key)["supply_assets_usd"].sum()
 
     rows = []
-    group_key = "vault_address" if "vault_address" in alloc.columns else "vault_name"
     for gid, g in alloc.groupby(group_key):
-        g_pre = pre_depeg[pre_depeg[group_key] == gid] if not pre_depeg.empty else pd.DataFrame()
-
-        # Pre-depeg exposure: sum across toxic markets on latest pre-depeg date
-        pre_depeg_val = 0.0
-        if not g_pre.empty:
-            latest_date = g_pre["date"].max()
-            day_data = g_pre[g_pre["date"] == latest_date]
-            pre_depeg_val = day_data["supply_assets_usd"].sum()
+        pre_depeg_val = float(pre_depeg.get(gid, 0.0))
 
         # Peak exposure across entire timeseries
         daily_totals = g.groupby("date")["supply_assets_usd"].sum()
@@ -818,6 +944,60 @@ def load_pre_depeg_exposure() -> pd.DataFrame:
     return df
 
 
+def load_live_markets() -> pd.DataFrame:
+    """
+    Source: _live/markets.csv (queries/monitor.py, rewritten every poll)
+    Section expects: market, chain, utilization, oracle_spot_gap_pct (fraction), bad_debt_usd,
+    liquidity_usd, utilization_change_window, bad_debt_change_usd_window, timestamp (datetime)
+    """
+    df = _read("_live/markets.csv")
+    if df.empty:
+        return df
+    df["market"] = df["collateral_symbol"].astype(str) + "/" + df["loan_symbol"].astype(str)
+    df["timestamp"] = pd.to_datetime(df["timestamp"], unit="s")
+    return df.sort_values("utilization", ascending=False).reset_index(drop=True)
+
+def load_live_vaults() -> pd.DataFrame:
+    """
+    Source: _live/vaults.csv (queries/monitor.py, rewritten every poll)
+    Section expects: vault_name, chain, share_price, total_assets_usd,
+    share_price_change_pct_window, tvl_change_pct_window, in_bank_run, timestamp (datetime)
+    """
+    df = _read("_live/vaults.csv")
+    if df.empty:
+        return df
+    df["timestamp"] = pd.to_datetime(df["timestamp"], unit="s")
+    return df.sort_values("total_assets_usd", ascending=False).reset_index(drop=True)
+
+def load_live_status() -> dict:
+    """
+    Source: _live/status.json (queries/monitor.py)
+    Section expects: polled_at (unix), url, markets, vaults, market_deltas, vault_deltas,
+    bank_run_onsets, errors. Empty dict if the monitor has never run.
+    """
+    path = DATA_DIR / "_live" / "status.json"
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except ValueError:
+        return {}
+
+def load_alerts(limit: int = 200) -> pd.DataFrame:
+    """
+    Source: _store/alerts.jsonl (queries/alerts.py via monitor.py, one JSON line per alert)
+    Section expects: datetime, state, severity, rule, label, metric, value, threshold, held_hours
+    (newest first, at most `limit` rows)
+    """
+    path = DATA_DIR / "_store" / "alerts.jsonl"
+    if not path.exists():
+        return pd.DataFrame()
+    df = pd.read_json(path, lines=True)
+    if df.empty:
+        return df
+    df["datetime"] = pd.to_datetime(df["timestamp"], unit="s")
+    return df.sort_values("timestamp", ascending=False).head(limit).reset_index(drop=True)
+
 def load_timeline() -> pd.DataFrame:
     """
     Source: timeline_events.csv (editorial, hand-written, not generated)
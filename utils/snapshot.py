@@ -13,6 +13,8 @@ import numpy as np
 from pathlib import Path
 from datetime import datetime, timezone
 
+from queries.asof import AsOfIndex, MAX_AGE
+
 DATA_DIR = Path(__file__).parent.parent / "data"
 SNAPSHOT_PATH = DATA_DIR / "snapshot.txt"
 
@@ -169,24 +171,20 @@ def write_snapshot():
         alloc_ts_s3["supply_assets_usd"] = pd.to_numeric(
             alloc_ts_s3["supply_assets_usd"], errors="coerce").fillna(0)
         a_grp_s3 = "vault_address" if "vault_address" in alloc_ts_s3.columns else "vault_name"
+        # Latest allocation on or before Nov 3 (within MAX_AGE), per vault × market
+        pre_s3 = AsOfIndex(alloc_ts_s3, [a_grp_s3, "market_unique_key"]).at("2025-11-03", max_age=MAX_AGE)
+        pre_by_vault = dict(list(pre_s3.groupby(a_grp_s3)))
         for gid, g in alloc_ts_s3.groupby(a_grp_s3):
             addr = str(gid).lower()
-            pre = g[g["date"] <= "2025-11-03"]
-            pre_val = 0
-            market_allocs = []
-            if not pre.empty:
-                latest = pre["date"].max()
-                day_data = pre[pre["date"] == latest]
-                pre_val = day_data["supply_assets_usd"].sum()
-                for _, row in day_data.iterrows():
-                    if row["supply_assets_usd"] > 0:
-                        market_allocs.append({
-                            "market_unique_key": str(row.get("market_unique_key", "")).lower(),
-                            "supply_usd": row["supply_assets_usd"],
-                        })
+            pre = pre_by_vault.get(gid, pre_s3.iloc[0:0])
+            market_allocs = [
+                {"market_unique_key": str(row.get("market_unique_key", "")).lower(),
+                 "supply_usd": row["supply_assets_usd"]}
+                for _, row in pre.iterrows() if row["supply_assets_usd"] > 0
+            ]
             peak_val = g.groupby("date")["supply_assets_usd"].sum().max()
             alloc_by_vault[addr] = {
-                "pre_depeg": pre_val,
+                "pre_depeg": pre["supply_assets_usd"].sum(),
                 "peak": peak_val,
                 "market_allocs": market_allocs,
             }